@@ -0,0 +1,218 @@
+"""
+Benchmarks for the technical and fundamental tool hot paths.
+
+Runs the TechDataTool/FundDataTool computations on synthetic OHLCV fixtures,
+records per-call timings and peak memory, and compares them with a JSON
+baseline. Nothing here touches the network.
+
+Usage:
+    python -m benchmarks.bench_tools                 # compare with baseline
+    python -m benchmarks.bench_tools --update        # rewrite the baseline
+    python -m benchmarks.bench_tools --sizes 200 --symbols 1,16 --filter tech.
+
+Timings are machine specific: refresh the baseline with ``--update`` when
+moving to new hardware, then commit it together with the change it measures.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import synthetic_fundamentals, synthetic_ohlcv, synthetic_universe
+from vn_stock_advisor.price_arrays import PriceBars
+from vn_stock_advisor.tools.custom_tool import FundDataTool, TechDataTool
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+DEFAULT_SIZES = (200, 2_000, 20_000)
+DEFAULT_SYMBOLS = (1, 16, 160, 1_600)
+SWEEP_BARS = 200
+MIN_SAMPLE_SECONDS = 0.05
+
+
+def _time_call(fn, repeat: int) -> float:
+    """Return the best per-call wall time of ``fn`` over ``repeat`` samples."""
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+
+    # Slow cases use the first call as a sample, fast ones are looped until measurable
+    number = 1
+    while elapsed < MIN_SAMPLE_SECONDS and number < 1_000:
+        number *= 10
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _peak_memory(fn) -> float:
+    """Return the peak traced allocation of one ``fn`` call in KiB."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def _measure(fn, repeat: int) -> dict:
+    return {
+        "seconds": _time_call(fn, repeat),
+        "peak_kib": _peak_memory(fn),
+    }
+
+
+def _bar_cases(sizes):
+    tech = TechDataTool()
+    fund = FundDataTool()
+
+    for n_bars in sizes:
+        price_data = synthetic_ohlcv(n_bars)
+        indicators = tech._calculate_indicators(price_data)
+        latest = indicators.latest()
+        current_price = price_data["close"].iloc[-1]
+        support_resistance = tech._find_support_resistance(price_data)
+
+        yield f"tech.calculate_indicators[bars={n_bars}]", lambda p=price_data: tech._calculate_indicators(p)
+        yield f"tech.find_support_resistance[bars={n_bars}]", lambda p=price_data: tech._find_support_resistance(p)
+        yield (
+            f"tech.get_technical_analysis[bars={n_bars}]",
+            lambda i=latest, c=current_price, s=support_resistance: tech._get_technical_analysis(i, c, s),
+        )
+        yield f"tech.timeframes[bars={n_bars}]", lambda p=price_data: tech._compute_timeframes(p)
+        yield (
+            f"tech.format_report[bars={n_bars}]",
+            lambda p=price_data: tech._format_report("BENCH", "Công ty Benchmark", "Thép", p),
+        )
+
+    ratios, income = synthetic_fundamentals()
+    yield "fund.format_report", lambda: fund._format_report("BENCH", "Công ty Benchmark", "Thép", ratios, income)
+
+
+def _symbol_cases(symbol_counts):
+    tech = TechDataTool()
+
+    for n_symbols in symbol_counts:
+        universe = synthetic_universe(n_symbols, SWEEP_BARS)
+
+        def run(universe=universe):
+            # Keep every symbol's bars and indicators alive, as a resident universe would
+            bars = [PriceBars.from_frame(df) for df in universe.values()]
+            indicators = [tech._calculate_indicators(b) for b in bars]
+            levels = [tech._find_support_resistance(b) for b in bars]
+            return bars, indicators, levels
+
+        yield f"tech.universe[symbols={n_symbols},bars={SWEEP_BARS}]", run
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, symbol_counts=DEFAULT_SYMBOLS, repeat: int = 3, name_filter: str = "") -> dict:
+    """Run every case whose name contains ``name_filter`` and return its metrics."""
+    results = {}
+    for name, fn in _bar_cases(sizes):
+        if name_filter in name:
+            results[name] = _measure(fn, repeat)
+            print(f"  {name:<55} {results[name]['seconds'] * 1000:>10.3f} ms {results[name]['peak_kib']:>12.1f} KiB")
+
+    for name, fn in _symbol_cases(symbol_counts):
+        if name_filter in name:
+            # Universe sweeps are long enough that a single sample is stable
+            results[name] = _measure(fn, 1)
+            print(f"  {name:<55} {results[name]['seconds'] * 1000:>10.3f} ms {results[name]['peak_kib']:>12.1f} KiB")
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list:
+    """Return a list of regression messages for ``results`` against ``baseline``."""
+    limits = {"seconds": tolerance, "peak_kib": memory_tolerance}
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric, limit in limits.items():
+            if metric not in reference or reference[metric] <= 0:
+                continue
+            ratio = metrics[metric] / reference[metric]
+            if ratio > 1 + limit:
+                regressions.append(
+                    f"{name} {metric}: {metrics[metric]:.6g} vs baseline {reference[metric]:.6g} "
+                    f"(+{(ratio - 1) * 100:.1f}%, tolerance {limit * 100:.0f}%)"
+                )
+    return regressions
+
+
+def _metadata() -> dict:
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def _parse_ints(value: str) -> tuple:
+    return tuple(int(v) for v in value.split(",") if v)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the technical/fundamental tool hot paths.")
+    parser.add_argument("--sizes", type=_parse_ints, default=DEFAULT_SIZES, help="Bar counts, comma separated")
+    parser.add_argument("--symbols", type=_parse_ints, default=DEFAULT_SYMBOLS, help="Universe sizes, comma separated")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing samples per case (best is kept)")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--output", type=Path, help="Also write this run's results to a JSON file")
+    parser.add_argument("--update", action="store_true", help="Merge this run into the baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.30, help="Allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="Allowed relative peak memory growth")
+    args = parser.parse_args(argv)
+
+    print(f"{'case':<57} {'time':>13} {'peak memory':>16}")
+    results = run_benchmarks(args.sizes, args.symbols, args.repeat, args.filter)
+    report = {"meta": _metadata(), "results": results}
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {"results": {}}
+
+    if args.update:
+        stored["meta"] = report["meta"]
+        stored["results"] = {**stored.get("results", {}), **results}
+        args.baseline.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"\nBaseline updated: {args.baseline}")
+        return 0
+
+    regressions = compare(results, stored.get("results", {}), args.tolerance, args.memory_tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  - {message}")
+        return 1
+
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Synthetic replay recordings standing in for vnstock, Serper and the LLMs.
+
+``write_cassettes`` fills a ``REPLAY_DIR`` with one recording per data call and
+per task LLM step. Served with ``REPLAY_MODE=replay REPLAY_STRICT=false``, they
+let the API run the full crew (tools included) for any symbol without network
+access or API keys, which is what the load-test harness needs.
+
+Usage:
+    python -m benchmarks.cassettes data/replay-mock
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from benchmarks.fixtures import synthetic_fundamentals, synthetic_ohlcv
+from vn_stock_advisor import replay
+
+MOCK_SYMBOL = "MOCK"
+
+FUND_TOOL = "Công cụ tra cứu dữ liệu cổ phiếu phục vụ phân tích cơ bản."
+TECH_TOOL = "Công cụ tra cứu dữ liệu cổ phiếu phục vụ phân tích kĩ thuật."
+SEARCH_TOOL = "Search the internet with Serper"
+
+
+def _action(tool: str, arguments: dict) -> str:
+    return (
+        "Thought: Tôi cần thu thập dữ liệu trước khi phân tích.\n"
+        f"Action: {tool}\n"
+        f"Action Input: {json.dumps(arguments, ensure_ascii=False)}"
+    )
+
+
+def _final(answer: str) -> str:
+    return f"Thought: Tôi đã có đủ thông tin để trả lời.\nFinal Answer: {answer}"
+
+
+def _decision() -> str:
+    return json.dumps({
+        "stock_ticker": MOCK_SYMBOL,
+        "full_name": "Công ty Cổ phần Mock",
+        "industry": "Thép",
+        "today_date": str(datetime.now().date()),
+        "decision": "GIỮ",
+        "macro_reasoning": "Vĩ mô ổn định, lãi suất thấp hỗ trợ thị trường.",
+        "fund_reasoning": "P/E và P/B gần trung bình ngành, biên lợi nhuận ổn định.",
+        "tech_reasoning": "Giá dao động quanh MA50, RSI trung tính.",
+        "buy_price": 24.5,
+        "sell_price": 29.0,
+    }, ensure_ascii=False)
+
+
+# Per task: the LLM completion returned at each step (label "<task>:<step>")
+LLM_STEPS = {
+    "macro_digest": [
+        "- **Lãi suất**: NHNN giữ nguyên lãi suất điều hành, hỗ trợ thanh khoản.\n"
+        "- **Tỷ giá**: USD/VND ổn định.\n"
+        "- **VN-Index**: thị trường tích lũy quanh vùng hỗ trợ.",
+    ],
+    "news_collecting": [
+        _action(SEARCH_TOOL, {"search_query": f"tin tức doanh nghiệp {MOCK_SYMBOL}"}),
+        _final("1. **Lãi suất điều hành giữ nguyên** - NHNN duy trì lãi suất, hỗ trợ thanh khoản thị trường."),
+    ],
+    "fundamental_analysis": [
+        _action(FUND_TOOL, {"argument": MOCK_SYMBOL}),
+        _final("Định giá hợp lý so với ngành, sức khỏe tài chính ổn định. Điểm cơ bản: 6/10."),
+    ],
+    # TechDataTool is result_as_answer, so its output ends the task
+    "technical_analysis": [
+        _action(TECH_TOOL, {"argument": MOCK_SYMBOL}),
+    ],
+    "investment_decision": [
+        _final(_decision()),
+    ],
+}
+
+
+def write_cassettes(directory: str, symbol: str = MOCK_SYMBOL, n_bars: int = 200) -> int:
+    """Write the synthetic recordings to ``directory`` and return how many were written."""
+    previous = replay.settings
+    replay.configure(mode="record", directory=directory)
+    written = 0
+    try:
+        def record(kind, key, value, label):
+            nonlocal written
+            replay.call(kind, key, lambda: value, label=label)
+            written += 1
+
+        end = datetime.now()
+        start = end - timedelta(days=200)
+        ratios, income = synthetic_fundamentals()
+        for call, value, params in (
+            ("company", ["Công ty Cổ phần Mock", "Thép"], {}),
+            ("finance.ratio", ratios, {"period": "quarter"}),
+            ("finance.income_statement", income, {"period": "quarter"}),
+            # Bars end today so date-filtered reads (the market store) find them
+            ("quote.history", synthetic_ohlcv(n_bars).assign(time=pd.bdate_range(end=end.date(), periods=n_bars)), {
+                "start": start.strftime("%Y-%m-%d"), "end": end.strftime("%Y-%m-%d"), "interval": "1D",
+            }),
+        ):
+            key = {"source": "TCBS", "symbol": symbol, "call": call, **params}
+            record("vnstock", key, value, f"TCBS.{call}")
+
+        record("search", {"query": "mock"}, {"organic": [{
+            "title": "NHNN giữ nguyên lãi suất điều hành",
+            "link": "https://vneconomy.vn/mock",
+            "snippet": "Ngân hàng Nhà nước tiếp tục duy trì mặt bằng lãi suất thấp.",
+            "date": str(end.date()),
+        }]}, "serper")
+
+        for task, steps in LLM_STEPS.items():
+            for step, completion in enumerate(steps):
+                record("llm", {"task": task, "step": step}, completion, f"{task}:{step}")
+    finally:
+        replay.configure(**previous.__dict__)
+    return written
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic replay recordings for offline runs.")
+    parser.add_argument("directory", help="Target REPLAY_DIR")
+    parser.add_argument("--bars", type=int, default=200, help="Price history length")
+    args = parser.parse_args(argv)
+    print(f"Wrote {write_cassettes(args.directory, n_bars=args.bars)} recordings to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Synthetic market data used by the benchmark suite.
+
+Frames mimic what vnstock (TCBS) returns so the tools can be exercised without
+network access. Prices are in thousands of VND, like the real quote history.
+"""
+import numpy as np
+import pandas as pd
+
+
+def synthetic_ohlcv(n_bars: int, seed: int = 0, start_price: float = 25.0) -> pd.DataFrame:
+    """Build a daily OHLCV frame of ``n_bars`` sessions from a seeded random walk."""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.018, n_bars)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = close * (1 + rng.normal(0, 0.004, n_bars))
+    spread = np.abs(rng.normal(0, 0.012, n_bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.lognormal(mean=13.5, sigma=0.6, size=n_bars).astype(np.int64)
+
+    return pd.DataFrame({
+        "time": pd.bdate_range(end="2025-06-30", periods=n_bars),
+        "open": open_.round(2),
+        "high": high.round(2),
+        "low": low.round(2),
+        "close": close.round(2),
+        "volume": volume,
+    })
+
+
+def synthetic_universe(n_symbols: int, n_bars: int, seed: int = 0) -> dict:
+    """Build ``{symbol: ohlcv}`` for ``n_symbols`` synthetic tickers."""
+    return {
+        f"S{i:04d}": synthetic_ohlcv(n_bars, seed=seed + i, start_price=10 + (i % 90))
+        for i in range(n_symbols)
+    }
+
+
+def synthetic_fundamentals(seed: int = 0) -> tuple:
+    """Build ``(financial_ratios, income_statement)`` frames with TCBS column names."""
+    rng = np.random.default_rng(seed)
+    n_quarters = 8
+    ratios = pd.DataFrame({
+        "price_to_earning": rng.uniform(5, 25, n_quarters).round(1),
+        "price_to_book": rng.uniform(0.8, 4, n_quarters).round(1),
+        "roe": rng.uniform(0.05, 0.3, n_quarters).round(3),
+        "roa": rng.uniform(0.01, 0.15, n_quarters).round(3),
+        "earning_per_share": rng.integers(500, 8000, n_quarters),
+        "debt_on_equity": rng.uniform(0.1, 2, n_quarters).round(2),
+        "gross_profit_margin": rng.uniform(0.1, 0.5, n_quarters).round(3),
+        "value_before_ebitda": rng.uniform(3, 15, n_quarters).round(1),
+    })
+    revenue = rng.integers(1_000, 50_000, n_quarters)
+    income = pd.DataFrame({
+        "revenue": revenue,
+        "gross_profit": (revenue * rng.uniform(0.1, 0.4, n_quarters)).astype(np.int64),
+        "post_tax_profit": (revenue * rng.uniform(0.02, 0.15, n_quarters)).astype(np.int64),
+    })
+    return ratios, income
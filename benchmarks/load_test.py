@@ -0,0 +1,353 @@
+"""
+HTTP load test for the API server.
+
+Drives the ``/analyze/*`` endpoints at a fixed concurrency (closed loop: each
+worker sends its next request when the previous one returns) or a fixed
+arrival rate (open loop: requests start on schedule however many are in
+flight). Several levels can be swept in one run. Each level reports
+throughput, p50/p95/p99 latency, error/timeout/408 rates, and the server's CPU
+and RSS sampled from ``/metrics`` while it runs.
+
+``--spawn`` starts a local server backed by mock providers: synthetic replay
+recordings (see ``benchmarks.cassettes``) served with a configurable latency
+per kind, so runs need no network or API keys.
+
+Usage:
+    python -m benchmarks.load_test --spawn --concurrency 1,2,4,8 --duration 60
+    python -m benchmarks.load_test --spawn --rate 0.5,1,2 --endpoints complete \\
+        --latency "llm=1500,vnstock=80,search=400" --complete-timeout 20
+    python -m benchmarks.load_test --url http://localhost:8000 --concurrency 4
+
+CPU and RSS come from the one process answering ``/metrics``, so measure a
+single-worker server (one container) at a time.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.cassettes import write_cassettes
+
+ENDPOINTS = ("market", "fundamental", "technical", "decision", "complete")
+DEFAULT_SYMBOLS = ("FPT", "HPG", "VNM", "MWG", "TCB")
+DEFAULT_LATENCY = "llm=1500,vnstock=80,search=400"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+
+def _latency_summary(latencies: List[float]) -> dict:
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": float(np.mean(latencies)) if latencies else None,
+        "max": max(latencies) if latencies else None,
+    }
+
+
+def summarize(results: List[dict], elapsed: float, samples: List[dict]) -> dict:
+    """Aggregate per-request results and server samples of one load level.
+
+    Each result is ``{"endpoint", "status", "seconds"}`` where ``status`` is the
+    HTTP status code, ``"timeout"`` (client gave up) or ``"error"`` (transport).
+    """
+    total = len(results)
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    ok = [r for r in results if isinstance(r["status"], int) and r["status"] < 400]
+    failed = total - len(ok)
+
+    by_endpoint = {}
+    for endpoint in sorted({r["endpoint"] for r in results}):
+        rows = [r for r in results if r["endpoint"] == endpoint]
+        by_endpoint[endpoint] = {
+            "requests": len(rows),
+            "errors": sum(1 for r in rows if not (isinstance(r["status"], int) and r["status"] < 400)),
+            "latency": _latency_summary([r["seconds"] for r in rows if r["status"] != "timeout"]),
+        }
+
+    cpu = [s["cpu_percent"] for s in samples if s.get("cpu_percent") is not None]
+    rss = [s["rss_mib"] for s in samples if s.get("rss_mib") is not None]
+    return {
+        "requests": total,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "latency": _latency_summary([r["seconds"] for r in ok]),
+        "status_counts": statuses,
+        "error_rate": failed / total if total else 0.0,
+        "timeout_rate": statuses.get("timeout", 0) / total if total else 0.0,
+        "http_408_rate": statuses.get("408", 0) / total if total else 0.0,
+        "by_endpoint": by_endpoint,
+        "server": {
+            "cpu_percent_mean": float(np.mean(cpu)) if cpu else None,
+            "cpu_percent_max": max(cpu) if cpu else None,
+            "rss_mib_max": max(rss) if rss else None,
+            "samples": samples,
+        },
+    }
+
+
+def _parse_process_metrics(text: str) -> dict:
+    values = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in ("process_cpu_seconds_total", "process_resident_memory_bytes"):
+            values[name] = float(value)
+    return values
+
+
+async def _monitor(client: httpx.AsyncClient, url: str, interval: float, samples: List[dict], stop: asyncio.Event):
+    """Sample server CPU (% of one core) and RSS from /metrics until ``stop`` is set."""
+    started = time.perf_counter()
+    previous = None
+    while not stop.is_set():
+        try:
+            response = await client.get(f"{url}/metrics", timeout=interval * 5)
+            values = _parse_process_metrics(response.text)
+        except httpx.HTTPError:
+            values = {}
+        now = time.perf_counter()
+        sample = {"t": round(now - started, 2), "cpu_percent": None, "rss_mib": None}
+        if "process_resident_memory_bytes" in values:
+            sample["rss_mib"] = round(values["process_resident_memory_bytes"] / 2**20, 1)
+        if "process_cpu_seconds_total" in values:
+            if previous is not None:
+                cpu_delta = values["process_cpu_seconds_total"] - previous[1]
+                sample["cpu_percent"] = round(100 * cpu_delta / (now - previous[0]), 1)
+            previous = (now, values["process_cpu_seconds_total"])
+        samples.append(sample)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _send(client: httpx.AsyncClient, url: str, endpoint: str, symbol: str, timeout: float) -> dict:
+    start = time.perf_counter()
+    try:
+        response = await client.post(f"{url}/analyze/{endpoint}", json={"symbol": symbol}, timeout=timeout)
+        status = response.status_code
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.HTTPError:
+        status = "error"
+    return {"endpoint": endpoint, "symbol": symbol, "status": status, "seconds": time.perf_counter() - start}
+
+
+async def run_level(url: str, endpoints, symbols, duration: float, timeout: float,
+                    concurrency: Optional[int] = None, rate: Optional[float] = None,
+                    sample_interval: float = 1.0) -> dict:
+    """Run one load level for ``duration`` seconds and return its summary.
+
+    Requests still in flight when the duration ends are awaited and counted.
+    """
+    requests = itertools.cycle([(e, s) for s in symbols for e in endpoints])
+    results: List[dict] = []
+    samples: List[dict] = []
+    stop = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(limits=limits) as client:
+        monitor = asyncio.create_task(_monitor(client, url, sample_interval, samples, stop))
+        started = time.perf_counter()
+        deadline = started + duration
+
+        if rate:
+            in_flight = []
+            n = 0
+            while started + n / rate < deadline:
+                await asyncio.sleep(max(0.0, started + n / rate - time.perf_counter()))
+                in_flight.append(asyncio.create_task(_send(client, url, *next(requests), timeout)))
+                n += 1
+            results = list(await asyncio.gather(*in_flight))
+        else:
+            async def worker():
+                while time.perf_counter() < deadline:
+                    results.append(await _send(client, url, *next(requests), timeout))
+
+            await asyncio.gather(*(worker() for _ in range(concurrency or 1)))
+
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+
+    summary = summarize(results, elapsed, samples)
+    summary["level"] = {"concurrency": concurrency} if not rate else {"rate_rps": rate}
+    return summary
+
+
+def _wait_until_healthy(url: str, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not become healthy within {timeout:.0f}s")
+
+
+@contextmanager
+def mock_server(port: int, latency: str, complete_timeout: Optional[float] = None, log_path: Optional[Path] = None):
+    """Run a single-worker API server on replayed synthetic data; yields its URL."""
+    with tempfile.TemporaryDirectory(prefix="vn-stock-load-") as directory:
+        write_cassettes(os.path.join(directory, "replay"))
+        env = {
+            **os.environ,
+            "REPLAY_MODE": "replay",
+            "REPLAY_DIR": os.path.join(directory, "replay"),
+            "REPLAY_STRICT": "false",
+            "REPLAY_LATENCY_MS": latency,
+            "USAGE_DB_PATH": os.path.join(directory, "usage.sqlite3"),
+            "SEARCH_CACHE_PATH": os.path.join(directory, "search_cache.sqlite3"),
+            "MACRO_DIGEST_DIR": os.path.join(directory, "macro_digest"),
+            "MARKET_STORE_PATH": os.path.join(directory, "market_store.sqlite3"),
+            # Measure crew runs, not precomputed answers
+            "ANALYSIS_CACHE_ENABLED": "false",
+            "SCHEDULER_ENABLED": "false",
+            "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "mock-key"),
+            "GEMINI_MODEL": "gemini/mock-model",
+            "SERPER_API_KEY": os.environ.get("SERPER_API_KEY", "mock-key"),
+            "USE_AWS_MODELS": "false",
+            "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        }
+        if complete_timeout:
+            env["COMPLETE_TIMEOUT_SECONDS"] = str(complete_timeout)
+
+        log = open(log_path or os.devnull, "w")
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "vn_stock_advisor.api:app", "--port", str(port), "--log-level", "warning"],
+            env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_until_healthy(url, process)
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+
+def _print_level(summary: dict) -> None:
+    level = summary["level"]
+    name = f"c={level['concurrency']}" if "concurrency" in level else f"rate={level['rate_rps']}/s"
+    latency = summary["latency"]
+    fmt = lambda v: f"{v:8.2f}" if v is not None else "       -"
+    server = summary["server"]
+    print(
+        f"  {name:<12} {summary['requests']:>6} {summary['throughput_rps']:>8.2f}"
+        f" {fmt(latency['p50'])} {fmt(latency['p95'])} {fmt(latency['p99'])}"
+        f" {summary['error_rate'] * 100:>6.1f}% {summary['timeout_rate'] * 100:>6.1f}% {summary['http_408_rate'] * 100:>6.1f}%"
+        f" {fmt(server['cpu_percent_mean'])} {fmt(server['rss_mib_max'])}"
+    )
+
+
+def sustained_level(levels: List[dict], max_error_rate: float, slo_p95: Optional[float]) -> Optional[dict]:
+    """Highest level whose error rate (and p95, if an SLO is given) stays within bounds."""
+    best = None
+    for summary in levels:
+        p95 = summary["latency"]["p95"]
+        if summary["error_rate"] > max_error_rate or (slo_p95 and (p95 is None or p95 > slo_p95)):
+            continue
+        best = summary["level"]
+    return best
+
+
+def _parse_list(cast):
+    return lambda value: tuple(cast(v) for v in value.split(",") if v)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the VN Stock Advisor API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server to test (ignored with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Start a local server backed by mock providers")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the spawned server")
+    parser.add_argument("--latency", default=DEFAULT_LATENCY, help="Mock latency in ms per kind (REPLAY_LATENCY_MS)")
+    parser.add_argument("--complete-timeout", type=float, help="COMPLETE_TIMEOUT_SECONDS of the spawned server")
+    parser.add_argument("--server-log", type=Path, help="Write the spawned server's output here")
+    parser.add_argument("--endpoints", type=_parse_list(str), default=("complete",),
+                        help=f"Comma separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--symbols", type=_parse_list(str), default=DEFAULT_SYMBOLS, help="Symbols to cycle through")
+    parser.add_argument("--concurrency", type=_parse_list(int), default=(1, 2, 4, 8), help="Closed-loop levels")
+    parser.add_argument("--rate", type=_parse_list(float), default=(), help="Open-loop levels in requests/s")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds per level")
+    parser.add_argument("--timeout", type=float, default=240.0, help="Client timeout per request in seconds")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured requests sent before the first level")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Server CPU/RSS sampling interval")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate a sustained level may have")
+    parser.add_argument("--slo-p95", type=float, help="p95 latency (s) a sustained level must meet")
+    parser.add_argument("--output", type=Path, help="Write the full report (with samples) as JSON")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    levels = [{"rate": r} for r in args.rate] or [{"concurrency": c} for c in args.concurrency]
+
+    def run(url):
+        print(f"Target {url}, endpoints {','.join(args.endpoints)}, {args.duration:g}s per level")
+        print(f"  {'level':<12} {'reqs':>6} {'ok/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}"
+              f" {'errors':>7} {'timeout':>7} {'408':>7} {'cpu %':>8} {'rss MiB':>8}")
+        for i in range(args.warmup):
+            httpx.post(f"{url}/analyze/{args.endpoints[0]}", json={"symbol": args.symbols[i % len(args.symbols)]},
+                       timeout=args.timeout)
+        summaries = []
+        for level in levels:
+            summary = asyncio.run(run_level(
+                url, args.endpoints, args.symbols, args.duration, args.timeout,
+                sample_interval=args.sample_interval, **level,
+            ))
+            _print_level(summary)
+            summaries.append(summary)
+        return summaries
+
+    if args.spawn:
+        with mock_server(args.port, args.latency, args.complete_timeout, args.server_log) as url:
+            summaries = run(url)
+    else:
+        summaries = run(args.url)
+
+    sustained = sustained_level(summaries, args.max_error_rate, args.slo_p95)
+    print(f"\nHighest sustained level: {sustained or 'none'}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "target": "mock" if args.spawn else args.url,
+                "latency": args.latency if args.spawn else None,
+                "endpoints": list(args.endpoints),
+                "duration": args.duration,
+            },
+            "levels": summaries,
+            "sustained": sustained,
+        }
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Precomputed crew results served by the ``/analyze/*`` endpoints.
+
+The after-close scheduler runs the full crew for every watchlist symbol and
+stores the task outputs here under the symbol and the days they answer for
+(the closed session and the next one). The endpoints look a symbol up before
+starting a crew, so morning requests for watchlist names skip the four agents
+entirely. ``?refresh=true`` bypasses the lookup.
+
+Entries live in memory and in SQLite (``ANALYSIS_CACHE_PATH``, ``""`` keeps
+them in memory only) until their expiry.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from vn_stock_advisor import metrics
+
+ANALYSIS_CACHE_ENABLED = os.environ.get("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+ANALYSIS_CACHE_PATH = os.environ.get("ANALYSIS_CACHE_PATH", os.path.join("data", "analysis_cache.sqlite3"))
+
+ANALYSIS_CACHE_REQUESTS = metrics.Counter(
+    "vn_stock_advisor_analysis_cache_requests_total",
+    "Analysis requests by whether a precomputed result was served (hit) or a crew was run (miss).",
+    labelnames=("outcome",),
+)
+
+
+@dataclass
+class CachedTaskOutput:
+    """The parts of a crewAI ``TaskOutput`` the endpoints read."""
+    name: str
+    raw: str
+
+
+@dataclass
+class CachedAnalysis:
+    """Stored crew result, shaped like a ``CrewOutput`` for the endpoints."""
+    symbol: str
+    day: str
+    tasks_output: List[CachedTaskOutput] = field(default_factory=list)
+    created_at: float = 0.0
+    expires: float = 0.0
+
+    @property
+    def raw(self) -> str:
+        return self.tasks_output[-1].raw if self.tasks_output else ""
+
+    def __str__(self) -> str:
+        return self.raw
+
+
+class AnalysisCache:
+    """Crew results by (symbol, day), persisted to SQLite."""
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH, enabled: bool = ANALYSIS_CACHE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._memory: Dict[Tuple[str, str], CachedAnalysis] = {}
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                if not self._initialized:
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS analyses (symbol TEXT, day TEXT, created_at REAL,"
+                        " expires REAL, tasks TEXT, PRIMARY KEY (symbol, day))"
+                    )
+                    self._initialized = True
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, symbol: str, day: str, now: Optional[float] = None) -> Optional[CachedAnalysis]:
+        """Unexpired result of ``symbol`` for ``day``, if any."""
+        if not self.enabled:
+            return None
+        now = time.time() if now is None else now
+        key = (symbol.upper(), day)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self.path:
+                with self._connect() as connection:
+                    row = connection.execute(
+                        "SELECT created_at, expires, tasks FROM analyses WHERE symbol = ? AND day = ?", key
+                    ).fetchone()
+                if row:
+                    tasks = [CachedTaskOutput(**task) for task in json.loads(row[2])]
+                    entry = self._memory[key] = CachedAnalysis(key[0], day, tasks, row[0], row[1])
+        if entry is None or entry.expires <= now:
+            ANALYSIS_CACHE_REQUESTS.inc(outcome="miss")
+            return None
+        ANALYSIS_CACHE_REQUESTS.inc(outcome="hit")
+        return entry
+
+    def put(self, symbol: str, days: Iterable[str], result, expires: float) -> None:
+        """Store the task outputs of crew ``result`` for each of ``days`` until ``expires``."""
+        symbol, now = symbol.upper(), time.time()
+        tasks = [
+            CachedTaskOutput(name=getattr(task, "name", None) or "", raw=str(getattr(task, "raw", task)))
+            for task in getattr(result, "tasks_output", [])
+        ]
+        payload = json.dumps([task.__dict__ for task in tasks], ensure_ascii=False)
+        with self._lock:
+            for day in days:
+                self._memory[(symbol, day)] = CachedAnalysis(symbol, day, tasks, now, expires)
+                if self.path:
+                    with self._connect() as connection:
+                        connection.execute("DELETE FROM analyses WHERE expires <= ?", (now,))
+                        connection.execute(
+                            "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?)",
+                            (symbol, day, now, expires, payload),
+                        )
+
+
+cache = AnalysisCache()
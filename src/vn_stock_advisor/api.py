@@ -1,18 +1,51 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from contextlib import asynccontextmanager, nullcontext
 import uvicorn
+from dataclasses import asdict
 from datetime import date
 import json
 import asyncio
+import os
+import time
+import weakref
 
 from .crew import VnStockAdvisor
+from .tools.custom_tool import TechDataTool
+from . import analysis_cache, cancellation, cascade, correlation, deadlines, intraday, liquidity, macro_digest, market_data, market_regime, metrics, portfolio, scheduler, series, signals, universe, usage
+
+# Time limit of /analyze/complete before answering 408
+COMPLETE_TIMEOUT_SECONDS = float(os.environ.get("COMPLETE_TIMEOUT_SECONDS", "180"))
+# Section of the /analyze/complete response produced by each degradable task
+DEGRADED_SECTIONS = {
+    "news_collecting": "market_analysis",
+    "fundamental_analysis": "fundamental_analysis",
+    "technical_analysis": "technical_analysis",
+}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Bật lịch làm nóng cache cho watchlist sau giờ đóng cửa (SCHEDULER_ENABLED=true)
+    và nguồn dữ liệu intraday (INTRADAY_SOURCE)"""
+    if scheduler.SCHEDULER_ENABLED:
+        scheduler.scheduler.start()
+    source = intraday.source_from_env()
+    feed = intraday.IntradayFeed(source, intraday.store) if source is not None else None
+    if feed is not None:
+        feed.start()
+    yield
+    scheduler.scheduler.stop()
+    if feed is not None:
+        feed.stop()
 
 app = FastAPI(
     title="VN Stock Advisor API",
     description="API cho hệ thống phân tích cổ phiếu Việt Nam sử dụng Multi-AI-Agent",
-    version="0.4.1"
+    version="0.4.1",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -24,6 +57,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Đo thời gian xử lý request và thu thập timing breakdown cho từng request"""
+    start = time.perf_counter()
+    status = 500
+    with metrics.collect_timings():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            metrics.REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=request.method,
+                path=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
+
+def _timings(include: bool) -> Optional[Dict[str, Any]]:
+    """Trả về timing breakdown của request hiện tại nếu client yêu cầu (?timings=true)"""
+    breakdown = metrics.current_breakdown()
+    if not include or breakdown is None:
+        return None
+    return breakdown.summary()
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+async def _kickoff(inputs: Dict[str, str], endpoint: str, timeout: Optional[float] = None, refresh: bool = False,
+                  budget: Optional[deadlines.DeadlineBudget] = None):
+    """Chạy crew trong thread riêng và ghi nhận token/chi phí LLM của request.
+    Trả về kết quả tính sẵn (scheduler) nếu có, trừ khi refresh=true.
+    Mã không thanh khoản/tạm ngừng giao dịch (no_trade_rule) nhận ngay quyết định GIỮ, không chạy crew.
+    Quá thời gian thì crew bị hủy, không tiếp tục gọi LLM/công cụ.
+    Với budget, các tác vụ quá hạn riêng được thay bằng kết quả thiếu (budget.degraded)"""
+    with usage.track_request(inputs["symbol"], endpoint) as ledger:
+        if not refresh:
+            cached = await asyncio.to_thread(analysis_cache.cache.get, inputs["symbol"], inputs["current_date"])
+            if cached is not None:
+                return cached, ledger
+        day = inputs["current_date"]
+        illiquid = await asyncio.to_thread(liquidity.check, inputs["symbol"], _parse_date(day))
+        if illiquid is not None:
+            return await asyncio.to_thread(liquidity.no_trade_result, illiquid, day), ledger
+        # The agents carry the token into the crew's threads; a timed-out run stops at its next checkpoint
+        token = cancellation.CancellationToken(endpoint)
+        with cancellation.scope(token), deadlines.scope(budget) if budget is not None else nullcontext():
+            crew = VnStockAdvisor().crew()
+        if budget is not None:
+            budget.start()
+        run = asyncio.to_thread(token.run, crew.kickoff, inputs=inputs)
+        try:
+            result = await (asyncio.wait_for(run, timeout=timeout) if timeout else run)
+        except asyncio.TimeoutError:
+            token.cancel("timeout")
+            raise
+        except asyncio.CancelledError:
+            token.cancel("cancelled")
+            raise
+    return result, ledger
+
+async def _technical_indicators(symbol: str) -> Dict[str, Any]:
+    """Chỉ báo kỹ thuật khung ngày/tuần/tháng tính cục bộ từ dữ liệu giá ngày; rỗng nếu không lấy được dữ liệu"""
+    try:
+        return await asyncio.to_thread(TechDataTool().structured_indicators, symbol)
+    except Exception:
+        return {}
+
 # Request/Response Models
 class StockAnalysisRequest(BaseModel):
     symbol: str = Field(..., description="Mã cổ phiếu cần phân tích", example="HPG")
@@ -34,6 +139,8 @@ class MarketAnalysisResponse(BaseModel):
     analysis_date: str
     news_summary: str
     market_impact: str
+    timings: Optional[Dict[str, Any]] = None
+    usage: Optional[Dict[str, Any]] = None
 
 class FundamentalAnalysisResponse(BaseModel):
     symbol: str
@@ -44,6 +151,8 @@ class FundamentalAnalysisResponse(BaseModel):
     quarterly_trends: Dict[str, Any]
     valuation_assessment: str
     performance_evaluation: str
+    timings: Optional[Dict[str, Any]] = None
+    usage: Optional[Dict[str, Any]] = None
 
 class TechnicalAnalysisResponse(BaseModel):
     symbol: str
@@ -56,6 +165,8 @@ class TechnicalAnalysisResponse(BaseModel):
     support_resistance: Dict[str, Any]
     trend_analysis: str
     technical_signals: str
+    timings: Optional[Dict[str, Any]] = None
+    usage: Optional[Dict[str, Any]] = None
 
 class InvestmentDecisionResponse(BaseModel):
     stock_ticker: str
@@ -72,6 +183,8 @@ class InvestmentDecisionResponse(BaseModel):
     prob_up_60d: Optional[float] = None
     expected_return_60d: Optional[float] = None
     conviction: Optional[float] = None
+    timings: Optional[Dict[str, Any]] = None
+    usage: Optional[Dict[str, Any]] = None
 
 class CompleteAnalysisResponse(BaseModel):
     symbol: str
@@ -80,6 +193,37 @@ class CompleteAnalysisResponse(BaseModel):
     fundamental_analysis: FundamentalAnalysisResponse
     technical_analysis: TechnicalAnalysisResponse
     investment_decision: InvestmentDecisionResponse
+    # Parts cut at their deadline (TASK_DEADLINE_SHARES); the decision was made without them
+    degraded: List[str] = Field(default_factory=list)
+    timings: Optional[Dict[str, Any]] = None
+    usage: Optional[Dict[str, Any]] = None
+
+class PortfolioHolding(BaseModel):
+    symbol: str
+    weight: Optional[float] = Field(default=None, ge=0)
+
+class PortfolioAnalysisRequest(BaseModel):
+    holdings: List[PortfolioHolding] = Field(min_length=1)
+    current_date: Optional[str] = None
+
+class PortfolioHoldingResult(BaseModel):
+    symbol: str
+    weight: float
+    decision: Optional[str] = None
+    overall_score: Optional[float] = None
+    industry: Optional[str] = None
+    full_name: Optional[str] = None
+    buy_price: Optional[float] = None
+    sell_price: Optional[float] = None
+    cached: bool = False
+    error: Optional[str] = None
+
+class PortfolioAnalysisResponse(BaseModel):
+    analysis_date: str
+    holdings: List[PortfolioHoldingResult]
+    aggregates: Dict[str, Any]
+    timings: Optional[Dict[str, Any]] = None
+    usage: Optional[Dict[str, Any]] = None
 
 @app.get("/")
 async def root():
@@ -91,12 +235,211 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": str(date.today())}
+    return {"status": "healthy", "timestamp": str(date.today()), "data_sources": market_data.source_status()}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Histogram độ trễ theo từng giai đoạn (tool, data_source, search, llm, task) ở định dạng Prometheus"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/usage")
+async def llm_usage(
+    group_by: str = "day,symbol",
+    symbol: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    """
+    Thống kê token và chi phí LLM ước tính, nhóm theo day, symbol, endpoint, agent, task hoặc model
+    """
+    columns = tuple(c.strip() for c in group_by.split(",") if c.strip())
+    try:
+        rows = await asyncio.to_thread(usage.store.aggregate, columns, symbol, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group_by": list(columns), "rows": rows}
+
+@app.get("/macro-digest")
+async def get_macro_digest(day: Optional[str] = None, refresh: bool = False):
+    """
+    Bản tin vĩ mô dùng chung cho mọi mã trong ngày giao dịch (tạo mới nếu chưa có hoặc khi refresh=true).
+    Ngày đã qua chỉ trả về bản tin đã lưu
+    """
+    if day and _parse_date(day) is None:
+        raise HTTPException(status_code=400, detail="Ngày không hợp lệ, định dạng YYYY-MM-DD")
+    try:
+        digest = await asyncio.to_thread(macro_digest.get, _parse_date(day), refresh)
+    except macro_digest.PastDayError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except usage.BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi tạo bản tin vĩ mô: {str(e)}")
+    return asdict(digest)
+
+@app.get("/market/regime")
+async def get_market_regime(day: Optional[str] = None):
+    """
+    Độ rộng thị trường (tỷ lệ mã trên SMA50/SMA200, tăng/giảm) và xu hướng VNIndex của phiên đã đóng cửa gần nhất
+    (hoặc phiên của ngày day), tính từ dữ liệu giá nội bộ
+    """
+    if day and _parse_date(day) is None:
+        raise HTTPException(status_code=400, detail="Ngày không hợp lệ, định dạng YYYY-MM-DD")
+    try:
+        regime = await asyncio.to_thread(market_regime.get, _parse_date(day))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi tính chế độ thị trường: {str(e)}")
+    return asdict(regime)
+
+@app.get("/liquidity/{symbol}")
+async def get_liquidity(symbol: str, day: Optional[str] = None):
+    """
+    Khối lượng bình quân 10 phiên và số phiên không giao dịch của mã tại phiên đã đóng cửa gần nhất
+    (hoặc phiên của ngày day); no_trade=true thì các yêu cầu phân tích trả về GIỮ mà không chạy crew
+    """
+    if day and _parse_date(day) is None:
+        raise HTTPException(status_code=400, detail="Ngày không hợp lệ, định dạng YYYY-MM-DD")
+    try:
+        screened = await asyncio.to_thread(liquidity.screen, [symbol], _parse_date(day))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi sàng lọc thanh khoản: {str(e)}")
+    return asdict(screened[symbol.upper()])
+
+@app.get("/cascade")
+async def cascade_status():
+    """
+    Cấu hình mô hình nhanh và tỷ lệ chuyển lên mô hình chính của từng tác vụ phân tích
+    """
+    return cascade.status()
+
+@app.get("/scheduler")
+async def scheduler_status(day: Optional[str] = None):
+    """
+    Tiến độ làm nóng cache watchlist của một phiên (mặc định phiên gần nhất)
+    """
+    if day and _parse_date(day) is None:
+        raise HTTPException(status_code=400, detail="Ngày không hợp lệ, định dạng YYYY-MM-DD")
+    return await asyncio.to_thread(scheduler.status, _parse_date(day))
+
+@app.get("/universe")
+async def universe_status():
+    """
+    Thế hệ ma trận giá/chỉ báo toàn thị trường mà tiến trình này đang ánh xạ (dùng chung giữa các worker)
+    """
+    return await asyncio.to_thread(universe.status)
 
-# Cache management endpoints removed - using standard SerperDevTool
+@app.get("/correlation/{symbol}/peers")
+async def get_correlation_peers(symbol: str, n: int = 10):
+    """
+    Các mã tương quan cao nhất và thấp nhất với mã cổ phiếu (lợi suất ngày trong cửa sổ trượt)
+    """
+    if not 1 <= n <= 100:
+        raise HTTPException(status_code=400, detail="n phải nằm trong khoảng 1-100")
+    matrices = await asyncio.to_thread(correlation.reader.current)
+    if matrices is None:
+        raise HTTPException(status_code=404, detail="Chưa có ma trận tương quan, hãy chạy cập nhật tương quan")
+    try:
+        return matrices.peers(symbol, n)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+@app.get("/intraday/{symbol}")
+async def intraday_indicators(symbol: str, interval: str = "5m"):
+    """
+    Chỉ báo kỹ thuật trong phiên (1m/5m/15m) tính từ bộ đệm nến intraday, không gọi dữ liệu từ xa
+    """
+    if interval not in intraday.INTERVALS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Khung thời gian không hỗ trợ: {interval} (hỗ trợ: {', '.join(intraday.INTERVALS)})",
+        )
+    return await asyncio.to_thread(intraday.indicators, symbol, interval)
+
+@app.get("/indicators/{symbol}/series")
+async def indicator_series(request: Request, symbol: str, start: Optional[str] = None, end: Optional[str] = None,
+                           columns: Optional[str] = None, offset: int = 0, limit: int = series.SERIES_MAX_LIMIT,
+                           format: Optional[str] = None):
+    """
+    Toàn bộ chuỗi giá và chỉ báo kỹ thuật theo từng phiên trong khoảng ngày, cho biểu đồ.
+    format=arrow (Arrow IPC stream) hoặc ndjson (mặc định, hoặc theo header Accept);
+    columns chọn cột, offset/limit phân trang (tổng số phiên và offset kế tiếp trong header)
+    """
+    if format is None:
+        format = "arrow" if series.ARROW_MEDIA_TYPE in request.headers.get("accept", "") else "ndjson"
+    if format not in ("arrow", "ndjson"):
+        raise HTTPException(status_code=400, detail="Định dạng không hỗ trợ, dùng arrow hoặc ndjson")
+    if (start and _parse_date(start) is None) or (end and _parse_date(end) is None):
+        raise HTTPException(status_code=400, detail="Ngày không hợp lệ, định dạng YYYY-MM-DD")
+    if offset < 0 or not 1 <= limit <= series.SERIES_MAX_LIMIT:
+        raise HTTPException(
+            status_code=400, detail=f"offset phải >= 0 và limit trong khoảng 1-{series.SERIES_MAX_LIMIT}",
+        )
+    try:
+        selected = series.parse_columns(columns)
+        page = await asyncio.to_thread(
+            series.load, symbol, _parse_date(start), _parse_date(end), selected, offset, limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi lấy chuỗi chỉ báo: {str(e)}")
+
+    headers = {"X-Total-Count": str(page.total)}
+    if page.next_offset is not None:
+        headers["X-Next-Offset"] = str(page.next_offset)
+    if format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=406, detail="Máy chủ chưa cài pyarrow, hãy dùng format=ndjson")
+        return StreamingResponse(series.arrow_chunks(page), media_type=series.ARROW_MEDIA_TYPE, headers=headers)
+    return StreamingResponse(series.ndjson_chunks(page), media_type=series.NDJSON_MEDIA_TYPE, headers=headers)
+
+@app.websocket("/ws/signals")
+async def signal_stream(websocket: WebSocket):
+    """
+    Đẩy thay đổi trạng thái tín hiệu kỹ thuật (RSI, MACD, Bollinger Bands, xu hướng, khối lượng) theo từng nến intraday.
+
+    Gửi {"action": "subscribe" | "unsubscribe", "symbols": ["HPG", ...], "interval": "5m"};
+    nhận một bản "snapshot" trạng thái hiện tại cho mỗi mã, sau đó chỉ các bản "transition" khi trạng thái đổi.
+    """
+    await websocket.accept()
+    hub = signals.hub
+    subscriber = signals.Subscriber(asyncio.get_running_loop())
+
+    async def forward():
+        while True:
+            await websocket.send_json(await subscriber.queue.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                action, symbols = message["action"], message["symbols"]
+                interval = message.get("interval", "5m")
+            except (ValueError, KeyError, TypeError):
+                action, symbols, interval = None, None, None
+            if action not in ("subscribe", "unsubscribe") or not isinstance(symbols, list):
+                subscriber.put({"type": "error", "detail": "Yêu cầu không hợp lệ, cần action subscribe/unsubscribe và danh sách symbols"})
+                continue
+            for symbol in symbols:
+                if action == "unsubscribe":
+                    hub.unsubscribe(subscriber, str(symbol), interval)
+                    continue
+                try:
+                    subscriber.put(hub.subscribe(subscriber, str(symbol), interval))
+                except ValueError as e:
+                    subscriber.put({"type": "error", "detail": str(e)})
+                    break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        hub.remove(subscriber)
 
 @app.post("/analyze/market", response_model=MarketAnalysisResponse)
-async def analyze_market(request: StockAnalysisRequest):
+async def analyze_market(request: StockAnalysisRequest, timings: bool = False, refresh: bool = False):
     """
     Phân tích tin tức vĩ mô và tác động thị trường
     """
@@ -107,8 +450,7 @@ async def analyze_market(request: StockAnalysisRequest):
         }
         
         # Tạo crew và chạy toàn bộ pipeline
-        crew = VnStockAdvisor().crew()
-        result = crew.kickoff(inputs=inputs)
+        result, ledger = await _kickoff(inputs, "market", refresh=refresh)
         
         # Lấy output từ task đầu tiên (news_collecting)
         # Thử nhiều cách khác nhau để lấy task output
@@ -137,13 +479,17 @@ async def analyze_market(request: StockAnalysisRequest):
             symbol=request.symbol,
             analysis_date=inputs["current_date"],
             news_summary=news_task_output[:500] + "..." if len(news_task_output) > 500 else news_task_output,
-            market_impact="Phân tích tác động thị trường từ tin tức vĩ mô"
+            market_impact="Phân tích tác động thị trường từ tin tức vĩ mô",
+            timings=_timings(timings),
+            usage=ledger.summary()
         )
+    except usage.BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi phân tích thị trường: {str(e)}")
 
 @app.post("/analyze/fundamental", response_model=FundamentalAnalysisResponse)
-async def analyze_fundamental(request: StockAnalysisRequest):
+async def analyze_fundamental(request: StockAnalysisRequest, timings: bool = False, refresh: bool = False):
     """
     Phân tích cơ bản cổ phiếu
     """
@@ -153,8 +499,7 @@ async def analyze_fundamental(request: StockAnalysisRequest):
             "current_date": request.current_date or str(date.today())
         }
         
-        crew = VnStockAdvisor().crew()
-        result = crew.kickoff(inputs=inputs)
+        result, ledger = await _kickoff(inputs, "fundamental", refresh=refresh)
         
         # Lấy output từ task thứ 2 (fundamental_analysis)
         fundamental_output = ""
@@ -183,13 +528,17 @@ async def analyze_fundamental(request: StockAnalysisRequest):
             financial_ratios={},
             quarterly_trends={},
             valuation_assessment=fundamental_output[:300] + "..." if len(fundamental_output) > 300 else fundamental_output,
-            performance_evaluation="Đánh giá hiệu suất tài chính"
+            performance_evaluation="Đánh giá hiệu suất tài chính",
+            timings=_timings(timings),
+            usage=ledger.summary()
         )
+    except usage.BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi phân tích cơ bản: {str(e)}")
 
 @app.post("/analyze/technical", response_model=TechnicalAnalysisResponse)
-async def analyze_technical(request: StockAnalysisRequest):
+async def analyze_technical(request: StockAnalysisRequest, timings: bool = False, refresh: bool = False):
     """
     Phân tích kỹ thuật cổ phiếu
     """
@@ -199,8 +548,7 @@ async def analyze_technical(request: StockAnalysisRequest):
             "current_date": request.current_date or str(date.today())
         }
         
-        crew = VnStockAdvisor().crew()
-        result = crew.kickoff(inputs=inputs)
+        result, ledger = await _kickoff(inputs, "technical", refresh=refresh)
         
         # Lấy output từ task thứ 3 (technical_analysis)
         technical_output = ""
@@ -228,16 +576,20 @@ async def analyze_technical(request: StockAnalysisRequest):
             analysis_date=inputs["current_date"],
             current_price=0.0,
             current_volume=0,
-            technical_indicators={},
+            technical_indicators=await _technical_indicators(request.symbol),
             support_resistance={},
             trend_analysis=technical_output[:300] + "..." if len(technical_output) > 300 else technical_output,
-            technical_signals="Tín hiệu kỹ thuật"
+            technical_signals="Tín hiệu kỹ thuật",
+            timings=_timings(timings),
+            usage=ledger.summary()
         )
+    except usage.BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi phân tích kỹ thuật: {str(e)}")
 
 @app.post("/analyze/decision", response_model=InvestmentDecisionResponse)
-async def get_investment_decision(request: StockAnalysisRequest):
+async def get_investment_decision(request: StockAnalysisRequest, timings: bool = False, refresh: bool = False):
     """
     Lấy quyết định đầu tư cuối cùng
     """
@@ -247,8 +599,7 @@ async def get_investment_decision(request: StockAnalysisRequest):
             "current_date": request.current_date or str(date.today())
         }
         
-        crew = VnStockAdvisor().crew()
-        result = crew.kickoff(inputs=inputs)
+        result, ledger = await _kickoff(inputs, "decision", refresh=refresh)
         
         # Lấy output từ task thứ 4 (investment_decision)
         decision_output = {}
@@ -310,7 +661,9 @@ async def get_investment_decision(request: StockAnalysisRequest):
                 overall_score=decision_output.get('overall_score', 5.0),
                 prob_up_60d=decision_output.get('prob_up_60d'),
                 expected_return_60d=decision_output.get('expected_return_60d'),
-                conviction=decision_output.get('conviction')
+                conviction=decision_output.get('conviction'),
+                timings=_timings(timings),
+                usage=ledger.summary()
             )
         else:
             # Fallback nếu không parse được
@@ -328,13 +681,17 @@ async def get_investment_decision(request: StockAnalysisRequest):
                 overall_score=7.5,
                 prob_up_60d=None,
                 expected_return_60d=None,
-                conviction=None
+                conviction=None,
+                timings=_timings(timings),
+                usage=ledger.summary()
             )
+    except usage.BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi lấy quyết định đầu tư: {str(e)}")
 
 @app.post("/analyze/complete", response_model=CompleteAnalysisResponse)
-async def complete_analysis(request: StockAnalysisRequest):
+async def complete_analysis(request: StockAnalysisRequest, timings: bool = False, refresh: bool = False):
     """
     Thực hiện phân tích toàn diện và trả về tất cả kết quả
     """
@@ -344,11 +701,10 @@ async def complete_analysis(request: StockAnalysisRequest):
             "current_date": request.current_date or str(date.today())
         }
         
-        crew = VnStockAdvisor().crew()
-        # Add timeout to prevent hanging
-        result = await asyncio.wait_for(
-            asyncio.to_thread(crew.kickoff, inputs=inputs),
-            timeout=180  # 1 minute timeout - force faster completion
+        # The news and fundamental tasks have their own deadlines within the timeout (TASK_DEADLINE_SHARES)
+        budget = deadlines.DeadlineBudget(COMPLETE_TIMEOUT_SECONDS)
+        result, ledger = await _kickoff(
+            inputs, "complete", timeout=COMPLETE_TIMEOUT_SECONDS, refresh=refresh, budget=budget,
         )
         
         # Parse tất cả kết quả - xử lý cả dict và list
@@ -403,7 +759,7 @@ async def complete_analysis(request: StockAnalysisRequest):
             analysis_date=inputs["current_date"],
             current_price=0.0,
             current_volume=0,
-            technical_indicators={},
+            technical_indicators=await _technical_indicators(request.symbol),
             support_resistance={},
             trend_analysis=str(technical_output)[:300] + "..." if len(str(technical_output)) > 300 else str(technical_output),
             technical_signals="Tín hiệu kỹ thuật"
@@ -476,13 +832,132 @@ async def complete_analysis(request: StockAnalysisRequest):
             market_analysis=market_analysis,
             fundamental_analysis=fundamental_analysis,
             technical_analysis=technical_analysis,
-            investment_decision=investment_decision
+            investment_decision=investment_decision,
+            degraded=[DEGRADED_SECTIONS.get(task, task) for task in budget.degraded],
+            timings=_timings(timings),
+            usage=ledger.summary()
         )
     except asyncio.TimeoutError:
-        raise HTTPException(status_code=408, detail="Phân tích quá thời gian cho phép (3 phút)")
+        raise HTTPException(status_code=408, detail=f"Phân tích quá thời gian cho phép ({COMPLETE_TIMEOUT_SECONDS:g} giây)")
+    except usage.BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi phân tích toàn diện: {str(e)}")
 
+class _PortfolioRuns:
+    """Crew runs of the portfolio requests served by one event loop: at most PORTFOLIO_CONCURRENCY
+    at a time, and one per (symbol, day) shared by the requests waiting for it"""
+
+    def __init__(self):
+        self.slots = asyncio.Semaphore(max(portfolio.PORTFOLIO_CONCURRENCY, 1))
+        self.runs: Dict[Tuple[str, str], "_SharedRun"] = {}
+
+class _SharedRun:
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+_portfolio_runs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _PortfolioRuns]" = weakref.WeakKeyDictionary()
+
+async def _portfolio_run(runs: _PortfolioRuns, symbol: str, day: str, refresh: bool):
+    async with runs.slots:
+        result, ledger = await _kickoff(
+            {"symbol": symbol, "current_date": day}, "portfolio",
+            timeout=COMPLETE_TIMEOUT_SECONDS, refresh=refresh,
+        )
+    cached = isinstance(result, analysis_cache.CachedAnalysis)
+    if not cached:
+        # Overlapping portfolios (and the single-symbol endpoints) reuse it until the next close
+        await asyncio.to_thread(analysis_cache.cache.put, symbol, [day], result, portfolio.result_expiry(day))
+    return portfolio.decision_fields(result), cached, ledger.summary()
+
+async def _shared_portfolio_run(symbol: str, day: str, refresh: bool):
+    """Phân tích một mã của danh mục; các request danh mục cùng lúc hỏi cùng mã/ngày dùng chung một lần chạy crew.
+    Request đi sau nhận kết quả như kết quả có sẵn (cached, không tính usage)"""
+    loop = asyncio.get_running_loop()
+    runs = _portfolio_runs.get(loop)
+    if runs is None:
+        runs = _portfolio_runs[loop] = _PortfolioRuns()
+    key = (symbol, day)
+    run = runs.runs.get(key)
+    leader = run is None
+    if leader:
+        run = runs.runs[key] = _SharedRun(asyncio.ensure_future(_portfolio_run(runs, symbol, day, refresh)))
+        run.task.add_done_callback(lambda _: runs.runs.pop(key) if runs.runs.get(key) is run else None)
+    run.waiters += 1
+    try:
+        fields, cached, summary = await asyncio.shield(run.task)
+    except asyncio.CancelledError:
+        # The crew is cancelled only once no request waits for it any more
+        if run.waiters == 1:
+            run.task.cancel()
+        raise
+    finally:
+        run.waiters -= 1
+    if leader:
+        return fields, cached, summary
+    return fields, True, usage.UsageLedger(symbol, "portfolio", day).summary()
+
+@app.post("/analyze/portfolio", response_model=PortfolioAnalysisResponse)
+async def portfolio_analysis(request: PortfolioAnalysisRequest, timings: bool = False, refresh: bool = False):
+    """
+    Phân tích danh mục: chạy (hoặc dùng lại kết quả sẵn có của) từng mã với số crew chạy đồng thời giới hạn
+    (chung cho mọi request danh mục),
+    rồi tính điểm bình quân theo tỷ trọng, cơ cấu khuyến nghị, mức tập trung theo ngành
+    và biến động/tương quan từ dữ liệu giá cục bộ
+    """
+    try:
+        weights = portfolio.normalize_weights([(holding.symbol, holding.weight) for holding in request.holdings])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    day = request.current_date or str(date.today())
+    try:
+        outcomes, closes = await asyncio.gather(
+            asyncio.gather(*(_shared_portfolio_run(symbol, day, refresh) for symbol in weights), return_exceptions=True),
+            asyncio.to_thread(portfolio.price_matrix, list(weights)),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi phân tích danh mục: {str(e)}")
+    budget_errors = [outcome for outcome in outcomes if isinstance(outcome, usage.BudgetExceededError)]
+    if len(budget_errors) == len(outcomes):
+        raise HTTPException(status_code=429, detail=str(budget_errors[0]))
+
+    holdings, summaries = [], []
+    for (symbol, weight), outcome in zip(weights.items(), outcomes):
+        if isinstance(outcome, BaseException):
+            error = (f"Phân tích quá thời gian cho phép ({COMPLETE_TIMEOUT_SECONDS:g} giây)"
+                     if isinstance(outcome, asyncio.TimeoutError) else str(outcome))
+            holdings.append(PortfolioHoldingResult(symbol=symbol, weight=weight, error=error))
+            continue
+        fields, cached, summary = outcome
+        summaries.append(summary)
+
+        def number(key: str) -> Optional[float]:
+            try:
+                return float(fields[key]) if fields.get(key) is not None else None
+            except (TypeError, ValueError):
+                return None
+
+        holdings.append(PortfolioHoldingResult(
+            symbol=symbol,
+            weight=weight,
+            decision=fields.get("decision"),
+            overall_score=number("overall_score"),
+            industry=fields.get("industry"),
+            full_name=fields.get("full_name"),
+            buy_price=number("buy_price"),
+            sell_price=number("sell_price"),
+            cached=cached,
+        ))
+    aggregates = await asyncio.to_thread(portfolio.aggregate, [holding.model_dump() for holding in holdings], closes)
+    return PortfolioAnalysisResponse(
+        analysis_date=day,
+        holdings=holdings,
+        aggregates=aggregates,
+        timings=_timings(timings),
+        usage=portfolio.combine_usage(summaries),
+    )
+
 def main():
     """Main function để chạy API server"""
     print("🚀 Khởi động VN Stock Advisor API Server...")
@@ -0,0 +1,172 @@
+"""
+Cooperative cancellation of crew runs.
+
+``asyncio.wait_for`` only stops waiting for a crew: the worker thread running
+``crew.kickoff`` used to carry on, spending LLM and search calls on a response
+nobody reads. ``_kickoff`` now gives each run a ``CancellationToken`` and
+cancels it when the request times out. The token travels with the request's
+contextvars (agents re-enter the context that created them), and the crew
+checks it wherever it is about to spend time or money:
+
+- before each task (``AdvisorAgent``) and each LLM call (``AdvisorLLM``);
+- while waiting for the rate limiter, in replayed latency and for a result
+  another thread is computing (``wait``);
+- before market data fetches and web searches (the tools).
+
+A cancelled run raises ``RunCancelledError`` at its next checkpoint, which
+unwinds the crew and frees the worker; a call already sent to a provider is
+not interrupted. ``vn_stock_advisor_cancelled_runs_total`` counts cancelled
+runs and ``vn_stock_advisor_cancelled_runs_active`` those still unwinding.
+Child tokens (``token.child()``) cancel one part of a run, such as a task
+past its deadline, and are cancelled with their parent; they are not
+counted as runs.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, wait as wait_futures
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from vn_stock_advisor import metrics
+
+# Longest wait between two checkpoints while waiting for another thread
+WAIT_SLICE_SECONDS = 1.0
+
+CANCELLED_RUNS = metrics.Counter(
+    "vn_stock_advisor_cancelled_runs_total",
+    "Crew runs cancelled by endpoint and reason (timeout: the request gave up waiting, cancelled: the request went away).",
+    labelnames=("endpoint", "reason"),
+)
+CANCELLED_ACTIVE = metrics.Gauge(
+    "vn_stock_advisor_cancelled_runs_active",
+    "Cancelled crew runs whose worker thread has not stopped yet.",
+)
+CANCEL_STOP_SECONDS = metrics.Histogram(
+    "vn_stock_advisor_cancel_stop_seconds",
+    "Time from cancelling a crew run to its worker thread stopping.",
+)
+
+
+class RunCancelledError(RuntimeError):
+    """Raised at a checkpoint of a run whose token was cancelled.
+
+    A plain exception, not a ``BaseException``: crewAI reports async task
+    failures through futures that only carry ``Exception``s.
+    """
+
+
+class CancellationToken:
+    """Cancellation flag shared by every thread of one crew run."""
+
+    def __init__(self, endpoint: str = "", parent: Optional["CancellationToken"] = None):
+        self.endpoint = endpoint
+        self.parent = parent
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        # Counted in CANCELLED_ACTIVE: cancelled while its worker was running
+        self._active = False
+        self._children = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Cancel the run; return False if it already was."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.cancelled_at = time.perf_counter()
+            self._event.set()
+            if self._running and self.parent is None:
+                self._active = True
+                CANCELLED_ACTIVE.inc()
+            children, self._children = self._children, []
+        for child in children:
+            child.cancel(reason)
+        if self.parent is None:
+            CANCELLED_RUNS.inc(endpoint=self.endpoint, reason=reason)
+        return True
+
+    def child(self) -> "CancellationToken":
+        """Token of a part of this run: cancelled with it, or on its own."""
+        child = CancellationToken(self.endpoint, parent=self)
+        with self._lock:
+            if not self._event.is_set():
+                self._children.append(child)
+                return child
+        child.cancel(self.reason)
+        return child
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise RunCancelledError(f"Phân tích đã bị hủy ({self.reason})")
+
+    def sleep(self, seconds: float) -> None:
+        """``time.sleep`` that ends early, with ``RunCancelledError``, when the run is cancelled."""
+        if seconds > 0 and self._event.wait(seconds):
+            self.check()
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Run ``fn`` with this token as the current one (meant for the run's worker thread)."""
+        with self._lock:
+            self._running = True
+        try:
+            with scope(self):
+                return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running = False
+                if self._active:
+                    self._active = False
+                    CANCELLED_ACTIVE.dec()
+                    CANCEL_STOP_SECONDS.observe(time.perf_counter() - self.cancelled_at)
+
+
+_current: contextvars.ContextVar[Optional[CancellationToken]] = contextvars.ContextVar(
+    "vn_stock_advisor_cancellation", default=None
+)
+
+
+def current() -> Optional[CancellationToken]:
+    return _current.get()
+
+
+@contextmanager
+def scope(token: CancellationToken):
+    """Make ``token`` the current token of this context."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def check() -> None:
+    """Checkpoint: raise ``RunCancelledError`` if the current run was cancelled."""
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+def sleep(seconds: float) -> None:
+    """Sleep that the current run's cancellation interrupts."""
+    token = _current.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+def wait(future: Future, slice_seconds: float = WAIT_SLICE_SECONDS):
+    """``future.result()``, waited for in slices with a checkpoint between them."""
+    while True:
+        check()
+        done, _ = wait_futures([future], timeout=slice_seconds)
+        if done:
+            return future.result()
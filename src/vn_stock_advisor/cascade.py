@@ -0,0 +1,126 @@
+"""
+Model cascade for the analyst tasks.
+
+Every analyst used to run on ``main_llm`` however easy the case. With
+``CASCADE_FAST_MODEL`` set, the tasks in ``CASCADE_TASKS`` first run on that
+cheaper, faster model; the output is then reviewed:
+
+- shape: long enough, mentions the symbol, no agent/tool failure message;
+- task schema: the sections and verdicts its ``expected_output`` asks for
+  (news: macro context, company news and a source link; fundamentals: a
+  valuation verdict and ratios; technicals: a trend and indicators);
+- confidence: hedges such as "không đủ dữ liệu" are counted, and more than
+  ``CASCADE_MAX_HEDGES`` means the cheap model was unsure.
+
+Only an output with problems (or a failed call) is escalated: the task runs
+again on the agent's own model. Outcomes are counted per task in
+``vn_stock_advisor_cascade_runs_total`` and ``GET /cascade`` reports the
+escalation rate of each task. The strategist is not cascaded.
+"""
+import logging
+import os
+import re
+from typing import Callable, List, Optional
+
+from vn_stock_advisor import cancellation, metrics, replay, usage
+
+logger = logging.getLogger(__name__)
+
+# Empty disables the cascade (analysts run on their own model only)
+CASCADE_FAST_MODEL = os.environ.get("CASCADE_FAST_MODEL", "")
+CASCADE_TASKS = [
+    t.strip() for t in os.environ.get(
+        "CASCADE_TASKS", "news_collecting,fundamental_analysis,technical_analysis",
+    ).split(",") if t.strip()
+]
+CASCADE_MIN_CHARS = int(os.environ.get("CASCADE_MIN_CHARS", "200"))
+CASCADE_MAX_HEDGES = int(os.environ.get("CASCADE_MAX_HEDGES", "1"))
+
+OUTCOMES = ("accepted", "escalated")
+
+CASCADE_RUNS = metrics.Counter(
+    "vn_stock_advisor_cascade_runs_total",
+    "Cascaded task runs by task and outcome (accepted: fast model output kept, escalated: rerun on the main model).",
+    labelnames=("task", "outcome"),
+)
+
+# Agent, tool and provider failures that end up as a task's final answer
+FAILURE_MARKERS = (
+    "agent stopped due to iteration limit", "lỗi khi lấy dữ liệu", "invalid response from llm",
+    "i cannot", "i'm sorry", "i am unable",
+)
+HEDGES = (
+    "không đủ dữ liệu", "không có dữ liệu", "không tìm thấy", "không có thông tin", "chưa rõ", "không rõ",
+    "không thể xác định", "không thể đánh giá",
+)
+# Each entry: (problem reported when missing, alternatives of which one must appear)
+REQUIREMENTS = {
+    "news_collecting": (
+        ("thiếu phần bối cảnh vĩ mô", ("vĩ mô",)),
+        ("thiếu phần tin tức doanh nghiệp", ("tin tức doanh nghiệp", "doanh nghiệp")),
+        ("thiếu liên kết nguồn", ("http://", "https://")),
+    ),
+    "fundamental_analysis": (
+        ("thiếu nhận định định giá", ("rẻ", "đắt", "hợp lý")),
+        ("thiếu chỉ số tài chính", ("p/e", "p/b", "roe", "eps")),
+    ),
+    "technical_analysis": (
+        ("thiếu nhận định xu hướng", ("xu hướng", "tăng", "giảm", "đi ngang", "tích lũy")),
+        ("thiếu chỉ báo kỹ thuật", ("rsi", "macd", "sma", "ema")),
+    ),
+}
+
+
+def review(task: str, output, symbol: Optional[str] = None) -> List[str]:
+    """Problems of a task output (empty when it can be kept)."""
+    text = str(output or "").strip()
+    lowered = text.lower()
+    problems = []
+    if len(text) < CASCADE_MIN_CHARS:
+        problems.append(f"quá ngắn ({len(text)} ký tự)")
+    if symbol and not re.search(rf"\b{re.escape(symbol.upper())}\b", text.upper()):
+        problems.append(f"không nhắc đến {symbol.upper()}")
+    problems += [f"báo lỗi: {marker}" for marker in FAILURE_MARKERS if marker in lowered]
+    problems += [
+        problem for problem, alternatives in REQUIREMENTS.get(task, ())
+        if not any(alternative in lowered for alternative in alternatives)
+    ]
+    hedges = sum(lowered.count(hedge) for hedge in HEDGES)
+    if hedges > CASCADE_MAX_HEDGES:
+        problems.append(f"độ tin cậy thấp ({hedges} lần thiếu dữ liệu)")
+    return problems
+
+
+def run(task: str, agent, execute: Callable[[], object], fast_llm, symbol: Optional[str] = None):
+    """Run ``execute`` on ``fast_llm`` first, again on the agent's own model if the output is rejected."""
+    if fast_llm is None or task not in CASCADE_TASKS:
+        return execute()
+    own_llm = agent.llm
+    agent.llm = fast_llm
+    try:
+        result = execute()
+        problems = review(task, getattr(result, "raw", result), symbol)
+    except (usage.BudgetExceededError, cancellation.RunCancelledError):
+        raise
+    except Exception as e:
+        result, problems = None, [f"lỗi mô hình nhanh: {e}"]
+    finally:
+        agent.llm = own_llm
+    if not problems:
+        CASCADE_RUNS.inc(task=task, outcome="accepted")
+        return result
+    logger.info("Tác vụ %s (%s) chuyển sang mô hình chính: %s", task, symbol, "; ".join(problems))
+    CASCADE_RUNS.inc(task=task, outcome="escalated")
+    # A new execution of the task, with its own LLM step numbering
+    replay.start_llm_steps()
+    return execute()
+
+
+def status() -> dict:
+    """Cascade configuration and escalation rate per task since the process started."""
+    tasks = {}
+    for task in CASCADE_TASKS:
+        counts = {outcome: int(CASCADE_RUNS.value(task=task, outcome=outcome)) for outcome in OUTCOMES}
+        total = sum(counts.values())
+        tasks[task] = {**counts, "escalation_rate": round(counts["escalated"] / total, 4) if total else None}
+    return {"enabled": bool(CASCADE_FAST_MODEL), "fast_model": CASCADE_FAST_MODEL or None, "tasks": tasks}
@@ -0,0 +1,342 @@
+"""
+Correlation and covariance of daily returns across the universe.
+
+``DataFrame.corr()`` over ~1,600 symbols recomputes every pair from scratch
+each day and allocates several float64 copies of the full return history.
+This engine keeps the pairwise sufficient statistics of the last
+``CORRELATION_WINDOW`` sessions instead (symbols x symbols, float64):
+
+- ``n``: sessions where both symbols have a return;
+- ``sx``/``sxx``: sum of the row symbol's returns (and squares) over them;
+- ``sxy``: sum of the products.
+
+They are sums, so a new session is added and the one leaving the window
+subtracted with rank-k matrix products, without touching the other sessions.
+A full recompute (the same products over the whole window, in blocks of
+``CORRELATION_BLOCK`` rows to bound temporaries) happens when the symbols
+change, when the publisher revised past closes, or every
+``CORRELATION_RESYNC`` incremental updates to clear the rounding drift.
+
+A return needs a close on two consecutive sessions, so suspensions and late
+listings only remove the pairs they affect; pairs sharing fewer than
+``CORRELATION_MIN_PERIODS`` sessions are NaN, like ``min_periods`` in pandas.
+
+Returns come from the universe matrix (``universe.py``). The statistics are
+saved to ``CORRELATION_DIR/state.npz`` so the next run starts incrementally,
+and each update publishes float32 correlation and covariance matrices (plus
+int16 overlap counts) as ``.npy`` files behind a ``CURRENT`` pointer
+(``generations``), like the universe matrix. API workers map them read-only: a peer query reads one
+row, a few milliseconds for the whole universe.
+
+Usage (after the universe loader):
+    python -m vn_stock_advisor.correlation [--every 3600]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from vn_stock_advisor import generations, metrics, universe
+
+logger = logging.getLogger(__name__)
+
+CORRELATION_DIR = os.environ.get("CORRELATION_DIR", os.path.join("data", "correlation"))
+# Sessions of daily returns in the rolling window
+CORRELATION_WINDOW = int(os.environ.get("CORRELATION_WINDOW", "250"))
+CORRELATION_MIN_PERIODS = int(os.environ.get("CORRELATION_MIN_PERIODS", "60"))
+# Symbols per block of the matrix products
+CORRELATION_BLOCK = int(os.environ.get("CORRELATION_BLOCK", "256"))
+# Incremental updates between two full recomputes
+CORRELATION_RESYNC = int(os.environ.get("CORRELATION_RESYNC", "20"))
+CORRELATION_KEEP_GENERATIONS = int(os.environ.get("CORRELATION_KEEP_GENERATIONS", "2"))
+CORRELATION_CHECK_SECONDS = float(os.environ.get("CORRELATION_CHECK_SECONDS", "5"))
+
+MATRICES = ("corr", "cov", "overlap")
+
+CORRELATION_UPDATES = metrics.Counter(
+    "vn_stock_advisor_correlation_updates_total",
+    "Correlation engine updates by kind (full, incremental, unchanged).",
+    labelnames=("kind",),
+)
+CORRELATION_GENERATION = metrics.Gauge(
+    "vn_stock_advisor_correlation_generation",
+    "Correlation matrices generation last published (role=published) or mapped by this process (role=attached).",
+    labelnames=("role",),
+)
+
+
+def current_generation(directory: str = CORRELATION_DIR) -> Optional[int]:
+    """Generation ``CURRENT`` points to, if any was published."""
+    return generations.current(directory)
+
+
+def daily_returns(close: np.ndarray) -> np.ndarray:
+    """Close-to-close returns (symbols x sessions - 1) as float32, NaN unless both sessions traded."""
+    prices = np.asarray(close, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = prices[:, 1:] / prices[:, :-1] - 1
+    returns[~np.isfinite(returns)] = np.nan
+    return returns.astype(np.float32)
+
+
+class Moments:
+    """Pairwise sufficient statistics of returns (see the module docstring)."""
+
+    def __init__(self, n: np.ndarray, sx: np.ndarray, sxx: np.ndarray, sxy: np.ndarray):
+        self.n, self.sx, self.sxx, self.sxy = n, sx, sxx, sxy
+
+    @classmethod
+    def empty(cls, size: int) -> "Moments":
+        return cls(*(np.zeros((size, size)) for _ in range(4)))
+
+    def add(self, returns: np.ndarray, sign: float = 1.0, block: int = CORRELATION_BLOCK) -> None:
+        """Add (``sign=-1``: remove) the sessions of ``returns`` (symbols x sessions)."""
+        if not returns.shape[1]:
+            return
+        valid = ~np.isnan(returns)
+        mask = valid.astype(np.float64)
+        x = np.where(valid, returns, 0).astype(np.float64)
+        squares = x * x
+        for start in range(0, len(x), max(block, 1)):
+            rows = slice(start, start + max(block, 1))
+            self.n[rows] += sign * (mask[rows] @ mask.T)
+            self.sx[rows] += sign * (x[rows] @ mask.T)
+            self.sxx[rows] += sign * (squares[rows] @ mask.T)
+            self.sxy[rows] += sign * (x[rows] @ x.T)
+
+    def matrices(self, min_periods: int = CORRELATION_MIN_PERIODS, block: int = CORRELATION_BLOCK):
+        """Float32 correlation and covariance (NaN below ``min_periods`` shared sessions) and int16 overlaps."""
+        size = len(self.n)
+        corr = np.full((size, size), np.nan, dtype=np.float32)
+        cov = np.full((size, size), np.nan, dtype=np.float32)
+        # Statistics of the column symbol over the same sessions are the transposes
+        sy, syy = self.sx.T, self.sxx.T
+        for start in range(0, size, max(block, 1)):
+            rows = slice(start, start + max(block, 1))
+            n = self.n[rows]
+            enough = n >= max(min_periods, 2)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                centered = self.sxy[rows] - self.sx[rows] * sy[rows] / n
+                spread = (self.sxx[rows] - self.sx[rows] ** 2 / n) * (syy[rows] - sy[rows] ** 2 / n)
+                cov[rows] = np.where(enough, centered / (n - 1), np.nan)
+                corr[rows] = np.where(enough, np.clip(centered / np.sqrt(spread), -1, 1), np.nan)
+        overlap = np.minimum(np.rint(self.n), np.iinfo(np.int16).max).astype(np.int16)
+        return corr, cov, overlap
+
+
+class CorrelationEngine:
+    """Rolling-window moments of the universe returns, persisted in ``directory``."""
+
+    def __init__(self, directory: str = CORRELATION_DIR, window: int = CORRELATION_WINDOW,
+                 min_periods: int = CORRELATION_MIN_PERIODS, block: int = CORRELATION_BLOCK,
+                 resync: int = CORRELATION_RESYNC):
+        self.directory = directory
+        self.window = window
+        self.min_periods = min_periods
+        self.block = block
+        self.resync = resync
+        self.symbols: List[str] = []
+        self.dates = np.zeros(0, dtype="datetime64[s]")
+        self.returns = np.zeros((0, 0), dtype=np.float32)
+        self.moments: Optional[Moments] = None
+        self.updates = 0
+        self.universe_generation: Optional[int] = None
+        self._load()
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.directory, "state.npz")
+
+    def _load(self) -> None:
+        try:
+            with np.load(self._state_path) as state:
+                self.symbols = state["symbols"].tolist()
+                self.dates = state["dates"]
+                self.returns = state["returns"]
+                self.moments = Moments(state["n"], state["sx"], state["sxx"], state["sxy"])
+                self.updates = int(state["updates"])
+                self.universe_generation = int(state["universe_generation"])
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("Bỏ qua trạng thái tương quan hỏng %s: %s", self._state_path, e)
+            self.moments = None
+
+    def _save(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._state_path}.tmp.npz"
+        np.savez(
+            tmp_path, symbols=np.array(self.symbols, dtype=str), dates=self.dates, returns=self.returns,
+            n=self.moments.n, sx=self.moments.sx, sxx=self.moments.sxx, sxy=self.moments.sxy,
+            updates=self.updates, universe_generation=self.universe_generation,
+        )
+        os.replace(tmp_path, self._state_path)
+
+    def _roll(self, symbols: List[str], dates: np.ndarray, returns: np.ndarray) -> Optional[str]:
+        """Move the window onto ``dates``; ``None`` when a full recompute is needed instead."""
+        if self.moments is None or symbols != self.symbols or not len(self.dates) or self.updates >= self.resync:
+            return None
+        kept = np.isin(self.dates, dates)
+        count = int(kept.sum())
+        if not kept[-1]:
+            return None
+        # Sessions still in the window must not have changed (a republish may adjust past closes)
+        if not (np.array_equal(self.dates[kept], dates[:count])
+                and np.array_equal(self.returns[:, kept], returns[:, :count], equal_nan=True)):
+            return None
+        leaving, entering = self.returns[:, ~kept], returns[:, count:]
+        if not leaving.shape[1] and not entering.shape[1]:
+            return "unchanged"
+        if leaving.shape[1] + entering.shape[1] > len(dates) // 2:
+            return None
+        self.moments.add(entering, 1.0, self.block)
+        self.moments.add(leaving, -1.0, self.block)
+        self.updates += 1
+        return "incremental"
+
+    def update(self, mapped: "universe.Universe") -> str:
+        """Bring the moments to the last ``window`` sessions of ``mapped`` and publish them if they moved."""
+        returns = daily_returns(mapped["close"])[:, -self.window:]
+        dates = np.asarray(mapped.time[1:][-self.window:])
+        symbols = list(mapped.symbols)
+
+        kind = self._roll(symbols, dates, returns)
+        if kind is None:
+            kind = "full"
+            self.moments = Moments.empty(len(symbols))
+            self.moments.add(returns, 1.0, self.block)
+            self.updates = 0
+        self.symbols, self.dates, self.returns = symbols, dates, returns
+        self.universe_generation = mapped.generation
+        if kind != "unchanged":
+            self._save()
+            self.publish()
+        CORRELATION_UPDATES.inc(kind=kind)
+        return kind
+
+    def publish(self, keep: int = CORRELATION_KEEP_GENERATIONS) -> int:
+        """Write the matrices as a new generation and switch ``CURRENT`` to it."""
+        matrices = self.moments.matrices(self.min_periods, self.block)
+
+        def write(generation: int) -> None:
+            for name, matrix in zip(MATRICES, matrices):
+                np.save(generations.generation_path(self.directory, generation, f"{name}.npy"), matrix)
+            manifest = {
+                "generation": generation,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "universe_generation": self.universe_generation,
+                "symbols": self.symbols,
+                "window": self.window,
+                "sessions": len(self.dates),
+                "start": str(self.dates[0].astype("datetime64[D]")) if len(self.dates) else None,
+                "end": str(self.dates[-1].astype("datetime64[D]")) if len(self.dates) else None,
+                "min_periods": self.min_periods,
+            }
+            with open(generations.generation_path(self.directory, generation, "json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+
+        suffixes = ("json", *(f"{name}.npy" for name in MATRICES))
+        return generations.publish(self.directory, write, suffixes, keep, CORRELATION_GENERATION)
+
+
+# --- Readers ---
+
+class CorrelationMatrices:
+    """Read-only mapped matrices of one published generation."""
+
+    def __init__(self, directory: str, generation: int):
+        with open(generations.generation_path(directory, generation, "json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.generation = generation
+        self.symbols: List[str] = self.manifest["symbols"]
+        self._index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.corr, self.cov, self.overlap = (
+            np.load(generations.generation_path(directory, generation, f"{name}.npy"), mmap_mode="r") for name in MATRICES
+        )
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._index
+
+    def row(self, symbol: str) -> int:
+        try:
+            return self._index[symbol.upper()]
+        except KeyError:
+            raise KeyError(f"Mã {symbol.upper()} không có trong ma trận tương quan (thế hệ {self.generation})")
+
+    def _peer(self, row: int, column: int) -> dict:
+        return {
+            "symbol": self.symbols[column],
+            "correlation": round(float(self.corr[row, column]), 4),
+            "covariance": float(self.cov[row, column]),
+            "sessions": int(self.overlap[row, column]),
+        }
+
+    def peers(self, symbol: str, n: int = 10) -> dict:
+        """The ``n`` most and least correlated symbols with ``symbol`` (pairs with too few sessions excluded)."""
+        row = self.row(symbol)
+        values = np.array(self.corr[row], dtype=np.float64)
+        values[row] = np.nan
+        candidates = np.flatnonzero(~np.isnan(values))
+        n = min(max(n, 0), len(candidates))
+        most = least = candidates[:0]
+        if n:
+            # argpartition finds the n extremes in linear time; only those n are sorted
+            most = candidates[np.argpartition(-values[candidates], n - 1)[:n]]
+            most = most[np.argsort(-values[most], kind="stable")]
+            least = candidates[np.argpartition(values[candidates], n - 1)[:n]]
+            least = least[np.argsort(values[least], kind="stable")]
+        return {
+            "symbol": self.symbols[row],
+            "generation": self.generation,
+            "start": self.manifest["start"],
+            "end": self.manifest["end"],
+            "most_correlated": [self._peer(row, column) for column in most],
+            "least_correlated": [self._peer(row, column) for column in least],
+        }
+
+    def status(self) -> dict:
+        return {
+            key: self.manifest[key]
+            for key in ("generation", "created_at", "universe_generation", "window", "sessions", "start", "end")
+        } | {"symbols": len(self.symbols)}
+
+
+class CorrelationReader(generations.GenerationReader[CorrelationMatrices]):
+    """The current generation of ``directory``, reattached when a new one is published."""
+
+    def __init__(self, directory: str = CORRELATION_DIR, check_seconds: float = CORRELATION_CHECK_SECONDS):
+        super().__init__(directory, CorrelationMatrices, check_seconds, CORRELATION_GENERATION)
+
+
+reader = CorrelationReader()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Update the universe correlation and covariance matrices.")
+    parser.add_argument("--every", type=float, default=0, help="Check for a new universe every N seconds (0: once)")
+    args = parser.parse_args(argv)
+    engine = CorrelationEngine()
+    universe_reader = universe.UniverseReader(check_seconds=0)
+    while True:
+        mapped = universe_reader.current()
+        if mapped is None:
+            parser.error("Chưa có ma trận thị trường, hãy chạy `make universe` trước")
+        if mapped.generation != engine.universe_generation or engine.moments is None:
+            started = time.perf_counter()
+            kind = engine.update(mapped)
+            print(json.dumps({
+                "kind": kind, "symbols": len(engine.symbols), "sessions": len(engine.dates),
+                "seconds": round(time.perf_counter() - started, 3),
+            }, ensure_ascii=False))
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
 from crewai import Agent, Crew, Process, Task, LLM
-from crewai.project import CrewBase, agent, crew, task
+from crewai.project import CrewBase, agent, before_kickoff, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from crewai.knowledge.source.json_knowledge_source import JSONKnowledgeSource
-from crewai_tools import SerperDevTool, ScrapeWebsiteTool, WebsiteSearchTool
-from vn_stock_advisor.tools.custom_tool import FundDataTool, TechDataTool, FileReadTool
+from crewai_tools import ScrapeWebsiteTool, WebsiteSearchTool
+from vn_stock_advisor.tools.custom_tool import FundDataTool, TechDataTool, FileReadTool, SearchTool
 from vn_stock_advisor.aws_config import AWSConfig
-from pydantic import BaseModel, Field
+from vn_stock_advisor.llm import AdvisorLLM
+from vn_stock_advisor import cancellation, cascade, deadlines, macro_digest, market_regime, metrics, replay, task_memo
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Literal
 from dotenv import load_dotenv
 import os, json
+from datetime import date
+import contextvars
 import warnings
 warnings.filterwarnings("ignore") # Suppress unimportant warnings
 
@@ -39,14 +43,14 @@ if USE_AWS_MODELS:
         os.environ["AWS_SESSION_TOKEN"] = aws_config.aws_session_token
     
     # Create LLM with Claude model
-    main_llm = LLM(
+    main_llm = AdvisorLLM(
         model="bedrock/apac.anthropic.claude-sonnet-4-20250514-v1:0",
         temperature=0,
         max_tokens=2048  # Reduced from 4096
     )
     
     # Create reasoning LLM
-    reasoning_llm = LLM(
+    reasoning_llm = AdvisorLLM(
         model="bedrock/apac.anthropic.claude-sonnet-4-20250514-v1:0",
         temperature=0,
         max_tokens=2048  # Reduced from 4096
@@ -55,14 +59,14 @@ if USE_AWS_MODELS:
 
 else:
     # Create Gemini LLMs
-    main_llm = LLM(
+    main_llm = AdvisorLLM(
         model=GEMINI_MODEL,
         api_key=GEMINI_API_KEY,
         temperature=0,
         max_tokens=2048  # Reduced from 4096
     )
 
-    reasoning_llm = LLM(
+    reasoning_llm = AdvisorLLM(
         model=GEMINI_REASONING_MODEL if GEMINI_REASONING_MODEL else GEMINI_MODEL,
         api_key=GEMINI_API_KEY,
         temperature=0,
@@ -70,16 +74,27 @@ else:
     )
     print("✅ Using Google Gemini models")
 
+# Provider quotas are enforced across all agents and crews by ratelimit (LLM_RATE_LIMIT_*),
+# so agents no longer set their own max_rpm
+
 # Set the LLM variables for backward compatibility
 llm = main_llm
 
+# Cheaper first-pass model for the analyst tasks, escalated to llm when its output is rejected (see cascade)
+fast_llm = AdvisorLLM(
+    model=cascade.CASCADE_FAST_MODEL,
+    api_key=None if USE_AWS_MODELS else GEMINI_API_KEY,
+    temperature=0,
+    max_tokens=2048
+) if cascade.CASCADE_FAST_MODEL else None
+
 # Initialize the tools
 file_read_tool = FileReadTool(file_path="knowledge/PE_PB_industry_average.json")
 fund_tool=FundDataTool()
 tech_tool=TechDataTool(result_as_answer=True)
 scrape_tool = ScrapeWebsiteTool()
-# Use standard SerperDevTool with reduced results
-search_tool = SerperDevTool(
+# Use standard SerperDevTool (timed) with reduced results
+search_tool = SearchTool(
     country="vn",
     locale="vn",
     location="Hanoi, Hanoi, Vietnam",
@@ -108,6 +123,49 @@ class InvestmentDecision(BaseModel):
     buy_price: float = Field(..., description="Giá mua cổ phiếu khuyến nghị dựa trên phân tích kỹ thuật")
     sell_price: float = Field(..., description="Giá bán cổ phiếu khuyến nghị dựa trên phân tích kỹ thuật")
 
+# Set while an AdvisorAgent executes a task, so crewAI's retries stay within that execution
+_executing_task: contextvars.ContextVar[bool] = contextvars.ContextVar("vn_stock_advisor_executing_task", default=False)
+
+class AdvisorAgent(Agent):
+    """Agent that runs its tasks in the context of the request that created it.
+
+    crewAI executes async tasks on plain threads, which start with an empty
+    contextvars context. Re-entering the creating context keeps per-request
+    instrumentation working inside tools and LLM calls.
+    """
+    _request_context: contextvars.Context = PrivateAttr(default_factory=contextvars.copy_context)
+    # Kickoff inputs (symbol, current_date, ...), set by VnStockAdvisor before each run
+    _kickoff_inputs: dict = PrivateAttr(default_factory=dict)
+
+    def execute_task(self, task, context=None, tools=None):
+        if _executing_task.get():
+            # crewAI retrying a failed attempt: keep the current scope (and its cancellation token)
+            cancellation.check()
+            return super().execute_task(task, context, tools)
+        return self._request_context.copy().run(self._execute_task_in_scope, task, context, tools)
+
+    def _execute_task_in_scope(self, task, context, tools):
+        task_name = task.name or self.role
+        cancellation.check()
+        _executing_task.set(True)
+        replay.start_llm_steps()
+        execute = super().execute_task
+        with metrics.task_scope(task_name, self.role.strip()), metrics.span("task", task_name):
+            # Reuses the stored output when the task's inputs have not changed since it last ran;
+            # a task past its deadline gives way to a placeholder, and decisions built on one are not stored
+            return deadlines.run(task_name, lambda: task_memo.memo.run(
+                task_name, self._kickoff_inputs, context,
+                lambda: cascade.run(task_name, self, lambda: execute(task, context, tools), fast_llm,
+                                    symbol=self._kickoff_inputs.get("symbol")),
+                prompt=self._memo_prompt(task), model=str(getattr(self.llm, "model", "")),
+                store=not deadlines.degraded(),
+            ))
+
+    def _memo_prompt(self, task) -> str:
+        """Everything of the prompt besides the inputs: the task template, the agent's persona and its tools."""
+        tools = sorted(tool.name for tool in (task.tools or self.tools or []))
+        return json.dumps([getattr(task, "key", ""), self.role, self.goal, self.backstory, tools], ensure_ascii=False)
+
 @CrewBase
 class VnStockAdvisor():
     """VnStockAdvisor crew"""
@@ -118,12 +176,11 @@ class VnStockAdvisor():
 
     @agent
     def stock_news_researcher(self) -> Agent:
-        return Agent(
+        return AdvisorAgent(
             config=self.agents_config["stock_news_researcher"],
             verbose=False,  # Reduced verbosity
             llm=llm,
-            tools=[search_tool],  # Removed scrape_tool to reduce API calls
-            max_rpm=15  # Increased further
+            tools=[search_tool]  # Removed scrape_tool to reduce API calls
         )
 
     @agent
@@ -143,33 +200,30 @@ class VnStockAdvisor():
                 }
             }
         
-        return Agent(
+        return AdvisorAgent(
             config=self.agents_config["fundamental_analyst"],
             verbose=False,  # Reduced verbosity
             llm=llm,
             tools=[fund_tool, file_read_tool],
             knowledge_sources=[json_source] if json_source else [],
-            max_rpm=15,  # Increased from 5
             embedder=embedder_config
         )
 
     @agent
     def technical_analyst(self) -> Agent:
-        return Agent(
+        return AdvisorAgent(
             config=self.agents_config["technical_analyst"],
             verbose=False,  # Reduced verbosity
             llm=llm,
-            tools=[tech_tool],
-            max_rpm=15  # Increased further
+            tools=[tech_tool]
         )
     
     @agent
     def investment_strategist(self) -> Agent:
-        return Agent(
+        return AdvisorAgent(
             config=self.agents_config["investment_strategist"],
             verbose=False,  # Reduced verbosity
-            llm=reasoning_llm,
-            max_rpm=15  # Increased further
+            llm=reasoning_llm
         )
 
     @task
@@ -201,6 +255,25 @@ class VnStockAdvisor():
             output_json=InvestmentDecision
         )
 
+    @before_kickoff
+    def share_inputs(self, inputs):
+        """Add the macro digest and market regime of the analysis date and give the agents the
+        kickoff inputs their task fingerprints depend on.
+        Runs inside kickoff, so within the run's timeout and cancellation scope"""
+        inputs = dict(inputs or {})
+        try:
+            day = date.fromisoformat(inputs["current_date"]) if inputs.get("current_date") else None
+        except ValueError:
+            day = None
+        if "macro_digest" not in inputs:
+            inputs["macro_digest"] = macro_digest.digest_text(day)
+        if "market_regime" not in inputs:
+            inputs["market_regime"] = market_regime.regime_text(day)
+        for advisor in self.agents:
+            if isinstance(advisor, AdvisorAgent):
+                advisor._kickoff_inputs = dict(inputs or {})
+        return inputs
+
     @crew
     def crew(self) -> Crew:
         """Creates the VnStockAdvisor crew"""
@@ -0,0 +1,151 @@
+"""
+Per-task deadlines of a crew run.
+
+``/analyze/complete`` used to be all or nothing: one slow search and the
+whole analysis ended in a 408 after ``COMPLETE_TIMEOUT_SECONDS``. The run now
+gets a ``DeadlineBudget`` of that many seconds, of which the tasks listed in
+``TASK_DEADLINE_SHARES`` may use a share (``news_collecting=0.5`` means the
+news task must finish within the first half). A task still running at its
+deadline is cancelled (see ``cancellation``) and replaced by a short note, so
+the strategist decides on what is available with the rest of the budget;
+the task is recorded as degraded and the response says so.
+
+Tasks without a share (the technical analyst and the strategist) are only
+bounded by the overall timeout. Runs with degraded parts are never memoized.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from vn_stock_advisor import cancellation, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_shares(value: str) -> Dict[str, float]:
+    """Parse ``"news_collecting=0.5,fundamental_analysis=0.6"`` into shares per task."""
+    shares = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        task, _, share = part.partition("=")
+        shares[task.strip()] = min(max(float(share), 0.0), 1.0)
+    return shares
+
+
+TASK_DEADLINE_SHARES = _parse_shares(
+    os.environ.get("TASK_DEADLINE_SHARES", "news_collecting=0.5,fundamental_analysis=0.5")
+)
+
+TASK_DEADLINE_MISSES = metrics.Counter(
+    "vn_stock_advisor_task_deadline_misses_total",
+    "Tasks cut at their deadline and replaced by a degraded placeholder, by task.",
+    labelnames=("task",),
+)
+
+# Task output shown to the strategist in place of a task cut at its deadline
+PLACEHOLDERS = {
+    "news_collecting": "tin tức và bối cảnh vĩ mô",
+    "fundamental_analysis": "phân tích cơ bản",
+    "technical_analysis": "phân tích kỹ thuật",
+}
+
+
+class DeadlineBudget:
+    """Seconds granted to one crew run and the tasks degraded so far."""
+
+    def __init__(self, seconds: float, shares: Optional[Dict[str, float]] = None):
+        self.seconds = seconds
+        self.shares = TASK_DEADLINE_SHARES if shares is None else shares
+        self._degraded: List[str] = []
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self) -> None:
+        """Start counting the deadlines (when the crew starts)."""
+        self.started = time.perf_counter()
+
+    def remaining(self, task: str) -> Optional[float]:
+        """Seconds left before ``task``'s deadline, None if it has none."""
+        share = self.shares.get(task)
+        if share is None:
+            return None
+        return max(0.0, self.started + self.seconds * share - time.perf_counter())
+
+    def degrade(self, task: str) -> None:
+        with self._lock:
+            if task not in self._degraded:
+                self._degraded.append(task)
+
+    @property
+    def degraded(self) -> List[str]:
+        with self._lock:
+            return list(self._degraded)
+
+
+_current: contextvars.ContextVar[Optional[DeadlineBudget]] = contextvars.ContextVar(
+    "vn_stock_advisor_deadline_budget", default=None
+)
+
+
+def current() -> Optional[DeadlineBudget]:
+    return _current.get()
+
+
+@contextmanager
+def scope(budget: DeadlineBudget):
+    """Make ``budget`` the deadline budget of the crew runs created in this context."""
+    reset = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(reset)
+
+
+def degraded() -> List[str]:
+    """Tasks of the current run cut at their deadline."""
+    budget = _current.get()
+    return budget.degraded if budget is not None else []
+
+
+def placeholder(task: str, seconds: float) -> str:
+    part = PLACEHOLDERS.get(task, task)
+    return (
+        f"Không có kết quả {part}: tác vụ không hoàn thành trong {seconds:g} giây. "
+        f"Hãy ra quyết định dựa trên các phần phân tích còn lại và nêu rõ phần {part} bị thiếu."
+    )
+
+
+def run(task: str, execute: Callable[[], object]):
+    """Run ``execute`` within ``task``'s deadline; past it, cancel it and return a placeholder."""
+    budget = _current.get()
+    remaining = budget.remaining(task) if budget is not None else None
+    if remaining is None:
+        return execute()
+    parent = cancellation.current()
+    token = parent.child() if parent is not None else cancellation.CancellationToken()
+    context = contextvars.copy_context()
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = context.run(token.run, execute)
+        except Exception as e:
+            outcome["error"] = e
+
+    worker = threading.Thread(target=target, name=f"deadline-{task}", daemon=True)
+    worker.start()
+    worker.join(remaining)
+    if worker.is_alive():
+        # The worker stops at its next checkpoint; the strategist does not wait for it
+        token.cancel("deadline")
+        budget.degrade(task)
+        TASK_DEADLINE_MISSES.inc(task=task)
+        seconds = round(budget.seconds * budget.shares[task], 1)
+        logger.warning("Tác vụ %s quá hạn %g giây, tiếp tục với kết quả thiếu", task, seconds)
+        return placeholder(task, seconds)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
@@ -0,0 +1,292 @@
+"""
+Evaluation of the crew over many symbols and dates.
+
+``main.py``'s ``train``/``test`` run one hard-coded symbol serially. This
+harness runs the full crew for every (symbol, session) case of a symbol list
+and a date range (every ``--every`` sessions), ``EVALUATION_CONCURRENCY`` cases
+at a time with LLM calls at background rate-limit priority, so comparing a
+prompt change over 100 symbols takes minutes.
+
+Each finished case is checkpointed in ``EVALUATION_DIR/<name>.json``: an
+interrupted run started again with the same name only runs the cases that are
+missing, and failed ones until they have failed ``EVALUATION_MAX_ATTEMPTS``
+times. The report (``<name>.report.json``) aggregates:
+
+- quality: decision JSON that parses and passes ``decision_problems``
+  (required fields, prices excepted for a no-trade GIỮ, MUA/GIỮ/BÁN, scores
+  and probabilities in range, no decision contradicting its score, buy below
+  sell);
+- latency and cost: p50/p95 seconds per case, LLM calls, tokens and USD.
+
+Cases run on fresh crews: the task memo is off for the run (pass ``memo`` to
+measure a memoized setup), and the tasks a case got from it are recorded
+under ``memo_hits``.
+
+The tools read prices and financials up to now, not up to the case's
+session, so the sessions of a symbol only vary the analysis date of the
+news; decisions are not scored against later returns, since a past case has
+already seen the prices it would be judged against. For a prompt
+comparison one session per symbol is usually enough.
+
+Usage:
+    python -m vn_stock_advisor.evaluation --name prompt-v2 --symbols HPG,FPT \\
+        --start 2025-01-02 --end 2025-03-31 [--every 5] [--concurrency 8]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from vn_stock_advisor import liquidity, metrics, portfolio, ratelimit, task_memo, usage
+
+logger = logging.getLogger(__name__)
+
+EVALUATION_DIR = os.environ.get("EVALUATION_DIR", os.path.join("data", "evaluation"))
+EVALUATION_CONCURRENCY = int(os.environ.get("EVALUATION_CONCURRENCY", "8"))
+EVALUATION_MAX_ATTEMPTS = int(os.environ.get("EVALUATION_MAX_ATTEMPTS", "2"))
+
+# Fields of crew.InvestmentDecision the endpoints rely on
+DECISION_FIELDS = (
+    "stock_ticker", "full_name", "industry", "today_date", "decision",
+    "macro_reasoning", "fund_reasoning", "tech_reasoning", "buy_price", "sell_price",
+)
+NO_TRADE_NULL_FIELDS = ("buy_price", "sell_price")
+SCORE_FIELDS = ("macro_score", "fund_score", "tech_score", "overall_score")
+
+EVALUATION_CASES = metrics.Counter(
+    "vn_stock_advisor_evaluation_cases_total",
+    "Evaluation cases by outcome (done, failed).",
+    labelnames=("outcome",),
+)
+
+
+def decision_problems(fields: dict) -> List[str]:
+    """What is wrong with a decision JSON (empty when it is usable)."""
+    if not fields:
+        return ["không đọc được JSON quyết định"]
+    # no_trade_rule: GIỮ without buy or sell price, conviction 0
+    no_trade = fields.get("decision") == "GIỮ" and fields.get("conviction") in (0, 0.0)
+    problems = [
+        f"thiếu trường {name}" for name in DECISION_FIELDS
+        if fields.get(name) in (None, "") and not (no_trade and name in NO_TRADE_NULL_FIELDS)
+    ]
+    if fields.get("decision") not in (None, "") and fields["decision"] not in portfolio.DECISIONS:
+        problems.append(f"quyết định không hợp lệ: {fields['decision']}")
+
+    def number(name: str) -> Optional[float]:
+        try:
+            return float(fields[name]) if fields.get(name) is not None else None
+        except (TypeError, ValueError):
+            problems.append(f"{name} không phải số")
+            return None
+
+    for name in SCORE_FIELDS:
+        value = number(name)
+        if value is not None and not 0 <= value <= 10:
+            problems.append(f"{name} ngoài thang 0-10")
+    probability = number("prob_up_60d")
+    if probability is not None and not 0 <= probability <= 1:
+        problems.append("prob_up_60d ngoài khoảng 0-1")
+    overall = number("overall_score")
+    if overall is not None and (
+        (overall >= 6.5 and fields.get("decision") == "BÁN") or (overall < 4.5 and fields.get("decision") == "MUA")
+    ):
+        problems.append(f"quyết định {fields['decision']} mâu thuẫn với điểm {overall:g}")
+    buy, sell = number("buy_price"), number("sell_price")
+    if buy and sell and buy > sell:
+        problems.append("giá mua cao hơn giá bán")
+    return problems
+
+
+def sessions(start: date, end: date, every: int = 1) -> List[date]:
+    """Weekdays from ``start`` to ``end``, one every ``every`` sessions."""
+    days, day = [], start
+    while day <= end:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days[::max(every, 1)]
+
+
+def _run_crew(symbol: str, day: date):
+    from vn_stock_advisor.crew import VnStockAdvisor
+
+    illiquid = liquidity.check(symbol, day)
+    if illiquid is not None:
+        return liquidity.no_trade_result(illiquid, day.isoformat())
+    inputs = {"symbol": symbol, "current_date": day.isoformat()}
+    return VnStockAdvisor().crew().kickoff(inputs=inputs)
+
+
+# Replaced by tests and experiments (e.g. a crew built with other prompts)
+CASE_FUNCTION: Callable[[str, date], object] = _run_crew
+
+
+class EvaluationRun:
+    """Crew runs of ``symbols`` x ``days`` checkpointed to ``directory/<name>.json``."""
+
+    def __init__(self, name: str, symbols: Sequence[str], days: Sequence[date], directory: str = EVALUATION_DIR,
+                 concurrency: int = EVALUATION_CONCURRENCY, max_attempts: int = EVALUATION_MAX_ATTEMPTS,
+                 memo: Optional[task_memo.TaskMemo] = None):
+        self.name = name
+        self.symbols = [s.upper() for s in symbols]
+        self.days = sorted(days)
+        self.path = os.path.join(directory, f"{name}.json")
+        self.report_path = os.path.join(directory, f"{name}.report.json")
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        # Fresh crew runs by default: memo hits would measure cached text
+        self.memo = memo if memo is not None else task_memo.TaskMemo("", enabled=False)
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    @staticmethod
+    def key(symbol: str, day: date) -> str:
+        return f"{symbol}@{day.isoformat()}"
+
+    def _load(self) -> dict:
+        state = {"name": self.name, "cases": {}, "started_at": None, "finished_at": None}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                state.update(json.load(f))
+        for symbol in self.symbols:
+            for day in self.days:
+                state["cases"].setdefault(self.key(symbol, day), {
+                    "symbol": symbol, "day": day.isoformat(), "status": "pending", "attempts": 0, "error": None,
+                })
+        return state
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _cases(self) -> List[dict]:
+        return [self.state["cases"][self.key(symbol, day)] for symbol in self.symbols for day in self.days]
+
+    def pending(self) -> List[dict]:
+        return [
+            case for case in self._cases()
+            if case["status"] != "done" and case["attempts"] < self.max_attempts
+        ]
+
+    def _run_case(self, case: dict) -> None:
+        started = time.perf_counter()
+        try:
+            with usage.track_request(case["symbol"], "evaluation") as ledger, \
+                    ratelimit.priority(ratelimit.BACKGROUND), task_memo.record_hits() as memo_hits:
+                result = CASE_FUNCTION(case["symbol"], date.fromisoformat(case["day"]))
+        except Exception as e:
+            logger.warning("Đánh giá %s ngày %s thất bại: %s", case["symbol"], case["day"], e)
+            EVALUATION_CASES.inc(outcome="failed")
+            with self._lock:
+                case.update(status="failed", attempts=case["attempts"] + 1, error=str(e))
+                self._save()
+            return
+        fields = portfolio.decision_fields(result)
+        summary = ledger.summary()
+        EVALUATION_CASES.inc(outcome="done")
+        with self._lock:
+            case.update(
+                status="done", attempts=case["attempts"] + 1, error=None,
+                seconds=round(time.perf_counter() - started, 3),
+                decision=fields or None, problems=decision_problems(fields),
+                usage={key: summary[key] for key in ("calls", "total_tokens", "cost_usd")},
+                memo_hits=list(memo_hits),
+            )
+            self._save()
+
+    def run(self) -> dict:
+        """Run the pending cases once, then write and return the report."""
+        self.state["started_at"] = self.state["started_at"] or datetime.now().isoformat(timespec="seconds")
+        self._save()
+        started = time.perf_counter()
+        todo = self.pending()
+        memo, task_memo.memo = task_memo.memo, self.memo
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="evaluation") as pool:
+                list(pool.map(self._run_case, todo))
+        finally:
+            task_memo.memo = memo
+        if not self.pending():
+            self.state["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        self._save()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: Optional[float] = None) -> dict:
+        """Quality, latency and cost of the finished cases, written next to the checkpoint."""
+        cases = self._cases()
+        done = [case for case in cases if case["status"] == "done"]
+        seconds = [case["seconds"] for case in done]
+        valid = [case for case in done if not case["problems"]]
+        problems: Dict[str, int] = {}
+        for case in done:
+            for problem in case["problems"]:
+                kind = problem.split(":")[0]
+                problems[kind] = problems.get(kind, 0) + 1
+
+        report = {
+            "name": self.name,
+            "symbols": len(self.symbols),
+            "days": len(self.days),
+            "cases": len(cases),
+            "done": len(done),
+            "failed": sum(1 for case in cases if case["status"] == "failed"),
+            "elapsed_seconds": None if elapsed is None else round(elapsed, 3),
+            "data_as_of": "now",
+            "note": "Mọi phiên đọc giá và báo cáo tài chính đến hiện tại; các phiên chỉ khác nhau ở ngày tin tức.",
+            "memo_hits": sum(len(case.get("memo_hits", [])) for case in done),
+            "quality": {
+                "valid_rate": round(len(valid) / len(done), 4) if done else None,
+                "problems": dict(sorted(problems.items(), key=lambda item: -item[1])),
+                "decisions": {
+                    decision: sum(1 for case in valid if case["decision"]["decision"] == decision)
+                    for decision in portfolio.DECISIONS
+                },
+            },
+            "latency": {
+                "p50": round(float(np.percentile(seconds, 50)), 3) if seconds else None,
+                "p95": round(float(np.percentile(seconds, 95)), 3) if seconds else None,
+                "mean": round(float(np.mean(seconds)), 3) if seconds else None,
+            },
+            "usage": {
+                key: round(sum(case["usage"][key] for case in done), 6)
+                for key in ("calls", "total_tokens", "cost_usd")
+            },
+        }
+        os.makedirs(os.path.dirname(self.report_path), exist_ok=True)
+        with open(self.report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Evaluate the crew over symbols and sessions, resumable. Every session reads prices and "
+                    "financials as of now: sessions only vary the news date.",
+    )
+    parser.add_argument("--name", required=True, help="Run name (checkpoint and report file names)")
+    parser.add_argument("--symbols", required=True, help="Comma separated symbols")
+    parser.add_argument("--start", required=True, help="First session (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last session (YYYY-MM-DD), --start by default")
+    parser.add_argument("--every", type=int, default=1, help="Evaluate one session out of N")
+    parser.add_argument("--concurrency", type=int, default=EVALUATION_CONCURRENCY)
+    args = parser.parse_args(argv)
+    start = date.fromisoformat(args.start)
+    days = sessions(start, date.fromisoformat(args.end) if args.end else start, args.every)
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    report = EvaluationRun(args.name, symbols, days, concurrency=args.concurrency).run()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Generation directories: immutable files published behind a ``CURRENT`` pointer.
+
+The universe matrix (``universe``) and the correlation matrices
+(``correlation``) are written by one process and mapped read-only by every
+API worker. Both use the same layout in their directory:
+
+- a generation ``n`` is a manifest ``gen-<n>.json`` plus data files
+  ``gen-<n>.<suffix>``, written once and never modified;
+- ``CURRENT`` holds the number of the latest complete generation. The writer
+  creates every file first, then atomically replaces ``CURRENT``, so readers
+  see either the old generation or the new one, never a partial write;
+- only the last ``keep`` generations are kept. A mapping stays valid after
+  its file is unlinked, so pruning never breaks a reader, which switches
+  generation whenever it next checks ``CURRENT`` (``GenerationReader``).
+"""
+import os
+import threading
+import time
+from typing import Callable, Generic, Iterable, Optional, TypeVar
+
+from vn_stock_advisor import metrics
+
+T = TypeVar("T")
+
+
+def current_path(directory: str) -> str:
+    return os.path.join(directory, "CURRENT")
+
+
+def generation_path(directory: str, generation: int, suffix: str) -> str:
+    return os.path.join(directory, f"gen-{generation:06d}.{suffix}")
+
+
+def current(directory: str) -> Optional[int]:
+    """Generation ``CURRENT`` points to, if any was published."""
+    try:
+        with open(current_path(directory), encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def publish(directory: str, write: Callable[[int], None], suffixes: Iterable[str], keep: int,
+            gauge: metrics.Gauge) -> int:
+    """Write a new generation with ``write(generation)``, switch ``CURRENT`` to it and prune old ones.
+
+    ``write`` creates the manifest and the data files (``suffixes``, the
+    manifest's ``json`` included) of the generation it is given.
+    """
+    os.makedirs(directory, exist_ok=True)
+    existing = [int(name[4:10]) for name in os.listdir(directory) if name.startswith("gen-") and name.endswith(".json")]
+    generation = max([current(directory) or 0, *existing]) + 1
+    write(generation)
+
+    # The switch: readers open either the previous generation or this complete one
+    tmp_path = f"{current_path(directory)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(generation))
+    os.replace(tmp_path, current_path(directory))
+    gauge.set(generation, role="published")
+
+    suffixes = tuple(suffixes)
+    for old in existing:
+        if old <= generation - max(keep, 1):
+            for suffix in suffixes:
+                try:
+                    os.remove(generation_path(directory, old, suffix))
+                except FileNotFoundError:
+                    pass
+    return generation
+
+
+class GenerationReader(Generic[T]):
+    """The current generation of ``directory`` opened with ``open(directory, generation)``,
+    reopened when a new one is published."""
+
+    def __init__(self, directory: str, open: Callable[[str, int], T], check_seconds: float, gauge: metrics.Gauge):
+        self.directory = directory
+        self.check_seconds = check_seconds
+        self._open = open
+        self._gauge = gauge
+        self._current: Optional[T] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[T]:
+        """The latest published generation, or ``None`` before the first publish."""
+        now = time.monotonic()
+        if self._current is not None and now - self._checked < self.check_seconds:
+            return self._current
+        with self._lock:
+            self._checked = now
+            for _ in range(3):
+                generation = current(self.directory)
+                if generation is None or (self._current is not None and self._current.generation == generation):
+                    break
+                try:
+                    self._current = self._open(self.directory, generation)
+                except FileNotFoundError:
+                    # Pruned between reading CURRENT and opening it: a newer one is current
+                    continue
+                self._gauge.set(generation, role="attached")
+                break
+            return self._current
@@ -0,0 +1,351 @@
+"""
+Intraday bars (1m/5m/15m) kept in fixed-size ring buffers.
+
+Pulling intraday history for every request is far too slow, so trades and
+1-minute bars are ingested once, as they arrive, from a pluggable source:
+
+- ``FileReplaySource`` replays a CSV or NDJSON file of ticks
+  (``symbol,time,price,volume``) or bars (``symbol,time,open,high,low,close,volume``),
+  optionally paced at ``speed`` times real time. It stands in for a live feed in
+  tests, demos and after-hours development;
+- ``PollingSource`` polls ``market_data.intraday_trades`` for a list of symbols
+  and emits the trades it has not seen yet.
+
+Each event updates every interval of its symbol incrementally: the newest
+slot of a buffer is the bar still forming, and a new slot opens when the event
+falls into the next interval. Buffers hold ``INTRADAY_BUFFER_BARS`` bars each,
+so memory per symbol is fixed whatever the session length. ``frame()`` returns
+a bar frame in the daily schema, which feeds the same indicator engine as
+``TechDataTool``. Listeners added with ``add_listener`` are called with every
+bar that closes, which is how ``signals`` evaluates each new bar once.
+"""
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from vn_stock_advisor import market_data, metrics, price_arrays
+
+logger = logging.getLogger(__name__)
+
+# Bars kept per symbol and interval (a HOSE session has ~255 one-minute bars)
+INTRADAY_BUFFER_BARS = int(os.environ.get("INTRADAY_BUFFER_BARS", "512"))
+# "file:<path>" replays a recorded session, "vnstock" polls matched trades of INTRADAY_SYMBOLS
+INTRADAY_SOURCE = os.environ.get("INTRADAY_SOURCE", "")
+INTRADAY_SYMBOLS = [s.strip().upper() for s in os.environ.get("INTRADAY_SYMBOLS", "").split(",") if s.strip()]
+INTRADAY_POLL_SECONDS = float(os.environ.get("INTRADAY_POLL_SECONDS", "5"))
+INTRADAY_REPLAY_SPEED = float(os.environ.get("INTRADAY_REPLAY_SPEED", "0"))
+
+INTERVALS = {"1m": 60, "5m": 300, "15m": 900}
+
+INTRADAY_EVENTS = metrics.Counter(
+    "vn_stock_advisor_intraday_events_total",
+    "Intraday events ingested, by kind (tick, bar) and outcome (ok, late, invalid).",
+    labelnames=("kind", "outcome"),
+)
+
+_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+# Called with (symbol, interval, bar start epoch, open/high/low/close/volume) of each closed bar
+BarListener = Callable[[str, str, int, np.ndarray], None]
+
+
+class RingBuffer:
+    """Fixed-capacity OHLCV bars of one interval; the newest bar may still be forming."""
+
+    def __init__(self, seconds: int, capacity: int = INTRADAY_BUFFER_BARS):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.start = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, len(_FIELDS)), dtype=np.float64)
+        self.head = 0  # Slot of the oldest bar
+        self.size = 0
+
+    @property
+    def last_slot(self) -> int:
+        return (self.head + self.size - 1) % self.capacity
+
+    def accepts(self, timestamp: int) -> bool:
+        """Whether an event at ``timestamp`` is not older than the forming bar."""
+        return not self.size or timestamp - timestamp % self.seconds >= self.start[self.last_slot]
+
+    def update(self, timestamp: int, open_: float, high: float, low: float, close: float,
+               volume: float) -> Optional[Tuple[int, np.ndarray]]:
+        """Merge an event into its interval bar (events must pass ``accepts``).
+
+        Returns the start and values of the previous bar when the event opens a new one.
+        """
+        bucket = timestamp - timestamp % self.seconds
+        closed = None
+        if self.size:
+            last = self.last_slot
+            if bucket == self.start[last]:
+                bar = self.values[last]
+                bar[1] = max(bar[1], high)
+                bar[2] = min(bar[2], low)
+                bar[3] = close
+                bar[4] += volume
+                return None
+            closed = (int(self.start[last]), self.values[last].copy())
+        if self.size < self.capacity:
+            slot = (self.head + self.size) % self.capacity
+            self.size += 1
+        else:
+            # Full: overwrite the oldest bar
+            slot = self.head
+            self.head = (self.head + 1) % self.capacity
+        self.start[slot] = bucket
+        self.values[slot] = (open_, high, low, close, volume)
+        return closed
+
+    def frame(self, last: Optional[int] = None) -> pd.DataFrame:
+        """Bars oldest first as a ``time, open, high, low, close, volume`` frame."""
+        count = self.size if last is None else min(last, self.size)
+        order = (self.head + self.size - count + np.arange(count)) % self.capacity
+        frame = pd.DataFrame(self.values[order], columns=list(_FIELDS))
+        frame.insert(0, "time", pd.to_datetime(self.start[order], unit="s"))
+        return frame
+
+
+class IntradayStore:
+    """Ring buffers of every symbol and interval, updated by ingested events."""
+
+    def __init__(self, intervals: Dict[str, int] = INTERVALS, capacity: int = INTRADAY_BUFFER_BARS):
+        self.intervals = dict(intervals)
+        self.capacity = capacity
+        self._buffers: Dict[str, Dict[str, RingBuffer]] = {}
+        self._listeners: List[BarListener] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: "BarListener") -> None:
+        """Call ``listener(symbol, interval, start, values)`` with every bar that closes."""
+        self._listeners.append(listener)
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return sorted(self._buffers)
+
+    def _symbol_buffers(self, symbol: str) -> Dict[str, RingBuffer]:
+        buffers = self._buffers.get(symbol)
+        if buffers is None:
+            buffers = self._buffers[symbol] = {
+                name: RingBuffer(seconds, self.capacity) for name, seconds in self.intervals.items()
+            }
+        return buffers
+
+    def ingest_tick(self, symbol: str, timestamp: int, price: float, volume: float) -> bool:
+        return self.ingest_bar(symbol, timestamp, price, price, price, price, volume, kind="tick")
+
+    def ingest_bar(self, symbol: str, timestamp: int, open_: float, high: float, low: float, close: float,
+                   volume: float, kind: str = "bar") -> bool:
+        """Fold a tick or 1-minute bar into every interval of ``symbol``."""
+        symbol = symbol.upper()
+        timestamp = int(timestamp)
+        closed = []
+        with self._lock:
+            buffers = self._symbol_buffers(symbol)
+            # Late events are dropped everywhere so the intervals stay consistent
+            accepted = all(buffer.accepts(timestamp) for buffer in buffers.values())
+            if accepted:
+                for name, buffer in buffers.items():
+                    bar = buffer.update(timestamp, open_, high, low, close, volume)
+                    if bar is not None:
+                        closed.append((name, *bar))
+        INTRADAY_EVENTS.inc(kind=kind, outcome="ok" if accepted else "late")
+        # Outside the lock: listeners may read the store back
+        for interval, start, values in closed:
+            for listener in self._listeners:
+                try:
+                    listener(symbol, interval, start, values)
+                except Exception as e:
+                    logger.warning("Bộ lắng nghe nến %s %s lỗi: %s", symbol, interval, e)
+        return accepted
+
+    def ingest(self, event: dict) -> bool:
+        """Ingest a tick (``price``) or bar (``open``...``close``) event with ``symbol``, ``time``, ``volume``."""
+        kind = "tick" if "price" in event else "bar"
+        try:
+            timestamp = _epoch(event["time"])
+            if kind == "tick":
+                return self.ingest_tick(event["symbol"], timestamp, float(event["price"]), float(event.get("volume", 0)))
+            return self.ingest_bar(
+                event["symbol"], timestamp, *(float(event[field]) for field in ("open", "high", "low", "close")),
+                float(event.get("volume", 0)),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            INTRADAY_EVENTS.inc(kind=kind, outcome="invalid")
+            logger.debug("Bỏ qua sự kiện intraday không hợp lệ %s: %s", event, e)
+            return False
+
+    def frame(self, symbol: str, interval: str = "1m", last: Optional[int] = None) -> pd.DataFrame:
+        """Bars of ``symbol`` at ``interval``, oldest first (empty if nothing was ingested)."""
+        if interval not in self.intervals:
+            raise ValueError(f"Khung thời gian không hỗ trợ: {interval} (hỗ trợ: {', '.join(self.intervals)})")
+        with self._lock:
+            buffers = self._buffers.get(symbol.upper())
+            if buffers is None:
+                return pd.DataFrame(columns=["time", *_FIELDS])
+            return buffers[interval].frame(last)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(
+                buffer.start.nbytes + buffer.values.nbytes
+                for buffers in self._buffers.values() for buffer in buffers.values()
+            )
+
+
+def _epoch(value) -> int:
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    return int(pd.Timestamp(value).timestamp())
+
+
+def _trade_keys(trades: pd.DataFrame) -> List[tuple]:
+    """Identity of each trade: its id, else (second, price, volume, occurrence among identical trades)."""
+    seconds = trades["time"].map(_epoch)
+    if "id" in trades.columns:
+        return [(second, str(trade_id)) for second, trade_id in zip(seconds, trades["id"])]
+    occurrence = trades.assign(second=seconds).groupby(["second", "price", "volume"], sort=False).cumcount()
+    return list(zip(seconds, trades["price"], trades["volume"], occurrence))
+
+
+# --- Sources ---
+
+class FileReplaySource:
+    """Events from a CSV or NDJSON recording, in file order.
+
+    ``speed`` paces the replay: 0 emits as fast as possible, 1 in real time,
+    60 replays a minute of market time per second.
+    """
+
+    def __init__(self, path: str, speed: float = INTRADAY_REPLAY_SPEED):
+        self.path = path
+        self.speed = speed
+
+    def _rows(self) -> Iterator[dict]:
+        with open(self.path, encoding="utf-8") as f:
+            if self.path.endswith((".ndjson", ".jsonl")):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from csv.DictReader(f)
+
+    def __iter__(self) -> Iterator[dict]:
+        previous = None
+        for event in self._rows():
+            if self.speed > 0:
+                current = _epoch(event["time"])
+                if previous is not None and current > previous:
+                    time.sleep((current - previous) / self.speed)
+                previous = current
+            yield event
+
+
+class PollingSource:
+    """Matched trades of ``symbols`` polled from ``market_data`` every ``poll_seconds``."""
+
+    def __init__(self, symbols: Sequence[str], poll_seconds: float = INTRADAY_POLL_SECONDS,
+                 fetch: Callable[[str], pd.DataFrame] = market_data.intraday_trades):
+        self.symbols = [s.upper() for s in symbols]
+        self.poll_seconds = poll_seconds
+        self.fetch = fetch
+        # Per symbol: the latest second polled and the trades already emitted in it
+        self._seen: Dict[str, Tuple[int, set]] = {}
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def poll(self) -> List[dict]:
+        """Trades newer than the last poll, per symbol, oldest first."""
+        events = []
+        for symbol in self.symbols:
+            try:
+                trades = self.fetch(symbol)
+            except Exception as e:
+                logger.warning("Không lấy được khớp lệnh %s: %s", symbol, e)
+                continue
+            last, emitted = self._seen.get(symbol, (0, set()))
+            keys = _trade_keys(trades)
+            # A trade printed in the last polled second may only arrive now: it is new unless already emitted
+            for key, row in zip(keys, trades.itertuples(index=False)):
+                if key[0] > last or (key[0] == last and key not in emitted):
+                    events.append({"symbol": symbol, "time": key[0], "price": row.price, "volume": row.volume})
+            if keys:
+                latest = max(last, max(key[0] for key in keys))
+                current = {key for key in keys if key[0] == latest}
+                self._seen[symbol] = (latest, current | emitted if latest == last else current)
+        return events
+
+    def __iter__(self) -> Iterator[dict]:
+        while not self._stop.is_set():
+            yield from self.poll()
+            self._stop.wait(self.poll_seconds)
+
+
+class IntradayFeed:
+    """Background thread ingesting a source into a store."""
+
+    def __init__(self, source: Iterable[dict], store: IntradayStore):
+        self.source = source
+        self.store = store
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run, name="intraday-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if hasattr(self.source, "stop"):
+            self.source.stop()
+
+    def run(self) -> int:
+        """Ingest every event of the source; returns how many were accepted."""
+        accepted = 0
+        for event in self.source:
+            accepted += self.store.ingest(event)
+        return accepted
+
+
+def source_from_env() -> Optional[Iterable[dict]]:
+    """Source configured by ``INTRADAY_SOURCE``, if any."""
+    if INTRADAY_SOURCE.startswith("file:"):
+        return FileReplaySource(INTRADAY_SOURCE[len("file:"):])
+    if INTRADAY_SOURCE == "vnstock" and INTRADAY_SYMBOLS:
+        return PollingSource(INTRADAY_SYMBOLS)
+    return None
+
+
+def indicators(symbol: str, interval: str = "5m") -> dict:
+    """Indicators and signals of ``symbol`` at ``interval``, from the same engine as ``TechDataTool``."""
+    from vn_stock_advisor.tools.custom_tool import TechDataTool, _json_values
+
+    frame = store.frame(symbol, interval)
+    if frame.empty:
+        return {"symbol": symbol.upper(), "interval": interval, "bars": 0}
+    bars = price_arrays.PriceBars.from_frame(frame)
+    tool = TechDataTool()
+    with metrics.span("compute", f"tech.indicators.{interval}"):
+        latest = tool._calculate_indicators(bars).latest()
+        support_resistance = tool._find_support_resistance(bars)
+    return {
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "bars": len(bars),
+        "time": str(latest["time"]),
+        "indicators": _json_values(latest),
+        "signals": tool._get_technical_analysis(latest, latest["close"], support_resistance).splitlines(),
+    }
+
+
+store = IntradayStore()
@@ -0,0 +1,262 @@
+"""
+Deterministic no-trade pre-screen.
+
+``scoring_rules.no_trade_rule`` of the strategist (``avg_volume_10d == 0`` or
+trading suspended for 5 sessions or more) was only applied by the LLM, after
+the four agents had run: an illiquid name cost a full crew to end up as GIỮ.
+This module computes the two flags from local prices before any crew starts:
+
+- ``avg_volume_10d``: mean volume of the last ``LIQUIDITY_VOLUME_SESSIONS``
+  sessions (a session without a bar counts as zero);
+- ``idle_sessions``: sessions since the last one with a close and a non-zero
+  volume, up to the analysed session.
+
+Sessions are the days the market actually traded: the dates of the universe
+matrix when it reaches the analysed day, else the bars of
+``REGIME_INDEX_SYMBOL``. A day without a market session (a weekend or a
+holiday such as Tết) is screened as the last session before it, so a long
+holiday does not count as a suspension of every symbol; without either
+calendar nothing is screened out.
+
+With a published universe (``universe``) every symbol is screened in one
+vectorized pass over its volume and close matrices, cached per session and
+universe generation; symbols outside it (or a universe that does not reach
+the session yet) are read from the market store one by one. A symbol that
+trips the rule gets the output the rule prescribes, built here without any
+LLM call (``no_trade_result``): GIỮ, no buy or sell price, conviction 0.
+Symbols whose prices cannot be read, or without a single bar in the last
+``LIQUIDITY_HISTORY_SESSIONS`` of the store, are not screened out: the crew
+runs.
+"""
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from vn_stock_advisor import analysis_cache, market_regime, market_store, metrics, universe
+
+logger = logging.getLogger(__name__)
+
+LIQUIDITY_SCREEN_ENABLED = os.environ.get("LIQUIDITY_SCREEN_ENABLED", "true").lower() == "true"
+LIQUIDITY_VOLUME_SESSIONS = int(os.environ.get("LIQUIDITY_VOLUME_SESSIONS", "10"))
+LIQUIDITY_SUSPENDED_SESSIONS = int(os.environ.get("LIQUIDITY_SUSPENDED_SESSIONS", "5"))
+# Sessions read per symbol; a longer suspension is reported as this many
+LIQUIDITY_HISTORY_SESSIONS = int(os.environ.get("LIQUIDITY_HISTORY_SESSIONS", "40"))
+
+OUTCOMES = ("no_trade", "tradable", "unknown")
+
+LIQUIDITY_SCREENS = metrics.Counter(
+    "vn_stock_advisor_liquidity_screens_total",
+    "Symbols screened before a crew run, by outcome (no_trade: answered without a crew).",
+    labelnames=("outcome",),
+)
+
+TASK_NAMES = ("news_collecting", "fundamental_analysis", "technical_analysis", "investment_decision")
+
+
+@dataclass
+class Liquidity:
+    symbol: str
+    session: str
+    avg_volume_10d: Optional[float]
+    idle_sessions: Optional[int]
+    no_trade: bool
+    source: str
+
+    @property
+    def outcome(self) -> str:
+        if self.avg_volume_10d is None:
+            return "unknown"
+        return "no_trade" if self.no_trade else "tradable"
+
+    def reason(self) -> str:
+        """Why the rule applies (Vietnamese, like the task outputs)."""
+        if self.avg_volume_10d is not None and self.avg_volume_10d == 0:
+            return (f"{self.symbol} không có khối lượng giao dịch trong {LIQUIDITY_VOLUME_SESSIONS} phiên gần nhất "
+                    f"(avg_volume_10d = 0) tính đến phiên {self.session}")
+        return (f"{self.symbol} không giao dịch {self.idle_sessions} phiên liên tiếp tính đến phiên {self.session} "
+                f"(tạm ngừng giao dịch ≥ {LIQUIDITY_SUSPENDED_SESSIONS} phiên)")
+
+
+def flags(volume: np.ndarray, close: np.ndarray, volume_sessions: int = LIQUIDITY_VOLUME_SESSIONS
+          ) -> Tuple[np.ndarray, np.ndarray]:
+    """Average volume of the last ``volume_sessions`` and trailing sessions without a trade, per row.
+
+    ``volume`` and ``close`` are symbols x sessions, the last column being the
+    analysed session; a session without a bar has a NaN close.
+    """
+    volume = np.nan_to_num(np.asarray(volume, dtype=np.float64))
+    close = np.asarray(close, dtype=np.float64)
+    if volume.ndim != 2 or volume.shape[1] == 0:
+        return np.zeros(len(volume)), np.zeros(len(volume), dtype=np.int64)
+    traded = (volume > 0) & ~np.isnan(close)
+    average = volume[:, -max(volume_sessions, 1):].mean(axis=1)
+    idle = np.where(traded.any(axis=1), np.argmax(traded[:, ::-1], axis=1), traded.shape[1])
+    return average, idle.astype(np.int64)
+
+
+def _no_trade(average: float, idle: int) -> bool:
+    return bool(average == 0 or idle >= LIQUIDITY_SUSPENDED_SESSIONS)
+
+
+def market_sessions(session: date) -> Optional[pd.DatetimeIndex]:
+    """The last ``LIQUIDITY_HISTORY_SESSIONS`` sessions the market traded up to ``session``, None if unknown."""
+    mapped = universe.reader.current()
+    if mapped is not None and len(mapped.time) and mapped.time[-1] >= np.datetime64(session, "s"):
+        sessions = pd.DatetimeIndex(mapped.time).normalize()
+    else:
+        # Calendar days covering the sessions, with room for holidays
+        start = session - timedelta(days=LIQUIDITY_HISTORY_SESSIONS * 2 + 14)
+        try:
+            frame = market_store.store.price_history(
+                market_regime.REGIME_INDEX_SYMBOL, start=start.isoformat(), end=session.isoformat(),
+            )
+        except Exception as e:
+            logger.warning("Không đọc được lịch phiên %s: %s", market_regime.REGIME_INDEX_SYMBOL, e)
+            return None
+        if frame.empty:
+            return None
+        sessions = pd.DatetimeIndex(pd.to_datetime(frame["time"]).dt.normalize().unique()).sort_values()
+    sessions = sessions[sessions <= pd.Timestamp(session)][-max(LIQUIDITY_HISTORY_SESSIONS, 1):]
+    return sessions if len(sessions) else None
+
+
+def _universe_screen(mapped: universe.Universe, session: date) -> Optional[Dict[str, Liquidity]]:
+    """Flags of every universe symbol, None if the universe does not reach ``session``."""
+    columns = int(np.searchsorted(mapped.time, np.datetime64(session + timedelta(days=1), "s")))
+    if columns == 0 or mapped.time[columns - 1].astype("datetime64[D]").astype(date) != session:
+        return None
+    window = slice(max(columns - LIQUIDITY_HISTORY_SESSIONS, 0), columns)
+    average, idle = flags(mapped["volume"][:, window], mapped["close"][:, window])
+    source = f"universe:{mapped.generation}"
+    return {
+        symbol: Liquidity(symbol, session.isoformat(), float(average[row]), int(idle[row]),
+                          _no_trade(average[row], idle[row]), source)
+        for row, symbol in enumerate(mapped.symbols)
+    }
+
+
+def _store_screen(symbol: str, sessions: pd.DatetimeIndex) -> Liquidity:
+    session = sessions[-1].date()
+    try:
+        frame = market_store.store.price_history(
+            symbol, start=sessions[0].strftime("%Y-%m-%d"), end=session.isoformat(),
+        )
+    except Exception as e:
+        logger.warning("Không đọc được giá %s để sàng lọc thanh khoản: %s", symbol, e)
+        frame = pd.DataFrame()
+    if not frame.empty:
+        bars = frame.set_index(pd.to_datetime(frame["time"]).dt.normalize())[["volume", "close"]]
+        frame = bars[~bars.index.duplicated(keep="last")].reindex(sessions)
+    if frame.empty or frame["close"].isna().all():
+        # No bar in the window: a stale or missing source as much as a long suspension
+        return Liquidity(symbol, session.isoformat(), None, None, False, "unavailable")
+    average, idle = flags(frame["volume"].to_numpy()[None, :], frame["close"].to_numpy()[None, :])
+    return Liquidity(symbol, session.isoformat(), float(average[0]), int(idle[0]),
+                     _no_trade(average[0], idle[0]), "market_store")
+
+
+_cache: Dict[tuple, Optional[Dict[str, Liquidity]]] = {}
+_lock = threading.Lock()
+# Sessions kept (evaluation runs ask for many past sessions)
+_CACHE_SIZE = 16
+
+
+def _universe_flags(session: date) -> Dict[str, Liquidity]:
+    mapped = universe.reader.current()
+    if mapped is None:
+        return {}
+    key = (session, mapped.generation)
+    with _lock:
+        if key not in _cache:
+            for stale in [k for k in _cache if k[0] == session]:
+                del _cache[stale]
+            _cache[key] = _universe_screen(mapped, session)
+            while len(_cache) > _CACHE_SIZE:
+                del _cache[next(iter(_cache))]
+        return _cache[key] or {}
+
+
+def screen(symbols: Iterable[str], day: Optional[date] = None, now: Optional[datetime] = None) -> Dict[str, Liquidity]:
+    """Liquidity flags of ``symbols`` for the latest closed market session on or before ``day``."""
+    symbols = [s.upper() for s in symbols]
+    requested = market_regime.session_for(day, now)
+    sessions = market_sessions(requested)
+    if sessions is None:
+        LIQUIDITY_SCREENS.inc(len(symbols), outcome="unknown")
+        return {symbol: Liquidity(symbol, requested.isoformat(), None, None, False, "unavailable") for symbol in symbols}
+    session = sessions[-1].date()
+    try:
+        screened = _universe_flags(session)
+    except Exception as e:
+        logger.warning("Không sàng lọc được thanh khoản từ universe: %s", e)
+        screened = {}
+    result = {}
+    for symbol in symbols:
+        result[symbol] = screened.get(symbol) or _store_screen(symbol, sessions)
+        LIQUIDITY_SCREENS.inc(outcome=result[symbol].outcome)
+    return result
+
+
+def check(symbol: str, day: Optional[date] = None) -> Optional[Liquidity]:
+    """Flags of ``symbol`` if it trips the no-trade rule, else None (also when disabled or unreadable)."""
+    if not LIQUIDITY_SCREEN_ENABLED:
+        return None
+    try:
+        liquidity = screen([symbol], day)[symbol.upper()]
+    except Exception as e:
+        logger.warning("Không sàng lọc được thanh khoản %s: %s", symbol, e)
+        return None
+    return liquidity if liquidity.no_trade else None
+
+
+@dataclass
+class NoTradeAnalysis:
+    """No-trade answer of the rule, shaped like a ``CrewOutput`` for the endpoints."""
+    symbol: str
+    day: str
+    liquidity: Liquidity
+    tasks_output: List[analysis_cache.CachedTaskOutput]
+
+    @property
+    def raw(self) -> str:
+        return self.tasks_output[-1].raw
+
+    def __str__(self) -> str:
+        return self.raw
+
+
+def no_trade_result(liquidity: Liquidity, day: str) -> NoTradeAnalysis:
+    """Output prescribed by ``no_trade_rule``, for every task of the crew."""
+    try:
+        full_name, industry = market_store.store.company_info(liquidity.symbol)
+    except Exception:
+        full_name, industry = liquidity.symbol, ""
+    reason = liquidity.reason()
+    skipped = f"Không phân tích: {reason}. Áp dụng no_trade_rule, không thể thực thi lệnh."
+    decision = {
+        "stock_ticker": liquidity.symbol,
+        "full_name": full_name,
+        "industry": industry,
+        "today_date": day,
+        "decision": "GIỮ",
+        "no_trade": True,
+        "macro_reasoning": skipped,
+        "fund_reasoning": skipped,
+        "tech_reasoning": (
+            f"{reason}. avg_volume_10d = {liquidity.avg_volume_10d:,.0f}. Chỉ xem xét BÁN khi giao dịch trở lại "
+            f"≥ 3 phiên liên tiếp và khối lượng ≥ MA20."
+        ),
+        "buy_price": None,
+        "sell_price": None,
+        "conviction": 0.0,
+    }
+    outputs = [analysis_cache.CachedTaskOutput(name, skipped) for name in TASK_NAMES[:-1]]
+    outputs.append(analysis_cache.CachedTaskOutput(TASK_NAMES[-1], json.dumps(decision, ensure_ascii=False)))
+    return NoTradeAnalysis(liquidity.symbol, day, liquidity, outputs)
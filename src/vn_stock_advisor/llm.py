@@ -0,0 +1,57 @@
+"""
+LLM wrapper used by the crew agents.
+
+``AdvisorLLM`` behaves exactly like crewAI's ``LLM`` but routes every completion
+through the project's instrumentation: calls are timed per task and model,
+their token usage and estimated cost are recorded on the request's ledger,
+they share the provider quota through ``ratelimit``, and they can be recorded
+to disk and replayed offline (see ``replay``).
+"""
+from crewai import LLM
+
+from vn_stock_advisor import cancellation, metrics, ratelimit, replay, usage
+
+
+class AdvisorLLM(LLM):
+    """crewAI LLM whose completions are rate limited, timed and metered per task and model."""
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        cancellation.check()
+        usage.check_budget()
+
+        # crewAI reports the provider usage block to any callback with log_success_event
+        recorder = usage.UsageRecorder()
+        callbacks = [*(callbacks or []), recorder]
+
+        task = metrics.current_task()
+        name = f"{task}:{self.model}" if task else self.model
+
+        def complete():
+            return super(AdvisorLLM, self).call(
+                messages, tools=tools, callbacks=callbacks, available_functions=available_functions, **kwargs
+            )
+
+        label = f"{task or 'none'}:{replay.next_llm_step()}"
+
+        def send():
+            with metrics.span("llm", name):
+                return replay.call(
+                    "llm",
+                    {"model": self.model, "messages": messages, "tools": tools},
+                    complete,
+                    label=label,
+                    extra=lambda: {"prompt_tokens": recorder.prompt_tokens, "completion_tokens": recorder.completion_tokens}
+                    if recorder.reported else {},
+                    on_replay=lambda stored: recorder.log_success_event({}, {"usage": stored or None}, 0, 0),
+                )
+
+        # Shared provider quota: reserve prompt + max completion tokens, settle with the reported usage
+        response = ratelimit.call(
+            self.model,
+            send,
+            reserve_tokens=lambda: usage.estimate_tokens(self.model, messages=messages) + (self.max_tokens or 0),
+            used_tokens=lambda: recorder.prompt_tokens + recorder.completion_tokens if recorder.reported else None,
+        )
+
+        usage.record_call(self.model, recorder, messages, response)
+        return response
@@ -0,0 +1,198 @@
+"""
+Daily macro news digest shared by every symbol.
+
+Macro context (interest rates, FX, VN-Index, fiscal policy...) is the same for
+all tickers on a given day, so it is researched once per trading day: a fixed
+set of searches is summarized by the LLM into a compact digest, stored as JSON
+under ``MACRO_DIGEST_DIR`` and injected into every crew's news task through
+the ``macro_digest`` input. The per-symbol agent then only searches for
+company-specific news.
+
+The digest is built on first use each trading day (concurrent requests wait
+for the same build), on demand through ``GET /macro-digest?refresh=true``, or
+ahead of time by the scheduler. Only the current trading day is built: the
+searches return today's news, so a past day is served from its stored digest
+or not at all.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from vn_stock_advisor import cancellation, metrics, replay, usage
+
+logger = logging.getLogger(__name__)
+
+MACRO_DIGEST_ENABLED = os.environ.get("MACRO_DIGEST_ENABLED", "true").lower() == "true"
+MACRO_DIGEST_DIR = os.environ.get("MACRO_DIGEST_DIR", os.path.join("data", "macro_digest"))
+MACRO_DIGEST_MAX_CHARS = int(os.environ.get("MACRO_DIGEST_MAX_CHARS", "2000"))
+# Semicolon separated override of the searches
+MACRO_QUERIES = [
+    q.strip() for q in os.environ.get(
+        "MACRO_DIGEST_QUERIES",
+        "lãi suất điều hành ngân hàng nhà nước Việt Nam;"
+        "tỷ giá USD/VND;"
+        "VN-Index thị trường chứng khoán Việt Nam;"
+        "lạm phát CPI tăng trưởng GDP Việt Nam;"
+        "chính sách tài khóa đầu tư công thuế Việt Nam",
+    ).split(";") if q.strip()
+]
+# Wait this long before retrying a failed build
+RETRY_AFTER_FAILURE_SECONDS = 300
+
+UNAVAILABLE = "Chưa có bản tin vĩ mô tổng hợp sẵn cho ngày phân tích."
+
+PROMPT = """Bạn là chuyên gia kinh tế vĩ mô Việt Nam. Dưới đây là kết quả tìm kiếm tin tức ngày {day}.
+Hãy viết bản tin vĩ mô ngắn gọn bằng tiếng Việt (tối đa {max_chars} ký tự) cho nhà đầu tư chứng khoán:
+- 5–8 gạch đầu dòng, mỗi dòng một chủ đề (lãi suất, tỷ giá, VN-Index, lạm phát/tăng trưởng, chính sách...)
+- Nêu rõ số liệu, nguồn và tác động dự kiến đến thị trường chứng khoán
+- KHÔNG bịa thông tin ngoài kết quả tìm kiếm, KHÔNG dùng nguồn vietstock.vn
+
+Kết quả tìm kiếm:
+{results}"""
+
+
+class PastDayError(ValueError):
+    """Raised when asked to build the digest of a day that has passed."""
+
+
+@dataclass
+class MacroDigest:
+    day: str
+    summary: str
+    generated_at: str = ""
+    sources: List[Dict[str, str]] = field(default_factory=list)
+
+
+def trading_day(day: Optional[date] = None) -> date:
+    """The trading day a digest for ``day`` belongs to (weekends map to Friday)."""
+    day = day or date.today()
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def _path(day: date) -> str:
+    return os.path.join(MACRO_DIGEST_DIR, f"{day.isoformat()}.json")
+
+
+def load(day: date) -> Optional[MacroDigest]:
+    """Stored digest of the trading day of ``day``, if any."""
+    path = _path(trading_day(day))
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return MacroDigest(**json.load(f))
+
+
+def _save(digest: MacroDigest) -> None:
+    os.makedirs(MACRO_DIGEST_DIR, exist_ok=True)
+    path = _path(date.fromisoformat(digest.day))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(asdict(digest), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _organic(result) -> List[dict]:
+    if isinstance(result, dict):
+        return result.get("organic") or []
+    return []
+
+
+def _search(queries: List[str]) -> List[dict]:
+    from vn_stock_advisor.crew import search_tool
+
+    articles, seen = [], set()
+    for query in queries:
+        for item in _organic(search_tool._run(search_query=query)):
+            link = item.get("link", "")
+            if link in seen or "vietstock.vn" in link:
+                continue
+            seen.add(link)
+            articles.append({
+                "title": item.get("title", ""),
+                "link": link,
+                "date": item.get("date", ""),
+                "snippet": item.get("snippet", ""),
+            })
+    return articles
+
+
+def build(day: Optional[date] = None, llm=None, now: Optional[datetime] = None) -> MacroDigest:
+    """Search the macro queries, summarize them with the LLM and store the digest."""
+    day = trading_day(day)
+    today = trading_day((now or datetime.now()).date())
+    if day < today:
+        raise PastDayError(f"Không tạo được bản tin vĩ mô cho ngày đã qua {day.isoformat()}")
+    if llm is None:
+        from vn_stock_advisor.crew import llm
+
+    with usage.track_request("*", "macro_digest"), metrics.task_scope("macro_digest"), \
+            metrics.span("task", "macro_digest"):
+        replay.start_llm_steps()
+        articles = _search(MACRO_QUERIES)
+        results = "\n".join(
+            f"- {a['title']} ({a['date'] or 'không rõ ngày'}, {a['link']}): {a['snippet']}" for a in articles
+        ) or "(không có kết quả)"
+        prompt = PROMPT.format(day=day.isoformat(), max_chars=MACRO_DIGEST_MAX_CHARS, results=results)
+        summary = str(llm.call([{"role": "user", "content": prompt}])).strip()
+
+    digest = MacroDigest(
+        day=day.isoformat(),
+        summary=summary[:MACRO_DIGEST_MAX_CHARS],
+        generated_at=datetime.now().isoformat(timespec="seconds"),
+        sources=[{"title": a["title"], "link": a["link"]} for a in articles],
+    )
+    _save(digest)
+    return digest
+
+
+_build_lock = threading.Lock()
+_failed_at: Dict[str, float] = {}
+
+
+def get(day: Optional[date] = None, refresh: bool = False, now: Optional[datetime] = None) -> MacroDigest:
+    """Digest of the trading day of ``day``, building it once if missing (or if ``refresh``).
+
+    Raises ``PastDayError`` for a past day without a stored digest (or with ``refresh``).
+    """
+    day = trading_day(day)
+    if not refresh:
+        digest = load(day)
+        if digest is not None:
+            return digest
+    # One build at a time; callers queued behind it reuse its result (or give up when cancelled)
+    while not _build_lock.acquire(timeout=1):
+        cancellation.check()
+    try:
+        if not refresh:
+            digest = load(day)
+            if digest is not None:
+                return digest
+        return build(day, now=now)
+    finally:
+        _build_lock.release()
+
+
+def digest_text(day: Optional[date] = None, now: Optional[datetime] = None) -> str:
+    """Digest summary for crew inputs; only a cancelled run fails the analysis it is injected into."""
+    if not MACRO_DIGEST_ENABLED:
+        return UNAVAILABLE
+    key = trading_day(day).isoformat()
+    if time.time() - _failed_at.get(key, 0) < RETRY_AFTER_FAILURE_SECONDS:
+        return UNAVAILABLE
+    try:
+        return get(day, now=now).summary
+    except PastDayError:
+        return UNAVAILABLE
+    except cancellation.RunCancelledError:
+        raise
+    except Exception as e:
+        _failed_at[key] = time.time()
+        logger.warning("Không tạo được bản tin vĩ mô %s: %s", key, e)
+        return UNAVAILABLE
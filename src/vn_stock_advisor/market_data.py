@@ -0,0 +1,404 @@
+"""
+Market data access for the analysis tools.
+
+Every call is served by the vnstock providers listed in ``MARKET_DATA_SOURCES``
+(TCBS, then VCI by default) and returned in one schema, the TCBS column names
+the tools were written against, latest period first.
+
+Each source sits behind a circuit breaker: after a run of failures it is
+skipped for a cool-down, then probed with a single call. Requests are hedged:
+when the first source has not answered within its recent latency percentile,
+the next source is queried too and the first good answer wins. Failures and
+empty answers fail over to the next source immediately. A call gives up after
+``MARKET_DATA_TIMEOUT_SECONDS`` even if every source hangs, and stops early
+when its run is cancelled.
+
+Every remote call is timed as a ``data_source`` span and goes through the
+record/replay layer. vnstock objects are only built inside the real call, so
+replay mode never touches the network.
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from vnstock import Vnstock
+
+from vn_stock_advisor import cancellation, metrics, replay
+
+SOURCES = tuple(s.strip().upper() for s in os.environ.get("MARKET_DATA_SOURCES", "TCBS,VCI").split(",") if s.strip())
+DEFAULT_SOURCE = SOURCES[0]
+
+# Hedge once the first source is slower than this percentile of its recent calls
+HEDGE_PERCENTILE = float(os.environ.get("MARKET_DATA_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SECONDS = float(os.environ.get("MARKET_DATA_HEDGE_MIN_SECONDS", "0.5"))
+# Used until a source has enough samples for a percentile
+HEDGE_DEFAULT_SECONDS = float(os.environ.get("MARKET_DATA_HEDGE_DEFAULT_SECONDS", "3"))
+HEDGE_MIN_SAMPLES = 20
+# Overall bound of one call, hedges and failovers included
+MARKET_DATA_TIMEOUT_SECONDS = float(os.environ.get("MARKET_DATA_TIMEOUT_SECONDS", "60"))
+# Longest wait between two cancellation checkpoints
+WAIT_SLICE_SECONDS = 1.0
+
+BREAKER_FAILURES = int(os.environ.get("MARKET_DATA_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("MARKET_DATA_BREAKER_RESET_SECONDS", "30"))
+
+CIRCUIT_STATE = metrics.Gauge(
+    "vn_stock_advisor_data_source_circuit_state",
+    "Circuit breaker state per data source (0 closed, 1 half-open, 2 open).",
+    labelnames=("source",),
+)
+DATA_HEDGES = metrics.Counter(
+    "vn_stock_advisor_data_source_hedges_total",
+    "Secondary data source requests started because the first one was slow.",
+    labelnames=("call",),
+)
+DATA_SERVED = metrics.Counter(
+    "vn_stock_advisor_data_source_served_total",
+    "Market data answers by the source that served them.",
+    labelnames=("call", "source"),
+)
+
+
+class DataSourceError(RuntimeError):
+    """Raised when no configured source could serve a market data call."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(self.state, source=name)
+
+    def _set(self, state: int) -> None:
+        self.state = state
+        CIRCUIT_STATE.set(state, source=self.name)
+
+    def allow(self) -> bool:
+        """Whether a call may be sent now (claims the probe when half-open)."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._set(self.HALF_OPEN)
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return self.state != self.OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._set(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set(self.OPEN)
+
+
+class LatencyTracker:
+    """Recent successful call latencies of one (source, call)."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_SECONDS
+        return max(HEDGE_MIN_SECONDS, float(np.percentile(samples, HEDGE_PERCENTILE)))
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[Tuple[str, str], LatencyTracker] = {}
+_state_lock = threading.Lock()
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("MARKET_DATA_WORKERS", "16")), thread_name_prefix="market-data"
+)
+
+
+def breaker(source: str) -> CircuitBreaker:
+    with _state_lock:
+        return _breakers.setdefault(source, CircuitBreaker(source))
+
+
+def _latency(source: str, call: str) -> LatencyTracker:
+    with _state_lock:
+        return _latencies.setdefault((source, call), LatencyTracker())
+
+
+def _attempt(source: str, symbol: str, call: str, fetch: Callable[[str], object], normalize, params: dict):
+    source_breaker = breaker(source)
+    start = time.perf_counter()
+    try:
+        with metrics.span("data_source", f"{source}.{call}"):
+            raw = replay.call(
+                "vnstock",
+                {"source": source, "symbol": symbol, "call": call, **params},
+                lambda: fetch(source),
+                label=f"{source}.{call}",
+            )
+            result = normalize(raw, source)
+            if isinstance(result, pd.DataFrame) and result.empty:
+                raise ValueError(f"{source} trả về dữ liệu rỗng cho {symbol}")
+    except Exception:
+        source_breaker.record_failure()
+        raise
+    source_breaker.record_success()
+    _latency(source, call).add(time.perf_counter() - start)
+    return result
+
+
+def _fetch(symbol: str, call: str, fetch: Callable[[str], object], normalize=lambda raw, source: raw,
+           source: Optional[str] = None, **params):
+    """Serve ``call`` from ``source``, or from the configured sources with hedging and failover."""
+    cancellation.check()
+    pending = {}
+    errors = []
+    # Breakers are consulted only when a source is actually launched, so a
+    # half-open probe is never claimed by a source that is not queried
+    candidates = iter([source] if source else SOURCES)
+    started = time.perf_counter()
+
+    def launch() -> bool:
+        for next_source in candidates:
+            if source or breaker(next_source).allow():
+                # Copy the context so spans land in the caller's request breakdown
+                context = contextvars.copy_context()
+                future = _executor.submit(context.run, _attempt, next_source, symbol, call, fetch, normalize, params)
+                pending[future] = next_source
+                return True
+        return False
+
+    if not launch():
+        raise DataSourceError(f"Tất cả nguồn dữ liệu đang tạm ngắt ({', '.join(SOURCES)})")
+    hedge_at = _latency(next(iter(pending.values())), call).hedge_delay()
+    hedged = False
+    while pending:
+        elapsed = time.perf_counter() - started
+        if elapsed >= MARKET_DATA_TIMEOUT_SECONDS:
+            # The abandoned attempts finish on the executor; their answers are dropped
+            errors.append(f"{', '.join(pending.values())}: quá {MARKET_DATA_TIMEOUT_SECONDS:g} giây")
+            break
+        timeout = min(WAIT_SLICE_SECONDS, MARKET_DATA_TIMEOUT_SECONDS - elapsed)
+        if not hedged:
+            timeout = min(timeout, max(0.0, hedge_at - elapsed))
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            cancellation.check()
+            if not hedged and time.perf_counter() - started >= hedge_at:
+                hedged = True
+                if launch():
+                    DATA_HEDGES.inc(call=call)
+            continue
+        for future in done:
+            served_by = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(f"{served_by}: {e}")
+                continue
+            DATA_SERVED.inc(call=call, source=served_by)
+            return result
+        if not pending:
+            launch()
+
+    raise DataSourceError(f"Không lấy được {call} của {symbol}: " + "; ".join(errors))
+
+
+# --- Schema normalization (TCBS column names, latest period first) ---
+
+_RATIO_COLUMNS = {
+    "P/E": "price_to_earning",
+    "P/B": "price_to_book",
+    "ROE (%)": "roe",
+    "ROA (%)": "roa",
+    "EPS (VND)": "earning_per_share",
+    "Debt/Equity": "debt_on_equity",
+    "Gross Profit Margin (%)": "gross_profit_margin",
+    "EV/EBITDA": "value_before_ebitda",
+    "yearReport": "year",
+    "lengthReport": "quarter",
+}
+
+_INCOME_COLUMNS = {
+    "Revenue (Bn. VND)": "revenue",
+    "Net Sales": "revenue",
+    "Gross Profit": "gross_profit",
+    "Attribute to parent company (Bn. VND)": "post_tax_profit",
+    "Net Profit For the Year": "post_tax_profit",
+    "yearReport": "year",
+    "lengthReport": "quarter",
+}
+
+_PRICE_COLUMNS = ("time", "open", "high", "low", "close", "volume")
+
+
+def _flatten(df: pd.DataFrame) -> pd.DataFrame:
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = [column[-1] for column in df.columns]
+    return df
+
+
+def _rename(df: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame:
+    df = _flatten(df)
+    # Keep the first source column for each target (e.g. Revenue before Net Sales)
+    renames = {}
+    for column in df.columns:
+        target = mapping.get(column)
+        if target and target not in renames.values() and target not in df.columns:
+            renames[column] = target
+    return df.rename(columns=renames)
+
+
+def _latest_first(df: pd.DataFrame) -> pd.DataFrame:
+    if {"year", "quarter"} <= set(df.columns):
+        return df.sort_values(["year", "quarter"], ascending=False, kind="stable").reset_index(drop=True)
+    return df
+
+
+def normalize_ratios(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    return _latest_first(_rename(df, _RATIO_COLUMNS))
+
+
+def normalize_income(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    df = _latest_first(_rename(df, _INCOME_COLUMNS))
+    # The tools report billions of VND; some sources return plain VND
+    money = [c for c in ("revenue", "gross_profit", "post_tax_profit") if c in df.columns]
+    if money and df[money].abs().median().max() > 1e7:
+        df = df.copy()
+        df[money] = df[money] / 1e9
+    return df
+
+
+def normalize_prices(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    df = _flatten(df).rename(columns=str.lower)
+    missing = [c for c in _PRICE_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"{source} thiếu cột giá {missing}")
+    df = df.loc[:, list(_PRICE_COLUMNS)].assign(time=lambda frame: pd.to_datetime(frame["time"]))
+    return df.sort_values("time", kind="stable").reset_index(drop=True)
+
+
+def normalize_intraday(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    df = _flatten(df).rename(columns=str.lower)
+    missing = [c for c in ("time", "price", "volume") if c not in df.columns]
+    if missing:
+        raise ValueError(f"{source} thiếu cột khớp lệnh {missing}")
+    df = df.loc[:, [c for c in ("time", "price", "volume", "id") if c in df.columns]]
+    times = pd.to_datetime(df["time"].astype(str), errors="coerce")
+    if df["time"].astype(str).str.len().max() <= 8:
+        # Time of day only: the trades of the current session
+        times = pd.to_datetime(pd.Timestamp.now().strftime("%Y-%m-%d ") + df["time"].astype(str), errors="coerce")
+    df = df.assign(time=times).dropna(subset=["time"])
+    # Quote history is in thousands of VND; matched prices may come in VND
+    if len(df) and df["price"].median() > 1000:
+        df = df.assign(price=df["price"] / 1000)
+    return df.sort_values("time", kind="stable").reset_index(drop=True)
+
+
+# --- Public calls ---
+
+def price_history(symbol: str, start: str, end: str, interval: str = "1D", source: Optional[str] = None) -> pd.DataFrame:
+    """Daily (or ``interval``) OHLCV history, oldest first, prices in thousands of VND."""
+    return _fetch(
+        symbol, "quote.history",
+        lambda src: Vnstock().stock(symbol=symbol, source=src).quote.history(start=start, end=end, interval=interval),
+        normalize_prices, source,
+        start=start, end=end, interval=interval,
+    )
+
+
+def intraday_trades(symbol: str, page_size: int = 100, source: Optional[str] = None) -> pd.DataFrame:
+    """Latest matched trades of the session (time, price, volume), oldest first, prices in thousands of VND."""
+    return _fetch(
+        symbol, "quote.intraday",
+        lambda src: Vnstock().stock(symbol=symbol, source=src).quote.intraday(page_size=page_size),
+        normalize_intraday, source,
+        page_size=page_size,
+    )
+
+
+def financial_ratios(symbol: str, period: str = "quarter", source: Optional[str] = None) -> pd.DataFrame:
+    """Financial ratios, latest period first."""
+    return _fetch(
+        symbol, "finance.ratio",
+        lambda src: Vnstock().stock(symbol=symbol, source=src).finance.ratio(period=period),
+        normalize_ratios, source,
+        period=period,
+    )
+
+
+def income_statement(symbol: str, period: str = "quarter", source: Optional[str] = None) -> pd.DataFrame:
+    """Income statement, latest period first, amounts in billions of VND."""
+    return _fetch(
+        symbol, "finance.income_statement",
+        lambda src: Vnstock().stock(symbol=symbol, source=src).finance.income_statement(period=period),
+        normalize_income, source,
+        period=period,
+    )
+
+
+def _company_info(symbol: str, source: str) -> list:
+    stock = Vnstock().stock(symbol=symbol, source=source)
+    if source == "TCBS":
+        company = stock.company
+        return [company.profile().get("company_name").iloc[0], company.overview().get("industry").iloc[0]]
+
+    # VCI: the name comes from the listing, the industry from the ICB level 3 classification
+    listing = stock.listing.all_symbols()
+    names = listing.loc[listing["symbol"] == symbol, "organ_name"]
+    overview = stock.company.overview()
+    industry_column = next(c for c in ("icb_name3", "icb_name2", "industry") if c in overview.columns)
+    return [names.iloc[0] if len(names) else symbol, overview[industry_column].iloc[0]]
+
+
+def company_info(symbol: str, source: Optional[str] = None) -> Tuple[str, str]:
+    """Company full name and industry."""
+    full_name, industry = _fetch(symbol, "company", lambda src: _company_info(symbol, src), source=source)
+    return full_name, industry
+
+
+def source_status() -> Sequence[dict]:
+    """Circuit state and hedge delay of every configured source (for diagnostics)."""
+    names = {CircuitBreaker.CLOSED: "closed", CircuitBreaker.HALF_OPEN: "half_open", CircuitBreaker.OPEN: "open"}
+    with _state_lock:
+        trackers = dict(_latencies)
+    return [
+        {
+            "source": source,
+            "circuit": names[breaker(source).state],
+            "failures": breaker(source).failures,
+            "hedge_delay_seconds": {
+                call: round(tracker.hedge_delay(), 3) for (name, call), tracker in trackers.items() if name == source
+            },
+        }
+        for source in SOURCES
+    ]
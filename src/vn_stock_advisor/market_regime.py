@@ -0,0 +1,288 @@
+"""
+Market breadth and VNIndex regime from local prices.
+
+``scoring_rules.risk_on_condition`` of the strategist ("breadth > 50% and
+VNIndex > SMA200") was left to the LLM, which guessed or searched for it.
+This module computes it from the universe matrix (``universe``) in one
+vectorized pass over the closes (symbols x sessions):
+
+- the share of symbols closing above their SMA50 and SMA200 (a symbol needs
+  ``REGIME_SMA_COVERAGE`` of the window's sessions traded to count);
+- advancers, decliners and the advance/decline ratio of the session;
+- VNIndex (``REGIME_INDEX_SYMBOL``) close against its SMA50 and SMA200.
+
+Without a published universe, or one that does not reach the session yet,
+the closes of ``UNIVERSE_SYMBOLS`` (or the ``WATCHLIST``) are read from the
+market store; the regime is labelled with the last session the closes
+reach. The regime is risk-on when the share above SMA200 exceeds
+``REGIME_BREADTH_THRESHOLD`` and VNIndex is above its SMA200. Results are computed once per session (and universe
+generation), concurrent callers waiting for the first one, and cached;
+``VnStockAdvisor`` injects ``regime_text`` into the strategist's task.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from vn_stock_advisor import cancellation, market_store, metrics, portfolio, scheduler, universe
+
+logger = logging.getLogger(__name__)
+
+REGIME_ENABLED = os.environ.get("REGIME_ENABLED", "true").lower() == "true"
+REGIME_INDEX_SYMBOL = os.environ.get("REGIME_INDEX_SYMBOL", "VNINDEX").upper()
+REGIME_BREADTH_THRESHOLD = float(os.environ.get("REGIME_BREADTH_THRESHOLD", "0.5"))
+# Fewer eligible symbols than this and breadth is not reported
+REGIME_MIN_SYMBOLS = int(os.environ.get("REGIME_MIN_SYMBOLS", "20"))
+REGIME_SMA_COVERAGE = float(os.environ.get("REGIME_SMA_COVERAGE", "0.8"))
+# Calendar days of history read from the market store (SMA200 needs ~290)
+REGIME_HISTORY_DAYS = int(os.environ.get("REGIME_HISTORY_DAYS", "400"))
+
+SMA_WINDOWS = (50, 200)
+
+UNAVAILABLE = "Chưa có dữ liệu chế độ thị trường; áp dụng trọng số mặc định (weights_default)."
+
+MARKET_BREADTH = metrics.Gauge(
+    "vn_stock_advisor_market_breadth_ratio",
+    "Share of the universe closing above its moving average, by window (sma50, sma200).",
+    labelnames=("measure",),
+)
+
+
+@dataclass
+class MarketRegime:
+    session: str
+    symbols: int
+    above_sma50: Optional[float]
+    above_sma200: Optional[float]
+    advancers: int
+    decliners: int
+    unchanged: int
+    advance_decline: Optional[float]
+    index_symbol: str
+    index_close: Optional[float]
+    index_sma50: Optional[float]
+    index_sma200: Optional[float]
+    risk_on: Optional[bool]
+    source: str
+
+    def text(self) -> str:
+        """Summary for the strategist (Vietnamese, like the task prompts)."""
+        lines = [f"Chế độ thị trường phiên {self.session} (tính từ dữ liệu giá nội bộ, {self.symbols} mã):"]
+        if self.above_sma200 is not None:
+            lines.append(
+                f"- Breadth: {self.above_sma200:.0%} số mã trên SMA200, {_percent(self.above_sma50)} trên SMA50"
+            )
+        else:
+            lines.append("- Breadth: không đủ dữ liệu")
+        ratio = f"{self.advance_decline:.2f}" if self.advance_decline is not None else "n/a"
+        lines.append(f"- Tăng/giảm/đứng giá: {self.advancers}/{self.decliners}/{self.unchanged} (A/D {ratio})")
+        if self.index_close is not None and self.index_sma200 is not None:
+            lines.append(
+                f"- {self.index_symbol}: {self.index_close:,.2f}, SMA50 {_number(self.index_sma50)}, "
+                f"SMA200 {self.index_sma200:,.2f} ({self.index_close / self.index_sma200 - 1:+.1%})"
+            )
+        else:
+            lines.append(f"- {self.index_symbol}: không đủ dữ liệu")
+        if self.risk_on is None:
+            lines.append("=> Không xác định được risk_on_condition; áp dụng trọng số mặc định (weights_default).")
+        elif self.risk_on:
+            lines.append("=> risk_on_condition THỎA: áp dụng trọng số weights_risk_on.")
+        else:
+            lines.append("=> risk_on_condition KHÔNG thỏa: áp dụng trọng số mặc định (weights_default).")
+        return "\n".join(lines)
+
+
+def _percent(value: Optional[float]) -> str:
+    return f"{value:.0%}" if value is not None else "n/a"
+
+
+def _number(value: Optional[float]) -> str:
+    return f"{value:,.2f}" if value is not None else "n/a"
+
+
+def breadth(closes: np.ndarray, coverage: float = REGIME_SMA_COVERAGE,
+            min_symbols: int = REGIME_MIN_SYMBOLS) -> dict:
+    """Breadth of the last session of ``closes`` (symbols x sessions, NaN where a symbol did not trade)."""
+    closes = np.asarray(closes, dtype=np.float64)
+    if closes.ndim != 2 or closes.shape[1] == 0:
+        closes = np.empty((0, 1))
+    last = closes[:, -1]
+    traded = ~np.isnan(last)
+    result = {"symbols": int(traded.sum())}
+    for window in SMA_WINDOWS:
+        values = closes[:, -window:]
+        counts = np.count_nonzero(~np.isnan(values), axis=1)
+        sma = np.nansum(values, axis=1) / np.maximum(counts, 1)
+        eligible = traded & (counts >= window * coverage) if closes.shape[1] >= window else np.zeros_like(traded)
+        share = float(np.mean(last[eligible] > sma[eligible])) if eligible.sum() >= max(min_symbols, 1) else None
+        result[f"above_sma{window}"] = share
+    if closes.shape[1] >= 2:
+        previous = closes[:, -2]
+        both = traded & ~np.isnan(previous)
+        change = last[both] - previous[both]
+        advancers, decliners = int(np.sum(change > 0)), int(np.sum(change < 0))
+        unchanged = int(both.sum()) - advancers - decliners
+    else:
+        advancers = decliners = unchanged = 0
+    result.update(
+        advancers=advancers, decliners=decliners, unchanged=unchanged,
+        advance_decline=round(advancers / decliners, 4) if decliners else None,
+    )
+    return result
+
+
+def index_trend(closes: np.ndarray) -> dict:
+    """Last close and SMA50/SMA200 of the index (``None`` where the history is too short)."""
+    closes = np.asarray(closes, dtype=np.float64)
+    closes = closes[~np.isnan(closes)]
+    trend = {"index_close": float(closes[-1]) if len(closes) else None}
+    for window in SMA_WINDOWS:
+        trend[f"index_sma{window}"] = float(closes[-window:].mean()) if len(closes) >= window else None
+    return trend
+
+
+def _universe_closes(mapped: universe.Universe, session: date
+                     ) -> Optional[Tuple[np.ndarray, Optional[np.ndarray], date]]:
+    """Stock closes, index closes (if published) and last session up to ``session`` from the mapped universe.
+
+    None if the universe does not reach ``session`` (published before its close).
+    """
+    if not len(mapped.time) or mapped.time[-1] < np.datetime64(session, "s"):
+        return None
+    columns = int(np.searchsorted(mapped.time, np.datetime64(session + timedelta(days=1), "s")))
+    if columns == 0:
+        return None
+    closes = mapped["close"][:, :columns]
+    last = mapped.time[columns - 1].astype("datetime64[D]").astype(date)
+    if REGIME_INDEX_SYMBOL in mapped:
+        row = mapped.row(REGIME_INDEX_SYMBOL)
+        return np.delete(closes, row, axis=0), closes[row], last
+    return closes, None, last
+
+
+def _store_closes(session: date) -> Tuple[np.ndarray, Optional[date]]:
+    symbols = [s for s in (universe.UNIVERSE_SYMBOLS or scheduler.WATCHLIST) if s != REGIME_INDEX_SYMBOL]
+    end = market_store.local_time(session, market_store.MARKET_CLOSE_TIME)
+    matrix = portfolio.price_matrix(symbols, days=REGIME_HISTORY_DAYS, now=end, from_universe=False) if symbols else pd.DataFrame()
+    matrix = matrix[matrix.index <= pd.Timestamp(session)] if len(matrix) else matrix
+    if not len(matrix.columns) or not len(matrix):
+        return np.empty((0, 0)), None
+    return matrix.to_numpy(np.float64).T, matrix.index[-1].date()
+
+
+def _index_closes(session: date) -> np.ndarray:
+    end = market_store.local_time(session, market_store.MARKET_CLOSE_TIME)
+    frame = market_store.store.price_history(
+        REGIME_INDEX_SYMBOL, start=(end - timedelta(days=REGIME_HISTORY_DAYS)).strftime("%Y-%m-%d"),
+        end=end.strftime("%Y-%m-%d"),
+    )
+    return frame["close"].to_numpy(np.float64)
+
+
+def compute(session: date) -> MarketRegime:
+    """Breadth and index trend of ``session`` (no caching)."""
+    mapped = universe.reader.current()
+    published = _universe_closes(mapped, session) if mapped is not None else None
+    if published is not None:
+        closes, index, last = published
+        source = f"universe:{mapped.generation}"
+    else:
+        (closes, last), index = _store_closes(session), None
+        source = "market_store"
+    if index is None:
+        try:
+            index = _index_closes(session)
+        except Exception as e:
+            logger.warning("Không lấy được giá %s cho chế độ thị trường: %s", REGIME_INDEX_SYMBOL, e)
+            index = np.empty(0)
+    stats = breadth(closes)
+    trend = index_trend(index)
+    risk_on = None
+    if stats["above_sma200"] is not None and trend["index_sma200"] is not None:
+        risk_on = stats["above_sma200"] > REGIME_BREADTH_THRESHOLD and trend["index_close"] > trend["index_sma200"]
+    for window in SMA_WINDOWS:
+        if stats[f"above_sma{window}"] is not None:
+            MARKET_BREADTH.set(stats[f"above_sma{window}"], measure=f"sma{window}")
+    # Labelled with the last session the closes actually reach
+    return MarketRegime(
+        session=(last or session).isoformat(), index_symbol=REGIME_INDEX_SYMBOL, risk_on=risk_on, source=source,
+        **stats, **trend,
+    )
+
+
+_cache: Dict[tuple, MarketRegime] = {}
+_inflight: Dict[tuple, Future] = {}
+_lock = threading.Lock()
+# Sessions kept (evaluation runs ask for many past sessions)
+_CACHE_SIZE = 64
+
+
+def session_for(day: Optional[date] = None, now: Optional[datetime] = None) -> date:
+    """Latest closed session on or before ``day`` (today by default)."""
+    now = now or datetime.now()
+    if day is not None and day < now.date():
+        return market_store.latest_session(market_store.local_time(day, "23:59"))
+    session = market_store.latest_session(now)
+    if not market_store.session_closed(session, now):
+        session = market_store.latest_session(market_store.local_time(session - timedelta(days=1), "23:59"))
+    return session
+
+
+def get(day: Optional[date] = None, now: Optional[datetime] = None) -> MarketRegime:
+    """Regime of the session of ``day``, computed once per session and universe generation.
+
+    Concurrent callers for the same session wait for the one computing it.
+    """
+    session = session_for(day, now)
+    mapped = universe.reader.current()
+    key = (session, mapped.generation if mapped is not None else None)
+    while True:
+        with _lock:
+            regime = _cache.get(key)
+            if regime is not None:
+                return regime
+            future = _inflight.get(key)
+            if future is None:
+                future = _inflight[key] = Future()
+                break
+        try:
+            return cancellation.wait(future)
+        except cancellation.RunCancelledError:
+            # The computing run was cancelled, not necessarily this one: take over unless it was
+            cancellation.check()
+
+    try:
+        regime = compute(session)
+        with _lock:
+            for stale in [k for k in _cache if k[0] == session]:
+                del _cache[stale]
+            _cache[key] = regime
+            while len(_cache) > _CACHE_SIZE:
+                del _cache[next(iter(_cache))]
+        future.set_result(regime)
+        return regime
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def regime_text(day: Optional[date] = None) -> str:
+    """Regime summary for crew inputs; never fails the analysis it is injected into, unless it was cancelled."""
+    if not REGIME_ENABLED:
+        return UNAVAILABLE
+    try:
+        return get(day).text()
+    except cancellation.RunCancelledError:
+        raise
+    except Exception as e:
+        logger.warning("Không tính được chế độ thị trường: %s", e)
+        return UNAVAILABLE
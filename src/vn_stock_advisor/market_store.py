@@ -0,0 +1,288 @@
+"""
+Local store of daily prices, fundamentals and indicator snapshots.
+
+The tools used to download 200 days of prices and the whole ratio and income
+history on every call. The store keeps them in SQLite (``MARKET_STORE_PATH``)
+and only goes back to ``market_data`` for what is missing:
+
+- daily bars are fetched incrementally from the last stored session. Once the
+  latest session has closed they are served locally; during trading hours a
+  fetch younger than ``MARKET_STORE_INTRADAY_TTL_SECONDS`` is reused;
+- fundamentals (ratios, income statement, company info) change quarterly and
+  are refetched when older than ``FUNDAMENTALS_MAX_AGE_DAYS``;
+- snapshots (e.g. the latest indicator row) are stored under a fingerprint of
+  their inputs, so they are computed once per new bar.
+
+``MARKET_STORE_PATH=""`` disables the store: every call goes straight to
+``market_data`` and snapshots are always recomputed.
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from vn_stock_advisor import market_data, metrics
+
+MARKET_STORE_PATH = os.environ.get("MARKET_STORE_PATH", os.path.join("data", "market_store.sqlite3"))
+MARKET_STORE_INTRADAY_TTL_SECONDS = float(os.environ.get("MARKET_STORE_INTRADAY_TTL_SECONDS", "60"))
+# Bars loaded for a symbol seen for the first time
+MARKET_STORE_HISTORY_DAYS = int(os.environ.get("MARKET_STORE_HISTORY_DAYS", "400"))
+FUNDAMENTALS_MAX_AGE_DAYS = float(os.environ.get("FUNDAMENTALS_MAX_AGE_DAYS", "7"))
+# HOSE trading hours (local time)
+MARKET_OPEN_TIME = os.environ.get("MARKET_OPEN_TIME", "09:00")
+MARKET_CLOSE_TIME = os.environ.get("MARKET_CLOSE_TIME", "15:00")
+
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+STORE_REQUESTS = metrics.Counter(
+    "vn_stock_advisor_market_store_requests_total",
+    "Market store reads by kind (prices, fundamentals, snapshot) and outcome (local, fetched, computed).",
+    labelnames=("kind", "outcome"),
+)
+
+
+# --- Trading calendar (weekdays only, holidays are treated as sessions without bars) ---
+
+def local_time(day: date, clock: str) -> datetime:
+    hour, minute = clock.split(":")
+    return datetime.combine(day, datetime.min.time()).replace(hour=int(hour), minute=int(minute))
+
+
+def latest_session(now: Optional[datetime] = None) -> date:
+    """Latest trading day whose session has opened by ``now``."""
+    now = now or datetime.now()
+    day = now.date()
+    if now < local_time(day, MARKET_OPEN_TIME):
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def next_session(day: date) -> date:
+    """Trading day following ``day``."""
+    day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def session_closed(day: date, now: Optional[datetime] = None) -> bool:
+    return (now or datetime.now()) >= local_time(day, MARKET_CLOSE_TIME)
+
+
+def fingerprint(frame: pd.DataFrame) -> str:
+    """Cheap identity of a bar frame: length and last bar."""
+    if frame.empty:
+        return "empty"
+    last = frame.iloc[-1]
+    identity = [len(frame), str(last.get("time"))] + [float(last.get(c, 0)) for c in PRICE_COLUMNS]
+    return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()[:16]
+
+
+class MarketStore:
+    """SQLite store of bars, fundamentals and snapshots, refreshed from ``market_data``."""
+
+    def __init__(self, path: str = MARKET_STORE_PATH):
+        self.path = path
+        self._initialized = False
+        self._memory: Dict[Tuple[str, str], Tuple[str, Any]] = {}
+        # One refresh per symbol at a time; concurrent readers wait for it
+        self._symbol_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @contextmanager
+    def _connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                if not self._initialized:
+                    connection.executescript(
+                        "CREATE TABLE IF NOT EXISTS bars (symbol TEXT, time TEXT, open REAL, high REAL, low REAL,"
+                        " close REAL, volume REAL, PRIMARY KEY (symbol, time));"
+                        "CREATE TABLE IF NOT EXISTS coverage (symbol TEXT PRIMARY KEY, start TEXT, end TEXT,"
+                        " fetched_at REAL);"
+                        "CREATE TABLE IF NOT EXISTS fundamentals (symbol TEXT, kind TEXT, fetched_at REAL,"
+                        " payload TEXT, PRIMARY KEY (symbol, kind));"
+                        "CREATE TABLE IF NOT EXISTS snapshots (symbol TEXT, kind TEXT, fingerprint TEXT,"
+                        " payload TEXT, PRIMARY KEY (symbol, kind));"
+                    )
+                    self._initialized = True
+                yield connection
+        finally:
+            connection.close()
+
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._lock:
+            return self._symbol_locks[symbol]
+
+    # --- Prices ---
+
+    def coverage(self, symbol: str) -> Optional[Tuple[str, str, float]]:
+        """(start, end, fetched_at) of the stored history of ``symbol``."""
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT start, end, fetched_at FROM coverage WHERE symbol = ?", (symbol,)
+            ).fetchone()
+
+    def is_fresh(self, symbol: str, start: Optional[str] = None, now: Optional[datetime] = None) -> bool:
+        """Whether the stored bars of ``symbol`` can be served without a fetch."""
+        now = now or datetime.now()
+        covered = self.coverage(symbol)
+        if covered is None or (start and start < covered[0]):
+            return False
+        session = latest_session(now)
+        if covered[1] < session.isoformat():
+            return False
+        fetched_at = datetime.fromtimestamp(covered[2])
+        if session_closed(session, fetched_at):
+            return True
+        # Session still running: reuse a recent fetch
+        return not session_closed(session, now) and (now - fetched_at).total_seconds() < MARKET_STORE_INTRADAY_TTL_SECONDS
+
+    def refresh(self, symbol: str, start: Optional[str] = None, now: Optional[datetime] = None) -> int:
+        """Fetch the bars missing from the store and return how many were written."""
+        now = now or datetime.now()
+        end = now.date().isoformat()
+        covered = self.coverage(symbol)
+        if covered is None or (start and start < covered[0]):
+            default_start = (now.date() - timedelta(days=MARKET_STORE_HISTORY_DAYS)).isoformat()
+            fetch_start = min(s for s in (start, default_start, covered and covered[0]) if s)
+        else:
+            # Refetch the last stored session too: it may have been stored while still trading
+            with self._connect() as connection:
+                last = connection.execute("SELECT MAX(time) FROM bars WHERE symbol = ?", (symbol,)).fetchone()[0]
+            fetch_start = (last or covered[1])[:10]
+
+        frame = market_data.price_history(symbol, start=fetch_start, end=end, interval="1D")
+        rows = [
+            (symbol, pd.Timestamp(t).isoformat(), *(float(v) for v in values))
+            for t, *values in frame.loc[:, ["time", *PRICE_COLUMNS]].itertuples(index=False)
+        ]
+        with self._connect() as connection:
+            connection.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.execute(
+                "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)",
+                (symbol, min(fetch_start, covered[0]) if covered else fetch_start, end, now.timestamp()),
+            )
+        return len(rows)
+
+    def bars(self, symbol: str, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Stored daily bars of ``symbol`` between ``start`` and ``end`` (inclusive), oldest first."""
+        query, params = "SELECT time, open, high, low, close, volume FROM bars WHERE symbol = ?", [symbol]
+        if start:
+            query, params = query + " AND time >= ?", params + [start]
+        if end:
+            # Bars are stored with their timestamp; include the whole end day
+            query, params = query + " AND time < ?", params + [(date.fromisoformat(end[:10]) + timedelta(days=1)).isoformat()]
+        with self._connect() as connection:
+            frame = pd.read_sql_query(query + " ORDER BY time", connection, params=params)
+        return frame.assign(time=pd.to_datetime(frame["time"]))
+
+    def price_history(self, symbol: str, start: str, end: str, now: Optional[datetime] = None) -> pd.DataFrame:
+        """Daily bars like ``market_data.price_history``, fetching only what the store lacks."""
+        if not self.enabled:
+            return market_data.price_history(symbol, start=start, end=end, interval="1D")
+        with self._symbol_lock(symbol):
+            if self.is_fresh(symbol, start, now):
+                STORE_REQUESTS.inc(kind="prices", outcome="local")
+            else:
+                self.refresh(symbol, start, now)
+                STORE_REQUESTS.inc(kind="prices", outcome="fetched")
+        return self.bars(symbol, start, end)
+
+    # --- Fundamentals ---
+
+    def _fundamental(self, symbol: str, kind: str, fetch: Callable[[], Any], max_age_days: float):
+        if not self.enabled:
+            return fetch()
+        with self._symbol_lock(f"{symbol}:{kind}"):
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT fetched_at, payload FROM fundamentals WHERE symbol = ? AND kind = ?", (symbol, kind)
+                ).fetchone()
+            if row and time.time() - row[0] < max_age_days * 86400:
+                STORE_REQUESTS.inc(kind="fundamentals", outcome="local")
+                return json.loads(row[1])
+            value = fetch()
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO fundamentals VALUES (?, ?, ?, ?)",
+                    (symbol, kind, time.time(), json.dumps(value, ensure_ascii=False, default=str)),
+                )
+            STORE_REQUESTS.inc(kind="fundamentals", outcome="fetched")
+            return value
+
+    def _fundamental_frame(self, symbol: str, kind: str, fetch: Callable[[], pd.DataFrame],
+                           max_age_days: float) -> pd.DataFrame:
+        payload = self._fundamental(symbol, kind, lambda: fetch().to_json(orient="split", date_format="iso"),
+                                    max_age_days)
+        return pd.read_json(io.StringIO(payload), orient="split", convert_dates=False)
+
+    def financial_ratios(self, symbol: str, period: str = "quarter",
+                         max_age_days: float = FUNDAMENTALS_MAX_AGE_DAYS) -> pd.DataFrame:
+        if not self.enabled:
+            return market_data.financial_ratios(symbol, period=period)
+        return self._fundamental_frame(
+            symbol, f"ratios.{period}", lambda: market_data.financial_ratios(symbol, period=period), max_age_days
+        )
+
+    def income_statement(self, symbol: str, period: str = "quarter",
+                         max_age_days: float = FUNDAMENTALS_MAX_AGE_DAYS) -> pd.DataFrame:
+        if not self.enabled:
+            return market_data.income_statement(symbol, period=period)
+        return self._fundamental_frame(
+            symbol, f"income.{period}", lambda: market_data.income_statement(symbol, period=period), max_age_days
+        )
+
+    def company_info(self, symbol: str, max_age_days: float = FUNDAMENTALS_MAX_AGE_DAYS) -> Tuple[str, str]:
+        full_name, industry = self._fundamental(
+            symbol, "company", lambda: list(market_data.company_info(symbol)), max_age_days
+        )
+        return full_name, industry
+
+    # --- Snapshots ---
+
+    def snapshot(self, symbol: str, kind: str, key: str, compute: Callable[[], Any]) -> Any:
+        """JSON value of ``compute()`` for inputs identified by ``key``, computed once per key."""
+        memory_key = (symbol, kind)
+        entry = self._memory.get(memory_key)
+        if entry is None and self.enabled:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT fingerprint, payload FROM snapshots WHERE symbol = ? AND kind = ?", (symbol, kind)
+                ).fetchone()
+            if row:
+                entry = self._memory[memory_key] = (row[0], json.loads(row[1]))
+        if entry is not None and entry[0] == key:
+            STORE_REQUESTS.inc(kind="snapshot", outcome="local")
+            return entry[1]
+
+        value = compute()
+        STORE_REQUESTS.inc(kind="snapshot", outcome="computed")
+        if self.enabled:
+            self._memory[memory_key] = (key, value)
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+                    (symbol, kind, key, json.dumps(value, ensure_ascii=False, default=str)),
+                )
+        return value
+
+
+store = MarketStore()
@@ -0,0 +1,357 @@
+"""
+Lightweight latency instrumentation for VN Stock Advisor.
+
+Provides Prometheus-compatible counters and histograms (text exposition format,
+no extra dependency) plus per-request timing breakdowns. Code wraps a stage in
+``span(stage, name)``; the duration is observed on the stage histogram and, when
+a request is collecting timings, appended to that request's breakdown.
+"""
+import contextvars
+import functools
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Buckets cover sub-millisecond indicator math up to full 3-minute crew runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180, 300)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class holding the name, help text and label names of a metric."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self, **labels) -> Optional[Dict[str, float]]:
+        """Return ``{"count", "sum"}`` for one label set, or None if never observed."""
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return None
+        return {"count": state[-1], "sum": state[-2]}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class Callback(_Metric):
+    """Unlabelled metric whose value is read from ``fn`` when rendered."""
+
+    def __init__(self, name: str, documentation: str, fn, type_name: str = "gauge", registry=None):
+        self.type_name = type_name
+        self._fn = fn
+        super().__init__(name, documentation, (), registry)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self._fn())}"]
+
+
+class Registry:
+    """Collection of metrics rendered together on ``/metrics``."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = Histogram(
+    "vn_stock_advisor_stage_duration_seconds",
+    "Duration of instrumented stages (tool, data_source, search, llm, task).",
+    labelnames=("stage", "name"),
+)
+STAGE_ERRORS = Counter(
+    "vn_stock_advisor_stage_errors_total",
+    "Instrumented stages that raised an exception.",
+    labelnames=("stage", "name"),
+)
+REQUEST_SECONDS = Histogram(
+    "vn_stock_advisor_http_request_duration_seconds",
+    "HTTP request latency by route and status code.",
+    labelnames=("method", "path", "status"),
+)
+
+
+
+def _process_cpu_seconds() -> float:
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+    return rusage.ru_utime + rusage.ru_stime
+
+
+def _process_rss_bytes() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # No procfs: fall back to the peak RSS (KiB on Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+PROCESS_CPU_SECONDS = Callback(
+    "process_cpu_seconds_total", "Total user and system CPU time of the server process.",
+    _process_cpu_seconds, type_name="counter",
+)
+PROCESS_RSS_BYTES = Callback(
+    "process_resident_memory_bytes", "Resident memory of the server process.", _process_rss_bytes,
+)
+
+
+class TimingBreakdown:
+    """Spans recorded while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, name: str, start: float, seconds: float, error: bool = False) -> None:
+        span = {
+            "stage": stage,
+            "name": name,
+            "start_offset": round(start - self.started, 4),
+            "seconds": round(seconds, 4),
+        }
+        if error:
+            span["error"] = True
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """Return total time, per-stage totals and the individual spans."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_offset"])
+        stages: Dict[str, dict] = {}
+        for span in spans:
+            totals = stages.setdefault(span["stage"], {"count": 0, "seconds": 0.0})
+            totals["count"] += 1
+            totals["seconds"] = round(totals["seconds"] + span["seconds"], 4)
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "stages": stages,
+            "spans": spans,
+        }
+
+
+_current_breakdown: contextvars.ContextVar[Optional[TimingBreakdown]] = contextvars.ContextVar(
+    "vn_stock_advisor_timing_breakdown", default=None
+)
+
+
+_current_task: contextvars.ContextVar[Optional[Tuple[str, Optional[str]]]] = contextvars.ContextVar(
+    "vn_stock_advisor_current_task", default=None
+)
+
+
+def current_breakdown() -> Optional[TimingBreakdown]:
+    return _current_breakdown.get()
+
+
+def current_task() -> Optional[str]:
+    """Name of the crew task being executed in this context, if any."""
+    scope = _current_task.get()
+    return scope[0] if scope else None
+
+
+def current_agent() -> Optional[str]:
+    """Role of the agent executing the current task, if any."""
+    scope = _current_task.get()
+    return scope[1] if scope else None
+
+
+@contextmanager
+def task_scope(name: str, agent: Optional[str] = None):
+    """Mark ``name`` (run by ``agent``) as the task running in this context."""
+    token = _current_task.set((name, agent))
+    try:
+        yield
+    finally:
+        _current_task.reset(token)
+
+
+@contextmanager
+def collect_timings():
+    """Collect every span recorded in this context (and contexts copied from it)."""
+    breakdown = TimingBreakdown()
+    token = _current_breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _current_breakdown.reset(token)
+
+
+@contextmanager
+def span(stage: str, name: str):
+    """Time a block, observe it on the stage histogram and the current breakdown."""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        STAGE_ERRORS.inc(stage=stage, name=name)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage, name=name)
+        breakdown = _current_breakdown.get()
+        if breakdown is not None:
+            breakdown.add(stage, name, start, seconds, error)
+
+
+def timed(stage: str, name: str):
+    """Decorator form of ``span``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render() -> str:
+    """Render every registered metric in Prometheus text format."""
+    return REGISTRY.render()
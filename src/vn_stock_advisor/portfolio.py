@@ -0,0 +1,199 @@
+"""
+Portfolio-level aggregates over per-symbol analyses.
+
+``POST /analyze/portfolio`` runs (or reuses) one analysis per holding, then
+this module turns them into portfolio figures in one vectorized pass:
+
+- ``weighted_score``: holdings' ``overall_score`` weighted by their weights;
+- ``decision_mix``: weight share of each decision (MUA, GIỮ, BÁN);
+- ``industries``: weight per industry and Herfindahl concentration;
+- ``risk``: annualized volatility, pairwise correlation and diversification
+  ratio of daily returns, from local price data (the universe matrix when it
+  holds the symbol, the market store otherwise), never from the crews.
+
+Fresh analyses are kept in the analysis cache until the next close, so
+overlapping portfolios only pay for the symbols nobody asked for yet.
+"""
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from vn_stock_advisor import market_store, universe
+
+logger = logging.getLogger(__name__)
+
+# Per-symbol analyses of all portfolio requests running at the same time
+PORTFOLIO_CONCURRENCY = int(os.environ.get("PORTFOLIO_CONCURRENCY", "4"))
+PORTFOLIO_MAX_HOLDINGS = int(os.environ.get("PORTFOLIO_MAX_HOLDINGS", "50"))
+# Calendar days of daily closes behind the volatility and correlation figures
+PORTFOLIO_RETURNS_DAYS = int(os.environ.get("PORTFOLIO_RETURNS_DAYS", "365"))
+TRADING_DAYS_PER_YEAR = 252
+# Sessions two holdings must share before their correlation is reported
+MIN_OVERLAP_SESSIONS = 20
+
+DECISIONS = ("MUA", "GIỮ", "BÁN")
+
+
+def normalize_weights(holdings: Sequence[Tuple[str, Optional[float]]]) -> Dict[str, float]:
+    """Weights summing to 1 by upper-cased symbol; repeated symbols add up, no weights at all means equal weights."""
+    weights = [weight for _, weight in holdings]
+    if any(weight is None for weight in weights) and not all(weight is None for weight in weights):
+        raise ValueError("Cần nhập tỷ trọng cho tất cả mã hoặc bỏ trống tất cả")
+    merged: Dict[str, float] = {}
+    for symbol, weight in holdings:
+        symbol = symbol.strip().upper()
+        if not symbol:
+            raise ValueError("Mã cổ phiếu không được để trống")
+        if weight is not None and weight < 0:
+            raise ValueError(f"Tỷ trọng của {symbol} không được âm")
+        merged[symbol] = merged.get(symbol, 0.0) + (1.0 if weight is None else float(weight))
+    if len(merged) > PORTFOLIO_MAX_HOLDINGS:
+        raise ValueError(f"Danh mục tối đa {PORTFOLIO_MAX_HOLDINGS} mã")
+    total = sum(merged.values())
+    if total <= 0:
+        raise ValueError("Tổng tỷ trọng phải lớn hơn 0")
+    return {symbol: weight / total for symbol, weight in merged.items()}
+
+
+def decision_fields(result) -> dict:
+    """The investment decision JSON of a crew result (or cached analysis), ``{}`` if unreadable."""
+    tasks = getattr(result, "tasks_output", None) or []
+    raw = getattr(tasks[-1], "raw", "") if tasks else str(result or "")
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`").removeprefix("json").strip()
+    try:
+        fields = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    return fields if isinstance(fields, dict) else {}
+
+
+def result_expiry(day: str, now: Optional[datetime] = None) -> float:
+    """When a fresh analysis of ``day`` stops answering for it: the next market close."""
+    now = now or datetime.now()
+    session = date.fromisoformat(day)
+    close = market_store.local_time(session, market_store.MARKET_CLOSE_TIME)
+    if close <= now:
+        close = market_store.local_time(market_store.next_session(max(session, now.date())), market_store.MARKET_CLOSE_TIME)
+    return close.timestamp()
+
+
+def price_matrix(symbols: Sequence[str], days: int = PORTFOLIO_RETURNS_DAYS,
+                 now: Optional[datetime] = None, from_universe: bool = True) -> pd.DataFrame:
+    """Daily closes (sessions x symbols) of the last ``days`` days; symbols without data are left out.
+
+    ``from_universe=False`` reads every symbol from the market store.
+    """
+    now = now or datetime.now()
+    start = (now - timedelta(days=days)).strftime("%Y-%m-%d")
+    mapped = universe.reader.current() if from_universe else None
+    columns = {}
+    for symbol in symbols:
+        try:
+            if mapped is not None and symbol in mapped:
+                bars = mapped.bars(symbol)
+                series = pd.Series(bars.close, index=pd.to_datetime(bars.time), dtype=np.float64)
+                series = series[series.index >= pd.Timestamp(start)]
+            else:
+                frame = market_store.store.price_history(symbol, start=start, end=now.strftime("%Y-%m-%d"))
+                series = pd.Series(frame["close"].to_numpy(np.float64), index=pd.to_datetime(frame["time"]).dt.normalize())
+        except Exception as e:
+            logger.warning("Không lấy được giá %s cho danh mục: %s", symbol, e)
+            continue
+        if len(series):
+            columns[symbol] = series[~series.index.duplicated(keep="last")]
+    return pd.DataFrame(columns).sort_index()
+
+
+def risk(weights: Dict[str, float], closes: pd.DataFrame) -> dict:
+    """Volatility and correlation of the holdings with prices, weights renormalized over them."""
+    symbols = [symbol for symbol in weights if symbol in closes.columns]
+    returns = closes[symbols].pct_change(fill_method=None).iloc[1:]
+    if len(symbols) == 0 or len(returns) < 2:
+        return {"sessions": len(returns), "covered_weight": 0.0}
+    w = np.array([weights[symbol] for symbol in symbols])
+    covered = float(w.sum())
+    w = w / covered
+
+    # Pairwise over shared sessions: a suspension only drops the pairs it affects
+    covariance = returns.cov(min_periods=MIN_OVERLAP_SESSIONS).to_numpy() * TRADING_DAYS_PER_YEAR
+    volatility = np.sqrt(np.diag(covariance))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = covariance / np.outer(volatility, volatility)
+    known = ~np.isnan(covariance)
+    portfolio_variance = float(np.where(known, covariance, 0.0) @ w @ w)
+    portfolio_volatility = float(np.sqrt(max(portfolio_variance, 0.0)))
+
+    off_diagonal = np.outer(w, w) * known * ~np.eye(len(w), dtype=bool)
+    average_correlation = (
+        float(np.nansum(correlation * off_diagonal) / off_diagonal.sum()) if off_diagonal.sum() else None
+    )
+    weighted_volatility = float(np.nansum(w * volatility))
+    return {
+        "sessions": len(returns),
+        "covered_weight": round(covered, 6),
+        "volatility_annual": round(portfolio_volatility, 6),
+        "holding_volatility": {
+            symbol: (None if np.isnan(value) else round(float(value), 6)) for symbol, value in zip(symbols, volatility)
+        },
+        "average_correlation": None if average_correlation is None else round(average_correlation, 6),
+        "diversification_ratio": round(weighted_volatility / portfolio_volatility, 6) if portfolio_volatility else None,
+        "correlation": {
+            "symbols": symbols,
+            "matrix": [[None if np.isnan(value) else round(float(value), 4) for value in row] for row in correlation],
+        },
+    }
+
+
+def aggregate(holdings: List[dict], closes: pd.DataFrame) -> dict:
+    """Portfolio figures of analysed ``holdings`` (dicts with symbol, weight, decision, overall_score, industry)."""
+    weights = np.array([holding["weight"] for holding in holdings], dtype=np.float64)
+    scores = np.array([
+        np.nan if holding.get("overall_score") is None else float(holding["overall_score"]) for holding in holdings
+    ])
+    scored = ~np.isnan(scores)
+    scored_weight = float(weights[scored].sum())
+
+    frame = pd.DataFrame({
+        "weight": weights,
+        "decision": [holding.get("decision") or "KHÔNG RÕ" for holding in holdings],
+        "industry": [holding.get("industry") or "Chưa xác định" for holding in holdings],
+    })
+    decision_mix = frame.groupby("decision")["weight"].sum()
+    industries = frame.groupby("industry")["weight"].sum().sort_values(ascending=False)
+    return {
+        "weighted_score": round(float(weights[scored] @ scores[scored] / scored_weight), 4) if scored_weight else None,
+        "scored_weight": round(scored_weight, 6),
+        "decision_mix": {
+            decision: round(float(decision_mix.get(decision, 0.0)), 6)
+            for decision in (*DECISIONS, *sorted(set(decision_mix.index) - set(DECISIONS)))
+        },
+        "industries": {
+            "weights": {industry: round(float(weight), 6) for industry, weight in industries.items()},
+            "top": industries.index[0] if len(industries) else None,
+            # Herfindahl index: 1 is a single industry, 1/n is n equal ones
+            "hhi": round(float((industries ** 2).sum()), 6),
+        },
+        "holding_hhi": round(float((weights ** 2).sum()), 6),
+        "risk": risk(dict(zip((holding["symbol"] for holding in holdings), weights)), closes),
+    }
+
+
+def combine_usage(summaries: List[dict]) -> dict:
+    """One usage summary for the per-holding ledgers of a portfolio request."""
+    totals = {
+        key: sum(summary.get(key, 0) for summary in summaries)
+        for key in ("calls", "prompt_tokens", "completion_tokens", "total_tokens")
+    }
+    totals["cost_usd"] = round(sum(summary.get("cost_usd", 0.0) for summary in summaries), 6)
+    totals["by_symbol"] = [
+        {key: summary.get(key) for key in ("request_id", "symbol", "calls", "total_tokens", "cost_usd")}
+        for summary in summaries
+    ]
+    return totals
@@ -0,0 +1,216 @@
+"""
+Compact, array-backed price bars and technical indicators.
+
+A daily history used to live as a pandas frame, copied once more by the
+indicator code (plus ~20 float64 columns) and once more by the
+support/resistance code: about 47 KiB resident per symbol for 200 bars, and
+~286 KiB allocated at peak per analysis.
+
+``PriceBars`` holds one contiguous array per field instead (``datetime64[s]``
+times, ``float32`` prices, ``int64`` volumes) and ``Indicators`` one array per
+indicator. Every array is read-only, so the indicator and support/resistance
+code share the same views of a symbol's bars without defensive copies, and the
+whole market fits in one worker: 200 bars take 6.3 KiB of prices and 18 KiB of
+indicators per symbol.
+
+Indicators are computed in float64. Price indicators (averages, bands, MACD,
+RSI) are stored as float32, which keeps about seven significant digits, more
+than the reports print for prices. Volume averages and ratios stay float64:
+they are printed to the share, and float32 is exact only up to 2^24 (about
+16.8 million shares). OBV is int64.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterator, Union
+
+import numpy as np
+import pandas as pd
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+PRICE_DTYPE = np.float32
+VOLUME_DTYPE = np.int64
+# Volume averages and ratios (volumes exceed float32's exact integers)
+VOLUME_INDICATOR_DTYPE = np.float64
+
+# Indicator columns, in the order of the former indicator frame
+INDICATOR_COLUMNS = (
+    "SMA_20", "SMA_50", "SMA_200", "EMA_12", "EMA_26", "MACD", "MACD_Signal", "MACD_Hist", "RSI_14",
+    "BB_Middle", "BB_Upper", "BB_Lower", "Volume_SMA_10", "Volume_SMA_20", "Volume_SMA_50",
+    "Volume_Ratio_10", "Volume_Ratio_20", "OBV",
+)
+
+
+def _float(value) -> float:
+    """A float32 as the float64 of its shortest repr (24.39, not 24.389999389648438)."""
+    return float(str(value))
+
+
+def json_values(array: np.ndarray) -> list:
+    """``array`` as JSON-ready Python values: shortest-repr floats, ``None`` for NaN."""
+    if not np.issubdtype(array.dtype, np.floating):
+        return array.tolist()
+    return [None if value != value else _float(value) for value in array]
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class PriceBars:
+    """OHLCV bars of one symbol as contiguous read-only arrays, oldest first."""
+    time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    @classmethod
+    def from_frame(cls, frame: Union[pd.DataFrame, "PriceBars"]) -> "PriceBars":
+        """Bars of a ``time, open, high, low, close, volume`` frame (``PriceBars`` pass through)."""
+        if isinstance(frame, PriceBars):
+            return frame
+        fields = {
+            field: _read_only(np.ascontiguousarray(frame[field].to_numpy(), dtype=PRICE_DTYPE))
+            for field in PRICE_FIELDS
+        }
+        volume = frame["volume"].to_numpy()
+        if not np.issubdtype(volume.dtype, np.integer):
+            volume = np.nan_to_num(volume.astype(np.float64))
+        time = frame["time"]
+        if not pd.api.types.is_datetime64_dtype(time):
+            time = pd.to_datetime(time)
+        time = np.ascontiguousarray(time.to_numpy(dtype="datetime64[s]"))
+        volume = np.ascontiguousarray(volume, dtype=VOLUME_DTYPE)
+        return cls(time=_read_only(time), volume=_read_only(volume), **fields)
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, field).nbytes for field in ("time", *PRICE_FIELDS, "volume"))
+
+    def frame(self) -> pd.DataFrame:
+        """The bars as a pandas frame (a copy, for callers that need one)."""
+        return pd.DataFrame({
+            "time": pd.to_datetime(self.time), **{field: getattr(self, field) for field in PRICE_FIELDS},
+            "volume": self.volume,
+        })
+
+
+def _rolling(values: np.ndarray, window: int):
+    """``Series.rolling(window)`` over ``values`` without copying them."""
+    return pd.Series(values, copy=False).rolling(window=window)
+
+
+def _ema(values: np.ndarray, span: int) -> np.ndarray:
+    """``Series.ewm(span=span, adjust=False).mean()``."""
+    return pd.Series(values, copy=False).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+class Indicators:
+    """Indicator arrays of one symbol, aligned with its ``PriceBars``."""
+
+    def __init__(self, bars: PriceBars, values: Dict[str, np.ndarray]):
+        self.bars = bars
+        self.values = values
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.values[name] if name in self.values else getattr(self.bars, name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.values)
+
+    def __len__(self) -> int:
+        return len(self.bars)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the indicator arrays (the bars are shared, not counted; BB_Middle is SMA_20)."""
+        return sum({id(array): array.nbytes for array in self.values.values()}.values())
+
+    def latest(self) -> pd.Series:
+        """The last bar and its indicators, like the last row of the former indicator frame."""
+        row = {"time": pd.Timestamp(self.bars.time[-1])}
+        row.update((field, _float(getattr(self.bars, field)[-1])) for field in PRICE_FIELDS)
+        row["volume"] = int(self.bars.volume[-1])
+        row.update((name, _float(array[-1])) for name, array in self.values.items())
+        return pd.Series(row)
+
+    def frame(self) -> pd.DataFrame:
+        """Bars and indicators as one pandas frame (a copy)."""
+        frame = self.bars.frame()
+        for name, array in self.values.items():
+            frame[name] = array
+        return frame
+
+
+def calculate_indicators(bars: PriceBars) -> Indicators:
+    """SMA, EMA, MACD, RSI, Bollinger Bands, volume averages and OBV of every bar."""
+    # Computed in float64 and narrowed as soon as each column is final, to keep the peak low
+    close = bars.close.astype(np.float64)
+    volume = bars.volume.astype(np.float64)
+    arrays = {}
+
+    def store(name: str, values: np.ndarray, dtype=PRICE_DTYPE) -> np.ndarray:
+        arrays[name] = _read_only(values.astype(dtype))
+        return values
+
+    sma_20 = store("SMA_20", _rolling(close, 20).mean().to_numpy())
+    store("SMA_50", _rolling(close, 50).mean().to_numpy())
+    store("SMA_200", _rolling(close, 200).mean().to_numpy())
+    macd = store("EMA_12", _ema(close, 12)) - store("EMA_26", _ema(close, 26))
+    signal = store("MACD_Signal", _ema(store("MACD", macd), 9))
+    store("MACD_Hist", macd - signal)
+    del macd, signal
+
+    delta = np.diff(close, prepend=np.nan)
+    gain = _rolling(np.where(delta > 0, delta, 0.0), 14).mean().to_numpy()
+    loss = _rolling(np.where(delta < 0, -delta, 0.0), 14).mean().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gain / np.where(loss == 0, np.nan, loss)
+    # Neutral RSI while undefined (warm-up or no losing bar)
+    store("RSI_14", np.nan_to_num(100 - 100 / (1 + rs), nan=50.0))
+    del delta, gain, loss, rs
+
+    std = _rolling(close, 20).std().to_numpy()
+    arrays["BB_Middle"] = arrays["SMA_20"]
+    store("BB_Upper", sma_20 + 2 * std)
+    store("BB_Lower", sma_20 - 2 * std)
+    del std
+
+    volume_10 = store("Volume_SMA_10", _rolling(volume, 10).mean().to_numpy(), VOLUME_INDICATOR_DTYPE)
+    volume_20 = store("Volume_SMA_20", _rolling(volume, 20).mean().to_numpy(), VOLUME_INDICATOR_DTYPE)
+    store("Volume_SMA_50", _rolling(volume, 50).mean().to_numpy(), VOLUME_INDICATOR_DTYPE)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        store("Volume_Ratio_10", volume / volume_10, VOLUME_INDICATOR_DTYPE)
+        store("Volume_Ratio_20", volume / volume_20, VOLUME_INDICATOR_DTYPE)
+
+    if len(bars):
+        # OBV adds the volume of up bars and subtracts that of down bars, from the first volume
+        direction = np.sign(np.nan_to_num(np.diff(close))).astype(VOLUME_DTYPE)
+        obv = np.concatenate(([bars.volume[0]], bars.volume[0] + np.cumsum(direction * bars.volume[1:])))
+    else:
+        obv = np.zeros(0, dtype=VOLUME_DTYPE)
+    arrays["OBV"] = _read_only(obv.astype(VOLUME_DTYPE, copy=False))
+    return Indicators(bars, {name: arrays[name] for name in INDICATOR_COLUMNS})
+
+
+def _as_float64(values: np.ndarray) -> np.ndarray:
+    """float32 prices as the float64 of their shortest repr, so sums and means see the quoted prices."""
+    return np.array([_float(value) for value in values], dtype=np.float64)
+
+
+def pivot_levels(bars: PriceBars, window: int = 10):
+    """Highs that are the maximum, and lows the minimum, of the ``window`` bars centered on them (float64)."""
+    if len(bars) < window:
+        return np.zeros(0), np.zeros(0)
+    center = window // 2
+    highs = np.lib.stride_tricks.sliding_window_view(bars.high, window)
+    lows = np.lib.stride_tricks.sliding_window_view(bars.low, window)
+    candidates_high = bars.high[center:center + len(highs)]
+    candidates_low = bars.low[center:center + len(lows)]
+    return (_as_float64(candidates_high[highs.max(axis=1) == candidates_high]),
+            _as_float64(candidates_low[lows.min(axis=1) == candidates_low]))
@@ -0,0 +1,377 @@
+"""
+Process-wide rate limiting of LLM calls per provider and model.
+
+Every ``AdvisorLLM`` call, from any agent of any crew, takes a request and its
+estimated tokens from the token buckets of its model before going out, so the
+combined traffic stays under the provider quota instead of each agent pacing
+itself. Waiting calls are served by priority (interactive API requests before
+background jobs), then in arrival order.
+
+The limiter adapts to the provider: a 429 pauses the model until its
+Retry-After (or an exponential backoff) and lowers the refill rate, which then
+recovers gradually with each successful call. Setting ``RATE_LIMIT_SHARED_PATH``
+keeps the buckets in SQLite so several server processes share one budget.
+
+Limits come from ``LLM_RATE_LIMITS_JSON`` (per model or provider prefix) and
+default to ``LLM_RATE_LIMIT_RPM`` / ``LLM_RATE_LIMIT_TPM``; 0 disables a budget.
+"""
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from vn_stock_advisor import cancellation, metrics
+
+DEFAULT_RPM = float(os.environ.get("LLM_RATE_LIMIT_RPM", "60"))
+DEFAULT_TPM = float(os.environ.get("LLM_RATE_LIMIT_TPM", "0"))
+# Per model or provider: {"gemini/gemini-2.0-flash-001": {"rpm": 2000, "tpm": 4000000}, "bedrock": {"rpm": 50}}
+LIMIT_OVERRIDES = json.loads(os.environ.get("LLM_RATE_LIMITS_JSON", "{}"))
+SHARED_PATH = os.environ.get("RATE_LIMIT_SHARED_PATH", "")
+MAX_RETRIES = int(os.environ.get("LLM_RATE_LIMIT_RETRIES", "3"))
+
+# Priorities, lower is served first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+MIN_RATE_FACTOR = 0.25
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+
+RATE_LIMIT_WAIT = metrics.Histogram(
+    "vn_stock_advisor_rate_limit_wait_seconds",
+    "Time LLM calls waited for the rate limiter.",
+    labelnames=("limiter",),
+)
+RATE_LIMITED = metrics.Counter(
+    "vn_stock_advisor_rate_limited_total",
+    "429 responses received from LLM providers.",
+    labelnames=("limiter",),
+)
+RATE_LIMIT_QUEUE = metrics.Gauge(
+    "vn_stock_advisor_rate_limit_queue",
+    "LLM calls currently waiting for the rate limiter.",
+    labelnames=("limiter",),
+)
+RATE_LIMIT_FACTOR = metrics.Gauge(
+    "vn_stock_advisor_rate_limit_factor",
+    "Fraction of the configured rate currently allowed after 429 backoff.",
+    labelnames=("limiter",),
+)
+
+
+@dataclass
+class Limit:
+    rpm: float = 0.0
+    tpm: float = 0.0
+    # Share of the per-minute quota that may be spent at once
+    burst: float = 0.1
+
+    @property
+    def request_capacity(self) -> float:
+        return max(1.0, self.rpm * self.burst)
+
+    @property
+    def token_capacity(self) -> float:
+        return max(1.0, self.tpm * self.burst)
+
+
+@dataclass
+class BucketState:
+    requests: float
+    tokens: float
+    updated: float
+    paused_until: float = 0.0
+    factor: float = 1.0
+    failures: int = 0
+
+    @classmethod
+    def full(cls, limit: Limit, now: float) -> "BucketState":
+        return cls(limit.request_capacity, limit.token_capacity, now)
+
+
+def _refill(state: BucketState, limit: Limit, now: float) -> None:
+    elapsed = max(0.0, now - state.updated)
+    state.requests = min(limit.request_capacity, state.requests + elapsed * limit.rpm / 60 * state.factor)
+    state.tokens = min(limit.token_capacity, state.tokens + elapsed * limit.tpm / 60 * state.factor)
+    state.updated = now
+
+
+def _take(state: BucketState, limit: Limit, now: float, tokens: float) -> float:
+    """Take one request and ``tokens`` if available; otherwise return seconds to wait."""
+    _refill(state, limit, now)
+    if now < state.paused_until:
+        return state.paused_until - now
+
+    waits = []
+    if limit.rpm and state.requests < 1:
+        waits.append((1 - state.requests) / (limit.rpm / 60 * state.factor))
+    # A reservation larger than the bucket goes through once the bucket is full
+    needed = min(tokens, limit.token_capacity)
+    if limit.tpm and state.tokens < needed:
+        waits.append((needed - state.tokens) / (limit.tpm / 60 * state.factor))
+    if waits:
+        return max(waits)
+
+    if limit.rpm:
+        state.requests -= 1
+    if limit.tpm:
+        state.tokens -= tokens
+    return 0.0
+
+
+class _LocalStore:
+    """Bucket states held in this process."""
+
+    def __init__(self):
+        self._states: Dict[str, BucketState] = {}
+        self._lock = threading.Lock()
+
+    def transact(self, key: str, limit: Limit, fn: Callable[[BucketState, float], float]) -> float:
+        with self._lock:
+            now = time.time()
+            state = self._states.setdefault(key, BucketState.full(limit, now))
+            return fn(state, now)
+
+
+class _SQLiteStore:
+    """Bucket states shared between processes through a SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets (key TEXT PRIMARY KEY, state TEXT)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def transact(self, key: str, limit: Limit, fn: Callable[[BucketState, float], float]) -> float:
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = connection.execute("SELECT state FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+                state = BucketState(**json.loads(row[0])) if row else BucketState.full(limit, now)
+                result = fn(state, now)
+                connection.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets VALUES (?, ?)", (key, json.dumps(asdict(state)))
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            return result
+
+
+class RateLimiter:
+    """Token buckets (requests and tokens per minute) of one provider/model."""
+
+    def __init__(self, key: str, limit: Limit, store=None):
+        self.key = key
+        self.limit = limit
+        self._store = store or _LocalStore()
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        RATE_LIMIT_FACTOR.set(1.0, limiter=key)
+
+    def acquire(self, tokens: float = 0, priority: int = INTERACTIVE) -> float:
+        """Block until a request with ``tokens`` may be sent; return the seconds waited."""
+        start = time.perf_counter()
+        entry = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            RATE_LIMIT_QUEUE.set(len(self._waiters), limiter=self.key)
+            self._cond.notify_all()
+            try:
+                while True:
+                    cancellation.check()
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = self._store.transact(
+                            self.key, self.limit, lambda state, now: _take(state, self.limit, now, tokens)
+                        )
+                        if wait <= 0:
+                            break
+                        # Re-check regularly: other processes may share the buckets
+                        wait = min(wait, 1.0)
+                    # Waiters behind others also wake up regularly to notice a cancelled run
+                    self._cond.wait(timeout=wait if wait is not None else 1.0)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                RATE_LIMIT_QUEUE.set(len(self._waiters), limiter=self.key)
+                self._cond.notify_all()
+
+        waited = time.perf_counter() - start
+        RATE_LIMIT_WAIT.observe(waited, limiter=self.key)
+        breakdown = metrics.current_breakdown()
+        if breakdown is not None and waited >= 0.001:
+            breakdown.add("rate_limit", self.key, start, waited)
+        return waited
+
+    def settle(self, reserved: float, used: float) -> None:
+        """Return unused reserved tokens to the bucket (or charge any excess)."""
+        if not self.limit.tpm or used == reserved:
+            return
+
+        def adjust(state, now):
+            state.tokens = min(self.limit.token_capacity, state.tokens + reserved - used)
+            return 0.0
+
+        self._store.transact(self.key, self.limit, adjust)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """Pause after a 429 and lower the rate; return the pause in seconds."""
+        RATE_LIMITED.inc(limiter=self.key)
+
+        def backoff(state, now):
+            state.failures += 1
+            pause = retry_after if retry_after is not None else min(
+                BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (state.failures - 1)
+            )
+            state.paused_until = max(state.paused_until, now + pause)
+            state.factor = max(MIN_RATE_FACTOR, state.factor * 0.7)
+            # Resume with an empty bucket so the next calls are paced, not bursted
+            state.requests = min(state.requests, 0.0)
+            RATE_LIMIT_FACTOR.set(state.factor, limiter=self.key)
+            return pause
+
+        return self._store.transact(self.key, self.limit, backoff)
+
+    def on_success(self) -> None:
+        """Recover the rate a little after a successful call."""
+
+        def recover(state, now):
+            state.failures = 0
+            if state.factor < 1.0:
+                state.factor = min(1.0, state.factor + 0.05)
+                RATE_LIMIT_FACTOR.set(state.factor, limiter=self.key)
+            return 0.0
+
+        self._store.transact(self.key, self.limit, recover)
+
+
+def limit_for(model: str) -> Limit:
+    """Configured limit of ``model``: exact override, provider override, then defaults."""
+    provider = model.split("/", 1)[0]
+    override = LIMIT_OVERRIDES.get(model) or LIMIT_OVERRIDES.get(provider) or {}
+    return Limit(
+        rpm=float(override.get("rpm", DEFAULT_RPM)),
+        tpm=float(override.get("tpm", DEFAULT_TPM)),
+        burst=float(override.get("burst", Limit.burst)),
+    )
+
+
+_limiters: Dict[str, Optional[RateLimiter]] = {}
+_limiters_lock = threading.Lock()
+_shared_store = None
+
+
+def limiter_for(model: str) -> Optional[RateLimiter]:
+    """Shared limiter of ``model``, or None when it has no budget."""
+    global _shared_store
+    with _limiters_lock:
+        if model not in _limiters:
+            limit = limit_for(model)
+            if not (limit.rpm or limit.tpm):
+                _limiters[model] = None
+            else:
+                if SHARED_PATH and _shared_store is None:
+                    _shared_store = _SQLiteStore(SHARED_PATH)
+                _limiters[model] = RateLimiter(model, limit, _shared_store)
+        return _limiters[model]
+
+
+_current_priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "vn_stock_advisor_rate_limit_priority", default=INTERACTIVE
+)
+
+
+def current_priority() -> int:
+    return _current_priority.get()
+
+
+@contextmanager
+def priority(level: int):
+    """Send LLM calls made in this context with ``level`` priority."""
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether ``error`` is a provider 429 / quota exhaustion."""
+    return (
+        getattr(error, "status_code", None) == 429
+        or type(error).__name__ == "RateLimitError"
+        or "RESOURCE_EXHAUSTED" in str(error)
+    )
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds to wait from a Retry-After header or Gemini's ``retryDelay``."""
+    response = getattr(error, "response", None)
+    headers = getattr(error, "litellm_response_headers", None) or getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    match = re.search(r'retryDelay"?\s*[:=]\s*"?(\d+(?:\.\d+)?)s', str(error))
+    return float(match.group(1)) if match else None
+
+
+def call(model: str, fn: Callable[[], object], reserve_tokens: Callable[[], float] = lambda: 0,
+         used_tokens: Callable[[], Optional[float]] = lambda: None):
+    """Run ``fn`` under the limiter of ``model``, retrying it after 429s.
+
+    ``reserve_tokens`` estimates the tokens of the call (only evaluated when the
+    model has a token budget); ``used_tokens`` returns the tokens actually
+    consumed (None if unknown) so the reservation can be corrected afterwards.
+    """
+    limiter = limiter_for(model)
+    if limiter is None:
+        return fn()
+
+    reserve_tokens = reserve_tokens() if limiter.limit.tpm else 0
+    for attempt in itertools.count():
+        limiter.acquire(reserve_tokens, current_priority())
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_rate_limited(e):
+                raise
+            limiter.settle(reserve_tokens, 0)
+            limiter.on_rate_limited(retry_after(e))
+            if attempt >= MAX_RETRIES:
+                raise
+            continue
+        limiter.on_success()
+        used = used_tokens()
+        if used is not None:
+            limiter.settle(reserve_tokens, used)
+        return result
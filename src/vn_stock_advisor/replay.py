@@ -0,0 +1,219 @@
+"""
+Record/replay of external calls (vnstock, Serper, LLM providers).
+
+``REPLAY_MODE=record`` runs calls normally and writes each response, with how
+long it took, to ``REPLAY_DIR``. ``REPLAY_MODE=replay`` serves those responses
+back without touching the network, sleeping either the recorded duration
+(scaled by ``REPLAY_LATENCY_SCALE``) or a fixed ``REPLAY_LATENCY_MS`` so load
+tests see realistic, configurable latency.
+
+With ``REPLAY_STRICT=false`` a replay miss falls back to another recording with
+the same label (same data call, same task step), which lets a handful of
+recorded symbols stand in for the whole universe.
+"""
+import contextvars
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from io import StringIO
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from vn_stock_advisor import cancellation, metrics
+
+MODES = ("off", "record", "replay")
+
+REPLAY_CALLS = metrics.Counter(
+    "vn_stock_advisor_replay_calls_total",
+    "Calls served or captured by the record/replay layer.",
+    labelnames=("kind", "outcome"),
+)
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when no recording matches a call."""
+
+
+def _parse_latency(value: str) -> Dict[str, float]:
+    """Parse ``"250"`` or ``"llm=1200,vnstock=80"`` into milliseconds per kind ("*" = default)."""
+    latencies = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        kind, _, millis = part.rpartition("=")
+        latencies[kind or "*"] = float(millis)
+    return latencies
+
+
+@dataclass
+class ReplaySettings:
+    mode: str = "off"
+    directory: str = os.path.join("data", "replay")
+    strict: bool = True
+    latency_ms: Dict[str, float] = field(default_factory=dict)
+    latency_scale: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> "ReplaySettings":
+        mode = os.environ.get("REPLAY_MODE", "off").lower()
+        if mode not in MODES:
+            raise ValueError(f"REPLAY_MODE must be one of {MODES}, got {mode!r}")
+        return cls(
+            mode=mode,
+            directory=os.environ.get("REPLAY_DIR", os.path.join("data", "replay")),
+            strict=os.environ.get("REPLAY_STRICT", "true").lower() == "true",
+            latency_ms=_parse_latency(os.environ.get("REPLAY_LATENCY_MS", "")),
+            latency_scale=float(os.environ.get("REPLAY_LATENCY_SCALE", "1.0")),
+        )
+
+    def latency_for(self, kind: str, recorded: float) -> float:
+        """Seconds to sleep before serving a recording of ``kind``."""
+        millis = self.latency_ms.get(kind, self.latency_ms.get("*"))
+        if millis is not None:
+            return millis / 1000
+        return recorded * self.latency_scale
+
+
+settings = ReplaySettings.from_env()
+
+
+def configure(**overrides) -> ReplaySettings:
+    """Replace the active settings (used by the load-test harness and tests)."""
+    global settings
+    settings = ReplaySettings(**{**settings.__dict__, **overrides})
+    with _index_lock:
+        _label_index.clear()
+        _indexed_kinds.clear()
+    return settings
+
+
+def _encode(value: Any) -> dict:
+    if isinstance(value, pd.DataFrame):
+        return {"type": "dataframe", "data": value.to_json(orient="table", date_format="iso")}
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    return {"type": "json", "data": value}
+
+
+def _decode(payload: dict) -> Any:
+    if payload["type"] == "dataframe":
+        return pd.read_json(StringIO(payload["data"]), orient="table")
+    return payload["data"]
+
+
+def _digest(key: Any) -> str:
+    canonical = json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:40]
+
+
+def _path(kind: str, digest: str) -> str:
+    return os.path.join(settings.directory, kind, f"{digest}.json")
+
+
+_label_index: Dict[str, List[str]] = {}
+_indexed_kinds = set()
+_index_lock = threading.Lock()
+
+
+def _recordings_with_label(kind: str, label: str) -> List[str]:
+    with _index_lock:
+        if kind not in _indexed_kinds:
+            _indexed_kinds.add(kind)
+            directory = os.path.join(settings.directory, kind)
+            for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    recorded_label = json.load(f).get("label", "")
+                _label_index.setdefault(f"{kind}|{recorded_label}", []).append(os.path.join(directory, name))
+        return _label_index.get(f"{kind}|{label}", [])
+
+
+def _load(kind: str, key: Any, label: str) -> dict:
+    digest = _digest(key)
+    path = _path(kind, digest)
+    if os.path.exists(path):
+        REPLAY_CALLS.inc(kind=kind, outcome="hit")
+    elif not settings.strict and _recordings_with_label(kind, label):
+        candidates = _recordings_with_label(kind, label)
+        path = candidates[int(digest, 16) % len(candidates)]
+        REPLAY_CALLS.inc(kind=kind, outcome="fallback")
+    else:
+        REPLAY_CALLS.inc(kind=kind, outcome="miss")
+        raise ReplayMissError(f"Không có bản ghi replay cho {kind} [{label}] (key {digest})")
+
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save(kind: str, key: Any, label: str, duration: float, value: Any, extra: Optional[dict]) -> None:
+    path = _path(kind, _digest(key))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    record = {
+        "kind": kind,
+        "label": label,
+        "key": json.loads(json.dumps(key, ensure_ascii=False, default=str)),
+        "duration": duration,
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "payload": _encode(value),
+        "extra": extra or {},
+    }
+    # Write then rename so concurrent readers never see a partial file
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+    REPLAY_CALLS.inc(kind=kind, outcome="recorded")
+
+
+def call(kind: str, key: Any, fn: Callable[[], Any], label: str = "",
+         extra: Optional[Callable[[], dict]] = None, on_replay: Optional[Callable[[dict], None]] = None) -> Any:
+    """Run ``fn`` through the record/replay layer.
+
+    Args:
+        kind: Recording family ("vnstock", "search", "llm").
+        key: JSON-serialisable identity of the call.
+        fn: The real call, only executed when not replaying.
+        label: Coarser identity used for non-strict fallback.
+        extra: Returns additional data to store alongside a recording.
+        on_replay: Receives that stored data when a recording is served.
+    """
+    if settings.mode == "replay":
+        record = _load(kind, key, label)
+        cancellation.sleep(settings.latency_for(kind, record.get("duration", 0.0)))
+        if on_replay is not None:
+            on_replay(record.get("extra", {}))
+        return _decode(record["payload"])
+
+    if settings.mode == "record":
+        start = time.perf_counter()
+        value = fn()
+        _save(kind, key, label, time.perf_counter() - start, value, extra() if extra else None)
+        return value
+
+    return fn()
+
+
+_llm_steps: contextvars.ContextVar[Optional[itertools.count]] = contextvars.ContextVar(
+    "vn_stock_advisor_replay_llm_steps", default=None
+)
+
+
+def start_llm_steps() -> None:
+    """Start numbering LLM calls for a new task execution in this context.
+
+    Called by AdvisorAgent before each task: crewAI may issue the individual
+    LLM calls from copies of the task context, which share this counter.
+    """
+    _llm_steps.set(itertools.count())
+
+
+def next_llm_step() -> int:
+    """Index of the next LLM call within the current task execution."""
+    counter = _llm_steps.get()
+    if counter is None:
+        start_llm_steps()
+        counter = _llm_steps.get()
+    return next(counter)
@@ -0,0 +1,259 @@
+"""
+After-close warm-up of the watchlist.
+
+Once HOSE has closed (``SCHEDULER_RUN_AT`` on weekdays), the session's macro
+digest is built once, then every ``WATCHLIST`` symbol goes through:
+
+1. ``prices``: incremental refresh of the market store
+2. ``fundamentals``: ratios, income statement and company info, refetched
+   only when older than ``FUNDAMENTALS_MAX_AGE_DAYS``
+3. ``indicators``: daily, weekly and monthly indicator snapshots of the
+   refreshed bars
+4. ``analysis``: full crew run, stored in the analysis cache for the closed
+   session and the next one; symbols tripping the no-trade rule (``liquidity``)
+   get its GIỮ answer without a crew
+
+Symbols run ``SCHEDULER_CONCURRENCY`` at a time, with LLM calls at background
+rate-limit priority so interactive requests go first. Progress is checkpointed
+per symbol and step in ``SCHEDULER_STATE_DIR/<day>.json``: a run interrupted by
+a crash or a failing upstream resumes where it stopped, and a failed step is
+retried on the next pass until it has failed ``SCHEDULER_MAX_ATTEMPTS`` times.
+
+Usage:
+    python -m vn_stock_advisor.scheduler [--day YYYY-MM-DD] [--symbols HPG,FPT]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+from vn_stock_advisor import (
+    analysis_cache, liquidity, macro_digest, market_store, metrics, ratelimit, usage,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "false").lower() == "true"
+WATCHLIST = [s.strip().upper() for s in os.environ.get("WATCHLIST", "").split(",") if s.strip()]
+# Local time after which the closed session is warmed (HOSE closes at 15:00)
+SCHEDULER_RUN_AT = os.environ.get("SCHEDULER_RUN_AT", "15:30")
+SCHEDULER_CONCURRENCY = int(os.environ.get("SCHEDULER_CONCURRENCY", "4"))
+SCHEDULER_MAX_ATTEMPTS = int(os.environ.get("SCHEDULER_MAX_ATTEMPTS", "3"))
+SCHEDULER_STATE_DIR = os.environ.get("SCHEDULER_STATE_DIR", os.path.join("data", "scheduler"))
+# How often the background thread checks whether a run is due
+SCHEDULER_POLL_SECONDS = 60
+
+STEPS = ("prices", "fundamentals", "indicators", "analysis")
+
+SCHEDULER_STEPS = metrics.Counter(
+    "vn_stock_advisor_scheduler_steps_total",
+    "Watchlist warm-up steps by step and outcome (done, failed).",
+    labelnames=("step", "outcome"),
+)
+
+
+# --- Steps ---
+
+def _warm_prices(symbol: str, day: date) -> None:
+    if market_store.store.enabled:
+        market_store.store.refresh(symbol)
+
+
+def _warm_fundamentals(symbol: str, day: date) -> None:
+    market_store.store.financial_ratios(symbol, period="quarter")
+    market_store.store.income_statement(symbol, period="quarter")
+    market_store.store.company_info(symbol)
+
+
+def _warm_indicators(symbol: str, day: date) -> None:
+    from vn_stock_advisor.tools.custom_tool import TechDataTool
+
+    TechDataTool().structured_indicators(symbol)
+
+
+def _warm_analysis(symbol: str, day: date) -> None:
+    from vn_stock_advisor.crew import VnStockAdvisor
+
+    following = market_store.next_session(day)
+    expires = market_store.local_time(following, market_store.MARKET_CLOSE_TIME).timestamp()
+    illiquid = liquidity.check(symbol, day)
+    if illiquid is not None:
+        result = liquidity.no_trade_result(illiquid, day.isoformat())
+        analysis_cache.cache.put(symbol, [day.isoformat(), following.isoformat()], result, expires)
+        return
+    inputs = {
+        "symbol": symbol,
+        "current_date": day.isoformat(),
+    }
+    # The crew captures the request context (ledger, priority) when it is built
+    with usage.track_request(symbol, "scheduler"), ratelimit.priority(ratelimit.BACKGROUND):
+        result = VnStockAdvisor().crew().kickoff(inputs=inputs)
+    analysis_cache.cache.put(symbol, [day.isoformat(), following.isoformat()], result, expires)
+
+
+STEP_FUNCTIONS: Dict[str, Callable[[str, date], None]] = {
+    "prices": _warm_prices,
+    "fundamentals": _warm_fundamentals,
+    "indicators": _warm_indicators,
+    "analysis": _warm_analysis,
+}
+
+
+# --- Checkpointed run ---
+
+class WarmupRun:
+    """Warm-up of ``symbols`` for session ``day``, checkpointed to ``state_dir``."""
+
+    def __init__(self, day: date, symbols: Sequence[str], state_dir: str = SCHEDULER_STATE_DIR,
+                 concurrency: int = SCHEDULER_CONCURRENCY, max_attempts: int = SCHEDULER_MAX_ATTEMPTS):
+        self.day = day
+        self.symbols = [s.upper() for s in symbols]
+        self.path = os.path.join(state_dir, f"{day.isoformat()}.json")
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    def _load(self) -> dict:
+        state = {"day": self.day.isoformat(), "macro_digest": None, "symbols": {}, "finished_at": None}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                state.update(json.load(f))
+        for symbol in self.symbols:
+            state["symbols"].setdefault(symbol, {"done": [], "attempts": {}, "error": None})
+        return state
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _pending(self, symbol: str) -> List[str]:
+        progress = self.state["symbols"][symbol]
+        return [step for step in STEPS if step not in progress["done"]]
+
+    def exhausted(self, symbol: str) -> bool:
+        """Whether ``symbol`` has nothing left to try in this session."""
+        pending = self._pending(symbol)
+        return not pending or self.state["symbols"][symbol]["attempts"].get(pending[0], 0) >= self.max_attempts
+
+    @property
+    def complete(self) -> bool:
+        return all(self.exhausted(symbol) for symbol in self.symbols)
+
+    def _warm_symbol(self, symbol: str) -> None:
+        progress = self.state["symbols"][symbol]
+        for step in self._pending(symbol):
+            if progress["attempts"].get(step, 0) >= self.max_attempts:
+                return
+            try:
+                with metrics.span("scheduler", step):
+                    STEP_FUNCTIONS[step](symbol, self.day)
+            except Exception as e:
+                logger.warning("Làm nóng %s bước %s thất bại: %s", symbol, step, e)
+                SCHEDULER_STEPS.inc(step=step, outcome="failed")
+                with self._lock:
+                    progress["attempts"][step] = progress["attempts"].get(step, 0) + 1
+                    progress["error"] = f"{step}: {e}"
+                    self._save()
+                # Later steps depend on this one
+                return
+            SCHEDULER_STEPS.inc(step=step, outcome="done")
+            with self._lock:
+                progress["done"].append(step)
+                progress["error"] = None
+                self._save()
+
+    def run(self) -> dict:
+        """Run every pending step once and return the checkpoint state."""
+        if self.state["macro_digest"] is None and macro_digest.MACRO_DIGEST_ENABLED:
+            try:
+                with ratelimit.priority(ratelimit.BACKGROUND):
+                    macro_digest.get(self.day)
+                self.state["macro_digest"] = "done"
+            except Exception as e:
+                # The crews fall back to their own macro search
+                logger.warning("Không tạo được bản tin vĩ mô %s: %s", self.day, e)
+        self._save()
+
+        todo = [symbol for symbol in self.symbols if not self.exhausted(symbol)]
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup") as pool:
+            list(pool.map(self._warm_symbol, todo))
+
+        if self.complete:
+            self.state["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        self._save()
+        return self.state
+
+
+def run(day: Optional[date] = None, symbols: Optional[Sequence[str]] = None) -> dict:
+    """Warm ``symbols`` (the watchlist by default) for the latest session, resuming a previous run."""
+    return WarmupRun(day or market_store.latest_session(), symbols or WATCHLIST).run()
+
+
+def due(now: Optional[datetime] = None) -> Optional[date]:
+    """Session to warm at ``now``, if its run time has passed and its run is not complete."""
+    now = now or datetime.now()
+    session = market_store.latest_session(now)
+    if not WATCHLIST or now < market_store.local_time(session, SCHEDULER_RUN_AT):
+        return None
+    return None if WarmupRun(session, WATCHLIST).complete else session
+
+
+class Scheduler:
+    """Background thread warming the watchlist after each close."""
+
+    def __init__(self, poll_seconds: float = SCHEDULER_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="warmup-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                session = due()
+                if session is not None:
+                    run(session)
+            except Exception as e:
+                logger.exception("Lịch làm nóng watchlist lỗi: %s", e)
+            self._stop.wait(self.poll_seconds)
+
+
+scheduler = Scheduler()
+
+
+def status(day: Optional[date] = None) -> dict:
+    """Checkpoint state of the run of ``day`` (latest session by default)."""
+    warmup = WarmupRun(day or market_store.latest_session(), WATCHLIST)
+    return {**warmup.state, "enabled": SCHEDULER_ENABLED, "watchlist": WATCHLIST, "complete": warmup.complete}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Warm the caches of the watchlist for a closed session.")
+    parser.add_argument("--day", help="Session (YYYY-MM-DD), latest by default")
+    parser.add_argument("--symbols", help="Comma separated symbols, WATCHLIST by default")
+    args = parser.parse_args(argv)
+    symbols = [s.strip() for s in args.symbols.split(",")] if args.symbols else WATCHLIST
+    if not symbols:
+        parser.error("Chưa cấu hình WATCHLIST hoặc --symbols")
+    state = run(date.fromisoformat(args.day) if args.day else None, symbols)
+    print(json.dumps(state, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
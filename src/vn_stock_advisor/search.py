@@ -0,0 +1,203 @@
+"""
+Cached, deduplicated web search for the news agent.
+
+Most news queries are the same macro questions (interest rates, FX, VNIndex)
+asked again for every symbol. Results are cached under the normalized query,
+the search parameters (locale, country, result count) and a date bucket, so a
+query is answered from the cache until its TTL expires or the bucket rolls
+over. The cache lives in memory and in SQLite (``SEARCH_CACHE_PATH``) so it
+survives restarts, and identical queries issued concurrently share one
+backend call (a waiting caller takes over if the leading run is cancelled).
+
+``SEARCH_BACKEND=offline`` replaces Serper with ``OfflineSearchBackend``,
+which serves canned results (from ``SEARCH_OFFLINE_PATH`` if set) for tests
+and offline runs.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from vn_stock_advisor import cancellation, metrics
+
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "serper").lower()
+SEARCH_OFFLINE_PATH = os.environ.get("SEARCH_OFFLINE_PATH", "")
+SEARCH_CACHE_PATH = os.environ.get("SEARCH_CACHE_PATH", os.path.join("data", "search_cache.sqlite3"))
+# 0 disables caching
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", str(6 * 3600)))
+# Results are never shared across date buckets, whatever the TTL
+SEARCH_CACHE_BUCKET_HOURS = float(os.environ.get("SEARCH_CACHE_BUCKET_HOURS", "24"))
+
+SEARCH_REQUESTS = metrics.Counter(
+    "vn_stock_advisor_search_requests_total",
+    "Search requests by how they were served (hit, miss, coalesced).",
+    labelnames=("outcome",),
+)
+
+
+def normalize_query(query: str) -> str:
+    """Case, Unicode-form, punctuation and whitespace insensitive form of ``query``.
+
+    Word order and repeated words are kept: the backend ranks by phrase, so
+    "HPG mua lại DXG" and "DXG mua lại HPG" are different searches.
+    """
+    text = unicodedata.normalize("NFC", str(query or "")).lower()
+    text = re.sub(r"[^\w\s%/.-]", " ", text)
+    return " ".join(text.split())
+
+
+def date_bucket(now: Optional[float] = None, hours: float = SEARCH_CACHE_BUCKET_HOURS) -> str:
+    """Label of the date bucket containing ``now`` (local time)."""
+    moment = datetime.fromtimestamp(now if now is not None else time.time())
+    if hours >= 24:
+        return moment.strftime("%Y-%m-%d")
+    slot = int((moment.hour * 60 + moment.minute) // (hours * 60))
+    return f"{moment:%Y-%m-%d}#{slot}"
+
+
+class SearchCache:
+    """TTL cache of search results with disk persistence and request coalescing."""
+
+    def __init__(self, path: str = SEARCH_CACHE_PATH, ttl: float = SEARCH_CACHE_TTL_SECONDS,
+                 bucket_hours: float = SEARCH_CACHE_BUCKET_HOURS):
+        self.path = path
+        self.ttl = ttl
+        self.bucket_hours = bucket_hours
+        self._memory: Dict[str, Tuple[float, Any]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def key(self, query: str, **params) -> str:
+        identity = {
+            "query": normalize_query(query),
+            "bucket": date_bucket(hours=self.bucket_hours),
+            **{name: value for name, value in params.items() if value is not None},
+        }
+        canonical = json.dumps(identity, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                if not self._initialized:
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS search_cache "
+                        "(key TEXT PRIMARY KEY, query TEXT, expires REAL, result TEXT)"
+                    )
+                    self._initialized = True
+                yield connection
+        finally:
+            connection.close()
+
+    def _lookup(self, key: str, now: float):
+        entry = self._memory.get(key)
+        if entry is None and self.path:
+            with self._connect() as connection:
+                row = connection.execute("SELECT expires, result FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                entry = (row[0], json.loads(row[1]))
+                self._memory[key] = entry
+        if entry is None or entry[0] <= now:
+            self._memory.pop(key, None)
+            return None
+        return entry
+
+    def _store(self, key: str, query: str, value: Any, now: float) -> None:
+        expires = now + self.ttl
+        self._memory[key] = (expires, value)
+        if self.path:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM search_cache WHERE expires <= ?", (now,))
+                connection.execute(
+                    "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?)",
+                    (key, query, expires, json.dumps(value, ensure_ascii=False, default=str)),
+                )
+
+    def get_or_fetch(self, query: str, fetch: Callable[[], Any], **params) -> Any:
+        """Return the cached result of ``query`` or run ``fetch`` once for all concurrent callers."""
+        if self.ttl <= 0:
+            SEARCH_REQUESTS.inc(outcome="miss")
+            return fetch()
+
+        key = self.key(query, **params)
+        while True:
+            with self._lock:
+                entry = self._lookup(key, time.time())
+                if entry is not None:
+                    SEARCH_REQUESTS.inc(outcome="hit")
+                    return entry[1]
+                future = self._inflight.get(key)
+                if future is None:
+                    future = self._inflight[key] = Future()
+                    break
+            SEARCH_REQUESTS.inc(outcome="coalesced")
+            try:
+                return cancellation.wait(future)
+            except cancellation.RunCancelledError:
+                # The leading run was cancelled, not necessarily this one: search in its place unless it was
+                cancellation.check()
+
+        SEARCH_REQUESTS.inc(outcome="miss")
+        try:
+            value = fetch()
+            # Empty answers are not cached so the next request retries the backend
+            if value:
+                with self._lock:
+                    self._store(key, query, value, time.time())
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+class OfflineSearchBackend:
+    """Stand-in for Serper serving canned results.
+
+    ``path`` is a JSON object mapping queries (compared normalized) to Serper
+    style results; ``"*"`` is the default. Without a file every query gets a
+    single placeholder article.
+    """
+
+    def __init__(self, path: str = SEARCH_OFFLINE_PATH):
+        self.results: Dict[str, Any] = {}
+        if path:
+            with open(path, encoding="utf-8") as f:
+                self.results = {
+                    (query if query == "*" else normalize_query(query)): result
+                    for query, result in json.load(f).items()
+                }
+
+    def __call__(self, query: str, **params) -> Any:
+        result = self.results.get(normalize_query(query), self.results.get("*"))
+        if result is not None:
+            return result
+        return {
+            "searchParameters": {"q": query, **params},
+            "organic": [{
+                "title": f"Tin tức: {query}",
+                "link": "https://example.com/offline",
+                "snippet": "Kết quả tìm kiếm ngoại tuyến dùng cho kiểm thử.",
+                "position": 1,
+            }],
+        }
+
+
+cache = SearchCache()
+offline_backend = OfflineSearchBackend() if SEARCH_BACKEND == "offline" else None
@@ -0,0 +1,151 @@
+"""
+Full per-bar indicator series of one symbol, for charts.
+
+``TechDataTool`` only reports the last row of the indicators it computes.
+``GET /indicators/{symbol}/series`` serves every bar of a date range instead,
+so a chart loads prices and indicators in one request without recomputing
+them:
+
+- ``format=arrow`` streams Arrow IPC record batches built on the numpy arrays
+  of ``price_arrays`` without copying them (``datetime64[s]`` times, float32
+  prices and price indicators, float64 volume averages and ratios, int64
+  volume and OBV, NaN during warm-up);
+- ``format=ndjson`` streams one JSON object per bar (``null`` for NaN).
+
+``columns`` selects the fields (``time`` is always first) and
+``offset``/``limit`` page through the bars; the response headers carry the
+total and the next offset. Indicators are computed over the bars since
+``SERIES_WARMUP_DAYS`` before ``start`` (all of the universe matrix row when it
+holds the symbol, those bars and the range up to its last closed session),
+so the first bars of a page have the same values as in a longer history.
+"""
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from vn_stock_advisor import market_regime, market_store, price_arrays, universe
+
+# Calendar days of bars before ``start`` feeding the long averages (SMA_200)
+SERIES_WARMUP_DAYS = int(os.environ.get("SERIES_WARMUP_DAYS", "300"))
+SERIES_DEFAULT_DAYS = int(os.environ.get("SERIES_DEFAULT_DAYS", "365"))
+SERIES_MAX_LIMIT = int(os.environ.get("SERIES_MAX_LIMIT", "5000"))
+# Bars per Arrow record batch / NDJSON chunk
+SERIES_CHUNK_ROWS = int(os.environ.get("SERIES_CHUNK_ROWS", "1000"))
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+COLUMNS = ("time", *price_arrays.PRICE_FIELDS, "volume", *price_arrays.INDICATOR_COLUMNS)
+
+
+def parse_columns(columns: Optional[str]) -> List[str]:
+    """Requested columns in the canonical order, ``time`` first (all of them when empty)."""
+    if not columns:
+        return list(COLUMNS)
+    requested = {column.strip() for column in columns.split(",") if column.strip()}
+    unknown = sorted(requested - set(COLUMNS))
+    if unknown:
+        raise ValueError(f"Cột không hỗ trợ: {', '.join(unknown)} (hỗ trợ: {', '.join(COLUMNS)})")
+    return [column for column in COLUMNS if column == "time" or column in requested]
+
+
+@dataclass
+class Series:
+    """Aligned read-only arrays of the selected columns for one page of bars."""
+    symbol: str
+    columns: List[str]
+    arrays: List[np.ndarray]
+    total: int
+    offset: int
+
+    @property
+    def next_offset(self) -> Optional[int]:
+        end = self.offset + (len(self.arrays[0]) if self.arrays else 0)
+        return end if end < self.total else None
+
+    def chunks(self, rows: int = SERIES_CHUNK_ROWS) -> Iterator[List[np.ndarray]]:
+        """The arrays in slices of ``rows`` bars (views, no copy)."""
+        length = len(self.arrays[0]) if self.arrays else 0
+        for start in range(0, length, max(rows, 1)):
+            yield [array[start:start + max(rows, 1)] for array in self.arrays]
+
+
+def _bars(symbol: str, start: date, end: date) -> price_arrays.PriceBars:
+    mapped = universe.reader.current()
+    warmup = start - timedelta(days=SERIES_WARMUP_DAYS)
+    # The universe serves the range only if it holds the warm-up bars and reaches the range's last closed session
+    if (mapped is not None and symbol in mapped and len(mapped.time)
+            and mapped.time[0] <= np.datetime64(warmup, "s")
+            and mapped.time[-1] >= np.datetime64(market_regime.session_for(end), "s")):
+        return mapped.bars(symbol)
+    frame = market_store.store.price_history(symbol, start=warmup.isoformat(), end=end.isoformat())
+    return price_arrays.PriceBars.from_frame(frame)
+
+
+def load(symbol: str, start: Optional[date] = None, end: Optional[date] = None, columns: Sequence[str] = COLUMNS,
+         offset: int = 0, limit: int = SERIES_MAX_LIMIT) -> Series:
+    """The selected columns of ``symbol``'s bars between ``start`` and ``end``, from bar ``offset``."""
+    symbol = symbol.upper()
+    end = end or date.today()
+    start = start or end - timedelta(days=SERIES_DEFAULT_DAYS)
+    if start > end:
+        raise ValueError("Ngày bắt đầu phải trước ngày kết thúc")
+    bars = _bars(symbol, start, end)
+    indicators = price_arrays.calculate_indicators(bars)
+    first, last = np.searchsorted(
+        bars.time, [np.datetime64(start, "s"), np.datetime64(end + timedelta(days=1), "s")], side="left",
+    )
+    total = int(last - first)
+    page = slice(first + min(offset, total), first + min(offset + limit, total))
+    return Series(symbol, list(columns), [indicators[column][page] for column in columns], total, offset)
+
+
+def ndjson_chunks(series: Series, rows: int = SERIES_CHUNK_ROWS) -> Iterator[bytes]:
+    """One JSON object per bar, ``rows`` bars per chunk."""
+    for chunk in series.chunks(rows):
+        values = [
+            np.datetime_as_string(array, unit="D").tolist() if column == "time" else price_arrays.json_values(array)
+            for column, array in zip(series.columns, chunk)
+        ]
+        yield "".join(
+            json.dumps(dict(zip(series.columns, row)), ensure_ascii=False) + "\n" for row in zip(*values)
+        ).encode("utf-8")
+
+
+def arrow_chunks(series: Series, rows: int = SERIES_CHUNK_ROWS) -> Iterator[bytes]:
+    """An Arrow IPC stream: the schema, then one record batch per ``rows`` bars."""
+    import pyarrow as pa
+
+    class Sink:
+        """File-like object collecting what the IPC writer emits between two yields."""
+
+        def __init__(self):
+            self.parts: List[bytes] = []
+            self.closed = False
+
+        def write(self, data) -> int:
+            self.parts.append(bytes(data))
+            return len(data)
+
+        def flush(self) -> None:
+            pass
+
+        def drain(self) -> bytes:
+            data, self.parts = b"".join(self.parts), []
+            return data
+
+    schema = pa.schema(
+        [pa.field(column, pa.from_numpy_dtype(array.dtype)) for column, array in zip(series.columns, series.arrays)],
+        metadata={"symbol": series.symbol, "total": str(series.total), "offset": str(series.offset)},
+    )
+    sink = Sink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for chunk in series.chunks(rows):
+            # pa.array wraps the numpy buffers of primitive arrays as they are
+            writer.write_batch(pa.record_batch([pa.array(array) for array in chunk], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
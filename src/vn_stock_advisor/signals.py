@@ -0,0 +1,289 @@
+"""
+Technical signal transitions pushed to WebSocket subscribers.
+
+Each line of ``TechDataTool._get_technical_analysis`` is a signal with a
+discrete state (``RSI: QUÁ MUA``, ``MACD: TÍCH CỰC``, ``Bollinger Bands:
+QUÁ BÁN``...). Clients of ``/ws/signals`` subscribe to (symbol, interval)
+pairs and receive a snapshot of the current states, then one message per state
+change, never the unchanged states.
+
+The work is per symbol, not per subscriber:
+
+- ``IncrementalIndicators`` keeps running sums and EMAs, so a closed bar
+  costs O(1) instead of recomputing the indicator frame;
+- ``SignalEvaluator`` runs the ``_get_technical_analysis`` conditions on the
+  updated values and diffs the states against the previous bar;
+- ``SignalHub`` listens to the intraday store, evaluates only the pairs that
+  have subscribers, and fans the transitions out to bounded per-connection
+  queues. A slow client loses its oldest messages instead of holding up the
+  feed.
+"""
+import asyncio
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from vn_stock_advisor import intraday, metrics
+
+# Messages buffered per connection before the oldest are dropped
+SIGNALS_QUEUE_SIZE = 1000
+
+SIGNAL_MESSAGES = metrics.Counter(
+    "vn_stock_advisor_signal_messages_total",
+    "Signal messages queued to WebSocket subscribers by kind (snapshot, transition, dropped).",
+    labelnames=("kind",),
+)
+SIGNAL_SUBSCRIPTIONS = metrics.Gauge(
+    "vn_stock_advisor_signal_subscriptions",
+    "Active (connection, symbol, interval) signal subscriptions.",
+)
+
+
+class _RollingWindow:
+    """Mean and sample standard deviation of the last ``window`` values."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.squares = 0.0
+        self.pushed = 0
+
+    def push(self, value: float) -> None:
+        if len(self.values) == self.window:
+            oldest = self.values[0]
+            self.total -= oldest
+            self.squares -= oldest * oldest
+        self.values.append(value)
+        self.total += value
+        self.squares += value * value
+        self.pushed += 1
+        if self.pushed % self.window == 0:
+            # Resum once per window so rounding errors do not accumulate (a flat RSI loss must be exactly 0)
+            self.total = math.fsum(self.values)
+            self.squares = math.fsum(v * v for v in self.values)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.window if len(self.values) == self.window else math.nan
+
+    @property
+    def std(self) -> float:
+        if len(self.values) < self.window:
+            return math.nan
+        variance = (self.squares - self.total * self.total / self.window) / (self.window - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+class _Ema:
+    """``ewm(span=..., adjust=False).mean()`` one value at a time."""
+
+    def __init__(self, span: int):
+        self.alpha = 2 / (span + 1)
+        self.value = math.nan
+
+    def push(self, value: float) -> float:
+        self.value = value if math.isnan(self.value) else self.alpha * value + (1 - self.alpha) * self.value
+        return self.value
+
+
+class IncrementalIndicators:
+    """The latest row of ``TechDataTool._calculate_indicators``, updated bar by bar."""
+
+    def __init__(self):
+        self.close = {window: _RollingWindow(window) for window in (20, 50, 200)}
+        self.volume = {window: _RollingWindow(window) for window in (10, 20, 50)}
+        self.gain = _RollingWindow(14)
+        self.loss = _RollingWindow(14)
+        self.ema_12, self.ema_26, self.signal = _Ema(12), _Ema(26), _Ema(9)
+        self.previous_close: Optional[float] = None
+        self.obv = 0.0
+
+    def push(self, close: float, volume: float) -> Dict[str, float]:
+        for window in self.close.values():
+            window.push(close)
+        for window in self.volume.values():
+            window.push(volume)
+        delta = 0.0 if self.previous_close is None else close - self.previous_close
+        self.gain.push(max(delta, 0.0))
+        self.loss.push(max(-delta, 0.0))
+        if self.previous_close is None:
+            self.obv = volume
+        elif close > self.previous_close:
+            self.obv += volume
+        elif close < self.previous_close:
+            self.obv -= volume
+        self.previous_close = close
+
+        macd = self.ema_12.push(close) - self.ema_26.push(close)
+        gain, loss = self.gain.mean, self.loss.mean
+        rsi = 100 - 100 / (1 + gain / loss) if loss and not math.isnan(loss + gain) else 50.0
+        middle, std = self.close[20].mean, self.close[20].std
+        volume_10, volume_20 = self.volume[10].mean, self.volume[20].mean
+        return {
+            "close": close,
+            "volume": volume,
+            "SMA_20": middle,
+            "SMA_50": self.close[50].mean,
+            "SMA_200": self.close[200].mean,
+            "EMA_12": self.ema_12.value,
+            "EMA_26": self.ema_26.value,
+            "MACD": macd,
+            "MACD_Signal": self.signal.push(macd),
+            "RSI_14": rsi,
+            "BB_Middle": middle,
+            "BB_Upper": middle + 2 * std,
+            "BB_Lower": middle - 2 * std,
+            "Volume_SMA_10": volume_10,
+            "Volume_SMA_20": volume_20,
+            "Volume_SMA_50": self.volume[50].mean,
+            "Volume_Ratio_10": volume / volume_10 if volume_10 else math.nan,
+            "Volume_Ratio_20": volume / volume_20 if volume_20 else math.nan,
+            "OBV": self.obv,
+        }
+
+
+def parse_states(analysis: str) -> Dict[str, Tuple[str, str]]:
+    """``{signal: (state, line)}`` of a ``_get_technical_analysis`` text."""
+    states = {}
+    for line in analysis.splitlines():
+        name, _, rest = line.lstrip("- ").partition(": ")
+        if rest:
+            states[name] = (rest.split(" (")[0].strip(), line.lstrip("- "))
+    return states
+
+
+class SignalEvaluator:
+    """Signal states of one symbol and interval, advanced by closed bars."""
+
+    def __init__(self):
+        from vn_stock_advisor.tools.custom_tool import TechDataTool
+
+        self._tool = TechDataTool()
+        self.indicators = IncrementalIndicators()
+        self.time: Optional[int] = None
+        self.states: Dict[str, Tuple[str, str]] = {}
+
+    def push(self, start: int, values) -> List[dict]:
+        """Evaluate the bar starting at ``start``; returns the signals whose state changed."""
+        if self.time is not None and start <= self.time:
+            return []
+        latest = self.indicators.push(float(values[3]), float(values[4]))
+        states = parse_states(self._tool._get_technical_analysis(latest, latest["close"], None))
+        changes = []
+        # The first bar only sets the baseline; an absent line (no volume signal) is a None state
+        if self.time is not None:
+            for name in dict.fromkeys([*self.states, *states]):
+                previous, (current, detail) = self.states.get(name, (None, None))[0], states.get(name, (None, None))
+                if previous != current:
+                    changes.append({"signal": name, "from": previous, "to": current, "detail": detail})
+        self.time, self.states = start, states
+        return changes
+
+    def snapshot(self) -> Dict[str, str]:
+        return {name: state for name, (state, _) in self.states.items()}
+
+
+class Subscriber:
+    """Outgoing messages of one WebSocket connection, fed from any thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = SIGNALS_QUEUE_SIZE):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, message: dict) -> None:
+        """Queue ``message``; must run on the connection's event loop."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            SIGNAL_MESSAGES.inc(kind="dropped")
+        self.queue.put_nowait(message)
+
+    def send(self, message: dict) -> None:
+        """Queue ``message`` from another thread."""
+        self.loop.call_soon_threadsafe(self.put, message)
+
+
+class SignalHub:
+    """Subscriptions by (symbol, interval), evaluated from the closed bars of ``store``."""
+
+    def __init__(self, store: intraday.IntradayStore):
+        self.store = store
+        self._subscribers: Dict[Tuple[str, str], Set[Subscriber]] = {}
+        self._evaluators: Dict[Tuple[str, str], SignalEvaluator] = {}
+        self._lock = threading.Lock()
+        store.add_listener(self.on_bar)
+
+    def _time(self, start: Optional[int]) -> Optional[str]:
+        return None if start is None else str(pd.Timestamp(start, unit="s"))
+
+    def subscribe(self, subscriber: Subscriber, symbol: str, interval: str) -> dict:
+        """Add a subscription and return its snapshot message."""
+        if interval not in self.store.intervals:
+            raise ValueError(f"Khung thời gian không hỗ trợ: {interval} (hỗ trợ: {', '.join(self.store.intervals)})")
+        key = (symbol.upper(), interval)
+        with self._lock:
+            evaluator = self._evaluators.get(key)
+            if evaluator is None:
+                evaluator = self._evaluators[key] = SignalEvaluator()
+                # Seed from the closed bars already buffered; the last one is still forming
+                bars = self.store.frame(*key).iloc[:-1]
+                for start, values in zip((pd.to_datetime(bars["time"]) - pd.Timestamp(0)) // pd.Timedelta(seconds=1),
+                                         bars[["open", "high", "low", "close", "volume"]].to_numpy(np.float64)):
+                    evaluator.push(int(start), values)
+            subscribers = self._subscribers.setdefault(key, set())
+            if subscriber not in subscribers:
+                subscribers.add(subscriber)
+                SIGNAL_SUBSCRIPTIONS.inc()
+            SIGNAL_MESSAGES.inc(kind="snapshot")
+            return {"type": "snapshot", "symbol": key[0], "interval": interval,
+                    "time": self._time(evaluator.time), "states": evaluator.snapshot()}
+
+    def unsubscribe(self, subscriber: Subscriber, symbol: str, interval: str) -> None:
+        key = (symbol.upper(), interval)
+        with self._lock:
+            subscribers = self._subscribers.get(key, set())
+            if subscriber in subscribers:
+                subscribers.discard(subscriber)
+                SIGNAL_SUBSCRIPTIONS.dec()
+            if not subscribers:
+                # Nobody listens: stop evaluating, a later subscription reseeds from the buffer
+                self._subscribers.pop(key, None)
+                self._evaluators.pop(key, None)
+
+    def remove(self, subscriber: Subscriber) -> None:
+        """Drop every subscription of a closed connection."""
+        with self._lock:
+            keys = [key for key, subscribers in self._subscribers.items() if subscriber in subscribers]
+        for key in keys:
+            self.unsubscribe(subscriber, *key)
+
+    def subscriptions(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def on_bar(self, symbol: str, interval: str, start: int, values) -> None:
+        """Store listener: evaluate a closed bar and push its transitions."""
+        key = (symbol, interval)
+        if key not in self._evaluators:
+            return
+        with self._lock:
+            evaluator = self._evaluators.get(key)
+            if evaluator is None:
+                return
+            changes = evaluator.push(start, values)
+            subscribers = list(self._subscribers.get(key, ()))
+        for change in changes:
+            message = {"type": "transition", "symbol": symbol, "interval": interval,
+                       "time": self._time(start), **change}
+            for subscriber in subscribers:
+                subscriber.send(message)
+            SIGNAL_MESSAGES.inc(len(subscribers), kind="transition")
+
+
+hub = SignalHub(intraday.store)
@@ -0,0 +1,201 @@
+"""
+Task-level memoization of crew runs.
+
+The analysis cache stores whole crew results; re-analysing a symbol after a
+price tick used to rerun all four agents. Each task output is stored here
+under a fingerprint of what the task actually depends on:
+
+- ``news_collecting``: the analysis date (and the macro digest text);
+- ``fundamental_analysis``: the latest reported quarter (first ratio row and
+  the four income statement quarters the tool reports);
+- ``technical_analysis``: the last daily bar (``market_store.fingerprint``);
+- ``investment_decision``: the three context outputs it receives and the
+  market regime (``market_regime``).
+
+Every fingerprint also covers the symbol, the task's prompt template, the
+agent's role, goal, backstory and tool names, and its model, so editing a
+prompt, an agent or its tools, or switching model invalidates its
+entries. A rerun executes only the tasks whose fingerprint changed: after a
+tick, the technical analyst runs again, and the strategist only if the new
+technical output differs. Entries live in memory and in SQLite
+(``TASK_MEMO_PATH``, ``""`` keeps them in memory only) for at most
+``TASK_MEMO_MAX_AGE_HOURS``.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from vn_stock_advisor import market_store, metrics
+
+logger = logging.getLogger(__name__)
+
+TASK_MEMO_ENABLED = os.environ.get("TASK_MEMO_ENABLED", "true").lower() == "true"
+TASK_MEMO_PATH = os.environ.get("TASK_MEMO_PATH", os.path.join("data", "task_memo.sqlite3"))
+TASK_MEMO_MAX_AGE_HOURS = float(os.environ.get("TASK_MEMO_MAX_AGE_HOURS", "72"))
+
+TASK_MEMO_REQUESTS = metrics.Counter(
+    "vn_stock_advisor_task_memo_requests_total",
+    "Crew task executions by task and outcome (hit: stored output reused, miss: task run, "
+    "bypass: inputs could not be fingerprinted).",
+    labelnames=("task", "outcome"),
+)
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def _news_inputs(inputs: dict, context: Optional[str]) -> str:
+    return _digest(inputs.get("current_date"), inputs.get("macro_digest"))
+
+
+def _fundamental_inputs(inputs: dict, context: Optional[str]) -> str:
+    symbol = inputs["symbol"]
+    ratios = market_store.store.financial_ratios(symbol, period="quarter")
+    income = market_store.store.income_statement(symbol, period="quarter")
+    return _digest(ratios.head(1).to_json(), income.head(4).to_json(), market_store.store.company_info(symbol))
+
+
+def _technical_inputs(inputs: dict, context: Optional[str]) -> str:
+    end = datetime.now()
+    # The window TechDataTool._run reads (daily and higher timeframes), so the tool then reads it from the store
+    from vn_stock_advisor.tools.custom_tool import HIGHER_TIMEFRAME_DAYS
+
+    history = market_store.store.price_history(
+        inputs["symbol"], start=(end - timedelta(days=HIGHER_TIMEFRAME_DAYS)).strftime("%Y-%m-%d"),
+        end=end.strftime("%Y-%m-%d"),
+    )
+    return market_store.fingerprint(history)
+
+
+def _decision_inputs(inputs: dict, context: Optional[str]) -> str:
+    return _digest(context, inputs.get("market_regime"))
+
+
+# What each task depends on besides its prompt, by task name
+FINGERPRINTS: Dict[str, Callable[[dict, Optional[str]], str]] = {
+    "news_collecting": _news_inputs,
+    "fundamental_analysis": _fundamental_inputs,
+    "technical_analysis": _technical_inputs,
+    "investment_decision": _decision_inputs,
+}
+
+
+_hits: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar(
+    "vn_stock_advisor_task_memo_hits", default=None
+)
+
+
+@contextmanager
+def record_hits():
+    """Collect the names of the tasks served from the memo by the crews built in this context."""
+    hits: List[str] = []
+    reset = _hits.set(hits)
+    try:
+        yield hits
+    finally:
+        _hits.reset(reset)
+
+
+class TaskMemo:
+    """Task outputs by (task, fingerprint), persisted to SQLite."""
+
+    def __init__(self, path: str = TASK_MEMO_PATH, enabled: bool = TASK_MEMO_ENABLED,
+                 max_age_hours: float = TASK_MEMO_MAX_AGE_HOURS):
+        self.path = path
+        self.enabled = enabled
+        self.max_age = max_age_hours * 3600
+        self._memory: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                if not self._initialized:
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS task_outputs (task TEXT, fingerprint TEXT, symbol TEXT,"
+                        " created_at REAL, raw TEXT, PRIMARY KEY (task, fingerprint))"
+                    )
+                    self._initialized = True
+                yield connection
+        finally:
+            connection.close()
+
+    def fingerprint(self, task: str, inputs: dict, context: Optional[str], prompt: str = "",
+                    model: str = "") -> Optional[str]:
+        """Fingerprint of ``task``'s inputs, ``None`` for unknown tasks or inputs that could not be read."""
+        compute = FINGERPRINTS.get(task)
+        if compute is None or not inputs.get("symbol"):
+            return None
+        try:
+            return _digest(task, inputs["symbol"].upper(), prompt, model, compute(inputs, context))
+        except Exception as e:
+            logger.warning("Không tính được dấu vân tay tác vụ %s của %s: %s", task, inputs.get("symbol"), e)
+            return None
+
+    def get(self, task: str, fingerprint: str, now: Optional[float] = None) -> Optional[str]:
+        now = time.time() if now is None else now
+        key = (task, fingerprint)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self.path:
+                with self._connect() as connection:
+                    row = connection.execute(
+                        "SELECT created_at, raw FROM task_outputs WHERE task = ? AND fingerprint = ?", key
+                    ).fetchone()
+                if row:
+                    entry = self._memory[key] = (row[0], row[1])
+        if entry is None or entry[0] + self.max_age <= now:
+            return None
+        return entry[1]
+
+    def put(self, task: str, fingerprint: str, symbol: str, raw: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._memory[(task, fingerprint)] = (now, raw)
+            if self.path:
+                with self._connect() as connection:
+                    connection.execute("DELETE FROM task_outputs WHERE created_at <= ?", (now - self.max_age,))
+                    connection.execute(
+                        "INSERT OR REPLACE INTO task_outputs VALUES (?, ?, ?, ?, ?)",
+                        (task, fingerprint, symbol.upper(), now, raw),
+                    )
+
+    def run(self, task: str, inputs: dict, context: Optional[str], execute: Callable[[], object],
+            prompt: str = "", model: str = "", store: bool = True):
+        """The stored output of ``task`` for these inputs, or ``execute()``'s, stored for next time
+        (unless ``store`` is false)."""
+        fingerprint = self.fingerprint(task, inputs, context, prompt, model) if self.enabled else None
+        if fingerprint is None:
+            TASK_MEMO_REQUESTS.inc(task=task, outcome="bypass")
+            return execute()
+        raw = self.get(task, fingerprint)
+        if raw is not None:
+            TASK_MEMO_REQUESTS.inc(task=task, outcome="hit")
+            recorder = _hits.get()
+            if recorder is not None:
+                recorder.append(task)
+            return raw
+        TASK_MEMO_REQUESTS.inc(task=task, outcome="miss")
+        result = execute()
+        # Structured results (output_json tasks) come back as models; crewAI parses the JSON again
+        raw = result.model_dump_json() if hasattr(result, "model_dump_json") else str(result)
+        if store and raw.strip():
+            self.put(task, fingerprint, inputs["symbol"], raw)
+        return result
+
+
+memo = TaskMemo()
@@ -1,11 +1,38 @@
 from typing import Type, Optional, Any
 from crewai.tools import BaseTool
+from crewai_tools import SerperDevTool
 from pydantic import BaseModel, Field
-from vnstock import Vnstock
+from vn_stock_advisor import cancellation, market_store, metrics, price_arrays, replay, search
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 
+# Calendar days of daily bars behind the daily indicators
+DAILY_WINDOW_DAYS = 200
+# Longer daily history resampled for the weekly and monthly indicators
+HIGHER_TIMEFRAME_DAYS = 3 * 365
+# Higher timeframes built from the daily bars (pandas period aliases)
+TIMEFRAMES = {"1W": "W-FRI", "1M": "M"}
+
+
+def resample_bars(price_data, period):
+    """Aggregate daily OHLCV bars into ``period`` bars stamped with their last session."""
+    periods = price_data["time"].dt.to_period(period)
+    bars = price_data.groupby(periods, sort=True).agg(
+        time=("time", "last"), open=("open", "first"), high=("high", "max"),
+        low=("low", "min"), close=("close", "last"), volume=("volume", "sum"),
+    )
+    return bars.reset_index(drop=True)
+
+
+def _json_values(row):
+    """Indicator row as a JSON-safe dict (NaN becomes None)."""
+    return {
+        key: (None if pd.isna(value) else float(value))
+        for key, value in row.drop(labels=["time"], errors="ignore").items()
+    }
+
+
 class MyToolInput(BaseModel):
     """Input schema for MyCustomTool."""
     argument: str = Field(..., description="Mã cổ phiếu.")
@@ -15,240 +42,279 @@ class FundDataTool(BaseTool):
     description: str = "Công cụ tra cứu dữ liệu cổ phiếu phục vụ phân tích cơ bản, cung cấp các chỉ số tài chính như P/E, P/B, ROE, ROA, EPS, D/E, biên lợi nhuận và EV/EBITDA."
     args_schema: Type[BaseModel] = MyToolInput
 
+    @metrics.timed("tool", "fund_data")
     def _run(self, argument: str) -> str:
         try:
-            # Initialize the class 
-            stock = Vnstock().stock(symbol=argument, source="TCBS")
-            financial_ratios = stock.finance.ratio(period="quarter")
-            income_df = stock.finance.income_statement(period="quarter")
-            company = Vnstock().stock(symbol=argument, source='TCBS').company
+            # Get quarterly financial ratios and income statement
+            financial_ratios = market_store.store.financial_ratios(argument, period="quarter")
+            income_df = market_store.store.income_statement(argument, period="quarter")
 
             # Get company full name & industry
-            full_name = company.profile().get("company_name").iloc[0]
-            industry = company.overview().get("industry").iloc[0]
+            full_name, industry = market_store.store.company_info(argument)
+
+            with metrics.span("compute", "fund.format_report"):
+                return self._format_report(argument, full_name, industry, financial_ratios, income_df)
+        except cancellation.RunCancelledError:
+            raise
+        except Exception as e:
+            return f"Lỗi khi lấy dữ liệu: {e}"
 
-            # Get data from the latest row of DataFrame for financial ratios
-            latest_ratios = financial_ratios.iloc[0]
+    def _format_report(self, argument, full_name, industry, financial_ratios, income_df):
+        """Format the fundamental report from ratio and income statement frames."""
+        # Get data from the latest row of DataFrame for financial ratios
+        latest_ratios = financial_ratios.iloc[0]
 
-            # Get last 4 quarters of income statement
-            last_4_quarters = income_df.head(4)
+        # Get last 4 quarters of income statement
+        last_4_quarters = income_df.head(4)
+        
+        # Extract financial ratios data
+        pe_ratio = latest_ratios.get("price_to_earning", "N/A")
+        pb_ratio = latest_ratios.get("price_to_book", "N/A")
+        roe = latest_ratios.get("roe", "N/A")
+        roa = latest_ratios.get("roa", "N/A")
+        eps = latest_ratios.get("earning_per_share", "N/A")
+        de = latest_ratios.get("debt_on_equity", "N/A")
+        profit_margin = latest_ratios.get("gross_profit_margin", "N/A")
+        evebitda = latest_ratios.get("value_before_ebitda", "N/A")
+
+        # Format quarterly income data
+        quarterly_trends = []
+        for i, (_, quarter) in enumerate(last_4_quarters.iterrows()):          
+            # Handle formatting of values properly
+            revenue = quarter.get("revenue", "N/A")
+            revenue_formatted = f"{revenue:,.0f}" if isinstance(revenue, (int, float)) else revenue
             
-            # Extract financial ratios data
-            pe_ratio = latest_ratios.get("price_to_earning", "N/A")
-            pb_ratio = latest_ratios.get("price_to_book", "N/A")
-            roe = latest_ratios.get("roe", "N/A")
-            roa = latest_ratios.get("roa", "N/A")
-            eps = latest_ratios.get("earning_per_share", "N/A")
-            de = latest_ratios.get("debt_on_equity", "N/A")
-            profit_margin = latest_ratios.get("gross_profit_margin", "N/A")
-            evebitda = latest_ratios.get("value_before_ebitda", "N/A")
-
-            # Format quarterly income data
-            quarterly_trends = []
-            for i, (_, quarter) in enumerate(last_4_quarters.iterrows()):          
-                # Handle formatting of values properly
-                revenue = quarter.get("revenue", "N/A")
-                revenue_formatted = f"{revenue:,.0f}" if isinstance(revenue, (int, float)) else revenue
-                
-                gross_profit = quarter.get("gross_profit", "N/A")
-                gross_profit_formatted = f"{gross_profit:,.0f}" if isinstance(gross_profit, (int, float)) else gross_profit
-                
-                post_tax_profit = quarter.get("post_tax_profit", "N/A")
-                post_tax_profit_formatted = f"{post_tax_profit:,.0f}" if isinstance(post_tax_profit, (int, float)) else post_tax_profit
-                
-                quarter_info = f"""
-                Quý T - {i + 1}:
-                - Doanh thu thuần: {revenue_formatted} tỉ đồng
-                - Lợi nhuận gộp: {gross_profit_formatted} tỉ đồng
-                - Lợi nhuận sau thuế: {post_tax_profit_formatted} tỉ đồng
-                """
-                quarterly_trends.append(quarter_info)
+            gross_profit = quarter.get("gross_profit", "N/A")
+            gross_profit_formatted = f"{gross_profit:,.0f}" if isinstance(gross_profit, (int, float)) else gross_profit
             
-            return f"""Mã cổ phiếu: {argument}
-            Tên công ty: {full_name}
-            Ngành: {industry}
-            Ngày phân tích: {datetime.now().strftime('%Y-%m-%d')}
+            post_tax_profit = quarter.get("post_tax_profit", "N/A")
+            post_tax_profit_formatted = f"{post_tax_profit:,.0f}" if isinstance(post_tax_profit, (int, float)) else post_tax_profit
             
-            Tỷ lệ P/E: {pe_ratio}
-            Tỷ lệ P/B: {pb_ratio}
-            Tỷ lệ ROE: {roe}
-            Tỷ lệ ROA: {roa}
-            Biên lợi nhuận: {profit_margin}
-            Lợi nhuận trên mỗi cổ phiếu EPS (VND): {eps}
-            Hệ số nợ trên vốn chủ sở hữu D/E: {de}
-            Tỷ lệ EV/EBITDA: {evebitda}
-
-            XU HƯỚNG 4 QUÝ GẦN NHẤT:
-            {"".join(quarterly_trends)}
+            quarter_info = f"""
+            Quý T - {i + 1}:
+            - Doanh thu thuần: {revenue_formatted} tỉ đồng
+            - Lợi nhuận gộp: {gross_profit_formatted} tỉ đồng
+            - Lợi nhuận sau thuế: {post_tax_profit_formatted} tỉ đồng
             """
-        except Exception as e:
-            return f"Lỗi khi lấy dữ liệu: {e}"
+            quarterly_trends.append(quarter_info)
+        
+        return f"""Mã cổ phiếu: {argument}
+        Tên công ty: {full_name}
+        Ngành: {industry}
+        Ngày phân tích: {datetime.now().strftime('%Y-%m-%d')}
+        
+        Tỷ lệ P/E: {pe_ratio}
+        Tỷ lệ P/B: {pb_ratio}
+        Tỷ lệ ROE: {roe}
+        Tỷ lệ ROA: {roa}
+        Biên lợi nhuận: {profit_margin}
+        Lợi nhuận trên mỗi cổ phiếu EPS (VND): {eps}
+        Hệ số nợ trên vốn chủ sở hữu D/E: {de}
+        Tỷ lệ EV/EBITDA: {evebitda}
+
+        XU HƯỚNG 4 QUÝ GẦN NHẤT:
+        {"".join(quarterly_trends)}
+        """
         
 class TechDataTool(BaseTool):
     name: str = "Công cụ tra cứu dữ liệu cổ phiếu phục vụ phân tích kĩ thuật."
     description: str = "Công cụ tra cứu dữ liệu cổ phiếu phục vụ phân tích kĩ thuật, cung cấp các chỉ số như SMA, EMA, RSI, MACD, Bollinger Bands, và vùng hỗ trợ/kháng cự."
     args_schema: Type[BaseModel] = MyToolInput
 
+    @metrics.timed("tool", "tech_data")
     def _run(self, argument: str) -> str:
         try:
-            # Initialize vnstock and get historical price data
-            stock = Vnstock().stock(symbol=argument, source="TCBS")
-            company = Vnstock().stock(symbol=argument, source='TCBS').company
-
             # Get company full name & industry
-            full_name = company.profile().get("company_name").iloc[0]
-            industry = company.overview().get("industry").iloc[0]
+            full_name, industry = market_store.store.company_info(argument)
             
-            # Get price data for the last 200 days
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=200)
-            price_data = stock.quote.history(
-                start=start_date.strftime("%Y-%m-%d"),
-                end=end_date.strftime("%Y-%m-%d"),
-                interval="1D"  # Daily data
-            )
+            # One daily series serves the daily window and the higher timeframes
+            history = self.price_data(argument, days=HIGHER_TIMEFRAME_DAYS)
+            price_data = self.daily_window(history)
             
             if price_data.empty:
                 return f"Không tìm thấy dữ liệu lịch sử cho cổ phiếu {argument}"
             
-            # Calculate technical indicators
-            tech_data = self._calculate_indicators(price_data)
-            
-            # Identify support and resistance levels
-            support_resistance = self._find_support_resistance(price_data)
-            
-            # Get recent price and volume data
-            current_price = price_data['close'].iloc[-1]
-            recent_prices = price_data['close'].iloc[-5:-1]
-            current_volume = price_data['volume'].iloc[-1]
-            recent_volumes = price_data['volume'].iloc[-5:-1]
-            
-            # Format result
-            latest_indicators = tech_data.iloc[-1]
-            
-            result = f"""Mã cổ phiếu: {argument}
-            Tên công ty: {full_name}
-            Ngành: {industry}
-            Ngày phân tích: {datetime.now().strftime('%Y-%m-%d')}
-            Giá hiện tại: {(current_price*1000):,.0f} VND
-            Khối lượng giao dịch: {current_volume:,.0f} cp
-
-            GIÁ ĐÓNG CỬA GẦN NHẤT:
-            - T-1: {(recent_prices.iloc[-1]*1000):,.0f} VND (KL: {recent_volumes.iloc[-1]:,.0f} cp)
-            - T-2: {(recent_prices.iloc[-2]*1000):,.0f} VND (KL: {recent_volumes.iloc[-2]:,.0f} cp)
-            - T-3: {(recent_prices.iloc[-3]*1000):,.0f} VND (KL: {recent_volumes.iloc[-3]:,.0f} cp)
-            - T-4: {(recent_prices.iloc[-4]*1000):,.0f} VND (KL: {recent_volumes.iloc[-4]:,.0f} cp)
-            
-            CHỈ SỐ KỸ THUẬT:
-            - SMA (20): {(latest_indicators['SMA_20']*1000):,.0f}
-            - SMA (50): {(latest_indicators['SMA_50']*1000):,.0f}
-            - SMA (200): {(latest_indicators['SMA_200']*1000):,.0f}
-            - EMA (12): {(latest_indicators['EMA_12']*1000):,.0f}
-            - EMA (26): {(latest_indicators['EMA_26']*1000):,.0f}
-            
-            - RSI (14): {latest_indicators['RSI_14']:.2f}
-            - MACD: {latest_indicators['MACD']:.2f}
-            - MACD Signal: {latest_indicators['MACD_Signal']:.2f}
-            - MACD Histogram: {latest_indicators['MACD_Hist']:.2f}
-            
-            - Bollinger Upper: {(latest_indicators['BB_Upper']*1000):,.0f}
-            - Bollinger Middle: {(latest_indicators['BB_Middle']*1000):,.0f}
-            - Bollinger Lower: {(latest_indicators['BB_Lower']*1000):,.0f}
-
-            CHỈ SỐ KHỐI LƯỢNG:
-            - Khối lượng hiện tại: {current_volume:,.0f} cp
-            - Trung bình 10 phiên: {latest_indicators['Volume_SMA_10']:,.0f} cp
-            - Trung bình 20 phiên: {latest_indicators['Volume_SMA_20']:,.0f} cp
-            - Trung bình 50 phiên: {latest_indicators['Volume_SMA_50']:,.0f} cp
-            - Tỷ lệ Khối lượng / Trung bình 20: {latest_indicators['Volume_Ratio_20']:.2f}
-            - On-Balance Volume (OBV): {latest_indicators['OBV']:,.0f}
-            
-            VÙNG HỖ TRỢ VÀ KHÁNG CỰ:
-            {support_resistance}
-            
-            NHẬN ĐỊNH KỸ THUẬT:
-            {self._get_technical_analysis(latest_indicators, current_price, support_resistance)}
-            """
-            return result
+            return self._format_report(
+                argument, full_name, industry, price_data,
+                self.indicators(argument, price_data), self.timeframe_indicators(argument, history),
+            )
             
+        except cancellation.RunCancelledError:
+            raise
         except Exception as e:
             return f"Lỗi khi lấy dữ liệu kỹ thuật: {e}"
-    
-    def _calculate_indicators(self, df):
-        """Calculate various technical indicators."""
-        # Make a copy to avoid modifying original data
-        data = df.copy()
+
+    def price_data(self, argument, days=DAILY_WINDOW_DAYS):
+        """Daily price data for the last ``days`` days."""
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        return market_store.store.price_history(
+            argument,
+            start=start_date.strftime("%Y-%m-%d"),
+            end=end_date.strftime("%Y-%m-%d"),
+        )
+
+    def daily_window(self, history):
+        """The last ``DAILY_WINDOW_DAYS`` days of a longer daily history."""
+        start_date = pd.Timestamp((datetime.now() - timedelta(days=DAILY_WINDOW_DAYS)).date())
+        return history[history["time"] >= start_date].reset_index(drop=True)
+
+    def timeframe_indicators(self, argument, history):
+        """Latest indicators of every higher timeframe resampled from the daily ``history``, cached per new bar."""
+        return market_store.store.snapshot(
+            argument, "indicators.higher", market_store.fingerprint(history),
+            lambda: self._compute_timeframes(history),
+        )
+
+    def _compute_timeframes(self, history):
+        result = {}
+        for timeframe, period in TIMEFRAMES.items():
+            bars = resample_bars(history, period)
+            if bars.empty:
+                continue
+            with metrics.span("compute", f"tech.indicators.{timeframe}"):
+                latest = self._calculate_indicators(bars).latest()
+            result[timeframe] = {"time": str(latest["time"].date()), "bars": len(bars), **_json_values(latest)}
+        return result
+
+    def structured_indicators(self, argument):
+        """Latest daily, weekly and monthly indicators, computed locally from the stored daily bars."""
+        history = self.price_data(argument, days=HIGHER_TIMEFRAME_DAYS)
+        price_data = self.daily_window(history)
+        if price_data.empty:
+            return {}
+        latest, _ = self.indicators(argument, price_data)
+        daily = {"time": str(price_data["time"].iloc[-1].date()), "bars": len(price_data), **_json_values(latest)}
+        return {"1D": daily, **self.timeframe_indicators(argument, history)}
+
+    def indicators(self, argument, price_data):
+        """Latest indicator row and support/resistance levels, computed once per new bar."""
+        def compute():
+            latest, support_resistance = self._compute_indicators(price_data)
+            return {"latest": latest.drop(labels=["time"], errors="ignore").astype(float).to_dict(), "support_resistance": support_resistance}
+
+        snapshot = market_store.store.snapshot(argument, "indicators.1D", market_store.fingerprint(price_data), compute)
+        return pd.Series(snapshot["latest"]), snapshot["support_resistance"]
+
+    def _compute_indicators(self, price_data):
+        # One compact copy of the bars, shared read-only by both computations
+        bars = price_arrays.PriceBars.from_frame(price_data)
+
+        # Calculate technical indicators
+        with metrics.span("compute", "tech.indicators"):
+            tech_data = self._calculate_indicators(bars)
         
-        # Simple Moving Averages
-        data['SMA_20'] = data['close'].rolling(window=20).mean()
-        data['SMA_50'] = data['close'].rolling(window=50).mean()
-        data['SMA_200'] = data['close'].rolling(window=200).mean()
+        # Identify support and resistance levels
+        with metrics.span("compute", "tech.support_resistance"):
+            support_resistance = self._find_support_resistance(bars)
+        return tech_data.latest(), support_resistance
+
+    def _format_report(self, argument, full_name, industry, price_data, indicators=None, timeframes=None):
+        """Format the technical report from a daily OHLCV frame (and its precomputed indicators)."""
+        latest_indicators, support_resistance = indicators or self._compute_indicators(price_data)
+        if timeframes is None:
+            timeframes = self._compute_timeframes(price_data)
         
-        # Exponential Moving Averages
-        data['EMA_12'] = data['close'].ewm(span=12, adjust=False).mean()
-        data['EMA_26'] = data['close'].ewm(span=26, adjust=False).mean()
+        # Get recent price and volume data
+        current_price = price_data['close'].iloc[-1]
+        recent_prices = price_data['close'].iloc[-5:-1]
+        current_volume = price_data['volume'].iloc[-1]
+        recent_volumes = price_data['volume'].iloc[-5:-1]
         
-        # MACD
-        data['MACD'] = data['EMA_12'] - data['EMA_26']
-        data['MACD_Signal'] = data['MACD'].ewm(span=9, adjust=False).mean()
-        data['MACD_Hist'] = data['MACD'] - data['MACD_Signal']
+        result = f"""Mã cổ phiếu: {argument}
+        Tên công ty: {full_name}
+        Ngành: {industry}
+        Ngày phân tích: {datetime.now().strftime('%Y-%m-%d')}
+        Giá hiện tại: {(current_price*1000):,.0f} VND
+        Khối lượng giao dịch: {current_volume:,.0f} cp
+
+        GIÁ ĐÓNG CỬA GẦN NHẤT:
+        - T-1: {(recent_prices.iloc[-1]*1000):,.0f} VND (KL: {recent_volumes.iloc[-1]:,.0f} cp)
+        - T-2: {(recent_prices.iloc[-2]*1000):,.0f} VND (KL: {recent_volumes.iloc[-2]:,.0f} cp)
+        - T-3: {(recent_prices.iloc[-3]*1000):,.0f} VND (KL: {recent_volumes.iloc[-3]:,.0f} cp)
+        - T-4: {(recent_prices.iloc[-4]*1000):,.0f} VND (KL: {recent_volumes.iloc[-4]:,.0f} cp)
         
-        # RSI
-        delta = data['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        CHỈ SỐ KỸ THUẬT:
+        - SMA (20): {(latest_indicators['SMA_20']*1000):,.0f}
+        - SMA (50): {(latest_indicators['SMA_50']*1000):,.0f}
+        - SMA (200): {(latest_indicators['SMA_200']*1000):,.0f}
+        - EMA (12): {(latest_indicators['EMA_12']*1000):,.0f}
+        - EMA (26): {(latest_indicators['EMA_26']*1000):,.0f}
         
-        # Avoid division by zero
-        rs = gain / loss.replace(0, np.nan)
-        data['RSI_14'] = 100 - (100 / (1 + rs))
-        data['RSI_14'] = data['RSI_14'].fillna(50)  # Fill NaN values with neutral RSI
+        - RSI (14): {latest_indicators['RSI_14']:.2f}
+        - MACD: {latest_indicators['MACD']:.2f}
+        - MACD Signal: {latest_indicators['MACD_Signal']:.2f}
+        - MACD Histogram: {latest_indicators['MACD_Hist']:.2f}
         
-        # Bollinger Bands
-        data['BB_Middle'] = data['close'].rolling(window=20).mean()
-        std_dev = data['close'].rolling(window=20).std()
-        data['BB_Upper'] = data['BB_Middle'] + (std_dev * 2)
-        data['BB_Lower'] = data['BB_Middle'] - (std_dev * 2)
-
-        # Calculate volume moving averages
-        data['Volume_SMA_10'] = data['volume'].rolling(window=10).mean()
-        data['Volume_SMA_20'] = data['volume'].rolling(window=20).mean()
-        data['Volume_SMA_50'] = data['volume'].rolling(window=50).mean()
+        - Bollinger Upper: {(latest_indicators['BB_Upper']*1000):,.0f}
+        - Bollinger Middle: {(latest_indicators['BB_Middle']*1000):,.0f}
+        - Bollinger Lower: {(latest_indicators['BB_Lower']*1000):,.0f}
+
+        CHỈ SỐ KHỐI LƯỢNG:
+        - Khối lượng hiện tại: {current_volume:,.0f} cp
+        - Trung bình 10 phiên: {latest_indicators['Volume_SMA_10']:,.0f} cp
+        - Trung bình 20 phiên: {latest_indicators['Volume_SMA_20']:,.0f} cp
+        - Trung bình 50 phiên: {latest_indicators['Volume_SMA_50']:,.0f} cp
+        - Tỷ lệ Khối lượng / Trung bình 20: {latest_indicators['Volume_Ratio_20']:.2f}
+        - On-Balance Volume (OBV): {latest_indicators['OBV']:,.0f}
         
-        # Calculate volume ratio compared to average
-        data['Volume_Ratio_10'] = data['volume'] / data['Volume_SMA_10']
-        data['Volume_Ratio_20'] = data['volume'] / data['Volume_SMA_20']
+        KHUNG THỜI GIAN LỚN HƠN (tổng hợp từ dữ liệu ngày):
+        {self._format_timeframes(timeframes)}
+
+        VÙNG HỖ TRỢ VÀ KHÁNG CỰ:
+        {support_resistance}
         
-        # On-Balance Volume (OBV)
-        data['OBV'] = 0
-        data.loc[0, 'OBV'] = data.loc[0, 'volume']
-        for i in range(1, len(data)):
-            if data.loc[i, 'close'] > data.loc[i-1, 'close']:
-                data.loc[i, 'OBV'] = data.loc[i-1, 'OBV'] + data.loc[i, 'volume']
-            elif data.loc[i, 'close'] < data.loc[i-1, 'close']:
-                data.loc[i, 'OBV'] = data.loc[i-1, 'OBV'] - data.loc[i, 'volume']
+        NHẬN ĐỊNH KỸ THUẬT:
+        {self._get_technical_analysis(latest_indicators, current_price, support_resistance)}
+        """
+        return result
+    
+    def _format_timeframes(self, timeframes):
+        """Format the weekly/monthly indicator lines of the report."""
+        names = {"1W": "Khung tuần", "1M": "Khung tháng"}
+        price = lambda value: f"{value*1000:,.0f}" if value is not None else "chưa đủ dữ liệu"
+        lines = []
+        for timeframe, ind in timeframes.items():
+            rsi = f"{ind['RSI_14']:.2f}" if ind.get("RSI_14") is not None else "chưa đủ dữ liệu"
+            if ind.get("MACD") is None or ind.get("MACD_Signal") is None:
+                macd = "chưa đủ dữ liệu"
             else:
-                data.loc[i, 'OBV'] = data.loc[i-1, 'OBV']
-        
-        return data
+                macd = "TÍCH CỰC" if ind["MACD"] > ind["MACD_Signal"] else "TIÊU CỰC"
+            lines.append(
+                f"- {names.get(timeframe, timeframe)} ({ind['bars']} nến, đến {ind['time']}): "
+                f"Giá đóng cửa {price(ind.get('close'))}, SMA 20: {price(ind.get('SMA_20'))}, "
+                f"SMA 50: {price(ind.get('SMA_50'))}, RSI (14): {rsi}, MACD: {macd}, "
+                f"Xu hướng: {self._timeframe_trend(ind)}"
+            )
+        return "\n        ".join(lines) or "- Chưa đủ dữ liệu"
+
+    def _timeframe_trend(self, ind):
+        """Trend of a higher timeframe from its close and moving averages."""
+        close, sma_20, sma_50 = ind.get("close"), ind.get("SMA_20"), ind.get("SMA_50")
+        if close is None or sma_20 is None:
+            return "CHƯA ĐỦ DỮ LIỆU"
+        if sma_50 is None:
+            return "TĂNG" if close > sma_20 else "GIẢM"
+        if close > sma_20 > sma_50:
+            return "TĂNG"
+        if close < sma_20 < sma_50:
+            return "GIẢM"
+        return "TRUNG LẬP"
+
+    def _calculate_indicators(self, df):
+        """Calculate various technical indicators as compact read-only arrays (see ``price_arrays``)."""
+        return price_arrays.calculate_indicators(price_arrays.PriceBars.from_frame(df))
     
     def _find_support_resistance(self, df, window=10, threshold=0.03):
         """Find support and resistance levels."""
-        data = df.copy()
+        bars = price_arrays.PriceBars.from_frame(df)
         
-        # Find potential pivot points
-        data['local_max'] = data['high'].rolling(window=window, center=True).apply(
-            lambda x: x.iloc[len(x)//2] == max(x), raw=False
-        )
-        data['local_min'] = data['low'].rolling(window=window, center=True).apply(
-            lambda x: x.iloc[len(x)//2] == min(x), raw=False
-        )
-        
-        # Get pivot high/low points
-        resistance_levels = data[data['local_max'] == 1]['high'].values
-        support_levels = data[data['local_min'] == 1]['low'].values
+        # Find pivot high/low points
+        resistance_levels, support_levels = price_arrays.pivot_levels(bars, window)
+        resistance_levels, support_levels = resistance_levels.tolist(), support_levels.tolist()
         
         # Group close resistance/support levels
-        current_price = data['close'].iloc[-1]
+        current_price = float(bars.close[-1])
         
         # Function to cluster price levels
         def cluster_levels(levels, threshold_pct):
@@ -371,6 +437,29 @@ class TechDataTool(BaseTool):
 
         return "\n".join(analysis)
     
+class SearchTool(SerperDevTool):
+    """SerperDevTool whose searches are cached, coalesced, timed and recordable."""
+
+    def _run(self, **kwargs: Any) -> Any:
+        cancellation.check()
+        query = kwargs.get("search_query") or kwargs.get("query")
+        params = {
+            "search_type": kwargs.get("search_type"),
+            "country": self.country,
+            "locale": self.locale,
+            "n_results": self.n_results,
+        }
+
+        def fetch():
+            if search.offline_backend is not None:
+                backend = lambda: search.offline_backend(query, **params)
+            else:
+                backend = lambda: super(SearchTool, self)._run(**kwargs)
+            with metrics.span("search", "serper"):
+                return replay.call("search", {"query": query, **params}, backend, label="serper")
+
+        return search.cache.get_or_fetch(query, fetch, **params)
+
 # Re-write basic FileReadTool but with utf-8 encoding
 class FileReadToolSchema(BaseModel):
     """Input for FileReadTool."""
@@ -0,0 +1,256 @@
+"""
+Universe price and indicator matrix shared by every process through a memory-mapped file.
+
+Each API worker or pool process reading the market store builds its own copy
+of the bars. Instead, one loader process publishes the whole universe once:
+
+- ``open``/``high``/``low``/``close`` as float32 matrices (symbols x sessions,
+  NaN where a symbol has no bar), ``volume`` as int64 (0 where no bar);
+- ``time``, the sessions, as ``datetime64[s]``;
+- ``indicators``, the latest ``price_arrays.INDICATOR_COLUMNS`` of every
+  symbol (float64, symbols x indicators).
+
+A generation is a data file ``gen-<n>.bin`` plus its manifest ``gen-<n>.json``
+(symbols, dtypes, shapes and offsets) in ``UNIVERSE_DIR``, published behind
+a ``CURRENT`` pointer (``generations``): readers see either the old generation
+or the new one, never a partial write. Readers map the data file read-only and
+build numpy views on it: no copy, the pages are shared through the OS page
+cache, so memory stays flat as workers are added and a new worker starts
+without loading anything. A mapping stays valid after the loader prunes its
+file (only the last ``UNIVERSE_KEEP_GENERATIONS`` are kept), so a reader
+switches generation whenever it next checks ``CURRENT``.
+
+A file is used rather than ``multiprocessing.shared_memory`` because workers
+are not children of the loader: a named segment would be unlinked by the
+resource tracker when the loader exits. Point ``UNIVERSE_DIR`` at ``/dev/shm``
+to keep the file in RAM.
+
+Usage (loader):
+    python -m vn_stock_advisor.universe [--symbols HPG,FPT] [--every 3600]
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from vn_stock_advisor import generations, market_store, metrics, price_arrays
+
+logger = logging.getLogger(__name__)
+
+UNIVERSE_DIR = os.environ.get("UNIVERSE_DIR", os.path.join("data", "universe"))
+# Symbols published by the loader (the watchlist by default)
+UNIVERSE_SYMBOLS = [s.strip().upper() for s in os.environ.get("UNIVERSE_SYMBOLS", "").split(",") if s.strip()]
+UNIVERSE_HISTORY_DAYS = int(os.environ.get("UNIVERSE_HISTORY_DAYS", str(market_store.MARKET_STORE_HISTORY_DAYS)))
+UNIVERSE_KEEP_GENERATIONS = int(os.environ.get("UNIVERSE_KEEP_GENERATIONS", "2"))
+# How often readers look for a newer generation
+UNIVERSE_CHECK_SECONDS = float(os.environ.get("UNIVERSE_CHECK_SECONDS", "1"))
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+# Arrays start on cache-line boundaries
+_ALIGN = 64
+
+UNIVERSE_GENERATION = metrics.Gauge(
+    "vn_stock_advisor_universe_generation",
+    "Universe matrix generation last published (role=published) or mapped by this process (role=attached).",
+    labelnames=("role",),
+)
+
+
+def current_generation(directory: str = UNIVERSE_DIR) -> Optional[int]:
+    """Generation ``CURRENT`` points to, if any was published."""
+    return generations.current(directory)
+
+
+# --- Loader ---
+
+def build(frames: Dict[str, pd.DataFrame]) -> Dict[str, np.ndarray]:
+    """Matrices of the daily bars of every symbol, aligned on the union of their sessions."""
+    symbols = sorted(symbol.upper() for symbol, frame in frames.items() if not frame.empty)
+    frames = {symbol.upper(): frame for symbol, frame in frames.items()}
+    sessions = pd.DatetimeIndex(sorted(set().union(*(
+        pd.to_datetime(frames[symbol]["time"]).dt.normalize() for symbol in symbols
+    )))) if symbols else pd.DatetimeIndex([])
+    arrays = {"time": sessions.to_numpy(dtype="datetime64[s]")}
+    for field in PRICE_FIELDS:
+        arrays[field] = np.full((len(symbols), len(sessions)), np.nan, dtype=price_arrays.PRICE_DTYPE)
+    arrays["volume"] = np.zeros((len(symbols), len(sessions)), dtype=price_arrays.VOLUME_DTYPE)
+    arrays["indicators"] = np.full((len(symbols), len(price_arrays.INDICATOR_COLUMNS)), np.nan)
+
+    for row, symbol in enumerate(symbols):
+        bars = price_arrays.PriceBars.from_frame(frames[symbol])
+        columns = sessions.get_indexer(pd.to_datetime(bars.time).normalize())
+        for field in (*PRICE_FIELDS, "volume"):
+            arrays[field][row, columns] = getattr(bars, field)
+        latest = price_arrays.calculate_indicators(bars).latest()
+        arrays["indicators"][row] = [latest[name] for name in price_arrays.INDICATOR_COLUMNS]
+    return {"symbols": symbols, **arrays}
+
+
+def publish(frames: Dict[str, pd.DataFrame], directory: str = UNIVERSE_DIR,
+            keep: int = UNIVERSE_KEEP_GENERATIONS) -> int:
+    """Write ``frames`` as a new generation, switch ``CURRENT`` to it and prune old ones."""
+    built = build(frames)
+    symbols = built.pop("symbols")
+    layout, offset = {}, 0
+    for name, array in built.items():
+        offset = -(-offset // _ALIGN) * _ALIGN
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+
+    def write(generation: int) -> None:
+        with open(generations.generation_path(directory, generation, "bin"), "wb") as f:
+            for name, array in built.items():
+                f.seek(layout[name]["offset"])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(max(offset, 1))
+            f.flush()
+            os.fsync(f.fileno())
+
+        sessions = built["time"]
+        manifest = {
+            "generation": generation,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "symbols": symbols,
+            "start": str(sessions[0].astype("datetime64[D]")) if len(sessions) else None,
+            "end": str(sessions[-1].astype("datetime64[D]")) if len(sessions) else None,
+            "indicator_columns": list(price_arrays.INDICATOR_COLUMNS),
+            "arrays": layout,
+            "bytes": offset,
+        }
+        with open(generations.generation_path(directory, generation, "json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+    return generations.publish(directory, write, ("bin", "json"), keep, UNIVERSE_GENERATION)
+
+
+def load(symbols: Sequence[str], directory: str = UNIVERSE_DIR, days: int = UNIVERSE_HISTORY_DAYS) -> int:
+    """Publish the last ``days`` of daily bars of ``symbols`` from the market store."""
+    end = datetime.now()
+    start = (end - timedelta(days=days)).strftime("%Y-%m-%d")
+    frames = {}
+    for symbol in symbols:
+        try:
+            frames[symbol] = market_store.store.price_history(symbol, start=start, end=end.strftime("%Y-%m-%d"))
+        except Exception as e:
+            logger.warning("Bỏ qua %s khi nạp ma trận thị trường: %s", symbol, e)
+    return publish(frames, directory)
+
+
+# --- Readers ---
+
+class Universe:
+    """Read-only views of one published generation."""
+
+    def __init__(self, directory: str, generation: int):
+        with open(generations.generation_path(directory, generation, "json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.generation = generation
+        self.symbols: List[str] = self.manifest["symbols"]
+        self._index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        with open(generations.generation_path(directory, generation, "bin"), "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.arrays = {
+            name: np.frombuffer(
+                self._buffer, dtype=np.dtype(spec["dtype"]), count=int(np.prod(spec["shape"])), offset=spec["offset"],
+            ).reshape(spec["shape"])
+            for name, spec in self.manifest["arrays"].items()
+        }
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._index
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.arrays["time"]
+
+    @property
+    def nbytes(self) -> int:
+        return self.manifest["bytes"]
+
+    def row(self, symbol: str) -> int:
+        try:
+            return self._index[symbol.upper()]
+        except KeyError:
+            raise KeyError(f"Mã {symbol.upper()} không có trong ma trận thị trường (thế hệ {self.generation})")
+
+    def bars(self, symbol: str) -> price_arrays.PriceBars:
+        """Daily bars of ``symbol``: views of its row, or a compact copy when it skipped sessions."""
+        row = self.row(symbol)
+        traded = ~np.isnan(self.arrays["close"][row])
+        sessions = np.flatnonzero(traded)
+        if not len(sessions):
+            select = slice(0, 0)
+        elif sessions[-1] - sessions[0] + 1 == len(sessions):
+            select = slice(sessions[0], sessions[-1] + 1)
+        else:
+            select = traded
+        return price_arrays.PriceBars(
+            time=self.time[select], volume=self.arrays["volume"][row, select],
+            **{field: self.arrays[field][row, select] for field in PRICE_FIELDS},
+        )
+
+    def indicators(self, symbol: str) -> Dict[str, float]:
+        """Latest indicators of ``symbol`` as published."""
+        values = self.arrays["indicators"][self.row(symbol)]
+        return dict(zip(self.manifest["indicator_columns"], values.tolist()))
+
+    def status(self) -> dict:
+        return {
+            "generation": self.generation,
+            "created_at": self.manifest["created_at"],
+            "symbols": len(self.symbols),
+            "sessions": len(self.time),
+            "start": self.manifest["start"],
+            "end": self.manifest["end"],
+            "bytes": self.nbytes,
+        }
+
+
+class UniverseReader(generations.GenerationReader[Universe]):
+    """The current generation of ``directory``, reattached when the loader publishes a new one."""
+
+    def __init__(self, directory: str = UNIVERSE_DIR, check_seconds: float = UNIVERSE_CHECK_SECONDS):
+        super().__init__(directory, Universe, check_seconds, UNIVERSE_GENERATION)
+
+
+reader = UniverseReader()
+
+
+def status() -> dict:
+    """Generation mapped by this process (``{"generation": None}`` before the first publish)."""
+    universe = reader.current()
+    return universe.status() if universe is not None else {"generation": None}
+
+
+def main(argv=None) -> None:
+    from vn_stock_advisor import scheduler
+
+    parser = argparse.ArgumentParser(description="Publish the universe price and indicator matrix.")
+    parser.add_argument("--symbols", help="Comma separated symbols, UNIVERSE_SYMBOLS or WATCHLIST by default")
+    parser.add_argument("--every", type=float, default=0, help="Republish every N seconds (0: once)")
+    args = parser.parse_args(argv)
+    symbols = [s.strip().upper() for s in args.symbols.split(",")] if args.symbols else (
+        UNIVERSE_SYMBOLS or scheduler.WATCHLIST
+    )
+    if not symbols:
+        parser.error("Chưa cấu hình UNIVERSE_SYMBOLS, WATCHLIST hoặc --symbols")
+    while True:
+        generation = load(symbols)
+        print(json.dumps(Universe(UNIVERSE_DIR, generation).status(), ensure_ascii=False))
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
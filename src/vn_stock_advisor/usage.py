@@ -0,0 +1,302 @@
+"""
+Token and cost accounting for LLM calls.
+
+Every completion made through ``AdvisorLLM`` is recorded on the ledger of the
+request that triggered it, broken down by agent, task and model. Ledgers are
+persisted to SQLite so usage can be aggregated per symbol and per day, and
+optional budgets stop a run before it spends more than allowed.
+"""
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from vn_stock_advisor import metrics
+
+USAGE_DB_PATH = os.environ.get("USAGE_DB_PATH", os.path.join("data", "usage.sqlite3"))
+
+# Budgets, 0 disables the check
+BUDGET_TOKENS_PER_REQUEST = int(os.environ.get("LLM_BUDGET_TOKENS_PER_REQUEST", "0"))
+BUDGET_USD_PER_REQUEST = float(os.environ.get("LLM_BUDGET_USD_PER_REQUEST", "0"))
+BUDGET_USD_PER_DAY = float(os.environ.get("LLM_BUDGET_USD_PER_DAY", "0"))
+
+# Optional price overrides: {"model": {"input": usd_per_1m_tokens, "output": usd_per_1m_tokens}}
+PRICE_OVERRIDES = json.loads(os.environ.get("LLM_PRICES_JSON", "{}"))
+
+GROUP_COLUMNS = ("day", "symbol", "endpoint", "agent", "task", "model")
+
+LLM_TOKENS = metrics.Counter(
+    "vn_stock_advisor_llm_tokens_total",
+    "LLM tokens consumed, by task, model and kind (prompt/completion).",
+    labelnames=("task", "model", "kind"),
+)
+LLM_COST = metrics.Counter(
+    "vn_stock_advisor_llm_cost_usd_total",
+    "Estimated LLM cost in USD, by task and model.",
+    labelnames=("task", "model"),
+)
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised before an LLM call when the request or daily budget is spent."""
+
+
+@dataclass
+class UsageEntry:
+    agent: str
+    task: str
+    model: str
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    estimated_calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class UsageLedger:
+    """Usage of a single request, grouped by (agent, task, model)."""
+
+    def __init__(self, symbol: str = "", endpoint: str = "", day: Optional[str] = None):
+        self.request_id = uuid.uuid4().hex
+        self.symbol = symbol
+        self.endpoint = endpoint
+        self.day = day or str(date.today())
+        self.entries: Dict[Tuple[str, str, str], UsageEntry] = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent: str, task: str, model: str, prompt_tokens: int, completion_tokens: int,
+            cost_usd: float, estimated: bool = False) -> None:
+        with self._lock:
+            entry = self.entries.setdefault((agent, task, model), UsageEntry(agent, task, model))
+            entry.calls += 1
+            entry.prompt_tokens += prompt_tokens
+            entry.completion_tokens += completion_tokens
+            entry.cost_usd += cost_usd
+            entry.estimated_calls += int(estimated)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(entry.total_tokens for entry in self.entries.values())
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(entry.cost_usd for entry in self.entries.values())
+
+    def summary(self) -> dict:
+        with self._lock:
+            entries = list(self.entries.values())
+        return {
+            "request_id": self.request_id,
+            "symbol": self.symbol,
+            "calls": sum(e.calls for e in entries),
+            "prompt_tokens": sum(e.prompt_tokens for e in entries),
+            "completion_tokens": sum(e.completion_tokens for e in entries),
+            "total_tokens": sum(e.total_tokens for e in entries),
+            "cost_usd": round(sum(e.cost_usd for e in entries), 6),
+            "by_task": [{**asdict(e), "cost_usd": round(e.cost_usd, 6)} for e in entries],
+        }
+
+
+class UsageStore:
+    """SQLite table of per-request usage rows with simple aggregations."""
+
+    def __init__(self, path: str = USAGE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                self._ensure_schema(connection)
+                yield connection
+        finally:
+            connection.close()
+
+    def _ensure_schema(self, connection: sqlite3.Connection) -> None:
+        if not self._initialized:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS llm_usage (
+                    request_id TEXT, day TEXT, symbol TEXT, endpoint TEXT,
+                    agent TEXT, task TEXT, model TEXT,
+                    calls INTEGER, prompt_tokens INTEGER, completion_tokens INTEGER,
+                    cost_usd REAL, estimated_calls INTEGER, created_at TEXT
+                )"""
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_day ON llm_usage (day, symbol)")
+            self._initialized = True
+
+    def save(self, ledger: UsageLedger) -> None:
+        rows = [
+            (ledger.request_id, ledger.day, ledger.symbol, ledger.endpoint, e.agent, e.task, e.model,
+             e.calls, e.prompt_tokens, e.completion_tokens, e.cost_usd, e.estimated_calls,
+             datetime.now().isoformat(timespec="seconds"))
+            for e in ledger.entries.values()
+        ]
+        if not rows:
+            return
+        with self._lock, self._connect() as connection:
+            connection.executemany("INSERT INTO llm_usage VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", rows)
+
+    def aggregate(self, group_by=("day", "symbol"), symbol: Optional[str] = None,
+                  start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+        """Sum usage grouped by any of ``GROUP_COLUMNS``, optionally filtered."""
+        columns = [c for c in group_by if c in GROUP_COLUMNS]
+        if len(columns) != len(group_by):
+            raise ValueError(f"group_by must be a subset of {GROUP_COLUMNS}")
+
+        where, params = [], []
+        if symbol:
+            where.append("symbol = ?")
+            params.append(symbol)
+        if start:
+            where.append("day >= ?")
+            params.append(start)
+        if end:
+            where.append("day <= ?")
+            params.append(end)
+
+        select = ", ".join(columns + [
+            "COUNT(DISTINCT request_id) AS requests",
+            "SUM(calls) AS calls",
+            "SUM(prompt_tokens) AS prompt_tokens",
+            "SUM(completion_tokens) AS completion_tokens",
+            "SUM(cost_usd) AS cost_usd",
+        ])
+        query = f"SELECT {select} FROM llm_usage"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        if columns:
+            query += f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+
+        with self._lock, self._connect() as connection:
+            connection.row_factory = sqlite3.Row
+            rows = [dict(row) for row in connection.execute(query, params)]
+        return [row for row in rows if row["requests"]]
+
+    def cost_on(self, day: str) -> float:
+        rows = self.aggregate(group_by=(), start=day, end=day)
+        return rows[0]["cost_usd"] if rows else 0.0
+
+
+store = UsageStore()
+
+_current_ledger: contextvars.ContextVar[Optional[UsageLedger]] = contextvars.ContextVar(
+    "vn_stock_advisor_usage_ledger", default=None
+)
+
+
+def current_ledger() -> Optional[UsageLedger]:
+    return _current_ledger.get()
+
+
+@contextmanager
+def track_request(symbol: str, endpoint: str, usage_store: Optional[UsageStore] = None):
+    """Record LLM usage made in this context on a new ledger, persisted on exit."""
+    usage_store = usage_store or store
+    if BUDGET_USD_PER_DAY and usage_store.cost_on(str(date.today())) >= BUDGET_USD_PER_DAY:
+        raise BudgetExceededError(f"Đã vượt ngân sách LLM trong ngày ({BUDGET_USD_PER_DAY} USD)")
+
+    ledger = UsageLedger(symbol, endpoint)
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+        usage_store.save(ledger)
+
+
+def check_budget() -> None:
+    """Raise ``BudgetExceededError`` if the current request has spent its budget."""
+    ledger = _current_ledger.get()
+    if ledger is None:
+        return
+    if BUDGET_TOKENS_PER_REQUEST and ledger.total_tokens >= BUDGET_TOKENS_PER_REQUEST:
+        raise BudgetExceededError(f"Đã vượt ngân sách {BUDGET_TOKENS_PER_REQUEST} token cho request")
+    if BUDGET_USD_PER_REQUEST and ledger.cost_usd >= BUDGET_USD_PER_REQUEST:
+        raise BudgetExceededError(f"Đã vượt ngân sách {BUDGET_USD_PER_REQUEST} USD cho request")
+
+
+class UsageRecorder:
+    """Callback passed to ``LLM.call``; crewAI hands it the provider's usage block.
+
+    Deliberately not a litellm ``CustomLogger`` so litellm's global callback
+    machinery never reports other concurrent calls to it.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.reported = False
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        usage_info = (response_obj or {}).get("usage")
+        if usage_info is None:
+            return
+        get = usage_info.get if isinstance(usage_info, dict) else lambda key, default=0: getattr(usage_info, key, default)
+        self.prompt_tokens += int(get("prompt_tokens", 0) or 0)
+        self.completion_tokens += int(get("completion_tokens", 0) or 0)
+        self.reported = True
+
+
+def estimate_tokens(model: str, messages=None, text: Optional[str] = None) -> int:
+    """Count tokens with litellm's tokenizer, falling back to ~4 characters per token."""
+    try:
+        import litellm
+
+        if text is not None:
+            return litellm.token_counter(model=model, text=text)
+        return litellm.token_counter(model=model, messages=messages)
+    except Exception:
+        content = text if text is not None else json.dumps(messages, ensure_ascii=False, default=str)
+        return max(1, len(content) // 4)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimate USD cost from ``LLM_PRICES_JSON`` or litellm's price map (0 if unknown)."""
+    prices = PRICE_OVERRIDES.get(model)
+    if prices:
+        return (prompt_tokens * prices.get("input", 0) + completion_tokens * prices.get("output", 0)) / 1_000_000
+    try:
+        import litellm
+
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+        return prompt_cost + completion_cost
+    except Exception:
+        return 0.0
+
+
+def record_call(model: str, recorder: UsageRecorder, messages, response) -> None:
+    """Record one completion on the current ledger and the token counters."""
+    estimated = not recorder.reported
+    if estimated:
+        prompt_tokens = estimate_tokens(model, messages=messages)
+        completion_tokens = estimate_tokens(model, text=response if isinstance(response, str) else str(response))
+    else:
+        prompt_tokens, completion_tokens = recorder.prompt_tokens, recorder.completion_tokens
+
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    task = metrics.current_task() or "unknown"
+    LLM_TOKENS.inc(prompt_tokens, task=task, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, task=task, model=model, kind="completion")
+    LLM_COST.inc(cost, task=task, model=model)
+
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.add(metrics.current_agent() or "unknown", task, model, prompt_tokens, completion_tokens, cost, estimated)
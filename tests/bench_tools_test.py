@@ -0,0 +1,46 @@
+from benchmarks.bench_tools import compare, run_benchmarks
+from benchmarks.fixtures import synthetic_fundamentals, synthetic_ohlcv
+from vn_stock_advisor.tools.custom_tool import FundDataTool, TechDataTool
+
+
+def test_synthetic_ohlcv_shape():
+    df = synthetic_ohlcv(300, seed=1)
+    assert list(df.columns) == ["time", "open", "high", "low", "close", "volume"]
+    assert len(df) == 300
+    assert (df["high"] >= df[["open", "close"]].max(axis=1)).all()
+    assert (df["low"] <= df[["open", "close"]].min(axis=1)).all()
+
+
+def test_tool_reports_run_offline():
+    tech_report = TechDataTool()._format_report("TST", "Công ty Test", "Thép", synthetic_ohlcv(250))
+    assert "CHỈ SỐ KỸ THUẬT" in tech_report
+    assert "NHẬN ĐỊNH KỸ THUẬT" in tech_report
+
+    ratios, income = synthetic_fundamentals()
+    fund_report = FundDataTool()._format_report("TST", "Công ty Test", "Thép", ratios, income)
+    assert "XU HƯỚNG 4 QUÝ GẦN NHẤT" in fund_report
+    assert fund_report.count("Quý T -") == 4
+
+
+def test_run_benchmarks_records_time_and_memory():
+    results = run_benchmarks(sizes=(200,), symbol_counts=(2,), repeat=1, name_filter="")
+    assert "tech.calculate_indicators[bars=200]" in results
+    assert "tech.universe[symbols=2,bars=200]" in results
+    for metrics in results.values():
+        assert metrics["seconds"] > 0
+        assert metrics["peak_kib"] > 0
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = {
+        "a": {"seconds": 1.0, "peak_kib": 100.0},
+        "b": {"seconds": 1.0, "peak_kib": 100.0},
+    }
+    results = {
+        "a": {"seconds": 1.2, "peak_kib": 105.0},
+        "b": {"seconds": 1.5, "peak_kib": 130.0},
+        "new": {"seconds": 9.0, "peak_kib": 900.0},
+    }
+    regressions = compare(results, baseline, tolerance=0.3, memory_tolerance=0.1)
+    assert len(regressions) == 2
+    assert all(message.startswith("b ") for message in regressions)
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from vn_stock_advisor import api, cancellation, ratelimit, replay
+
+
+def _run_in_thread(token, fn):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = token.run(fn)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+
+def test_cancel_interrupts_sleeps_and_checkpoints():
+    # No current token: checkpoints are free and sleeps are plain sleeps
+    cancellation.check()
+    cancellation.sleep(0)
+
+    token = cancellation.CancellationToken("test")
+    stopped = cancellation.CANCEL_STOP_SECONDS.snapshot() or {"count": 0}
+    thread, outcome = _run_in_thread(token, lambda: cancellation.sleep(30))
+    time.sleep(0.05)
+    assert token.cancel("timeout") and not token.cancel("timeout")
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+    assert isinstance(outcome["error"], cancellation.RunCancelledError)
+    assert cancellation.CANCELLED_RUNS.value(endpoint="test", reason="timeout") >= 1
+    assert cancellation.CANCELLED_ACTIVE.value() == 0
+    assert cancellation.CANCEL_STOP_SECONDS.snapshot()["count"] == stopped["count"] + 1
+
+    # Cancelled before its worker started: stops at the first checkpoint
+    late = cancellation.CancellationToken("test")
+    late.cancel()
+    with pytest.raises(cancellation.RunCancelledError):
+        late.run(cancellation.check)
+    assert cancellation.CANCELLED_ACTIVE.value() == 0
+
+
+def test_rate_limiter_waiters_give_up_when_cancelled():
+    limiter = ratelimit.RateLimiter("test-cancel", ratelimit.Limit(rpm=6, burst=1 / 6))
+    limiter.acquire()
+    token = cancellation.CancellationToken("test")
+    start = time.perf_counter()
+    thread, outcome = _run_in_thread(token, limiter.acquire)
+    time.sleep(0.1)
+    token.cancel()
+    thread.join(timeout=3)
+    assert isinstance(outcome.get("error"), cancellation.RunCancelledError)
+    # The next request was 10 s away
+    assert time.perf_counter() - start < 2.5
+    assert not limiter._waiters
+
+
+def test_timed_out_analysis_stops_spending(mock_providers, monkeypatch):
+    replay.configure(latency_ms={"*": 0, "llm": 500})
+    monkeypatch.setattr(api, "COMPLETE_TIMEOUT_SECONDS", 0.2)
+    before = cancellation.CANCEL_STOP_SECONDS.snapshot() or {"count": 0, "sum": 0.0}
+    stopped = before["count"]
+
+    response = TestClient(api.app).post("/analyze/complete", json={"symbol": "FPT", "current_date": "2025-06-27"})
+    assert response.status_code == 408
+    assert cancellation.CANCELLED_RUNS.value(endpoint="complete", reason="timeout") >= 1
+
+    deadline = time.time() + 5
+    while (cancellation.CANCEL_STOP_SECONDS.snapshot() or {"count": 0})["count"] == stopped and time.time() < deadline:
+        time.sleep(0.05)
+    # The in-flight recorded LLM calls are cut short, so the worker is free well before they would end
+    after = cancellation.CANCEL_STOP_SECONDS.snapshot()
+    assert after["count"] == stopped + 1 and after["sum"] - before["sum"] < 0.5
+    llm_calls = replay.REPLAY_CALLS.value(kind="llm", outcome="fallback") + replay.REPLAY_CALLS.value(kind="llm", outcome="hit")
+    time.sleep(0.6)
+    assert replay.REPLAY_CALLS.value(kind="llm", outcome="fallback") + replay.REPLAY_CALLS.value(kind="llm", outcome="hit") == llm_calls
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+import pytest
+
+# Let vn_stock_advisor.crew/api import offline: the LLM objects are built at
+# import time but never called by these tests.
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("GEMINI_MODEL", "gemini/offline-test-model")
+os.environ.setdefault("SERPER_API_KEY", "test-key")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+# Keep the search cache in memory instead of data/
+os.environ.setdefault("SEARCH_CACHE_PATH", "")
+# Daily macro digests built by the offline crew runs go to a scratch directory
+os.environ.setdefault("MACRO_DIGEST_DIR", tempfile.mkdtemp(prefix="macro-digest-"))
+# Tools fetch market data directly; precomputed analyses stay in memory
+os.environ.setdefault("MARKET_STORE_PATH", "")
+os.environ.setdefault("ANALYSIS_CACHE_PATH", "")
+os.environ.setdefault("SCHEDULER_STATE_DIR", tempfile.mkdtemp(prefix="scheduler-"))
+os.environ.setdefault("UNIVERSE_DIR", tempfile.mkdtemp(prefix="universe-"))
+os.environ.setdefault("CORRELATION_DIR", tempfile.mkdtemp(prefix="correlation-"))
+os.environ.setdefault("EVALUATION_DIR", tempfile.mkdtemp(prefix="evaluation-"))
+os.environ.setdefault("TASK_MEMO_PATH", "")
+
+
+@pytest.fixture
+def mock_providers(request, tmp_path, monkeypatch):
+    """Replayed LLM, market data and search providers (``benchmarks.cassettes``), without latency,
+    with fresh usage ledgers, caches and task memo under ``tmp_path``.
+
+    Parametrize indirectly with ``{"task_memo_path": "<file name>"}`` to persist the task memo.
+    """
+    from benchmarks import cassettes
+    from vn_stock_advisor import analysis_cache, macro_digest, replay, search, task_memo, usage
+
+    options = getattr(request, "param", None) or {}
+    previous = replay.settings
+    cassettes.write_cassettes(str(tmp_path / "replay"))
+    replay.configure(mode="replay", directory=str(tmp_path / "replay"), strict=False, latency_ms={"*": 0})
+    monkeypatch.setattr(usage, "store", usage.UsageStore(str(tmp_path / "usage.sqlite3")))
+    memo_path = str(tmp_path / options["task_memo_path"]) if options.get("task_memo_path") else ""
+    monkeypatch.setattr(task_memo, "memo", task_memo.TaskMemo(memo_path))
+    monkeypatch.setattr(analysis_cache, "cache", analysis_cache.AnalysisCache(""))
+    monkeypatch.setattr(search, "cache", search.SearchCache(""))
+    monkeypatch.setattr(macro_digest, "MACRO_DIGEST_DIR", str(tmp_path / "macro_digest"))
+    yield
+    replay.configure(**previous.__dict__)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from vn_stock_advisor import api, correlation, universe
+
+
+def _frames(sessions: int = 200, seed: int = 0) -> dict:
+    """Two steel names driven by one factor, a bank, and a stock listed late and suspended."""
+    rng = np.random.default_rng(seed)
+    time = pd.bdate_range(end="2025-06-30", periods=sessions)
+    steel = rng.normal(0, 0.015, sessions)
+    returns = {
+        "HPG": steel + rng.normal(0, 0.005, sessions),
+        "HSG": steel + rng.normal(0, 0.008, sessions),
+        "NKG": -steel + rng.normal(0, 0.01, sessions),
+        "VCB": rng.normal(0, 0.012, sessions),
+        "FPT": rng.normal(0, 0.012, sessions),
+    }
+    frames = {}
+    for symbol, values in returns.items():
+        close = (20 * np.exp(np.cumsum(values))).round(2)
+        frames[symbol] = pd.DataFrame({
+            "time": time, "open": close, "high": close, "low": close, "close": close, "volume": 1_000_000,
+        })
+    frames["FPT"] = frames["FPT"].iloc[30:].drop(index=range(100, 106)).reset_index(drop=True)
+    return frames
+
+
+def _pandas_returns(mapped: universe.Universe, window: int) -> pd.DataFrame:
+    close = pd.DataFrame(mapped["close"].T.astype(np.float64), columns=mapped.symbols)
+    return close.pct_change(fill_method=None).iloc[1:].astype(np.float32).astype(np.float64).tail(window)
+
+
+def test_matrices_match_pandas_pairwise(tmp_path):
+    universe.publish(_frames(), str(tmp_path / "universe"))
+    mapped = universe.UniverseReader(str(tmp_path / "universe")).current()
+    engine = correlation.CorrelationEngine(str(tmp_path / "corr"), window=120, min_periods=40, block=2)
+    assert engine.update(mapped) == "full"
+
+    returns = _pandas_returns(mapped, 120)
+    corr, cov, overlap = engine.moments.matrices(40)
+    expected_corr = returns.corr(min_periods=40).to_numpy()
+    assert np.allclose(corr, expected_corr, atol=1e-5, equal_nan=True)
+    assert np.allclose(cov, returns.cov(min_periods=40).to_numpy(), rtol=1e-4, atol=1e-9, equal_nan=True)
+    fpt, hpg = mapped.symbols.index("FPT"), mapped.symbols.index("HPG")
+    assert overlap[fpt, hpg] == returns[["FPT", "HPG"]].dropna().shape[0] < 120
+
+
+def test_rolling_updates_match_a_full_recompute_and_survive_restarts(tmp_path):
+    universe_dir, corr_dir = str(tmp_path / "universe"), str(tmp_path / "corr")
+    frames = _frames(200)
+    universe.publish({symbol: frame.iloc[:-5] for symbol, frame in frames.items()}, universe_dir)
+    reader = universe.UniverseReader(universe_dir, check_seconds=0)
+    assert correlation.CorrelationEngine(corr_dir, window=100).update(reader.current()) == "full"
+
+    # A new process picks the saved moments up and only applies the five new sessions
+    universe.publish(frames, universe_dir)
+    engine = correlation.CorrelationEngine(corr_dir, window=100)
+    assert engine.update(reader.current()) == "incremental"
+    assert engine.update(reader.current()) == "unchanged"
+    rolled = engine.moments.matrices(60)[0]
+    fresh = correlation.CorrelationEngine(str(tmp_path / "fresh"), window=100)
+    fresh.update(reader.current())
+    assert np.allclose(rolled, fresh.moments.matrices(60)[0], atol=1e-6, equal_nan=True)
+
+    # Revised closes (e.g. adjusted for a dividend) force a full recompute
+    frames["HPG"].loc[150, "close"] *= 0.97
+    universe.publish(frames, universe_dir)
+    assert engine.update(reader.current()) == "full"
+
+
+def test_peers_from_the_published_matrices(tmp_path, monkeypatch):
+    universe.publish(_frames(), str(tmp_path / "universe"))
+    mapped = universe.UniverseReader(str(tmp_path / "universe")).current()
+    monkeypatch.setattr(correlation, "reader", correlation.CorrelationReader(str(tmp_path / "corr"), check_seconds=0))
+    client = TestClient(api.app)
+    assert client.get("/correlation/HPG/peers").status_code == 404
+
+    correlation.CorrelationEngine(str(tmp_path / "corr"), window=150, min_periods=60).update(mapped)
+    peers = client.get("/correlation/hpg/peers", params={"n": 2}).json()
+    assert peers["symbol"] == "HPG"
+    assert [peer["symbol"] for peer in peers["most_correlated"]][0] == "HSG"
+    assert peers["least_correlated"][0]["symbol"] == "NKG"
+    assert peers["least_correlated"][0]["correlation"] < -0.5
+    assert "HPG" not in {peer["symbol"] for peer in peers["most_correlated"] + peers["least_correlated"]}
+    assert client.get("/correlation/VNM/peers").status_code == 404
+    assert client.get("/correlation/HPG/peers", params={"n": 0}).status_code == 400
@@ -0,0 +1,64 @@
+import time
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from vn_stock_advisor import api, cancellation, deadlines, macro_digest, replay, task_memo
+
+
+def test_a_task_past_its_deadline_gives_way_to_a_placeholder():
+    budget = deadlines.DeadlineBudget(1.0, shares={"news_collecting": 0.1, "fundamental_analysis": 0.5})
+    token = cancellation.CancellationToken("test")
+    stopped = []
+
+    def slow():
+        try:
+            cancellation.sleep(5)
+        finally:
+            stopped.append(time.perf_counter())
+
+    with deadlines.scope(budget), cancellation.scope(token):
+        start = time.perf_counter()
+        output = deadlines.run("news_collecting", slow)
+        assert time.perf_counter() - start < 0.5
+        assert output.startswith("Không có kết quả tin tức và bối cảnh vĩ mô")
+        assert deadlines.run("fundamental_analysis", lambda: "cơ bản") == "cơ bản"
+        with pytest.raises(ValueError):
+            deadlines.run("fundamental_analysis", lambda: int("không phải số"))
+        # No share: bounded by the overall timeout only
+        assert deadlines.run("investment_decision", lambda: "quyết định") == "quyết định"
+        assert deadlines.degraded() == ["news_collecting"]
+    assert deadlines.degraded() == []
+    # The abandoned worker stops at its next checkpoint, without cancelling the run
+    deadline = time.time() + 2
+    while not stopped and time.time() < deadline:
+        time.sleep(0.01)
+    assert stopped and not token.cancelled
+    assert deadlines.TASK_DEADLINE_MISSES.value(task="news_collecting") >= 1
+
+
+def test_shares_are_parsed_and_clamped():
+    assert deadlines._parse_shares("news_collecting=0.4, fundamental_analysis=2,") == {
+        "news_collecting": 0.4, "fundamental_analysis": 1.0,
+    }
+
+
+def test_slow_news_degrades_the_complete_analysis(mock_providers, monkeypatch):
+    # The day's macro digest is built before the crew, with the fast search
+    macro_digest.digest_text(date(2025, 6, 27))
+    # The news analyst's web search hangs; everything else answers at once
+    replay.configure(latency_ms={"*": 0, "search": 30_000})
+    monkeypatch.setattr(api, "COMPLETE_TIMEOUT_SECONDS", 20)
+    monkeypatch.setattr(deadlines, "TASK_DEADLINE_SHARES", {"news_collecting": 0.05, "fundamental_analysis": 0.5})
+
+    start = time.perf_counter()
+    response = TestClient(api.app).post("/analyze/complete", json={"symbol": "FPT", "current_date": "2025-06-27"})
+    assert response.status_code == 200
+    assert time.perf_counter() - start < 10
+    body = response.json()
+    assert body["degraded"] == ["market_analysis"]
+    assert body["market_analysis"]["news_summary"].startswith("Không có kết quả")
+    assert body["investment_decision"]["decision"] == "GIỮ"
+    # The decision made without the news is not reused by later requests
+    assert {task for task, _ in task_memo.memo._memory} == {"fundamental_analysis", "technical_analysis"}
@@ -0,0 +1,87 @@
+import json
+import threading
+from datetime import date
+from types import SimpleNamespace
+
+from vn_stock_advisor import evaluation, task_memo
+
+DAYS = [date(2025, 3, 3), date(2025, 3, 10)]
+
+
+def _decision(symbol, decision="MUA", **fields):
+    return {
+        "stock_ticker": symbol, "full_name": f"Công ty {symbol}", "industry": "Thép", "today_date": "2025-03-03",
+        "decision": decision, "macro_reasoning": "vĩ mô", "fund_reasoning": "cơ bản", "tech_reasoning": "kỹ thuật",
+        "buy_price": 25000.0, "sell_price": 28000.0, "overall_score": 7.0, "prob_up_60d": 0.7, **fields,
+    }
+
+
+def test_decision_problems():
+    assert evaluation.decision_problems(_decision("HPG")) == []
+    assert evaluation.decision_problems({}) == ["không đọc được JSON quyết định"]
+    problems = evaluation.decision_problems(
+        _decision("HPG", decision="BÁN", full_name="", prob_up_60d=1.4, buy_price=30000.0),
+    )
+    assert problems == [
+        "thiếu trường full_name", "prob_up_60d ngoài khoảng 0-1", "quyết định BÁN mâu thuẫn với điểm 7",
+        "giá mua cao hơn giá bán",
+    ]
+    assert evaluation.decision_problems(_decision("HPG", decision="MUA MẠNH")) == [
+        "quyết định không hợp lệ: MUA MẠNH",
+    ]
+
+
+def test_interrupted_runs_resume_and_report(tmp_path, monkeypatch):
+    calls, failures, lock = [], {("FPT", DAYS[1]): 1}, threading.Lock()
+
+    def case(symbol, day):
+        with lock:
+            calls.append((symbol, day))
+            if failures.get((symbol, day), 0) > 0:
+                failures[(symbol, day)] -= 1
+                raise RuntimeError("LLM quá thời gian")
+        fields = _decision(symbol, decision="MUA" if symbol == "HPG" else "GIỮ", overall_score=5.5)
+        return SimpleNamespace(tasks_output=[SimpleNamespace(raw=json.dumps(fields, ensure_ascii=False))])
+
+    monkeypatch.setattr(evaluation, "CASE_FUNCTION", case)
+    run = evaluation.EvaluationRun("prompt-v2", ["hpg", "FPT"], DAYS, directory=str(tmp_path), concurrency=4)
+    report = run.run()
+    assert sorted(calls) == sorted((symbol, day) for symbol in ("HPG", "FPT") for day in DAYS)
+    assert (report["done"], report["failed"]) == (3, 1)
+    assert report["latency"]["p50"] is not None
+
+    calls.clear()
+    resumed = evaluation.EvaluationRun("prompt-v2", ["HPG", "FPT"], DAYS, directory=str(tmp_path))
+    report = resumed.run()
+    assert calls == [("FPT", DAYS[1])]
+    assert resumed.state["finished_at"] is not None
+    assert report["quality"]["valid_rate"] == 1.0
+    assert report["quality"]["decisions"] == {"MUA": 2, "GIỮ": 2, "BÁN": 0}
+    assert "outcome" not in report
+    with open(tmp_path / "prompt-v2.report.json", encoding="utf-8") as f:
+        assert json.load(f)["done"] == 4
+
+
+
+def test_cases_run_on_fresh_crews_unless_given_a_memo(tmp_path, monkeypatch):
+    monkeypatch.setitem(task_memo.FINGERPRINTS, "technical_analysis", lambda inputs, context: "bar-1")
+    runs = []
+
+    def case(symbol, day):
+        inputs = {"symbol": symbol, "current_date": day.isoformat()}
+        task_memo.memo.run("technical_analysis", inputs, None, lambda: runs.append(day) or "kỹ thuật")
+        fields = _decision(symbol)
+        return SimpleNamespace(tasks_output=[SimpleNamespace(raw=json.dumps(fields, ensure_ascii=False))])
+
+    monkeypatch.setattr(evaluation, "CASE_FUNCTION", case)
+    report = evaluation.EvaluationRun("fresh", ["HPG"], DAYS, directory=str(tmp_path), concurrency=1).run()
+    assert runs == DAYS and report["memo_hits"] == 0
+
+    runs.clear()
+    memoized = evaluation.EvaluationRun("memo", ["HPG"], DAYS, directory=str(tmp_path), concurrency=1,
+                                        memo=task_memo.TaskMemo(""))
+    report = memoized.run()
+    # The fingerprint ignores the date: the second session is served from the memo
+    assert runs == DAYS[:1] and report["memo_hits"] == 1
+    assert memoized.state["cases"]["HPG@2025-03-10"]["memo_hits"] == ["technical_analysis"]
+    assert task_memo.memo is not memoized.memo
@@ -0,0 +1,44 @@
+import os
+
+from vn_stock_advisor import generations, metrics
+
+GAUGE = metrics.Gauge("vn_stock_advisor_test_generation", "Generation of the test directory.", labelnames=("role",))
+
+
+class Opened:
+    def __init__(self, directory, generation):
+        with open(generations.generation_path(directory, generation, "json"), encoding="utf-8") as f:
+            self.payload = f.read()
+        self.generation = generation
+
+
+def _write(directory, payload):
+    def write(generation):
+        for suffix in ("json", "data"):
+            with open(generations.generation_path(directory, generation, suffix), "w", encoding="utf-8") as f:
+                f.write(payload)
+    return write
+
+
+def test_publish_switches_current_and_prunes(tmp_path):
+    directory = str(tmp_path)
+    reader = generations.GenerationReader(directory, Opened, 0, GAUGE)
+    assert reader.current() is None and generations.current(directory) is None
+    for payload in ("a", "b", "c"):
+        generations.publish(directory, _write(directory, payload), ("json", "data"), 2, GAUGE)
+    assert generations.current(directory) == 3
+    assert sorted(os.listdir(directory)) == [
+        "CURRENT", "gen-000002.data", "gen-000002.json", "gen-000003.data", "gen-000003.json",
+    ]
+    assert reader.current().payload == "c"
+    assert GAUGE.value(role="published") == 3 and GAUGE.value(role="attached") == 3
+
+
+def test_a_generation_pruned_before_it_is_opened_is_skipped(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    for payload in ("a", "b", "c"):
+        generations.publish(directory, _write(directory, payload), ("json", "data"), 2, GAUGE)
+    # CURRENT read just before generation 1 was pruned, then again
+    pointers = iter([1, 3])
+    monkeypatch.setattr(generations, "current", lambda directory: next(pointers))
+    assert generations.GenerationReader(directory, Opened, 0, GAUGE).current().payload == "c"
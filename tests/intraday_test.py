@@ -0,0 +1,100 @@
+import json
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from vn_stock_advisor import api, intraday
+
+T0 = int(pd.Timestamp("2025-06-27 09:15:00").timestamp())
+
+
+def test_ticks_build_every_interval_incrementally():
+    store = intraday.IntradayStore()
+    for second, price, volume in ((0, 25.0, 100), (30, 25.4, 200), (59, 24.9, 50), (61, 25.1, 10), (301, 25.2, 5)):
+        assert store.ingest_tick("hpg", T0 + second, price, volume)
+
+    one_minute = store.frame("HPG", "1m")
+    assert one_minute.iloc[0][["open", "high", "low", "close", "volume"]].tolist() == [25.0, 25.4, 24.9, 24.9, 350]
+    assert len(one_minute) == 3
+    five_minutes = store.frame("HPG", "5m")
+    assert five_minutes["volume"].tolist() == [360, 5]
+    assert five_minutes["high"].iloc[0] == 25.4
+    assert five_minutes["time"].iloc[1] == pd.Timestamp("2025-06-27 09:20:00")
+    assert len(store.frame("HPG", "15m")) == 1
+
+    # Events older than the forming bar are dropped from every interval
+    assert not store.ingest_tick("HPG", T0 + 30, 30.0, 1000)
+    assert store.frame("HPG", "5m")["volume"].tolist() == [360, 5]
+
+
+def test_ring_buffer_keeps_the_newest_bars_in_bounded_memory():
+    store = intraday.IntradayStore(capacity=10)
+    for minute in range(25):
+        store.ingest_bar("FPT", T0 + minute * 60, 1, 2, 0.5, 1 + minute, 100)
+    memory = store.memory_bytes()
+
+    for minute in range(25, 500):
+        store.ingest_bar("FPT", T0 + minute * 60, 1, 2, 0.5, 1 + minute, 100)
+    bars = store.frame("FPT", "1m")
+    assert len(bars) == 10
+    assert bars["close"].tolist() == [float(1 + m) for m in range(490, 500)]
+    assert bars["time"].is_monotonic_increasing
+    assert store.memory_bytes() == memory
+
+
+def test_file_replay_source_feeds_the_indicator_engine(tmp_path, monkeypatch):
+    path = tmp_path / "session.ndjson"
+    with open(path, "w", encoding="utf-8") as f:
+        for minute in range(120):
+            price = 25 + (minute % 7) * 0.1
+            f.write(json.dumps({"symbol": "VNM", "time": T0 + minute * 60, "price": price, "volume": 100}) + "\n")
+        f.write(json.dumps({"symbol": "VNM", "time": "không phải thời gian", "price": 1}) + "\n")
+    monkeypatch.setattr(intraday, "store", intraday.IntradayStore())
+
+    assert intraday.IntradayFeed(intraday.FileReplaySource(str(path)), intraday.store).run() == 120
+    result = intraday.indicators("VNM", "5m")
+    assert result["bars"] == 24
+    assert result["indicators"]["SMA_20"] == pytest.approx(
+        intraday.store.frame("VNM", "5m")["close"].tail(20).mean()
+    )
+    assert any(line.startswith("- RSI") for line in result["signals"])
+
+    client = TestClient(api.app)
+    assert client.get("/intraday/VNM", params={"interval": "15m"}).json()["bars"] == 8
+    assert client.get("/intraday/VNM", params={"interval": "2m"}).status_code == 400
+
+
+def test_polling_source_emits_only_new_trades():
+    pages = [
+        pd.DataFrame({"time": pd.to_datetime(["2025-06-27 09:15:00", "2025-06-27 09:15:05"]),
+                      "price": [25.0, 25.1], "volume": [100, 200]}),
+        pd.DataFrame({"time": pd.to_datetime(["2025-06-27 09:15:05", "2025-06-27 09:15:09"]),
+                      "price": [25.1, 25.2], "volume": [200, 300]}),
+    ]
+    source = intraday.PollingSource(["HPG"], fetch=lambda symbol: pages.pop(0))
+    assert [e["price"] for e in source.poll()] == [25.0, 25.1]
+    assert [e["price"] for e in source.poll()] == [25.2]
+
+
+def test_polling_source_keeps_late_trades_of_the_last_second():
+    def page(times, prices, volumes, **columns):
+        return pd.DataFrame({"time": pd.to_datetime(times), "price": prices, "volume": volumes, **columns})
+
+    pages = [
+        page(["2025-06-27 09:15:05", "2025-06-27 09:15:05"], [25.1, 25.1], [200, 200]),
+        # A third identical trade of 09:15:05 printed after the first poll
+        page(["2025-06-27 09:15:05"] * 3 + ["2025-06-27 09:15:06"], [25.1] * 3 + [25.2], [200] * 3 + [300]),
+    ]
+    source = intraday.PollingSource(["HPG"], fetch=lambda symbol: pages.pop(0))
+    assert [e["volume"] for e in source.poll()] == [200, 200]
+    assert [e["volume"] for e in source.poll()] == [200, 300]
+
+    # With trade ids, the ids tell the trades of a second apart
+    pages = [
+        page(["2025-06-27 09:15:05"] * 2, [25.1, 25.1], [100, 100], id=[1, 2]),
+        page(["2025-06-27 09:15:05"] * 3, [25.1, 25.1, 25.0], [100, 100, 100], id=[1, 2, 3]),
+    ]
+    source = intraday.PollingSource(["HPG"], fetch=lambda symbol: pages.pop(0))
+    assert len(source.poll()) == 2
+    assert [e["price"] for e in source.poll()] == [25.0]
@@ -0,0 +1,108 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import analysis_cache, api, evaluation, liquidity, market_store, portfolio, universe, usage
+
+NOW = datetime(2025, 7, 1, 10, 0)  # session of 2025-07-01 still open: screens 2025-06-30
+
+
+def _frames() -> dict:
+    frames = {symbol: synthetic_ohlcv(60, seed=seed) for seed, symbol in enumerate(["HPG", "SUS", "ZERO", "GAP"])}
+    frames["SUS"] = frames["SUS"].iloc[:-5]  # suspended for the last 5 sessions
+    frames["ZERO"].loc[50:, "volume"] = 0  # quoted, nothing traded for 10 sessions
+    frames["GAP"] = frames["GAP"].iloc[:-4]  # 4 idle sessions: still tradable
+    frames["VNINDEX"] = synthetic_ohlcv(60, seed=9, start_price=1300.0)  # the market's sessions
+    return frames
+
+
+@pytest.fixture
+def published(tmp_path, monkeypatch):
+    frames = _frames()
+    universe.publish(frames, str(tmp_path))
+    monkeypatch.setattr(universe, "reader", universe.UniverseReader(str(tmp_path), check_seconds=0))
+    monkeypatch.setattr(liquidity, "_cache", {})
+    return frames
+
+
+def test_flags_are_computed_for_the_whole_universe(published, monkeypatch):
+    screened = liquidity.screen(["HPG", "sus", "ZERO", "GAP"], now=NOW)
+    assert {symbol: flags.no_trade for symbol, flags in screened.items()} == {
+        "HPG": False, "SUS": True, "ZERO": True, "GAP": False,
+    }
+    assert screened["SUS"].idle_sessions == 5 and screened["SUS"].session == "2025-06-30"
+    assert screened["ZERO"].avg_volume_10d == 0 and screened["ZERO"].idle_sessions == 10
+    assert screened["HPG"].avg_volume_10d == pytest.approx(published["HPG"]["volume"].iloc[-10:].mean())
+    assert screened["GAP"].source.startswith("universe:")
+
+    # Outside the universe, the same flags from the symbol's own bars
+    monkeypatch.setattr(universe, "reader", universe.UniverseReader("", check_seconds=0))
+    monkeypatch.setattr(market_store.store, "price_history", lambda symbol, start, end: published[symbol])
+    for symbol, flags in liquidity.screen(list(screened), now=NOW).items():
+        assert flags.source == "market_store"
+        assert (flags.avg_volume_10d, flags.idle_sessions, flags.no_trade) == (
+            pytest.approx(screened[symbol].avg_volume_10d), screened[symbol].idle_sessions, screened[symbol].no_trade,
+        )
+
+
+def test_a_market_holiday_is_not_a_suspension(tmp_path, monkeypatch):
+    holiday = pd.bdate_range("2025-06-16", "2025-06-20")  # five weekdays without a session
+    frames = {symbol: frame[~frame["time"].isin(holiday)].reset_index(drop=True) for symbol, frame in _frames().items()}
+    frames["SUS"] = frames["HPG"][frames["HPG"]["time"] <= "2025-06-10"]  # idle since 2025-06-11
+    monkeypatch.setattr(liquidity, "_cache", {})
+    monkeypatch.setattr(market_store.store, "price_history", lambda symbol, start, end: frames[symbol])
+    day = date(2025, 6, 20)  # last weekday of the holiday
+
+    for directory in ("", str(tmp_path)):  # from the index bars, then from the universe dates
+        if directory:
+            universe.publish({s: f for s, f in frames.items() if s != "VNINDEX"}, directory)
+        monkeypatch.setattr(universe, "reader", universe.UniverseReader(directory, check_seconds=0))
+        screened = liquidity.screen(["HPG", "SUS", "GAP"], day=day)
+        assert {flags.session for flags in screened.values()} == {"2025-06-13"}
+        assert screened["HPG"].idle_sessions == 0 and not screened["HPG"].no_trade
+        assert screened["SUS"].idle_sessions == 3 and not screened["SUS"].no_trade
+    # The sessions after the holiday count, the holiday itself does not
+    assert liquidity.screen(["SUS"], day=date(2025, 6, 24))["SUS"].idle_sessions == 5
+
+
+def test_unreadable_prices_do_not_screen_a_symbol_out(monkeypatch):
+    monkeypatch.setattr(universe, "reader", universe.UniverseReader("", check_seconds=0))
+
+    def failing(symbol, start, end):
+        raise ValueError("nguồn dữ liệu lỗi")
+
+    monkeypatch.setattr(market_store.store, "price_history", failing)
+    flags = liquidity.screen(["HPG"], day=date(2025, 6, 27))["HPG"]
+    assert flags.outcome == "unknown" and not flags.no_trade
+    assert liquidity.check("HPG", date(2025, 6, 27)) is None
+    assert liquidity.flags(np.zeros((2, 0)), np.zeros((2, 0)))[1].tolist() == [0, 0]
+
+
+def test_suspended_symbols_get_the_no_trade_decision_without_a_crew(published, tmp_path, monkeypatch):
+    monkeypatch.setattr(usage, "store", usage.UsageStore(str(tmp_path / "usage.sqlite3")))
+    monkeypatch.setattr(analysis_cache, "cache", analysis_cache.AnalysisCache(""))
+    monkeypatch.setattr(market_store.store, "company_info", lambda symbol: ("Công ty SUS", "Thép"))
+
+    def no_crew():
+        raise AssertionError("crew không được chạy cho mã no-trade")
+
+    monkeypatch.setattr(api, "VnStockAdvisor", no_crew)
+    response = TestClient(api.app).post("/analyze/decision", json={"symbol": "SUS", "current_date": "2025-06-30"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["decision"] == "GIỮ" and body["conviction"] == 0.0
+    assert (body["buy_price"], body["sell_price"]) == (0.0, 0.0)
+    assert body["full_name"] == "Công ty SUS" and "5 phiên" in body["tech_reasoning"]
+    assert body["usage"]["calls"] == 0
+    screened = TestClient(api.app).get("/liquidity/sus", params={"day": "2025-06-30"}).json()
+    assert screened["no_trade"] is True and screened["idle_sessions"] == 5
+
+    result = liquidity.no_trade_result(liquidity.check("SUS", date(2025, 6, 30)), "2025-06-30")
+    fields = portfolio.decision_fields(result)
+    assert fields["buy_price"] is None and fields["no_trade"] is True
+    assert evaluation.decision_problems(fields) == []
+    assert "thiếu trường buy_price" in evaluation.decision_problems({**fields, "conviction": 0.6})
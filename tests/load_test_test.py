@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.load_test import _parse_process_metrics, summarize, sustained_level
+from vn_stock_advisor import api, replay
+
+
+def test_summarize_reports_percentiles_and_rates():
+    results = [{"endpoint": "complete", "status": 200, "seconds": s} for s in (1.0, 2.0, 3.0, 4.0)]
+    results += [
+        {"endpoint": "complete", "status": 408, "seconds": 10.0},
+        {"endpoint": "technical", "status": "timeout", "seconds": 30.0},
+    ]
+    samples = [{"t": 0, "cpu_percent": None, "rss_mib": 400.0}, {"t": 1, "cpu_percent": 80.0, "rss_mib": 450.0}]
+
+    summary = summarize(results, elapsed=2.0, samples=samples)
+    assert summary["requests"] == 6
+    assert summary["throughput_rps"] == 2.0
+    assert summary["latency"]["p50"] == 2.5
+    assert summary["error_rate"] == pytest.approx(2 / 6)
+    assert summary["http_408_rate"] == pytest.approx(1 / 6)
+    assert summary["timeout_rate"] == pytest.approx(1 / 6)
+    assert summary["by_endpoint"]["technical"]["latency"]["p50"] is None
+    assert summary["server"]["cpu_percent_mean"] == 80.0
+    assert summary["server"]["rss_mib_max"] == 450.0
+
+
+def test_sustained_level_respects_error_rate_and_slo():
+    levels = [
+        {"level": {"concurrency": 1}, "error_rate": 0.0, "latency": {"p95": 2.0}},
+        {"level": {"concurrency": 4}, "error_rate": 0.0, "latency": {"p95": 9.0}},
+        {"level": {"concurrency": 8}, "error_rate": 0.2, "latency": {"p95": 20.0}},
+    ]
+    assert sustained_level(levels, max_error_rate=0.01, slo_p95=None) == {"concurrency": 4}
+    assert sustained_level(levels, max_error_rate=0.01, slo_p95=5.0) == {"concurrency": 1}
+
+
+def test_parse_process_metrics():
+    text = "# TYPE process_cpu_seconds_total counter\nprocess_cpu_seconds_total 1.5\nprocess_resident_memory_bytes 1048576.0\n"
+    assert _parse_process_metrics(text) == {"process_cpu_seconds_total": 1.5, "process_resident_memory_bytes": 1048576.0}
+
+
+def test_crew_runs_offline_on_mock_providers(mock_providers):
+    response = TestClient(api.app).post("/analyze/decision", json={"symbol": "FPT"})
+    assert response.status_code == 200
+    assert response.json()["decision"] == "GIỮ"
+
+
+def test_complete_analysis_times_out_with_408(mock_providers, monkeypatch):
+    replay.configure(latency_ms={"*": 0, "llm": 500})
+    monkeypatch.setattr(api, "COMPLETE_TIMEOUT_SECONDS", 0.2)
+    response = TestClient(api.app).post("/analyze/complete", json={"symbol": "FPT"})
+    assert response.status_code == 408
@@ -0,0 +1,96 @@
+import threading
+from datetime import date, datetime
+
+import pytest
+
+from vn_stock_advisor import macro_digest
+
+
+NOW = datetime(2025, 6, 28, 9, 0)  # Saturday: the trading day is Friday 2025-06-27
+
+
+class FakeLLM:
+    model = "fake"
+
+    def __init__(self):
+        self.prompts = []
+
+    def call(self, messages):
+        self.prompts.append(messages[0]["content"])
+        return "- Lãi suất ổn định"
+
+
+@pytest.fixture
+def digest_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(macro_digest, "MACRO_DIGEST_DIR", str(tmp_path))
+    monkeypatch.setattr(macro_digest, "_failed_at", {})
+    monkeypatch.setattr(macro_digest, "_search", lambda queries: [
+        {"title": "NHNN giữ lãi suất", "link": "https://vneconomy.vn/a", "date": "", "snippet": "..."}
+    ])
+    return tmp_path
+
+
+def test_weekends_belong_to_friday():
+    assert macro_digest.trading_day(date(2025, 6, 28)) == date(2025, 6, 27)
+    assert macro_digest.trading_day(date(2025, 6, 30)) == date(2025, 6, 30)
+
+
+def test_digest_is_built_once_per_trading_day(digest_dir, monkeypatch):
+    llm = FakeLLM()
+    monkeypatch.setattr(macro_digest, "build", lambda day, now=None, _build=macro_digest.build: _build(
+        day, llm=llm, now=NOW,
+    ))
+
+    threads = [threading.Thread(target=macro_digest.get, args=(date(2025, 6, 28),)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    digest = macro_digest.get(date(2025, 6, 27))
+    assert len(llm.prompts) == 1
+    assert "NHNN giữ lãi suất" in llm.prompts[0]
+    assert digest.day == "2025-06-27"
+    assert digest.sources == [{"title": "NHNN giữ lãi suất", "link": "https://vneconomy.vn/a"}]
+    assert (digest_dir / "2025-06-27.json").exists()
+
+    macro_digest.get(date(2025, 6, 27), refresh=True)
+    assert len(llm.prompts) == 2
+
+
+def test_digest_text_falls_back_when_build_fails(digest_dir, monkeypatch):
+    calls = []
+
+    def failing_build(day, now=None):
+        calls.append(day)
+        raise ConnectionError("search down")
+
+    monkeypatch.setattr(macro_digest, "build", failing_build)
+    assert macro_digest.digest_text(date(2025, 6, 30)) == macro_digest.UNAVAILABLE
+    assert macro_digest.digest_text(date(2025, 6, 30)) == macro_digest.UNAVAILABLE
+    assert len(calls) == 1
+
+
+def test_past_days_are_never_built(digest_dir):
+    llm = FakeLLM()
+    with pytest.raises(macro_digest.PastDayError):
+        macro_digest.build(date(2025, 6, 26), llm=llm, now=NOW)
+    assert macro_digest.digest_text(date(2025, 6, 26), now=NOW) == macro_digest.UNAVAILABLE
+    assert llm.prompts == [] and not list(digest_dir.iterdir())
+
+    # A digest stored on its own day keeps being served afterwards
+    macro_digest.build(date(2025, 6, 27), llm=llm, now=NOW)
+    assert macro_digest.digest_text(date(2025, 6, 27), now=datetime(2025, 7, 3)) == "- Lãi suất ổn định"
+    with pytest.raises(macro_digest.PastDayError):
+        macro_digest.get(date(2025, 6, 27), refresh=True, now=datetime(2025, 7, 3))
+
+
+def test_the_crew_injects_the_digest_itself(monkeypatch):
+    from vn_stock_advisor import crew
+
+    monkeypatch.setattr(macro_digest, "digest_text", lambda day=None: f"Bản tin vĩ mô {day}")
+    advisor = crew.VnStockAdvisor()
+    advisor.crew()
+    inputs = advisor.share_inputs({"symbol": "HPG", "current_date": "2025-06-27"})
+    assert inputs["macro_digest"] == "Bản tin vĩ mô 2025-06-27"
+    assert advisor.share_inputs({"symbol": "HPG", "macro_digest": ""})["macro_digest"] == ""
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import cancellation, market_data
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    def configure(*names):
+        monkeypatch.setattr(market_data, "SOURCES", names)
+        for name in names:
+            market_data._breakers.pop(name, None)
+            market_data._latencies.pop((name, "demo"), None)
+    return configure
+
+
+def fetcher(behaviour):
+    def fetch(source):
+        delay, value = behaviour[source]
+        time.sleep(delay)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return fetch
+
+
+def test_hanging_sources_are_bounded_and_cancellable(sources, monkeypatch):
+    sources("HANG1", "HANG2")
+    monkeypatch.setattr(market_data, "HEDGE_DEFAULT_SECONDS", 0.05)
+    monkeypatch.setattr(market_data, "WAIT_SLICE_SECONDS", 0.05)
+    monkeypatch.setattr(market_data, "MARKET_DATA_TIMEOUT_SECONDS", 0.3)
+    fetch = fetcher({"HANG1": (2.0, "late"), "HANG2": (2.0, "late")})
+    start = time.perf_counter()
+    with pytest.raises(market_data.DataSourceError, match="quá 0.3 giây"):
+        market_data._fetch("AAA", "demo", fetch)
+    assert time.perf_counter() - start < 1.0
+
+    monkeypatch.setattr(market_data, "MARKET_DATA_TIMEOUT_SECONDS", 60)
+    token = cancellation.CancellationToken("test")
+    threading.Timer(0.2, token.cancel).start()
+    start = time.perf_counter()
+    with pytest.raises(cancellation.RunCancelledError):
+        token.run(market_data._fetch, "AAA", "demo", fetch)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_fails_over_to_next_source(sources):
+    sources("DOWN1", "UP1")
+    fetch = fetcher({"DOWN1": (0, ConnectionError("timeout")), "UP1": (0, "ok")})
+    assert market_data._fetch("AAA", "demo", fetch) == "ok"
+    assert market_data.DATA_SERVED.value(call="demo", source="UP1") == 1
+
+
+def test_hedges_slow_primary(sources, monkeypatch):
+    sources("SLOW2", "FAST2")
+    monkeypatch.setattr(market_data, "HEDGE_DEFAULT_SECONDS", 0.05)
+    fetch = fetcher({"SLOW2": (1.0, "slow"), "FAST2": (0.01, "fast")})
+    start = time.perf_counter()
+    assert market_data._fetch("AAA", "demo", fetch) == "fast"
+    assert time.perf_counter() - start < 0.5
+    assert market_data.DATA_HEDGES.value(call="demo") >= 1
+
+
+def test_circuit_opens_and_probes_after_reset(sources):
+    sources("FLAKY3")
+    breaker = market_data.breaker("FLAKY3")
+    breaker.failure_threshold, breaker.reset_seconds = 2, 0.1
+    fetch = fetcher({"FLAKY3": (0, ConnectionError("down"))})
+    for _ in range(2):
+        with pytest.raises(market_data.DataSourceError):
+            market_data._fetch("AAA", "demo", fetch)
+    assert breaker.state == breaker.OPEN
+    with pytest.raises(market_data.DataSourceError, match="tạm ngắt"):
+        market_data._fetch("AAA", "demo", fetch)
+
+    time.sleep(0.12)
+    assert market_data._fetch("AAA", "demo", fetcher({"FLAKY3": (0, "back")})) == "back"
+    assert breaker.state == breaker.CLOSED
+
+
+def test_empty_frame_counts_as_failure(sources):
+    sources("EMPTY4", "FULL4")
+    fetch = fetcher({"EMPTY4": (0, pd.DataFrame()), "FULL4": (0, synthetic_ohlcv(5))})
+    result = market_data._fetch("AAA", "demo", fetch, market_data.normalize_prices)
+    assert len(result) == 5
+
+
+def test_vci_schemas_are_normalized():
+    columns = pd.MultiIndex.from_tuples([
+        ("Meta", "yearReport"), ("Meta", "lengthReport"),
+        ("Chỉ tiêu định giá", "P/E"), ("Chỉ tiêu định giá", "P/B"),
+        ("Chỉ tiêu khả năng sinh lợi", "ROE (%)"), ("Chỉ tiêu cơ cấu nguồn vốn", "Debt/Equity"),
+    ])
+    ratios = pd.DataFrame([[2024, 3, 10.0, 1.5, 0.18, 0.9], [2024, 4, 11.0, 1.6, 0.2, 0.8]], columns=columns)
+    normalized = market_data.normalize_ratios(ratios, "VCI")
+    assert normalized.iloc[0]["price_to_earning"] == 11.0
+    assert normalized.iloc[0]["debt_on_equity"] == 0.8
+
+    income = pd.DataFrame({
+        "yearReport": [2024, 2024], "lengthReport": [3, 4],
+        "Revenue (Bn. VND)": [1.2e13, 1.5e13], "Gross Profit": [3e12, 4e12],
+        "Attribute to parent company (Bn. VND)": [1e12, 2e12],
+    })
+    normalized = market_data.normalize_income(income, "VCI")
+    assert normalized.iloc[0][["revenue", "gross_profit", "post_tax_profit"]].tolist() == [15000.0, 4000.0, 2000.0]
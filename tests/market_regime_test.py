@@ -0,0 +1,136 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import cancellation, crew, market_regime, universe
+
+
+def test_breadth_matches_per_symbol_rolling_means():
+    frames = [synthetic_ohlcv(260, seed=seed) for seed in range(30)]
+    closes = np.array([frame["close"].to_numpy() for frame in frames])
+    closes[0, -1] = np.nan  # did not trade on the session
+    closes[1, :150] = np.nan  # listed too recently for SMA200
+    closes[2, -1] = closes[2, -2]  # unchanged
+
+    stats = market_regime.breadth(closes, min_symbols=10)
+    above = {50: [], 200: []}
+    for row in range(2, 30):
+        series = pd.Series(closes[row])
+        for window in above:
+            above[window].append(series.iloc[-1] > series.rolling(window).mean().iloc[-1])
+    # Row 1 still has SMA50 history
+    series = pd.Series(closes[1])
+    above[50].append(series.iloc[-1] > series.rolling(50).mean().iloc[-1])
+    assert stats["symbols"] == 29
+    assert stats["above_sma200"] == pytest.approx(np.mean(above[200]))
+    assert stats["above_sma50"] == pytest.approx(np.mean(above[50]))
+    change = closes[1:, -1] - closes[1:, -2]
+    assert (stats["advancers"], stats["decliners"], stats["unchanged"]) == (
+        int((change > 0).sum()), int((change < 0).sum()), int((change == 0).sum()),
+    )
+    assert stats["advance_decline"] == pytest.approx(stats["advancers"] / stats["decliners"], abs=1e-4)
+
+    # Too few symbols for a meaningful breadth
+    assert market_regime.breadth(closes[:5], min_symbols=10)["above_sma200"] is None
+    assert market_regime.index_trend(closes[3, -100:])["index_sma200"] is None
+
+
+def _trending(slope: float, seed: int) -> pd.DataFrame:
+    frame = synthetic_ohlcv(260, seed=seed)
+    return frame.assign(close=np.linspace(100, 100 + slope * 259, 260) + frame["close"].to_numpy() * 0.01)
+
+
+def test_regime_is_computed_once_per_session(tmp_path, monkeypatch):
+    frames = {f"S{i:02d}": _trending(0.5 if i < 18 else -0.3, seed=i) for i in range(25)}
+    frames["VNINDEX"] = _trending(1.0, seed=99)
+    universe.publish(frames, str(tmp_path))
+    monkeypatch.setattr(universe, "reader", universe.UniverseReader(str(tmp_path), check_seconds=0))
+    monkeypatch.setattr(market_regime, "_cache", {})
+    calls = []
+    compute = market_regime.compute
+    monkeypatch.setattr(market_regime, "compute", lambda session: calls.append(session) or compute(session))
+
+    now = datetime(2025, 7, 1, 10, 0)  # session of 2025-07-01 still open
+    regime = market_regime.get(now=now)
+    assert regime.session == "2025-06-30" and regime.source.startswith("universe:")
+    assert regime.symbols == 25
+    assert regime.above_sma200 == pytest.approx(18 / 25)
+    assert regime.index_close > regime.index_sma200 and regime.risk_on is True
+    assert "risk_on_condition THỎA" in regime.text()
+    assert market_regime.get(date(2025, 6, 30), now=now) is regime
+    assert calls == [date(2025, 6, 30)]
+
+    # An earlier session only sees the sessions up to it
+    earlier = market_regime.get(date(2025, 6, 27), now=now)
+    assert earlier.session == "2025-06-27" and earlier.index_close < regime.index_close
+
+
+def test_the_strategist_receives_the_regime(monkeypatch):
+    monkeypatch.setattr(market_regime, "regime_text", lambda day=None: f"Chế độ thị trường phiên {day}")
+    advisor = crew.VnStockAdvisor()
+    advisor.crew()
+    inputs = advisor.share_inputs({"symbol": "HPG", "current_date": "2025-06-27"})
+    assert inputs["market_regime"] == "Chế độ thị trường phiên 2025-06-27"
+    # Callers that computed it already are not overridden
+    assert advisor.share_inputs({"symbol": "HPG", "market_regime": "sẵn có"})["market_regime"] == "sẵn có"
+    assert "{market_regime}" in advisor.investment_decision().description
+
+
+def test_a_universe_behind_the_session_falls_back_to_the_store(tmp_path, monkeypatch):
+    frames = {f"S{i:02d}": _trending(0.5, seed=i) for i in range(25)}
+    frames["VNINDEX"] = _trending(1.0, seed=99)
+    universe.publish({symbol: frame.iloc[:-3] for symbol, frame in frames.items()}, str(tmp_path))
+    monkeypatch.setattr(universe, "reader", universe.UniverseReader(str(tmp_path), check_seconds=0))
+    monkeypatch.setattr(universe, "UNIVERSE_SYMBOLS", list(frames))
+    monkeypatch.setattr(market_regime, "_cache", {})
+    monkeypatch.setattr(market_regime.market_store.store, "price_history", lambda symbol, start, end: frames[symbol])
+
+    regime = market_regime.get(now=datetime(2025, 7, 1, 10, 0))
+    assert regime.source == "market_store" and regime.session == "2025-06-30"
+    assert regime.symbols == 25
+
+    # Without the last sessions anywhere, the regime says which session it describes
+    monkeypatch.setattr(market_regime.market_store.store, "price_history",
+                        lambda symbol, start, end: frames[symbol].iloc[:-3])
+    monkeypatch.setattr(market_regime, "_cache", {})
+    assert market_regime.get(now=datetime(2025, 7, 1, 10, 0)).session == "2025-06-25"
+
+
+def test_concurrent_callers_share_one_computation(monkeypatch):
+    monkeypatch.setattr(market_regime, "_cache", {})
+    monkeypatch.setattr(universe, "reader", universe.UniverseReader("", check_seconds=0))
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def compute(session):
+        calls.append(session)
+        started.set()
+        release.wait(5)
+        if len(calls) == 1:
+            raise cancellation.RunCancelledError("Phân tích đã bị hủy (timeout)")
+        return f"chế độ {session}"
+
+    monkeypatch.setattr(market_regime, "compute", compute)
+    now = datetime(2025, 7, 1, 10, 0)
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(market_regime.get, now=now)
+        started.wait(5)
+        follower = pool.submit(market_regime.get, now=now)
+        time.sleep(0.1)
+        release.set()
+        # The leader's run was cancelled; the follower's was not and computes in its place
+        with pytest.raises(cancellation.RunCancelledError):
+            leader.result(5)
+        assert follower.result(5) == "chế độ 2025-06-30"
+    assert calls == [date(2025, 6, 30)] * 2
+
+    token = cancellation.CancellationToken()
+    token.cancel("timeout")
+    monkeypatch.setattr(market_regime, "get", lambda day=None: token.check())
+    with pytest.raises(cancellation.RunCancelledError):
+        market_regime.regime_text()
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_fundamentals, synthetic_ohlcv
+from vn_stock_advisor import market_data, market_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    calls = []
+    history = synthetic_ohlcv(120)
+
+    def price_history(symbol, start, end, interval="1D"):
+        calls.append(("prices", start, end))
+        return history[(history["time"] >= start) & (history["time"] <= pd.Timestamp(end) + pd.Timedelta(days=1))]
+
+    def financial_ratios(symbol, period="quarter"):
+        calls.append(("ratios", period))
+        return synthetic_fundamentals()[0]
+
+    monkeypatch.setattr(market_data, "price_history", price_history)
+    monkeypatch.setattr(market_data, "financial_ratios", financial_ratios)
+    monkeypatch.setattr(market_data, "company_info", lambda symbol: calls.append(("company",)) or ("Công ty AAA", "Thép"))
+    store = market_store.MarketStore(str(tmp_path / "store.sqlite3"))
+    store.calls = calls
+    return store
+
+
+def test_calendar_maps_weekends_and_pre_open_to_previous_session():
+    assert market_store.latest_session(datetime(2025, 6, 28, 12)) == datetime(2025, 6, 27).date()
+    assert market_store.latest_session(datetime(2025, 6, 30, 8, 30)) == datetime(2025, 6, 27).date()
+    assert market_store.latest_session(datetime(2025, 6, 30, 9, 30)) == datetime(2025, 6, 30).date()
+    assert market_store.next_session(datetime(2025, 6, 27).date()) == datetime(2025, 6, 30).date()
+
+
+def test_prices_are_served_locally_after_close_and_fetched_incrementally(store):
+    after_close = datetime(2025, 6, 27, 16)
+    first = store.price_history("AAA", "2025-03-01", "2025-06-27", now=after_close)
+    second = store.price_history("AAA", "2025-03-01", "2025-06-27", now=after_close)
+    assert [c[0] for c in store.calls] == ["prices"]
+    pd.testing.assert_frame_equal(first, second)
+    assert first["time"].iloc[-1] == pd.Timestamp("2025-06-27")
+    assert list(first.columns) == ["time", *market_store.PRICE_COLUMNS]
+
+    # Next session: only the days since the last stored bar are fetched
+    store.price_history("AAA", "2025-03-01", "2025-06-30", now=datetime(2025, 6, 30, 10))
+    assert store.calls[-1] == ("prices", "2025-06-27", "2025-06-30")
+
+
+def test_intraday_fetches_are_reused_for_the_ttl(store, monkeypatch):
+    monkeypatch.setattr(market_store, "MARKET_STORE_INTRADAY_TTL_SECONDS", 60)
+    store.price_history("AAA", "2025-03-01", "2025-06-27", now=datetime(2025, 6, 27, 10))
+    store.price_history("AAA", "2025-03-01", "2025-06-27", now=datetime(2025, 6, 27, 10, 0, 30))
+    assert len(store.calls) == 1
+    store.price_history("AAA", "2025-03-01", "2025-06-27", now=datetime(2025, 6, 27, 10, 5))
+    assert len(store.calls) == 2
+
+
+def test_fundamentals_are_refetched_only_when_due(store):
+    ratios = store.financial_ratios("AAA")
+    pd.testing.assert_frame_equal(ratios, store.financial_ratios("AAA"), check_dtype=False)
+    assert store.company_info("AAA") == ("Công ty AAA", "Thép")
+    store.company_info("AAA")
+    assert [c[0] for c in store.calls] == ["ratios", "company"]
+
+    store.financial_ratios("AAA", max_age_days=0)
+    assert [c[0] for c in store.calls] == ["ratios", "company", "ratios"]
+
+
+def test_snapshots_are_computed_once_per_fingerprint(store):
+    computed = []
+    frame = synthetic_ohlcv(30)
+    compute = lambda: computed.append(1) or {"rsi": 55.0}
+    assert store.snapshot("AAA", "indicators", market_store.fingerprint(frame), compute) == {"rsi": 55.0}
+    store.snapshot("AAA", "indicators", market_store.fingerprint(frame), compute)
+    assert len(computed) == 1
+
+    # Survives a restart, recomputed when a new bar arrives
+    reopened = market_store.MarketStore(store.path)
+    reopened.snapshot("AAA", "indicators", market_store.fingerprint(frame), compute)
+    assert len(computed) == 1
+    reopened.snapshot("AAA", "indicators", market_store.fingerprint(synthetic_ohlcv(31)), compute)
+    assert len(computed) == 2
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from vn_stock_advisor import metrics
+from vn_stock_advisor.api import app
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    histogram = metrics.Histogram("demo_seconds", "Demo.", labelnames=("stage",), buckets=(0.1, 1), registry=registry)
+    histogram.observe(0.05, stage="llm")
+    histogram.observe(0.5, stage="llm")
+    histogram.observe(5, stage="llm")
+
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="llm",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{stage="llm"} 3' in text
+
+
+def test_metric_rejects_wrong_labels():
+    counter = metrics.Counter("demo_total", "Demo.", labelnames=("name",), registry=metrics.Registry())
+    with pytest.raises(ValueError):
+        counter.inc(stage="llm")
+
+
+def test_span_records_histogram_breakdown_and_errors():
+    with metrics.collect_timings() as breakdown:
+        with metrics.span("data_source", "test.ok"):
+            pass
+        with pytest.raises(RuntimeError):
+            with metrics.span("data_source", "test.fail"):
+                raise RuntimeError("boom")
+
+    summary = breakdown.summary()
+    assert summary["stages"]["data_source"]["count"] == 2
+    assert [s["name"] for s in summary["spans"]] == ["test.ok", "test.fail"]
+    assert summary["spans"][1]["error"] is True
+    assert metrics.STAGE_SECONDS.snapshot(stage="data_source", name="test.ok")["count"] >= 1
+    assert metrics.STAGE_ERRORS.value(stage="data_source", name="test.fail") >= 1
+    assert metrics.current_breakdown() is None
+
+
+def test_breakdown_follows_copied_context_into_threads():
+    import contextvars
+
+    with metrics.collect_timings() as breakdown:
+        context = contextvars.copy_context()
+
+    def worker():
+        with metrics.task_scope("technical_analysis"), metrics.span("tool", "test.thread"):
+            assert metrics.current_task() == "technical_analysis"
+
+    thread = threading.Thread(target=context.run, args=(worker,))
+    thread.start()
+    thread.join()
+    assert [s["name"] for s in breakdown.summary()["spans"]] == ["test.thread"]
+
+
+def test_metrics_endpoint_exposes_request_histogram():
+    client = TestClient(app)
+    assert client.get("/health").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'vn_stock_advisor_http_request_duration_seconds_count{method="GET",path="/health",status="200"}' in response.text
+
+
+def test_process_metrics_are_exposed():
+    values = {}
+    for line in metrics.render().splitlines():
+        name, _, value = line.partition(" ")
+        values[name] = value
+    assert float(values["process_cpu_seconds_total"]) > 0
+    assert float(values["process_resident_memory_bytes"]) > 0
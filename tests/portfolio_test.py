@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from vn_stock_advisor import analysis_cache, api, liquidity, market_store, portfolio, usage
+
+
+def test_weights_are_merged_and_normalized():
+    assert portfolio.normalize_weights([("hpg", 2), ("FPT", 1), ("HPG", 1)]) == {"HPG": 0.75, "FPT": 0.25}
+    assert portfolio.normalize_weights([("HPG", None), ("FPT", None)]) == {"HPG": 0.5, "FPT": 0.5}
+    for holdings in ([("HPG", 1), ("FPT", None)], [("HPG", 0)], [("HPG", -1), ("FPT", 2)]):
+        with pytest.raises(ValueError):
+            portfolio.normalize_weights(holdings)
+
+
+def test_aggregates_match_the_textbook_formulas():
+    rng = np.random.default_rng(7)
+    index = pd.bdate_range("2025-01-01", periods=250)
+    market = rng.normal(0, 0.01, len(index))
+    returns = pd.DataFrame({
+        "HPG": market + rng.normal(0, 0.01, len(index)),
+        "HSG": market + rng.normal(0, 0.01, len(index)),
+        "FPT": rng.normal(0, 0.015, len(index)),
+    }, index=index)
+    closes = 20_000 * (1 + returns).cumprod()
+    # A suspension only removes the sessions it covers
+    closes.loc[index[100:110], "FPT"] = np.nan
+    holdings = [
+        {"symbol": "HPG", "weight": 0.5, "decision": "MUA", "overall_score": 8.0, "industry": "Thép"},
+        {"symbol": "HSG", "weight": 0.3, "decision": "GIỮ", "overall_score": 6.0, "industry": "Thép"},
+        {"symbol": "FPT", "weight": 0.2, "decision": "MUA", "overall_score": None, "industry": "Công nghệ"},
+    ]
+
+    aggregates = portfolio.aggregate(holdings, closes)
+    assert aggregates["weighted_score"] == pytest.approx((0.5 * 8 + 0.3 * 6) / 0.8)
+    assert aggregates["decision_mix"] == {"MUA": 0.7, "GIỮ": 0.3, "BÁN": 0.0}
+    assert aggregates["industries"]["top"] == "Thép"
+    assert aggregates["industries"]["hhi"] == pytest.approx(0.8 ** 2 + 0.2 ** 2)
+
+    risk = aggregates["risk"]
+    daily = closes.pct_change(fill_method=None).iloc[1:]
+    w = np.array([0.5, 0.3, 0.2])
+    expected = np.sqrt(w @ (daily.cov().to_numpy() * 252) @ w)
+    assert risk["volatility_annual"] == pytest.approx(expected, rel=1e-5)
+    correlation = np.array(risk["correlation"]["matrix"])
+    assert correlation[0, 1] == pytest.approx(daily["HPG"].corr(daily["HSG"]), abs=1e-4)
+    assert correlation[0, 1] > 0.3 and abs(correlation[0, 2]) < 0.2
+    assert risk["diversification_ratio"] > 1
+
+
+def test_portfolio_only_pays_for_uncached_symbols(mock_providers):
+    client = TestClient(api.app)
+    first = client.post("/analyze/portfolio", json={"holdings": [{"symbol": "HPG"}, {"symbol": "FPT"}]})
+    assert first.status_code == 200
+    body = first.json()
+    assert [holding["weight"] for holding in body["holdings"]] == [0.5, 0.5]
+    assert not any(holding["cached"] for holding in body["holdings"])
+    assert body["usage"]["calls"] > 0
+    assert sum(body["aggregates"]["decision_mix"].values()) == pytest.approx(1.0)
+    assert body["aggregates"]["risk"]["covered_weight"] == pytest.approx(1.0)
+
+    # HPG and FPT come from the first request; only VNM runs a crew
+    second = client.post("/analyze/portfolio", json={
+        "holdings": [{"symbol": "hpg", "weight": 2}, {"symbol": "FPT", "weight": 1}, {"symbol": "VNM", "weight": 1}],
+    }).json()
+    assert [holding["cached"] for holding in second["holdings"]] == [True, True, False]
+    assert [entry["calls"] > 0 for entry in second["usage"]["by_symbol"]] == [False, False, True]
+
+    assert client.post("/analyze/portfolio", json={"holdings": []}).status_code == 422
+    assert client.post("/analyze/portfolio", json={"holdings": [{"symbol": "HPG", "weight": 0}]}).status_code == 422
+
+
+def test_concurrent_portfolios_share_the_crew_runs_and_their_limit(monkeypatch):
+    monkeypatch.setattr(analysis_cache, "cache", analysis_cache.AnalysisCache(""))
+    monkeypatch.setattr(portfolio, "PORTFOLIO_CONCURRENCY", 2)
+    monkeypatch.setattr(portfolio, "price_matrix", lambda symbols: pd.DataFrame())
+    monkeypatch.setattr(market_store.store, "company_info", lambda symbol: (symbol, "Thép"))
+    runs, running, peak = [], [], []
+
+    async def kickoff(inputs, endpoint, timeout=None, refresh=False):
+        runs.append(inputs["symbol"])
+        running.append(inputs["symbol"])
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(inputs["symbol"])
+        flags = liquidity.Liquidity(inputs["symbol"], inputs["current_date"], 0.0, 10, True, "test")
+        return liquidity.no_trade_result(flags, inputs["current_date"]), usage.UsageLedger(inputs["symbol"], endpoint)
+
+    monkeypatch.setattr(api, "_kickoff", kickoff)
+
+    async def post_both():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            requests = [
+                client.post("/analyze/portfolio", json={"holdings": holdings, "current_date": "2025-06-30"})
+                for holdings in ([{"symbol": "HPG"}, {"symbol": "FPT"}, {"symbol": "VNM"}],
+                                 [{"symbol": "FPT"}, {"symbol": "VNM"}, {"symbol": "MWG"}])
+            ]
+            return [response.json() for response in await asyncio.gather(*requests)]
+
+    first, second = asyncio.run(post_both())
+    assert sorted(runs) == ["FPT", "HPG", "MWG", "VNM"]
+    assert max(peak) == 2 and all(holding["decision"] == "GIỮ" for holding in second["holdings"])
+    # Each run is paid for once, by the request that started it
+    assert sum(holding["cached"] for holding in first["holdings"] + second["holdings"]) == 2
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import price_arrays
+from vn_stock_advisor.tools.custom_tool import TechDataTool
+
+
+def test_price_bars_are_compact_read_only_arrays():
+    frame = synthetic_ohlcv(200)
+    bars = price_arrays.PriceBars.from_frame(frame)
+
+    assert len(bars) == 200
+    assert bars.close.dtype == np.float32 and bars.volume.dtype == np.int64
+    assert bars.nbytes == 200 * (8 + 4 * 4 + 8)
+    assert price_arrays.PriceBars.from_frame(bars) is bars
+    with pytest.raises(ValueError):
+        bars.close[0] = 0
+    assert bars.frame()["time"].tolist() == frame["time"].tolist()
+
+
+def test_indicators_share_the_bars_and_match_pandas():
+    bars = price_arrays.PriceBars.from_frame(synthetic_ohlcv(300))
+    indicators = TechDataTool()._calculate_indicators(bars)
+
+    assert indicators.bars is bars
+    assert indicators["SMA_20"] is indicators["BB_Middle"]
+    assert all(not indicators[name].flags.writeable for name in indicators)
+    # 11 float32 price indicators (BB_Middle is SMA_20), 5 float64 volume ones and int64 OBV
+    assert indicators.nbytes == 300 * (4 * 11 + 8 * 5 + 8)
+    assert indicators["Volume_SMA_20"].dtype == np.float64 and indicators["RSI_14"].dtype == np.float32
+
+    close = pd.Series(bars.close, dtype=np.float64)
+    std = close.rolling(20).std()
+    delta = close.diff()
+    rs = delta.where(delta > 0, 0).rolling(14).mean() / (-delta.where(delta < 0, 0)).rolling(14).mean()
+    obv = (np.sign(delta.fillna(0)) * bars.volume).cumsum() + bars.volume[0]
+    latest = indicators.latest()
+    assert latest["SMA_200"] == pytest.approx(close.tail(200).mean(), rel=1e-6)
+    assert latest["BB_Upper"] == pytest.approx(close.tail(20).mean() + 2 * std.iloc[-1], rel=1e-6)
+    assert latest["RSI_14"] == pytest.approx(100 - 100 / (1 + rs.iloc[-1]), rel=1e-5)
+    assert latest["OBV"] == obv.iloc[-1]
+    assert latest["time"] == pd.Timestamp("2025-06-30")
+
+
+def test_pivot_levels_match_centered_rolling_extremes():
+    frame = synthetic_ohlcv(250, seed=3)
+    highs, lows = price_arrays.pivot_levels(price_arrays.PriceBars.from_frame(frame), window=10)
+
+    high = frame["high"].astype(np.float32)
+    is_max = high.rolling(10, center=True).apply(lambda x: x.iloc[len(x) // 2] == max(x), raw=False)
+    # The quoted prices, not their float32 approximations
+    assert highs.dtype == np.float64 and highs.tolist() == frame["high"][is_max == 1].tolist()
+    low = frame["low"].astype(np.float32)
+    is_min = low.rolling(10, center=True).apply(lambda x: x.iloc[len(x) // 2] == min(x), raw=False)
+    assert lows.tolist() == frame["low"][is_min == 1].tolist()
+
+    short = price_arrays.PriceBars.from_frame(frame.head(5))
+    assert [len(levels) for levels in price_arrays.pivot_levels(short)] == [0, 0]
+
+
+def test_volume_averages_are_exact_above_float32_integers():
+    frame = synthetic_ohlcv(60).assign(volume=lambda f: 30_000_001 + np.arange(len(f)) * 2)
+    latest = price_arrays.calculate_indicators(price_arrays.PriceBars.from_frame(frame)).latest()
+    assert latest["Volume_SMA_10"] == frame["volume"].tail(10).mean() == 30_000_110
+    assert latest["Volume_Ratio_20"] == frame["volume"].iloc[-1] / frame["volume"].tail(20).mean()
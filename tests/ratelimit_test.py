@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from vn_stock_advisor import ratelimit
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_bucket_paces_requests_at_the_configured_rate():
+    # 600 rpm with a one-request bucket: one call every 0.1s after the first
+    limiter = ratelimit.RateLimiter("test-pace", ratelimit.Limit(rpm=600, burst=1 / 600))
+    start = time.perf_counter()
+    for _ in range(4):
+        limiter.acquire()
+    assert 0.28 <= time.perf_counter() - start < 1.0
+
+
+def test_token_budget_waits_and_settles_unused_tokens():
+    limiter = ratelimit.RateLimiter("test-tokens", ratelimit.Limit(tpm=60_000, burst=1 / 60))  # 1000 tokens/s
+    limiter.acquire(tokens=1000)
+    limiter.settle(reserved=1000, used=100)
+    start = time.perf_counter()
+    limiter.acquire(tokens=800)
+    assert time.perf_counter() - start < 0.05
+
+
+def test_waiters_are_served_by_priority():
+    limiter = ratelimit.RateLimiter("test-priority", ratelimit.Limit(rpm=600, burst=1 / 600))
+    limiter.acquire()
+    limiter.on_rate_limited(retry_after=0.3)
+    order = []
+
+    def worker(name, level):
+        limiter.acquire(priority=level)
+        order.append(name)
+
+    threads = [threading.Thread(target=worker, args=("background", ratelimit.BACKGROUND))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=worker, args=("interactive", ratelimit.INTERACTIVE)))
+    threads[1].start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ["interactive", "background"]
+
+
+def test_rate_limited_call_backs_off_and_retries():
+    limiter = ratelimit.RateLimiter("test-retry", ratelimit.Limit(rpm=6000))
+    ratelimit._limiters["test-retry"] = limiter
+    attempts = []
+
+    def flaky():
+        attempts.append(time.perf_counter())
+        if len(attempts) == 1:
+            raise RateLimitError('quota exceeded, "retryDelay": "0.2s"')
+        return "ok"
+
+    assert ratelimit.call("test-retry", flaky) == "ok"
+    assert attempts[1] - attempts[0] >= 0.2
+    assert ratelimit.RATE_LIMITED.value(limiter="test-retry") == 1
+    assert ratelimit.RATE_LIMIT_FACTOR.value(limiter="test-retry") < 1.0
+
+    with pytest.raises(ValueError):
+        ratelimit.call("test-retry", lambda: (_ for _ in ()).throw(ValueError("boom")))
+
+
+def test_retry_after_from_header():
+    class Response:
+        headers = {"retry-after": "7"}
+
+    error = RateLimitError("429")
+    error.response = Response()
+    assert ratelimit.retry_after(error) == 7.0
+    assert ratelimit.retry_after(RateLimitError("no hint")) is None
+
+
+def test_limit_resolution(monkeypatch):
+    monkeypatch.setattr(ratelimit, "LIMIT_OVERRIDES", {"gemini": {"rpm": 100}, "gemini/pro": {"rpm": 5, "tpm": 1000}})
+    assert ratelimit.limit_for("gemini/flash").rpm == 100
+    assert ratelimit.limit_for("gemini/pro").tpm == 1000
+    assert ratelimit.limit_for("bedrock/claude").rpm == ratelimit.DEFAULT_RPM
+
+
+def test_sqlite_store_shares_buckets_between_limiters(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    limit = ratelimit.Limit(rpm=600, burst=1 / 600)
+    first = ratelimit.RateLimiter("shared", limit, ratelimit._SQLiteStore(path))
+    second = ratelimit.RateLimiter("shared", limit, ratelimit._SQLiteStore(path))
+    first.acquire()
+    start = time.perf_counter()
+    second.acquire()
+    assert time.perf_counter() - start >= 0.08
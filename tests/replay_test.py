@@ -0,0 +1,71 @@
+import time
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import market_data, replay
+
+
+@pytest.fixture
+def replay_dir(tmp_path):
+    previous = replay.settings
+    replay.configure(mode="record", directory=str(tmp_path), strict=True, latency_ms={}, latency_scale=0.0)
+    yield tmp_path
+    replay.configure(**previous.__dict__)
+
+
+def test_record_then_replay_dataframe_and_json(replay_dir):
+    frame = synthetic_ohlcv(30)
+    assert replay.call("vnstock", {"symbol": "AAA"}, lambda: frame, label="quote") is frame
+    replay.call("llm", {"messages": ["hi"]}, lambda: "xin chào", label="t:0", extra=lambda: {"prompt_tokens": 3})
+
+    replay.configure(mode="replay")
+    replayed = replay.call("vnstock", {"symbol": "AAA"}, lambda: pytest.fail("network call in replay"), label="quote")
+    pd.testing.assert_frame_equal(replayed, frame, check_freq=False)
+
+    stored = {}
+    answer = replay.call("llm", {"messages": ["hi"]}, lambda: None, label="t:0", on_replay=stored.update)
+    assert answer == "xin chào"
+    assert stored == {"prompt_tokens": 3}
+
+
+def test_strict_miss_raises_and_non_strict_falls_back_on_label(replay_dir):
+    replay.call("vnstock", {"symbol": "AAA", "call": "company"}, lambda: ["Công ty AAA", "Thép"], label="company")
+
+    replay.configure(mode="replay")
+    with pytest.raises(replay.ReplayMissError):
+        replay.call("vnstock", {"symbol": "BBB", "call": "company"}, lambda: None, label="company")
+
+    replay.configure(strict=False)
+    assert replay.call("vnstock", {"symbol": "BBB", "call": "company"}, lambda: None, label="company") == ["Công ty AAA", "Thép"]
+    with pytest.raises(replay.ReplayMissError):
+        replay.call("vnstock", {"symbol": "BBB"}, lambda: None, label="quote")
+
+
+def test_latency_configuration(replay_dir, monkeypatch):
+    monkeypatch.setenv("REPLAY_LATENCY_MS", "llm=1200, 80")
+    settings = replay.ReplaySettings.from_env()
+    assert settings.latency_for("llm", 5.0) == 1.2
+    assert settings.latency_for("vnstock", 5.0) == 0.08
+
+    replay.call("search", {"q": "VNM"}, lambda: {"organic": []}, label="serper")
+    replay.configure(mode="replay", latency_ms={"search": 50})
+    start = time.perf_counter()
+    replay.call("search", {"q": "VNM"}, lambda: None, label="serper")
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_market_data_replays_without_vnstock(replay_dir, monkeypatch):
+    frame = synthetic_ohlcv(20)
+    replay.call(
+        "vnstock",
+        {"source": "TCBS", "symbol": "AAA", "call": "quote.history", "start": "2024-01-01", "end": "2024-02-01", "interval": "1D"},
+        lambda: frame,
+        label="TCBS.quote.history",
+    )
+    replay.configure(mode="replay")
+    monkeypatch.setattr(market_data, "Vnstock", lambda: pytest.fail("network call in replay"))
+
+    history = market_data.price_history("AAA", "2024-01-01", "2024-02-01")
+    assert list(history["close"]) == list(frame["close"])
@@ -0,0 +1,82 @@
+import json
+import time
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from vn_stock_advisor import analysis_cache, api, macro_digest, market_store, scheduler
+
+DAY = date(2025, 6, 27)
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    calls, failures = [], {}
+
+    def step(name):
+        def run(symbol, day):
+            if failures.get((symbol, name), 0) > 0:
+                failures[(symbol, name)] -= 1
+                raise RuntimeError("nguồn dữ liệu lỗi")
+            calls.append((symbol, name))
+        return run
+
+    monkeypatch.setattr(scheduler, "STEP_FUNCTIONS", {name: step(name) for name in scheduler.STEPS})
+    monkeypatch.setattr(macro_digest, "MACRO_DIGEST_ENABLED", False)
+    return calls, failures
+
+
+def test_failed_steps_resume_from_the_checkpoint(tmp_path, steps):
+    calls, failures = steps
+    failures[("FPT", "indicators")] = 1
+
+    state = scheduler.WarmupRun(DAY, ["HPG", "FPT"], state_dir=str(tmp_path), concurrency=2).run()
+    assert state["symbols"]["HPG"]["done"] == list(scheduler.STEPS)
+    assert state["symbols"]["FPT"]["done"] == ["prices", "fundamentals"]
+    assert state["symbols"]["FPT"]["attempts"] == {"indicators": 1}
+    assert state["finished_at"] is None
+    assert ("FPT", "analysis") not in calls
+
+    calls.clear()
+    resumed = scheduler.WarmupRun(DAY, ["HPG", "FPT"], state_dir=str(tmp_path)).run()
+    assert calls == [("FPT", "indicators"), ("FPT", "analysis")]
+    assert resumed["finished_at"] is not None
+    with open(tmp_path / "2025-06-27.json", encoding="utf-8") as f:
+        assert json.load(f)["symbols"]["FPT"]["error"] is None
+
+
+def test_steps_stop_after_max_attempts(tmp_path, steps):
+    calls, failures = steps
+    failures[("HPG", "prices")] = 10
+    for _ in range(3):
+        scheduler.WarmupRun(DAY, ["HPG"], state_dir=str(tmp_path), max_attempts=2).run()
+    run = scheduler.WarmupRun(DAY, ["HPG"], state_dir=str(tmp_path), max_attempts=2)
+    assert run.state["symbols"]["HPG"]["attempts"] == {"prices": 2}
+    assert run.complete
+    assert calls == []
+
+
+def test_cached_analysis_expires():
+    cache = analysis_cache.AnalysisCache("")
+    result = analysis_cache.CachedAnalysis("HPG", "", [analysis_cache.CachedTaskOutput("news", "tin")])
+    cache.put("hpg", ["2025-06-27"], result, expires=time.time() + 60)
+    assert cache.get("HPG", "2025-06-27").tasks_output[0].raw == "tin"
+    assert cache.get("HPG", "2025-06-30") is None
+    assert cache.get("HPG", "2025-06-27", now=time.time() + 120) is None
+
+
+def test_warmed_symbols_are_served_without_llm_calls(tmp_path, mock_providers):
+    session = market_store.latest_session()
+    state = scheduler.WarmupRun(session, ["FPT"], state_dir=str(tmp_path / "state")).run()
+    assert state["symbols"]["FPT"]["done"] == list(scheduler.STEPS)
+    assert state["macro_digest"] == "done"
+
+    client = TestClient(api.app)
+    # Answers for the closed session and the next one
+    for day in (session, market_store.next_session(session)):
+        response = client.post("/analyze/decision", json={"symbol": "FPT", "current_date": str(day)})
+        assert response.status_code == 200
+        assert response.json()["decision"] == "GIỮ"
+        assert response.json()["usage"]["calls"] == 0
+    assert analysis_cache.ANALYSIS_CACHE_REQUESTS.value(outcome="hit") >= 2
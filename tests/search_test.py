@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from vn_stock_advisor import cancellation, search
+from vn_stock_advisor.tools.custom_tool import SearchTool
+
+
+def counting(result):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return result
+    return fetch, calls
+
+
+def test_normalized_queries_share_an_entry(tmp_path):
+    cache = search.SearchCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    fetch, calls = counting({"organic": [1]})
+    cache.get_or_fetch("Lãi suất  Việt Nam!", fetch, locale="vn")
+    cache.get_or_fetch("lãi suất việt nam", fetch, locale="vn")
+    assert len(calls) == 1
+    cache.get_or_fetch("lãi suất việt nam", fetch, locale="en")
+    assert len(calls) == 2
+    # Word order is part of the query
+    cache.get_or_fetch("việt nam lãi suất", fetch, locale="vn")
+    assert len(calls) == 3
+    assert search.normalize_query("HPG mua lại DXG") != search.normalize_query("DXG mua lại HPG")
+
+
+def test_ttl_and_date_bucket_expire_entries(tmp_path, monkeypatch):
+    cache = search.SearchCache(str(tmp_path / "cache.sqlite3"), ttl=0.1)
+    fetch, calls = counting({"organic": [1]})
+    cache.get_or_fetch("tỷ giá", fetch)
+    time.sleep(0.15)
+    cache.get_or_fetch("tỷ giá", fetch)
+    assert len(calls) == 2
+
+    cache.ttl = 3600
+    cache.get_or_fetch("vnindex", fetch)
+    monkeypatch.setattr(search, "date_bucket", lambda now=None, hours=24: "2099-01-01")
+    cache.get_or_fetch("vnindex", fetch)
+    assert len(calls) == 4
+
+
+def test_cache_persists_on_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    search.SearchCache(path, ttl=60).get_or_fetch("vnindex", lambda: {"organic": ["a"]})
+    fetch, calls = counting({"organic": ["b"]})
+    assert search.SearchCache(path, ttl=60).get_or_fetch("VNINDEX", fetch) == {"organic": ["a"]}
+    assert calls == []
+
+
+def test_concurrent_identical_queries_are_coalesced(tmp_path):
+    cache = search.SearchCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    calls = []
+
+    def slow_fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"organic": ["x"]}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("lãi suất", slow_fetch)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{"organic": ["x"]}] * 8
+
+
+def test_a_cancelled_leader_hands_the_search_over(tmp_path):
+    cache = search.SearchCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    leader_token, follower_token = cancellation.CancellationToken(), cancellation.CancellationToken()
+    started, calls = threading.Event(), []
+
+    def leading_fetch():
+        started.set()
+        leader_token.sleep(5)
+
+    def fetch():
+        calls.append(1)
+        return {"organic": ["y"]}
+
+    results = {}
+
+    def run(name, token, fetcher):
+        try:
+            results[name] = token.run(cache.get_or_fetch, "tỷ giá", fetcher)
+        except cancellation.RunCancelledError as e:
+            results[name] = e
+
+    leader = threading.Thread(target=run, args=("leader", leader_token, leading_fetch))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=run, args=("follower", follower_token, fetch))
+    follower.start()
+    time.sleep(0.1)
+    leader_token.cancel("timeout")
+    leader.join(5)
+    follower.join(5)
+    assert isinstance(results["leader"], cancellation.RunCancelledError)
+    assert results["follower"] == {"organic": ["y"]} and len(calls) == 1
+
+    # A waiting caller whose own run is cancelled stops waiting
+    blocked, waiting = threading.Event(), cancellation.CancellationToken()
+    leader = threading.Thread(target=cache.get_or_fetch, args=("vnindex", lambda: blocked.wait(5) and {"organic": [1]}))
+    leader.start()
+    time.sleep(0.1)
+    threading.Timer(0.1, waiting.cancel, args=("timeout",)).start()
+    started_at = time.monotonic()
+    with pytest.raises(cancellation.RunCancelledError):
+        waiting.run(cache.get_or_fetch, "vnindex", lambda: {"organic": [2]})
+    assert time.monotonic() - started_at < 2
+    blocked.set()
+    leader.join(5)
+
+
+def test_errors_and_empty_results_are_not_cached(tmp_path):
+    cache = search.SearchCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    with pytest.raises(ConnectionError):
+        cache.get_or_fetch("fx", lambda: (_ for _ in ()).throw(ConnectionError("down")))
+    cache.get_or_fetch("fx", lambda: {})
+    fetch, calls = counting({"organic": [1]})
+    cache.get_or_fetch("fx", fetch)
+    assert len(calls) == 1
+
+
+def test_search_tool_uses_offline_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(search, "cache", search.SearchCache(str(tmp_path / "cache.sqlite3"), ttl=60))
+    monkeypatch.setattr(search, "offline_backend", search.OfflineSearchBackend())
+    tool = SearchTool(country="vn", locale="vn", n_results=3)
+    result = tool._run(search_query="tin tức vĩ mô")
+    assert result["organic"][0]["title"] == "Tin tức: tin tức vĩ mô"
+    assert tool._run(search_query="Tin tức   vĩ mô") is result
@@ -0,0 +1,87 @@
+import json
+from datetime import date, timedelta
+
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import api, price_arrays, series, universe
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    frame = synthetic_ohlcv(400, seed=4)
+    universe.publish({"HPG": frame}, str(tmp_path))
+    monkeypatch.setattr(universe, "reader", universe.UniverseReader(str(tmp_path), check_seconds=0))
+    expected = price_arrays.calculate_indicators(price_arrays.PriceBars.from_frame(frame)).frame()
+    return TestClient(api.app), expected
+
+
+def test_ndjson_pages_through_the_full_series(client):
+    client, expected = client
+    params = {"start": "2025-01-01", "end": "2025-06-30", "columns": "close,SMA_200,RSI_14", "limit": 50}
+    first = client.get("/indicators/hpg/series", params=params)
+    assert first.headers["content-type"].startswith(series.NDJSON_MEDIA_TYPE)
+    in_range = expected[expected["time"] >= "2025-01-01"].reset_index(drop=True)
+    assert first.headers["x-total-count"] == str(len(in_range))
+    assert first.headers["x-next-offset"] == "50"
+
+    rows = [json.loads(line) for line in first.text.splitlines()]
+    second = client.get("/indicators/HPG/series", params={**params, "offset": 50, "limit": 1000})
+    assert "x-next-offset" not in second.headers
+    rows += [json.loads(line) for line in second.text.splitlines()]
+    assert len(rows) == len(in_range) and list(rows[0]) == ["time", "close", "SMA_200", "RSI_14"]
+    assert rows[0]["time"] == "2025-01-01"
+    # Indicators are warmed up on the bars before start
+    assert rows[0]["SMA_200"] == pytest.approx(float(in_range["SMA_200"][0]), rel=1e-6)
+    assert rows[-1]["close"] == float(str(in_range["close"].iloc[-1]))
+
+
+def test_arrow_stream_carries_the_typed_columns(client):
+    client, expected = client
+    response = client.get(
+        "/indicators/HPG/series", params={"start": "2024-12-02", "end": "2025-06-30", "columns": "volume,SMA_20,OBV"},
+        headers={"Accept": series.ARROW_MEDIA_TYPE},
+    )
+    assert response.headers["content-type"] == series.ARROW_MEDIA_TYPE
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["time", "volume", "SMA_20", "OBV"]
+    assert table.schema.field("SMA_20").type == pa.float32() and table.schema.field("OBV").type == pa.int64()
+    assert table.schema.metadata[b"symbol"] == b"HPG"
+    assert table.num_rows == int(response.headers["x-total-count"]) == 151
+    assert table.column("OBV").to_pylist() == expected["OBV"].tail(table.num_rows).tolist()
+    # Warm-up NaN stay values (not nulls), as in the numpy arrays
+    assert table.column("SMA_20").null_count == 0
+
+
+def test_arrow_batches_wrap_the_numpy_arrays():
+    values = price_arrays.calculate_indicators(price_arrays.PriceBars.from_frame(synthetic_ohlcv(50)))["RSI_14"]
+    assert pa.array(values[10:]).buffers()[1].address == values[10:].ctypes.data
+
+
+def test_invalid_requests(client):
+    client, _ = client
+    assert client.get("/indicators/HPG/series", params={"columns": "close,FOO"}).status_code == 400
+    assert client.get("/indicators/HPG/series", params={"format": "csv"}).status_code == 400
+    assert client.get("/indicators/HPG/series", params={"limit": 0}).status_code == 400
+    assert client.get("/indicators/HPG/series", params={"start": "2025-06-30", "end": "2025-01-01"}).status_code == 400
+
+
+def test_a_universe_missing_the_range_is_not_used(client, monkeypatch):
+    frame = synthetic_ohlcv(400, seed=4)
+    reads = []
+
+    def price_history(symbol, start, end):
+        reads.append(start)
+        return frame[(frame["time"] >= start) & (frame["time"] <= end)]
+
+    monkeypatch.setattr(series.market_store.store, "price_history", price_history)
+    in_universe = series.load("HPG", date(2025, 1, 1), date(2025, 6, 30), ["time", "SMA_200"])
+    assert reads == []
+    # Without the warm-up bars before start, or the sessions up to end, the store serves the range
+    for start, end in ((date(2024, 6, 3), date(2025, 6, 30)), (date(2025, 1, 1), date(2025, 7, 4))):
+        loaded = series.load("HPG", start, end, ["time", "SMA_200"])
+        assert reads[-1] == (start - timedelta(days=series.SERIES_WARMUP_DAYS)).isoformat()
+    assert len(reads) == 2
+    assert loaded.arrays[1][-1] == pytest.approx(in_universe.arrays[1][-1], rel=1e-6)
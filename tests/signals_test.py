@@ -0,0 +1,93 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import api, intraday, signals
+from vn_stock_advisor.tools.custom_tool import TechDataTool
+
+T0 = int(pd.Timestamp("2025-06-27 09:15:00").timestamp())
+
+
+def test_incremental_indicators_match_the_tool_engine():
+    bars = synthetic_ohlcv(260)
+    expected = TechDataTool()._calculate_indicators(bars).latest()
+
+    incremental = signals.IncrementalIndicators()
+    for close, volume in zip(bars["close"], bars["volume"]):
+        latest = incremental.push(float(close), float(volume))
+    for column in ("SMA_20", "SMA_50", "SMA_200", "MACD", "MACD_Signal", "RSI_14", "BB_Upper", "BB_Lower",
+                   "Volume_SMA_50", "Volume_Ratio_20", "OBV"):
+        assert latest[column] == pytest.approx(expected[column], rel=1e-6, abs=1e-5), column
+
+
+def test_evaluator_reports_only_state_transitions():
+    evaluator = signals.SignalEvaluator()
+    # A steady decline drives RSI below 30, then a rally brings it back
+    closes = [30 - 0.2 * i for i in range(30)] + [24.2 + 0.3 * i for i in range(1, 12)]
+    changes = [evaluator.push(T0 + i * 60, (c, c, c, c, 1000)) for i, c in enumerate(closes)]
+
+    assert changes[0] == []
+    rsi = [(i, change) for i, bar in enumerate(changes) for change in bar if change["signal"] == "RSI"]
+    assert [(change["from"], change["to"]) for _, change in rsi] == [
+        ("TRUNG TÍNH", "QUÁ BÁN"), ("QUÁ BÁN", "TRUNG TÍNH"), ("TRUNG TÍNH", "QUÁ MUA"),
+    ]
+    assert rsi[0][0] == 13  # First bar with a full 14-bar window
+    # Replayed or older bars are ignored
+    assert evaluator.push(T0, (50, 50, 50, 50, 1)) == []
+
+
+def test_hub_evaluates_once_per_symbol_for_thousands_of_subscribers():
+    store = intraday.IntradayStore()
+    hub = signals.SignalHub(store)
+    loop = asyncio.new_event_loop()
+    try:
+        subscribers = [signals.Subscriber(loop) for _ in range(2000)]
+        for subscriber in subscribers:
+            snapshot = hub.subscribe(subscriber, "hpg", "1m")
+        assert snapshot == {"type": "snapshot", "symbol": "HPG", "interval": "1m", "time": None, "states": {}}
+        assert hub.subscriptions() == 2000
+        with pytest.raises(ValueError):
+            hub.subscribe(subscribers[0], "HPG", "2h")
+
+        for minute, close in enumerate([30 - 0.2 * i for i in range(20)]):
+            store.ingest_bar("HPG", T0 + minute * 60, close, close, close, close, 1000)
+        loop.run_until_complete(asyncio.sleep(0))
+
+        messages = subscribers[-1].queue
+        transitions = [messages.get_nowait() for _ in range(messages.qsize())]
+        assert "RSI" in {message["signal"] for message in transitions}
+        assert all(message["type"] == "transition" and message["symbol"] == "HPG" for message in transitions)
+        assert all(subscriber.queue.qsize() == len(transitions) for subscriber in subscribers[:-1])
+
+        for subscriber in subscribers:
+            hub.remove(subscriber)
+        assert hub.subscriptions() == 0 and not hub._evaluators
+    finally:
+        loop.close()
+
+
+def test_websocket_pushes_snapshot_then_transitions(monkeypatch):
+    store = intraday.IntradayStore()
+    monkeypatch.setattr(signals, "hub", signals.SignalHub(store))
+    closes = np.r_[np.linspace(30, 26, 20), np.linspace(26.3, 29, 10)]
+    for minute, close in enumerate(closes[:16]):
+        store.ingest_bar("FPT", T0 + minute * 60, close, close, close, close, 1000)
+
+    with TestClient(api.app) as client, client.websocket_connect("/ws/signals") as websocket:
+        websocket.send_text("không phải JSON")
+        assert websocket.receive_json()["type"] == "error"
+
+        websocket.send_json({"action": "subscribe", "symbols": ["fpt"], "interval": "1m"})
+        snapshot = websocket.receive_json()
+        assert snapshot["type"] == "snapshot" and snapshot["states"]["RSI"] == "QUÁ BÁN"
+        assert snapshot["time"] == "2025-06-27 09:29:00"
+
+        for minute, close in enumerate(closes[16:], start=16):
+            store.ingest_bar("FPT", T0 + minute * 60, close, close, close, close, 1000)
+        message = websocket.receive_json()
+        assert message["type"] == "transition" and message["symbol"] == "FPT"
+        assert set(message) == {"type", "symbol", "interval", "time", "signal", "from", "to", "detail"}
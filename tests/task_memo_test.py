@@ -0,0 +1,94 @@
+import json
+import time
+
+import pytest
+
+from vn_stock_advisor import task_memo, usage
+
+
+def test_outputs_are_reused_until_their_inputs_change(monkeypatch):
+    memo = task_memo.TaskMemo("", max_age_hours=1)
+    bars = {"last": "bar-1"}
+    monkeypatch.setitem(task_memo.FINGERPRINTS, "technical_analysis", lambda inputs, context: bars["last"])
+    runs = []
+
+    def execute():
+        runs.append(bars["last"])
+        return f"phân tích {bars['last']}"
+
+    inputs = {"symbol": "hpg", "current_date": "2025-06-27"}
+    assert memo.run("technical_analysis", inputs, None, execute) == "phân tích bar-1"
+    assert memo.run("technical_analysis", {**inputs, "symbol": "HPG"}, None, execute) == "phân tích bar-1"
+    # Another prompt, another symbol or a new bar are new inputs
+    memo.run("technical_analysis", inputs, None, execute, prompt="prompt-v2")
+    memo.run("technical_analysis", {**inputs, "symbol": "FPT"}, None, execute)
+    bars["last"] = "bar-2"
+    assert memo.run("technical_analysis", inputs, None, execute) == "phân tích bar-2"
+    assert runs == ["bar-1", "bar-1", "bar-1", "bar-2"]
+
+    fingerprint = memo.fingerprint("technical_analysis", inputs, None)
+    assert memo.get("technical_analysis", fingerprint) == "phân tích bar-2"
+    assert memo.get("technical_analysis", fingerprint, now=time.time() + 7200) is None
+
+
+def test_unreadable_inputs_bypass_the_memo(monkeypatch):
+    memo = task_memo.TaskMemo("")
+
+    def failing(inputs, context):
+        raise RuntimeError("nguồn dữ liệu lỗi")
+
+    monkeypatch.setitem(task_memo.FINGERPRINTS, "fundamental_analysis", failing)
+    for _ in range(2):
+        assert memo.run("fundamental_analysis", {"symbol": "HPG"}, None, lambda: "cơ bản") == "cơ bản"
+    assert task_memo.TASK_MEMO_REQUESTS.value(task="fundamental_analysis", outcome="bypass") >= 2
+    assert memo.fingerprint("unknown_task", {"symbol": "HPG"}, None) is None
+
+
+def test_decision_depends_on_its_context():
+    memo = task_memo.TaskMemo("")
+    first = memo.fingerprint("investment_decision", {"symbol": "HPG"}, "tin tức\n\ncơ bản\n\nkỹ thuật A")
+    second = memo.fingerprint("investment_decision", {"symbol": "HPG"}, "tin tức\n\ncơ bản\n\nkỹ thuật B")
+    assert first and second and first != second
+
+
+def _llm_calls_by_task() -> dict:
+    from vn_stock_advisor.crew import VnStockAdvisor
+
+    inputs = {"symbol": "HPG", "current_date": "2025-06-27", "macro_digest": ""}
+    with usage.track_request("HPG", "test") as ledger:
+        VnStockAdvisor().crew().kickoff(inputs=inputs)
+    calls = {}
+    for entry in ledger.summary()["by_task"]:
+        calls[entry["task"]] = calls.get(entry["task"], 0) + entry["calls"]
+    return {task: count for task, count in calls.items() if count}
+
+
+@pytest.mark.parametrize("mock_providers", [{"task_memo_path": "task_memo.sqlite3"}], indirect=True)
+def test_a_price_tick_only_reruns_the_technical_analyst(mock_providers, monkeypatch):
+    bars = {"last": "bar-1"}
+    monkeypatch.setitem(task_memo.FINGERPRINTS, "technical_analysis", lambda inputs, context: bars["last"])
+
+    assert set(_llm_calls_by_task()) == {
+        "news_collecting", "fundamental_analysis", "technical_analysis", "investment_decision",
+    }
+    assert _llm_calls_by_task() == {}
+
+    bars["last"] = "bar-2"
+    # The recorded technical answer is unchanged, so the strategist's context is too
+    assert set(_llm_calls_by_task()) == {"technical_analysis"}
+    # A new process reads the outputs back from SQLite
+    monkeypatch.setattr(task_memo, "memo", task_memo.TaskMemo(task_memo.memo.path))
+    assert _llm_calls_by_task() == {}
+
+
+def test_the_prompt_covers_the_agent_and_its_tools():
+    from vn_stock_advisor.crew import VnStockAdvisor
+
+    crew = VnStockAdvisor().crew()
+    task = next(task for task in crew.tasks if task.name == "technical_analysis")
+    prompt = task.agent._memo_prompt(task)
+    key, role, goal, backstory, tools = json.loads(prompt)
+    assert (key, role, goal, backstory) == (task.key, task.agent.role, task.agent.goal, task.agent.backstory)
+    assert tools == sorted(tool.name for tool in task.tools or task.agent.tools)
+    task.agent.backstory += " Ưu tiên xu hướng dài hạn."
+    assert task.agent._memo_prompt(task) != prompt
@@ -0,0 +1,48 @@
+import pandas as pd
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import market_data
+from vn_stock_advisor.tools.custom_tool import TechDataTool, resample_bars
+
+
+def test_weekly_and_monthly_bars_aggregate_the_daily_series():
+    daily = synthetic_ohlcv(60)
+    weekly = resample_bars(daily, "W-FRI")
+    monthly = resample_bars(daily, "M")
+
+    # 2025-06-30 is a Monday: the current week holds a single session
+    assert weekly["time"].iloc[-1] == pd.Timestamp("2025-06-30")
+    assert weekly["close"].iloc[-1] == daily["close"].iloc[-1]
+    week = daily[(daily["time"] >= "2025-06-23") & (daily["time"] <= "2025-06-27")]
+    assert weekly.iloc[-2].to_dict() == {
+        "time": pd.Timestamp("2025-06-27"),
+        "open": week["open"].iloc[0],
+        "high": week["high"].max(),
+        "low": week["low"].min(),
+        "close": week["close"].iloc[-1],
+        "volume": week["volume"].sum(),
+    }
+    assert monthly["time"].iloc[-1] == pd.Timestamp("2025-06-30")
+    assert monthly["volume"].sum() == daily["volume"].sum()
+
+
+def test_report_includes_higher_timeframes():
+    report = TechDataTool()._format_report("TST", "Công ty Test", "Thép", synthetic_ohlcv(750))
+    assert "KHUNG THỜI GIAN LỚN HƠN" in report
+    assert "Khung tuần (151 nến" in report
+    assert "Khung tháng (35 nến" in report
+
+
+def test_structured_indicators_use_one_daily_fetch(monkeypatch):
+    history = synthetic_ohlcv(700)
+    history = history.assign(time=pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=len(history)))
+    fetches = []
+    monkeypatch.setattr(market_data, "price_history", lambda *args, **kwargs: fetches.append(kwargs) or history)
+
+    indicators = TechDataTool().structured_indicators("TST")
+    assert len(fetches) == 1
+    assert set(indicators) == {"1D", "1W", "1M"}
+    assert indicators["1D"]["bars"] < indicators["1W"]["bars"] * 5
+    assert indicators["1W"]["close"] == indicators["1D"]["close"] == history["close"].iloc[-1]
+    # JSON-safe: indicators without enough bars are None, not NaN
+    assert indicators["1M"]["SMA_50"] is None
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.fixtures import synthetic_ohlcv
+from vn_stock_advisor import api, price_arrays, universe
+
+
+def _frames():
+    hpg = synthetic_ohlcv(120, seed=1)
+    # Listed later and suspended for two sessions
+    fpt = synthetic_ohlcv(80, seed=2).drop(index=[40, 41]).reset_index(drop=True)
+    return {"hpg": hpg, "FPT": fpt}
+
+
+def test_workers_attach_zero_copy_read_only_views(tmp_path):
+    frames = _frames()
+    assert universe.publish(frames, str(tmp_path)) == 1
+    # Two readers stand in for two workers mapping the same generation
+    first, second = universe.UniverseReader(str(tmp_path)).current(), universe.UniverseReader(str(tmp_path)).current()
+
+    assert first.symbols == ["FPT", "HPG"] and len(first.time) == 120
+    close = first["close"]
+    assert close.dtype == np.float32 and not close.flags.writeable and not close.flags.owndata
+    assert np.array_equal(close, second["close"], equal_nan=True)
+
+    bars = first.bars("hpg")
+    assert np.shares_memory(bars.close, close)
+    assert bars.close.tolist() == frames["hpg"]["close"].astype(np.float32).tolist()
+    gapped = first.bars("FPT")
+    assert len(gapped) == 78 and gapped.volume.tolist() == frames["FPT"]["volume"].tolist()
+
+    expected = price_arrays.calculate_indicators(price_arrays.PriceBars.from_frame(frames["hpg"])).latest()
+    assert first.indicators("HPG")["RSI_14"] == pytest.approx(expected["RSI_14"], rel=1e-6)
+    with pytest.raises(KeyError):
+        first.bars("VNM")
+
+
+def test_new_generation_switches_atomically_and_old_views_survive_pruning(tmp_path):
+    directory = str(tmp_path)
+    universe.publish(_frames(), directory)
+    reader = universe.UniverseReader(directory, check_seconds=0)
+    old = reader.current()
+    old_close = old.bars("HPG").close
+
+    frames = _frames()
+    frames["VNM"] = synthetic_ohlcv(60, seed=3)
+    assert universe.publish(frames, directory, keep=1) == 2
+    assert universe.current_generation(directory) == 2
+    assert sorted(os.listdir(directory)) == ["CURRENT", "gen-000002.bin", "gen-000002.json"]
+
+    current = reader.current()
+    assert current.generation == 2 and "VNM" in current
+    # The pruned generation stays mapped for readers still holding it
+    assert old.generation == 1 and "VNM" not in old
+    assert old_close.tolist() == frames["hpg"]["close"].astype(np.float32).tolist()
+    assert current.status()["symbols"] == 3
+
+
+def test_status_endpoint_before_and_after_publish(tmp_path, monkeypatch):
+    monkeypatch.setattr(universe, "reader", universe.UniverseReader(str(tmp_path), check_seconds=0))
+    client = TestClient(api.app)
+    assert client.get("/universe").json() == {"generation": None}
+
+    universe.publish(_frames(), str(tmp_path))
+    status = client.get("/universe").json()
+    assert status["generation"] == 1 and status["symbols"] == 2 and status["sessions"] == 120
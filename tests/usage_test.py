@@ -0,0 +1,78 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from vn_stock_advisor import metrics, usage
+
+
+class _Usage:
+    prompt_tokens = 120
+    completion_tokens = 30
+
+
+def test_recorder_reads_dict_and_object_usage():
+    recorder = usage.UsageRecorder()
+    recorder.log_success_event({}, {"usage": {"prompt_tokens": 10, "completion_tokens": 5}}, 0, 0)
+    recorder.log_success_event({}, {"usage": _Usage()}, 0, 0)
+    assert (recorder.prompt_tokens, recorder.completion_tokens, recorder.reported) == (130, 35, True)
+
+
+def test_record_call_attributes_usage_to_agent_and_task(tmp_path, monkeypatch):
+    monkeypatch.setitem(usage.PRICE_OVERRIDES, "test/model", {"input": 1.0, "output": 2.0})
+    store = usage.UsageStore(str(tmp_path / "usage.sqlite3"))
+
+    with usage.track_request("HPG", "complete", usage_store=store) as ledger:
+        with metrics.task_scope("technical_analysis", "Chuyên gia phân tích kỹ thuật"):
+            recorder = usage.UsageRecorder()
+            recorder.log_success_event({}, {"usage": _Usage()}, 0, 0)
+            usage.record_call("test/model", recorder, [{"role": "user", "content": "hi"}], "ok")
+        # No usage reported by the provider: tokens are estimated
+        usage.record_call("test/model", usage.UsageRecorder(), [{"role": "user", "content": "x" * 400}], "y" * 40)
+
+    summary = ledger.summary()
+    assert summary["calls"] == 2
+    tech = next(e for e in summary["by_task"] if e["task"] == "technical_analysis")
+    assert tech["agent"] == "Chuyên gia phân tích kỹ thuật"
+    assert (tech["prompt_tokens"], tech["completion_tokens"]) == (120, 30)
+    assert tech["cost_usd"] == pytest.approx((120 * 1.0 + 30 * 2.0) / 1_000_000)
+    unknown = next(e for e in summary["by_task"] if e["task"] == "unknown")
+    assert unknown["estimated_calls"] == 1 and unknown["prompt_tokens"] > 0
+
+    by_symbol = store.aggregate(group_by=("symbol",))
+    assert by_symbol == [{
+        "symbol": "HPG", "requests": 1, "calls": 2,
+        "prompt_tokens": summary["prompt_tokens"], "completion_tokens": summary["completion_tokens"],
+        "cost_usd": pytest.approx(summary["cost_usd"]),
+    }]
+    assert store.aggregate(group_by=("day", "task"), symbol="FPT") == []
+    with pytest.raises(ValueError):
+        store.aggregate(group_by=("symbol; DROP TABLE llm_usage",))
+
+
+def test_budget_stops_further_calls(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage, "BUDGET_TOKENS_PER_REQUEST", 100)
+    store = usage.UsageStore(str(tmp_path / "usage.sqlite3"))
+
+    with usage.track_request("HPG", "complete", usage_store=store) as ledger:
+        usage.check_budget()
+        ledger.add("agent", "task", "model", 90, 20, 0.0)
+        with pytest.raises(usage.BudgetExceededError):
+            usage.check_budget()
+
+    # Outside a request nothing is enforced
+    usage.check_budget()
+
+
+def test_usage_endpoint_groups_rows(tmp_path, monkeypatch):
+    from vn_stock_advisor.api import app
+
+    store = usage.UsageStore(str(tmp_path / "usage.sqlite3"))
+    monkeypatch.setattr(usage, "store", store)
+    for symbol in ("HPG", "HPG", "FPT"):
+        ledger = usage.UsageLedger(symbol, "complete", day="2025-06-02")
+        ledger.add("agent", "news_collecting", "m", 100, 10, 0.01)
+        store.save(ledger)
+
+    client = TestClient(app)
+    rows = client.get("/usage", params={"group_by": "symbol"}).json()["rows"]
+    assert [(r["symbol"], r["requests"], r["prompt_tokens"]) for r in rows] == [("FPT", 1, 100), ("HPG", 2, 200)]
+    assert client.get("/usage", params={"group_by": "bogus"}).status_code == 400